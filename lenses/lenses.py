@@ -2,8 +2,13 @@
 Lenses.py
 
 A collection of conversion functions to convert documents between released schema versions
+
+Each lens applied is instrumented as a `lens.<name>` span, within a `migrate.<conversion>` span (see
+`power_curve_schema.instrumentation`).
 """
 
+from power_curve_schema.instrumentation import span
+
 
 def _add_power_reference_location(doc, value="low-voltage"):
     """Adds a new power_reference_location property using a given value (or by default
@@ -121,16 +126,27 @@ def _remove_dimension(arr, dim):
         return arr
 
 
-def alpha_3_to_alpha_4(doc):
-    """Convert documents compliant with alpha-3 to documents compliant with alpha-4"""
+def _named(lenses):
+    """Pair lenses with the names of their spans"""
+    return tuple((f"lens.{lens.__name__.lstrip('_')}", lens) for lens in lenses)
+
 
-    lenses = [
+_ALPHA_3_TO_ALPHA_4 = _named(
+    [
         _add_power_reference_location,
         _change_shear_coefficient_to_vertical_shear_exponent,
         _move_available_hub_heights_to_restricted,
         _rename_dimension_to_axis,
         _collapse_singleton_dimensions,
     ]
-    for lens in lenses:
-        doc = lens(doc)
+)
+
+
+def alpha_3_to_alpha_4(doc):
+    """Convert documents compliant with alpha-3 to documents compliant with alpha-4"""
+
+    with span("migrate.alpha_3_to_alpha_4"):
+        for name, lens in _ALPHA_3_TO_ALPHA_4:
+            with span(name):
+                doc = lens(doc)
     return doc
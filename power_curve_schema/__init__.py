@@ -0,0 +1,6 @@
+"""
+Tools for working with power curve documents compliant with the power-curve-schema.
+
+Submodules are deliberately not imported here, so that lightweight consumers (eg the command line interface)
+only pay for the imports they use.
+"""
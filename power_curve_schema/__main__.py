@@ -0,0 +1,11 @@
+"""
+__main__.py
+
+Allow the command line tool to be run with `python -m power_curve_schema`.
+"""
+
+import sys
+
+from .cli import main
+
+sys.exit(main())
@@ -0,0 +1,77 @@
+"""
+Arrays.py
+
+Helpers to convert between the nested-list N-D arrays used in power curve documents and numpy arrays
+"""
+
+import numpy as np
+
+from .instrumentation import count
+
+# The N-D arrays in an operating mode which are defined on the grid described by its `parameters`
+CURVE_FIELDS = ("power", "thrust_coefficient", "rotor_rpm")
+
+# Arrays derived from the curve arrays, on the same grid (see `derived.py`)
+DERIVED_FIELDS = ("power_coefficient", "axial_induction", "tip_speed_ratio")
+
+
+def to_ndarray(values, dtype=np.float64):
+    """Convert a (possibly nested) list of numbers to a numpy array.
+
+    Args:
+        values: A list, nested list or array of numbers
+        dtype: The numpy dtype of the returned array
+
+    Returns:
+        A numpy array of the given dtype
+
+    Raises:
+        ValueError: If the nested lists are ragged (ie not a regular N-D array)
+    """
+    try:
+        array = np.asarray(values, dtype=dtype)
+    except ValueError as e:
+        raise ValueError(f"Values do not form a regular N-D array of numbers: {e}") from e
+    if not isinstance(values, np.ndarray):
+        count("arrays.cells", array.size)
+    return array
+
+
+def to_nested(array):
+    """Convert a numpy array (or scalar) to nested lists of python numbers, as used in documents"""
+    return np.asarray(array).tolist()
+
+
+def axis_parameters(mode):
+    """Get the parameters of an operating mode which define an array axis, ordered by axis number"""
+    return sorted((parameter for parameter in mode["parameters"] if "axis" in parameter), key=lambda p: p["axis"])
+
+
+def mode_shape(mode):
+    """Get the shape of the curve arrays of an operating mode, as described by its axis parameters"""
+    return tuple(len(parameter["values"]) for parameter in axis_parameters(mode))
+
+
+# The dtype of coordinates of bucketed axes, whose values are {min, max} ranges rather than bin centers
+BUCKET_DTYPE = np.dtype([("min", np.float64), ("max", np.float64)])
+
+
+def axis_coordinates(values):
+    """Get the coordinates of an axis parameter as a sortable 1-D array, for aligning and searching axes.
+
+    Args:
+        values: The `values` of an axis parameter, either numbers (bin centers) or {min, max} dicts (buckets)
+
+    Returns:
+        A float64 array of bin centers, or an array of `BUCKET_DTYPE` (ordered by min, then max) for buckets
+    """
+    if not isinstance(values, np.ndarray) and values and all(isinstance(value, dict) for value in values):
+        return np.array([(value["min"], value["max"]) for value in values], dtype=BUCKET_DTYPE)
+    return to_ndarray(values)
+
+
+def coordinate_to_json(coordinate):
+    """Convert one element of an array from `axis_coordinates` back to its form in a document"""
+    if isinstance(coordinate, np.void):
+        return {"min": float(coordinate["min"]), "max": float(coordinate["max"])}
+    return float(coordinate)
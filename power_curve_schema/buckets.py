@@ -0,0 +1,200 @@
+"""
+Buckets.py
+
+Selection of buckets on range-valued axes, and checks of validity ranges, for many condition values at once.
+
+Axis values can be bin centers (interpolated between) or {min, max} buckets (selected from, the bucket containing a
+value being the one whose min is at most, and max is greater than, the value). A parameter can also be a validity range,
+{label, min, max}, which doesn't add an axis but restricts the conditions under which the mode's curves apply
+(inclusive of both ends).
+
+Each bucketed axis is indexed once as arrays of its bucket edges, sorted by min, so that locating any number of values
+is a vectorized binary search (`searchsorted`) and a comparison against the upper edge of the bucket found, rather than
+a scan of the buckets for each value. Values in no bucket (below the first, above the last or in a gap between buckets)
+are flagged as outside, and assigned the nearest bucket.
+
+Example:
+
+    from power_curve_schema.buckets import BucketSelector
+
+    selector = BucketSelector(mode)
+    indices, outside = selector({"turbulence-intensity": values, "wind-veer": veers})
+    indices["turbulence-intensity"]  # The index of each value's bucket along the axis
+    outside  # True where a value isn't in any bucket, or a validity range parameter isn't satisfied
+
+Interpolation of operating modes (see `interpolation.py`) selects buckets in this way along bucketed axes, while
+interpolating along the others.
+"""
+
+import functools
+
+import numpy as np
+
+from .arrays import BUCKET_DTYPE, axis_coordinates, axis_parameters
+
+
+class BucketAxis:
+    """An index of the buckets of a range-valued axis.
+
+    Args:
+        coordinates: The buckets, as an array of `BUCKET_DTYPE` (see `arrays.axis_coordinates`)
+        label: The label of the axis, used in error messages
+
+    Raises:
+        ValueError: If any bucket is empty (max not greater than min), or buckets overlap
+    """
+
+    __slots__ = ("label", "order", "mins", "maxs")
+
+    def __init__(self, coordinates, label="axis"):
+        self.label = label
+        self.order = np.argsort(coordinates["min"], kind="stable")
+        self.mins = np.ascontiguousarray(coordinates["min"][self.order])
+        self.maxs = np.ascontiguousarray(coordinates["max"][self.order])
+        if self.mins.size == 0:
+            raise ValueError(f"Axis '{label}' has no buckets")
+        if np.any(self.maxs <= self.mins):
+            raise ValueError(f"Axis '{label}' has empty buckets, whose max isn't greater than their min")
+        if np.any(self.maxs[:-1] > self.mins[1:]):
+            raise ValueError(f"Axis '{label}' has overlapping buckets")
+        for array in (self.order, self.mins, self.maxs):
+            array.setflags(write=False)
+
+    def __len__(self):
+        return self.mins.size
+
+    def locate(self, values):
+        """Find the bucket containing each of an array of values.
+
+        Args:
+            values: Array of values (any shape)
+
+        Returns:
+            An array of the indices of the buckets (into the axis, in its original order) and a boolean array which is
+            True for values in no bucket (including NaN), for which the index is that of the nearest bucket, both the
+            shape of `values`
+        """
+        values = np.asarray(values, dtype=np.float64)
+        positions = np.searchsorted(self.mins, values, side="right") - 1
+        below = positions < 0
+        positions = positions.clip(0)
+        outside = below | ~(values < self.maxs[positions])
+        if np.any(outside):
+            # Outside values after a bucket are nearer either it or the next bucket
+            following = np.minimum(positions + 1, self.mins.size - 1)
+            after = values - self.maxs[positions]
+            before = self.mins[following] - values
+            nearer_following = outside & ~below & (before < after)
+            positions = np.where(nearer_following, following, positions)
+        return self.order[positions], outside
+
+    def select(self, values, out_of_bounds="raise"):
+        """Find the bucket containing each of an array of values, as `locate`.
+
+        Args:
+            values: Array of values (any shape)
+            out_of_bounds: "raise" to raise a ValueError for values in no bucket, or "clip" to select the nearest
+
+        Returns:
+            An array of the indices of the buckets, the shape of `values`
+        """
+        indices, outside = self.locate(values)
+        if out_of_bounds == "raise" and np.any(outside):
+            values = np.broadcast_to(np.asarray(values, dtype=np.float64), outside.shape)
+            raise ValueError(
+                f"Cannot select buckets of axis '{self.label}' at {values[outside].ravel()[:5].tolist()}, which are in "
+                "no bucket (use out_of_bounds='clip' to select the nearest)"
+            )
+        return indices
+
+
+@functools.lru_cache(maxsize=1024)
+def _cached_bucket_axis(buckets, label):
+    return BucketAxis(np.array(list(buckets), dtype=BUCKET_DTYPE), label)
+
+
+def bucket_axis(coordinates, label="axis"):
+    """Get a (cached) BucketAxis of the buckets of an axis, given as an array of `BUCKET_DTYPE` or {min, max} dicts"""
+    if not isinstance(coordinates, np.ndarray):
+        coordinates = axis_coordinates(coordinates)
+    return _cached_bucket_axis(tuple(coordinates.tolist()), label)
+
+
+def is_validity_range(parameter):
+    """Check whether a parameter of an operating mode is a validity range ({label, min, max})"""
+    return "axis" not in parameter and "value" not in parameter and ("min" in parameter or "max" in parameter)
+
+
+def validity_ranges(mode):
+    """Get the validity range parameters of an operating mode, as a dict of {label: (min, max)}"""
+    return {
+        parameter["label"]: (parameter.get("min", -np.inf), parameter.get("max", np.inf))
+        for parameter in mode["parameters"]
+        if is_validity_range(parameter)
+    }
+
+
+def outside_validity_ranges(ranges, points):
+    """Check which points are outside any of a set of validity ranges.
+
+    Args:
+        ranges: A dict of {label: (min, max)}, as from `validity_ranges`
+        points: A dict mapping labels to values (numbers or arrays, which are broadcast together). Ranges whose labels
+            aren't in the points aren't checked.
+
+    Returns:
+        A boolean array of the broadcast shape of the checked values, True where any value is outside its range (or NaN)
+    """
+    outside = np.zeros((), dtype=bool)
+    for label, (low, high) in ranges.items():
+        if label in points:
+            values = np.asarray(points[label], dtype=np.float64)
+            outside = outside | ~((values >= low) & (values <= high))
+    return outside
+
+
+class BucketSelector:
+    """Selection of buckets along every bucketed axis of an operating mode, and checks of its validity ranges.
+
+    Args:
+        mode: An operating mode dict, as in a power curve document
+    """
+
+    __slots__ = ("label", "axes", "ranges")
+
+    def __init__(self, mode):
+        self.label = mode.get("label")
+        self.axes = {}
+        for parameter in axis_parameters(mode):
+            coordinates = axis_coordinates(parameter["values"])
+            if coordinates.dtype == BUCKET_DTYPE:
+                self.axes[parameter["label"]] = bucket_axis(coordinates, parameter["label"])
+        self.ranges = validity_ranges(mode)
+
+    def __call__(self, points):
+        """Select buckets for a set of points.
+
+        Args:
+            points: A dict mapping the label of every bucketed axis (and optionally of validity range parameters) to
+                values (numbers or arrays, which are broadcast together)
+
+        Returns:
+            A dict of arrays of bucket indices by axis label, and a boolean array which is True for points in no bucket
+            of some axis (for which the nearest bucket is given) or outside a validity range, all of the broadcast shape
+            of the points
+        """
+        labels = list(self.axes) + [label for label in self.ranges if label in points]
+        try:
+            values = np.broadcast_arrays(*(np.asarray(points[label], dtype=np.float64) for label in labels))
+        except KeyError as e:
+            raise KeyError(f"Operating mode '{self.label}' needs a value for parameter {e}") from None
+        values = dict(zip(labels, values))
+        shape = values[labels[0]].shape if labels else ()
+
+        indices = {}
+        outside = np.zeros(shape, dtype=bool)
+        for label, axis in self.axes.items():
+            indices[label], axis_outside = axis.locate(values[label])
+            outside |= axis_outside
+        outside |= outside_validity_ranges(self.ranges, values)
+        return indices, outside
@@ -0,0 +1,183 @@
+"""
+Bundle.py
+
+Build and load a pre-bundled version of the schema, in which all internal `$ref`s are inlined (dereferenced) and
+annotation-only keywords (`title`, `description`, `examples`, `$comment`, ...) are removed.
+
+Validation results are the same as for the source schema, but validators don't need to resolve references, and the
+artifact is cached on disk next to `schema.json` so that a fresh process only has to read it. The artifact is checked
+against its metaschema when built, and records the hash of the source schema it was built from (which also serves as
+its identity for validator caching). It is rebuilt automatically when the source changes.
+
+To build the artifact explicitly (eg as a packaging or CI step), run:
+
+    python -m power_curve_schema.bundle
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+
+from .schemas import SCHEMA_PATH
+
+BUNDLED_SCHEMA_PATH = os.path.join(os.path.dirname(SCHEMA_PATH), "schema.bundled.json")
+
+# Key under which the bundled artifact records the hash of its source
+SOURCE_HASH_KEY = "x-source-sha256"
+
+# Keywords which only annotate a schema, so have no effect on validation results
+ANNOTATION_KEYWORDS = frozenset(
+    ("title", "description", "examples", "$comment", "default", "deprecated", "readOnly", "writeOnly")
+)
+
+# Keywords whose values are a subschema, a list of subschemas, or a mapping of names to subschemas
+_SUBSCHEMA_KEYWORDS = frozenset(
+    (
+        "additionalProperties",
+        "contains",
+        "else",
+        "if",
+        "items",
+        "not",
+        "propertyNames",
+        "then",
+        "unevaluatedItems",
+        "unevaluatedProperties",
+    )
+)
+_SUBSCHEMA_LIST_KEYWORDS = frozenset(("allOf", "anyOf", "oneOf", "prefixItems"))
+_SUBSCHEMA_MAP_KEYWORDS = frozenset(("properties", "patternProperties", "dependentSchemas"))
+
+
+def _resolve_pointer(root, ref):
+    """Resolve an internal reference like `#/$defs/arrays/1d` against the root schema"""
+    if not ref.startswith("#"):
+        raise ValueError(f"Only internal references can be bundled, got '{ref}'")
+    node = root
+    for token in ref[1:].split("/")[1:]:
+        token = token.replace("~1", "/").replace("~0", "~")
+        node = node[int(token)] if isinstance(node, list) else node[token]
+    return node
+
+
+def _bundle(node, root, resolving):
+    """Recursively inline references in, and strip annotations from, a subschema"""
+    if not isinstance(node, dict):
+        return node
+
+    bundled = {}
+    for keyword, value in node.items():
+        if keyword in ANNOTATION_KEYWORDS or keyword in ("$ref", "$defs", "definitions"):
+            continue
+        if keyword in _SUBSCHEMA_KEYWORDS:
+            if isinstance(value, list):
+                value = [_bundle(item, root, resolving) for item in value]
+            else:
+                value = _bundle(value, root, resolving)
+        elif keyword in _SUBSCHEMA_LIST_KEYWORDS:
+            value = [_bundle(item, root, resolving) for item in value]
+        elif keyword in _SUBSCHEMA_MAP_KEYWORDS:
+            value = {name: _bundle(item, root, resolving) for name, item in value.items()}
+        bundled[keyword] = value
+
+    ref = node.get("$ref")
+    if ref is None:
+        return bundled
+
+    if ref in resolving:
+        raise ValueError(f"Cannot bundle recursive reference '{ref}'")
+    target = _bundle(_resolve_pointer(root, ref), root, resolving | {ref})
+
+    # A reference alongside other validation keywords applies both, which is preserved with an allOf
+    if not bundled:
+        return target
+    return {"allOf": [target, bundled]}
+
+
+def bundle_schema(schema):
+    """Produce a bundled copy of a schema, with internal references inlined and annotations removed.
+
+    Args:
+        schema: The source schema (which is not modified)
+
+    Returns:
+        The bundled schema, which has the same validation results as the source
+    """
+    bundled = _bundle(schema, schema, frozenset())
+    if "$schema" in schema:
+        bundled = {"$schema": schema["$schema"], **bundled}
+    return bundled
+
+
+def _source_hash(path):
+    with open(path, "rb") as fp:
+        return hashlib.sha256(fp.read()).hexdigest()
+
+
+def _build(source_path):
+    """Bundle the source schema, checking the result against its metaschema"""
+    with open(source_path, "r", encoding="utf-8") as fp:
+        schema = json.load(fp)
+
+    bundled = bundle_schema(schema)
+
+    # Check the artifact once here, so that loaders can skip the (expensive) check
+    from jsonschema.validators import validator_for  # pylint: disable=import-outside-toplevel
+
+    validator_for(bundled).check_schema(bundled)
+    bundled[SOURCE_HASH_KEY] = _source_hash(source_path)
+    return bundled
+
+
+def _write(bundled, output_path):
+    """Write an artifact to a temporary file then rename, so that concurrent processes never read a partial artifact"""
+    fd, temporary_path = tempfile.mkstemp(dir=os.path.dirname(output_path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as fp:
+            json.dump(bundled, fp, separators=(",", ":"))
+        os.replace(temporary_path, output_path)
+    except BaseException:
+        os.unlink(temporary_path)
+        raise
+
+
+def build_bundled_schema(source_path=SCHEMA_PATH, output_path=BUNDLED_SCHEMA_PATH):
+    """Build the bundled schema artifact from the source schema, writing it atomically to disk.
+
+    Returns:
+        The bundled schema
+    """
+    bundled = _build(source_path)
+    _write(bundled, output_path)
+    return bundled
+
+
+def load_bundled_schema(source_path=SCHEMA_PATH, output_path=BUNDLED_SCHEMA_PATH):
+    """Load the bundled schema artifact, (re)building it first if it is missing or out of date with the source.
+
+    If the artifact can't be written (eg in a read-only installation) the bundled schema is built in memory instead.
+
+    Returns:
+        The bundled schema
+    """
+    try:
+        with open(output_path, "r", encoding="utf-8") as fp:
+            bundled = json.load(fp)
+    except (FileNotFoundError, json.JSONDecodeError):
+        bundled = None
+
+    if bundled is not None and bundled.get(SOURCE_HASH_KEY) == _source_hash(source_path):
+        return bundled
+
+    bundled = _build(source_path)
+    try:
+        _write(bundled, output_path)
+    except OSError:
+        pass
+    return bundled
+
+
+if __name__ == "__main__":
+    build_bundled_schema()
+    print(f"Bundled schema written to {BUNDLED_SCHEMA_PATH}")
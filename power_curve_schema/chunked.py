@@ -0,0 +1,499 @@
+"""
+Chunked.py
+
+A chunked, compressed store for power curve documents whose curve arrays are too large to hold as nested JSON lists,
+or to load whole. The schema allows up to nine axes, so a curve with ten values per axis has a billion cells.
+
+Each curve array is split into chunks, which are compressed and stored separately, so that reading a slice of an array
+(eg the curves at one air density) reads only the chunks it intersects, and an array can be written slab by slab
+without ever being held in memory.
+
+The store is a directory in the Zarr (version 2) format, written using only numpy and zlib, so it can also be opened
+with `zarr` or `xarray`. Each operating mode is a group, whose arrays have dimensions named by the labels of the
+mode's axis parameters (with the numeric axis values as coordinate arrays), and the rest of the document is kept as an
+attribute of the root group:
+
+    generic-274-20.zarr/
+        .zgroup
+        .zattrs                     # {"power_curve_document": <the document without curve arrays>}
+        operating_modes/
+            .zgroup
+            0/                      # a group per operating mode, in document order
+                .zgroup
+                power/
+                    .zarray         # shape, chunk shape, dtype and compressor
+                    .zattrs         # {"_ARRAY_DIMENSIONS": ["air-density", "wind-speed"]}
+                    0.0             # compressed chunks, named by their index in the chunk grid
+                thrust_coefficient/
+                air-density/        # a coordinate array per axis
+                wind-speed/
+            1/
+
+By default chunks span whole trailing axes, splitting leading axes, so that selecting a value of a leading axis reads
+the fewest chunks; pass `chunk_bytes` (or an explicit chunk shape) to tune this.
+
+Example:
+
+    from power_curve_schema.chunked import ChunkedStore, export_document
+
+    store = export_document(doc, "generic-274-20.zarr")
+    mode = store.select("mode_1", {"air-density": 1.225})
+    mode["power"]  # a 1-D array over wind speed, read from one chunk
+
+    # Arrays too large for memory can be omitted from the document, then written in slabs
+    store = export_document(doc_without_arrays, "huge.zarr")
+    power = store.create_array("mode_1", "power")
+    for i, slab in enumerate(slabs):
+        power[i] = slab
+"""
+
+import itertools
+import json
+import math
+import os
+import zlib
+
+import numpy as np
+
+from .arrays import CURVE_FIELDS, axis_coordinates, axis_parameters, mode_shape, to_ndarray, to_nested
+from .encoding import decode_document
+
+# The default (uncompressed) size of a chunk
+CHUNK_BYTES = 1 << 20
+
+_DOCUMENT_ATTRIBUTE = "power_curve_document"
+_DIMENSIONS_ATTRIBUTE = "_ARRAY_DIMENSIONS"
+_MODES_GROUP = "operating_modes"
+
+# Zarr represents non-finite fill values as strings
+_SPECIAL_FILL_VALUES = {"NaN": np.nan, "Infinity": np.inf, "-Infinity": -np.inf}
+
+
+def _read_json_file(path):
+    with open(path, "r", encoding="utf-8") as fp:
+        return json.load(fp)
+
+
+def _write_json_file(path, data):
+    with open(path, "w", encoding="utf-8") as fp:
+        json.dump(data, fp, indent=2)
+
+
+def _create_group(path, attributes=None):
+    os.makedirs(path, exist_ok=True)
+    _write_json_file(os.path.join(path, ".zgroup"), {"zarr_format": 2})
+    if attributes is not None:
+        _write_json_file(os.path.join(path, ".zattrs"), attributes)
+
+
+def _fill_value_to_json(value):
+    if np.isnan(value):
+        return "NaN"
+    if np.isinf(value):
+        return "Infinity" if value > 0 else "-Infinity"
+    return float(value)
+
+
+def default_chunks(shape, itemsize=8, chunk_bytes=CHUNK_BYTES):
+    """Get a chunk shape for an array, spanning whole trailing axes and splitting leading ones.
+
+    Args:
+        shape: The shape of the array
+        itemsize: The size in bytes of each array element
+        chunk_bytes: The target (uncompressed) size of each chunk
+
+    Returns:
+        The chunk shape, as a tuple
+    """
+    cells = max(chunk_bytes // itemsize, 1)
+    chunks = []
+    for size in reversed(shape):
+        extent = max(min(size, cells), 1)
+        chunks.append(extent)
+        cells = max(cells // extent, 1)
+    return tuple(reversed(chunks))
+
+
+class ChunkedArray:
+    """An N-D array stored as compressed chunks in a directory, which is read and written by indexing.
+
+    Indexing with integers and slices reads only the chunks intersecting the selection, returning a numpy array.
+    Assigning to integers and (unit step) slices writes the chunks intersecting the selection, reading only those which
+    are partly overwritten. Chunks which have never been written read as the fill value.
+    """
+
+    __slots__ = ("path", "shape", "chunks", "dtype", "fill_value", "level")
+
+    def __init__(self, path):
+        metadata = _read_json_file(os.path.join(path, ".zarray"))
+        compressor = metadata.get("compressor")
+        if compressor is not None and compressor.get("id") != "zlib":
+            raise ValueError(f"Unsupported compressor '{compressor.get('id')}' for chunked array {path}")
+        if metadata.get("order", "C") != "C" or metadata.get("filters"):
+            raise ValueError(f"Unsupported chunk order or filters for chunked array {path}")
+        self.path = path
+        self.shape = tuple(metadata["shape"])
+        self.chunks = tuple(metadata["chunks"])
+        self.dtype = np.dtype(metadata["dtype"])
+        fill_value = metadata.get("fill_value")
+        self.fill_value = _SPECIAL_FILL_VALUES.get(fill_value, fill_value if fill_value is not None else 0)
+        self.level = None if compressor is None else compressor.get("level", 1)
+
+    @classmethod
+    def create(cls, path, shape, dimensions=None, chunks=None, dtype=np.float64, level=1, fill_value=np.nan):
+        """Create a new (empty) chunked array.
+
+        Args:
+            path: The directory to store the array in
+            shape: The shape of the array
+            dimensions: Optional names of the array's dimensions
+            chunks: The chunk shape, defaulting to that from `default_chunks`
+            dtype: The numpy dtype of the array
+            level: The zlib compression level, or None to store chunks uncompressed
+            fill_value: The value of cells in chunks which haven't been written
+
+        Returns:
+            The new ChunkedArray
+        """
+        dtype = np.dtype(dtype)
+        shape = tuple(int(size) for size in shape)
+        chunks = tuple(chunks) if chunks is not None else default_chunks(shape, dtype.itemsize)
+        if len(chunks) != len(shape) or any(extent < 1 for extent in chunks):
+            raise ValueError(f"Invalid chunk shape {chunks} for an array of shape {shape}")
+
+        os.makedirs(path, exist_ok=True)
+        metadata = {
+            "zarr_format": 2,
+            "shape": list(shape),
+            "chunks": list(chunks),
+            "dtype": dtype.str,
+            "compressor": None if level is None else {"id": "zlib", "level": level},
+            "fill_value": _fill_value_to_json(fill_value),
+            "order": "C",
+            "filters": None,
+            "dimension_separator": ".",
+        }
+        _write_json_file(os.path.join(path, ".zarray"), metadata)
+        _write_json_file(os.path.join(path, ".zattrs"), {_DIMENSIONS_ATTRIBUTE: list(dimensions or [])})
+        return cls(path)
+
+    @property
+    def ndim(self):
+        return len(self.shape)
+
+    @property
+    def dimensions(self):
+        """The names of the array's dimensions, or an empty list if they aren't named"""
+        try:
+            return _read_json_file(os.path.join(self.path, ".zattrs")).get(_DIMENSIONS_ATTRIBUTE, [])
+        except FileNotFoundError:
+            return []
+
+    def _chunk_path(self, index):
+        return os.path.join(self.path, ".".join(str(i) for i in index))
+
+    def _read_chunk(self, index):
+        try:
+            with open(self._chunk_path(index), "rb") as fp:
+                data = fp.read()
+        except FileNotFoundError:
+            return np.full(self.chunks, self.fill_value, dtype=self.dtype)
+        if self.level is not None:
+            data = zlib.decompress(data)
+        return np.frombuffer(data, dtype=self.dtype).reshape(self.chunks)
+
+    def _write_chunk(self, index, chunk):
+        data = np.ascontiguousarray(chunk, dtype=self.dtype).tobytes()
+        if self.level is not None:
+            data = zlib.compress(data, self.level)
+        with open(self._chunk_path(index), "wb") as fp:
+            fp.write(data)
+
+    def _region(self, key):
+        """Convert an index to a (start, stop, step) range for each axis, and the axes indexed by integers"""
+        if not isinstance(key, tuple):
+            key = (key,)
+        ellipses = [i for i, item in enumerate(key) if item is Ellipsis]
+        if len(ellipses) > 1:
+            raise IndexError("An index can only have a single ellipsis")
+        if ellipses:
+            i = ellipses[0]
+            key = key[:i] + (slice(None),) * (self.ndim - len(key) + 1) + key[i + 1 :]
+        if len(key) > self.ndim:
+            raise IndexError(f"Too many indices for a chunked array of {self.ndim} dimensions")
+        key = key + (slice(None),) * (self.ndim - len(key))
+
+        ranges, integer_axes = [], []
+        for axis, (item, size) in enumerate(zip(key, self.shape)):
+            if isinstance(item, (int, np.integer)) and not isinstance(item, bool):
+                index = int(item) + size if item < 0 else int(item)
+                if not 0 <= index < size:
+                    raise IndexError(f"Index {item} is out of bounds for axis {axis} with size {size}")
+                ranges.append((index, index + 1, 1))
+                integer_axes.append(axis)
+            elif isinstance(item, slice):
+                start, stop, step = item.indices(size)
+                if step < 0:
+                    raise IndexError("Chunked arrays can't be indexed with negative steps")
+                ranges.append((start, max(stop, start), step))
+            else:
+                raise TypeError("Chunked arrays can only be indexed with integers and slices")
+        return ranges, integer_axes
+
+    def _intersections(self, bounds):
+        """Get (chunk index, slices within the chunk, slices within the region) for chunks intersecting a region"""
+        grids = [
+            range(start // extent, (stop - 1) // extent + 1) if stop > start else range(0)
+            for (start, stop), extent in zip(bounds, self.chunks)
+        ]
+        for index in itertools.product(*grids):
+            chunk_slices, region_slices = [], []
+            for i, (start, stop), extent in zip(index, bounds, self.chunks):
+                lower, upper = max(start, i * extent), min(stop, (i + 1) * extent)
+                chunk_slices.append(slice(lower - i * extent, upper - i * extent))
+                region_slices.append(slice(lower - start, upper - start))
+            yield index, tuple(chunk_slices), tuple(region_slices)
+
+    def __getitem__(self, key):
+        ranges, integer_axes = self._region(key)
+        bounds = [(start, stop) for start, stop, _ in ranges]
+        region = np.empty([stop - start for start, stop in bounds], dtype=self.dtype)
+        for index, chunk_slices, region_slices in self._intersections(bounds):
+            region[region_slices] = self._read_chunk(index)[chunk_slices]
+        region = region[tuple(slice(None, None, step) for _, _, step in ranges)]
+        return region.reshape([size for axis, size in enumerate(region.shape) if axis not in integer_axes])
+
+    def __setitem__(self, key, value):
+        ranges, integer_axes = self._region(key)
+        if any(step != 1 for _, _, step in ranges):
+            raise IndexError("Chunked arrays can only be assigned to with unit step slices")
+        bounds = [(start, stop) for start, stop, _ in ranges]
+        shape = [stop - start for start, stop in bounds]
+        selected_shape = [size for axis, size in enumerate(shape) if axis not in integer_axes]
+        value = np.broadcast_to(np.asarray(value, dtype=self.dtype), selected_shape).reshape(shape)
+
+        for index, chunk_slices, region_slices in self._intersections(bounds):
+            # Chunks whose (in bounds) cells are all overwritten don't need to be read first
+            whole = all(
+                item.start == 0 and item.stop == min(extent, size - i * extent)
+                for item, i, extent, size in zip(chunk_slices, index, self.chunks, self.shape)
+            )
+            if whole:
+                chunk = np.full(self.chunks, self.fill_value, dtype=self.dtype)
+            else:
+                chunk = self._read_chunk(index).copy()
+            chunk[chunk_slices] = value[region_slices]
+            self._write_chunk(index, chunk)
+
+    def read(self):
+        """Read the whole array"""
+        return self[...]
+
+    def read_cells(self, start, stop, prefix=()):
+        """Read a run of cells of the array in C order (as indices into the flattened array), as a 1-D array.
+
+        The run is read as at most two partial sub-arrays and one whole block along each axis, so only the chunks
+        intersecting it are read, and only the run is held in memory.
+
+        Args:
+            start: The flat index of the first cell
+            stop: The flat index after the last cell
+            prefix: Integer indices of leading axes, to read a run of cells of that sub-array
+
+        Returns:
+            A 1-D array of the cells
+        """
+        if stop <= start:
+            return np.empty(0, dtype=self.dtype)
+        inner = math.prod(self.shape[len(prefix) + 1 :])
+        first, last = -(-start // inner), stop // inner
+        if first > last:
+            # The run is inside a single sub-array
+            return self.read_cells(start - last * inner, stop - last * inner, prefix + (last,))
+        parts = []
+        if start < first * inner:
+            parts.append(self.read_cells(start - (first - 1) * inner, inner, prefix + (first - 1,)))
+        if first < last:
+            parts.append(self[prefix + (slice(first, last),)].reshape(-1))
+        if stop > last * inner:
+            parts.append(self.read_cells(0, stop - last * inner, prefix + (last,)))
+        return parts[0] if len(parts) == 1 else np.concatenate(parts)
+
+
+class ChunkedStore:
+    """A power curve document in a chunked store, written by `export_document`.
+
+    Only the (small) non-array content of the document is read on opening; curve arrays are read when selected.
+    """
+
+    __slots__ = ("path", "document", "_mode_indices")
+
+    def __init__(self, path):
+        attributes = _read_json_file(os.path.join(path, ".zattrs"))
+        if _DOCUMENT_ATTRIBUTE not in attributes:
+            raise ValueError(f"{path} is not a chunked power curve document store")
+        self.path = path
+        self.document = attributes[_DOCUMENT_ATTRIBUTE]
+        modes = self.document["power_curves"]["operating_modes"]
+        self._mode_indices = {mode["label"]: i for i, mode in enumerate(modes)}
+
+    def _mode_index(self, label):
+        try:
+            return self._mode_indices[label]
+        except KeyError:
+            raise KeyError(f"Document has no operating mode '{label}'") from None
+
+    def _field_path(self, label, field):
+        return os.path.join(self.path, _MODES_GROUP, str(self._mode_index(label)), field)
+
+    def mode(self, label):
+        """Get an operating mode (without its curve arrays) by label, raising KeyError if not present"""
+        return self.document["power_curves"]["operating_modes"][self._mode_index(label)]
+
+    def fields(self, label):
+        """Get the curve fields stored for an operating mode"""
+        return [
+            field for field in CURVE_FIELDS if os.path.exists(os.path.join(self._field_path(label, field), ".zarray"))
+        ]
+
+    def array(self, label, field):
+        """Get a curve array of an operating mode, as a ChunkedArray to be read by indexing"""
+        if field not in self.fields(label):
+            raise KeyError(f"Operating mode '{label}' has no stored '{field}' array")
+        return ChunkedArray(self._field_path(label, field))
+
+    def create_array(self, label, field, chunks=None, level=1):
+        """Create an empty curve array for an operating mode, of the shape given by its axes, to be written in slabs.
+
+        Args:
+            label: The label of the operating mode
+            field: The curve field, eg "power"
+            chunks: The chunk shape, defaulting to that from `default_chunks`
+            level: The zlib compression level, or None to store chunks uncompressed
+
+        Returns:
+            The new ChunkedArray, whose cells are NaN until written
+        """
+        if field not in CURVE_FIELDS:
+            raise ValueError(f"Unknown curve field '{field}', must be one of {CURVE_FIELDS}")
+        mode = self.mode(label)
+        dimensions = [parameter["label"] for parameter in axis_parameters(mode)]
+        path = self._field_path(label, field)
+        return ChunkedArray.create(path, mode_shape(mode), dimensions=dimensions, chunks=chunks, level=level)
+
+    def select(self, label, selection=None, fields=None):
+        """Read part of an operating mode, selecting values of its axes by coordinate, or by index.
+
+        Args:
+            label: The label of the operating mode
+            selection: A dict by axis parameter label of either a value (selecting the cells at that axis value, and
+                dropping the axis), a (min, max) tuple (selecting the cells with axis values in that closed range) or a
+                slice (selecting cells by index). Axes not in the selection are read whole.
+            fields: The curve fields to read, defaulting to all stored for the mode
+
+        Returns:
+            An operating mode dict with curve arrays as numpy arrays, whose axis parameters describe the selection (with
+            the axes selected by value converted to value parameters)
+        """
+        mode = self.mode(label)
+        selection = dict(selection or {})
+        key, axes, values = [], [], []
+        for parameter in axis_parameters(mode):
+            item = selection.pop(parameter["label"], slice(None))
+            if not isinstance(item, slice):
+                item = self._select_coordinates(parameter, item)
+            key.append(item)
+            if isinstance(item, slice):
+                axes.append({**parameter, "axis": len(axes), "values": parameter["values"][item]})
+            else:
+                values.append({"label": parameter["label"], "value": parameter["values"][item]})
+        if selection:
+            raise ValueError(f"Operating mode '{label}' has no axes {sorted(selection)}")
+
+        selected = {field: value for field, value in mode.items() if field != "parameters"}
+        other_parameters = [parameter for parameter in mode["parameters"] if "axis" not in parameter]
+        selected["parameters"] = axes + values + other_parameters
+        for field in self.fields(label) if fields is None else fields:
+            selected[field] = self.array(label, field)[tuple(key)]
+        return selected
+
+    @staticmethod
+    def _select_coordinates(parameter, item):
+        """Get the index (for a value) or slice (for a (min, max) range) selecting coordinates of an axis parameter"""
+        coordinates = axis_coordinates(parameter["values"])
+        if coordinates.dtype.names is not None:
+            raise ValueError(f"Bucketed axis '{parameter['label']}' can only be selected by index")
+        if isinstance(item, tuple):
+            indices = np.flatnonzero((coordinates >= item[0]) & (coordinates <= item[1]))
+            if indices.size == 0:
+                raise ValueError(f"Axis '{parameter['label']}' has no values in [{item[0]}, {item[1]}]")
+            if indices[-1] - indices[0] + 1 != indices.size:
+                raise ValueError(f"Axis '{parameter['label']}' values in [{item[0]}, {item[1]}] aren't contiguous")
+            return slice(int(indices[0]), int(indices[-1]) + 1)
+        indices = np.flatnonzero(np.isclose(coordinates, item, rtol=1e-12, atol=0))
+        if indices.size == 0:
+            raise ValueError(f"Axis '{parameter['label']}' has no value {item}")
+        return int(indices[0])
+
+    def to_document(self):
+        """Read the whole document, with curve arrays as nested lists"""
+        doc = json.loads(json.dumps(self.document))
+        for mode in doc["power_curves"]["operating_modes"]:
+            for field in self.fields(mode["label"]):
+                mode[field] = to_nested(self.array(mode["label"], field).read())
+        return doc
+
+
+def export_document(doc, path, chunk_bytes=CHUNK_BYTES, level=1):
+    """Write a document to a new chunked store.
+
+    Args:
+        doc: The power curve document (whose curve arrays may be encoded, or omitted to be written later with
+            `ChunkedStore.create_array`)
+        path: The directory to write the store to, which must not already exist (or must be empty)
+        chunk_bytes: The target (uncompressed) size of each chunk of the curve arrays
+        level: The zlib compression level, or None to store chunks uncompressed
+
+    Returns:
+        The ChunkedStore
+    """
+    if os.path.isdir(path) and os.listdir(path):
+        raise FileExistsError(f"Can't export to {path}, which already exists and isn't empty")
+    doc = decode_document(doc)
+    metadata = {**doc, "power_curves": {**doc["power_curves"]}}
+    metadata["power_curves"]["operating_modes"] = [
+        {field: value for field, value in mode.items() if field not in CURVE_FIELDS}
+        for mode in doc["power_curves"]["operating_modes"]
+    ]
+    _create_group(path, {_DOCUMENT_ATTRIBUTE: metadata})
+    _create_group(os.path.join(path, _MODES_GROUP))
+
+    for i, mode in enumerate(doc["power_curves"]["operating_modes"]):
+        mode_path = os.path.join(path, _MODES_GROUP, str(i))
+        _create_group(mode_path, {})
+        axes = axis_parameters(mode)
+        dimensions = [parameter["label"] for parameter in axes]
+        for parameter in axes:
+            coordinates = axis_coordinates(parameter["values"])
+            if coordinates.dtype.names is None:
+                coordinate_path = os.path.join(mode_path, parameter["label"])
+                stored = ChunkedArray.create(
+                    coordinate_path, coordinates.shape, [parameter["label"]], coordinates.shape
+                )
+                stored[...] = coordinates
+        for field in CURVE_FIELDS:
+            if field not in mode:
+                continue
+            array = to_ndarray(mode[field])
+            chunks = default_chunks(array.shape, array.itemsize, chunk_bytes)
+            field_dimensions = dimensions if array.ndim == len(dimensions) else None
+            stored = ChunkedArray.create(
+                os.path.join(mode_path, field), array.shape, field_dimensions, chunks, level=level
+            )
+            stored[...] = array
+    return ChunkedStore(path)
+
+
+def import_document(path):
+    """Read a whole document from a chunked store, as `ChunkedStore.to_document`"""
+    return ChunkedStore(path).to_document()
@@ -0,0 +1,368 @@
+"""
+Cli.py
+
+The `power-curve-schema` command line tool, for validating, migrating, inspecting, converting, comparing and serving
+power curve documents.
+
+The tool is intended for use in CI and pre-commit hooks, so starts quickly: only the standard library and the modules
+a subcommand needs are imported, and only when that subcommand runs. In particular, `validate` checks documents with
+the compiled validator in `fast_validation.py` (which uses the pre-built bundled schema), only importing `jsonschema`
+to explain why a document is invalid.
+
+Usage:
+
+    power-curve-schema validate generic-120-3.json
+    power-curve-schema validate --section turbine partial.json
+    power-curve-schema validate --plausibility generic-120-3.json
+    power-curve-schema migrate old.json --output new.json
+    power-curve-schema inspect generic-120-3.json
+    power-curve-schema convert generic-120-3.json generic-120-3.npz
+    power-curve-schema convert generic-120-3.json generic-120-3.zarr
+    power-curve-schema convert generic-120-3.json encoded.json --to encoded --encoding quantize
+    power-curve-schema diff rev-01.json rev-02.json --rtol 1e-6
+    power-curve-schema serve library/ --port 8080
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import sys
+
+from .instrumentation import document_stats, span
+from .schemas import SECTIONS
+
+# Available migrations, by (from version, to version), as (module, function) to be imported on use
+MIGRATIONS = {
+    ("alpha-3", "alpha-4"): ("lenses.lenses", "alpha_3_to_alpha_4"),
+}
+
+CONVERSIONS = ("json", "canonical", "encoded", "binary", "chunked")
+
+_BINARY_EXTENSION = ".npz"
+_CHUNKED_EXTENSION = ".zarr"
+
+
+def _parse(fp):
+    """Parse a JSON document, instrumented as `serialization.load` (which isn't used, as it would import numpy)"""
+    text = fp.read()
+    with span("json.parse", bytes=len(text)) as active:
+        doc = json.loads(text)
+        if active:
+            active.set(**document_stats(doc))
+    return doc
+
+
+def _read_document(path):
+    """Read a document from a JSON file, a binary or chunked store, or stdin (if the path is '-')"""
+    if path == "-":
+        return _parse(sys.stdin)
+
+    if os.path.isdir(path):
+        from .chunked import import_document  # pylint: disable=import-outside-toplevel
+
+        return import_document(path)
+
+    if path.endswith(_BINARY_EXTENSION):
+        from .model import PowerCurveDocument  # pylint: disable=import-outside-toplevel
+
+        with PowerCurveDocument.from_binary(path) as model:
+            return model.to_dict()
+
+    with open(path, "r", encoding="utf-8") as fp:
+        return _parse(fp)
+
+
+@contextlib.contextmanager
+def _malformed(path):
+    """Report a missing property of a document (a KeyError from looking it up while processing the document) as a
+    ValueError, like other malformed documents"""
+    try:
+        yield
+    except KeyError as e:
+        raise ValueError(f"{path}: malformed document, missing {e}") from None
+
+
+def _write_json(doc, output, indent=None):
+    """Write a document as canonical JSON to a file, or to stdout if the output is None or '-'"""
+    from .serialization import dump  # pylint: disable=import-outside-toplevel
+
+    if output in (None, "-"):
+        dump(doc, sys.stdout, indent=indent)
+        sys.stdout.write("\n")
+        return
+
+    with open(output, "w", encoding="utf-8") as fp:
+        dump(doc, fp, indent=indent)
+        fp.write("\n")
+
+
+def _explain(instance, section):
+    """Get a description of the most relevant validation error in an instance (using the full jsonschema validator)"""
+    from jsonschema.exceptions import ValidationError  # pylint: disable=import-outside-toplevel
+
+    from .validation import validate  # pylint: disable=import-outside-toplevel
+
+    try:
+        validate(instance, section=section)
+    except ValidationError as e:
+        location = "/".join(str(item) for item in e.absolute_path)
+        return f"{e.message} (at /{location})"
+    return "unknown validation error"
+
+
+def _validate(args):
+    from .fast_validation import is_valid  # pylint: disable=import-outside-toplevel
+
+    status = 0
+    for path in args.files:
+        try:
+            instance = _read_document(path)
+        except (OSError, ValueError) as e:
+            print(f"{path}: unreadable: {e}", file=sys.stderr)
+            status = 1
+            continue
+
+        if not is_valid(instance, section=args.section):
+            print(f"{path}: invalid: {_explain(instance, args.section)}", file=sys.stderr)
+            status = 1
+        elif args.plausibility and args.section is None and _check_plausibility(path, instance):
+            status = 1
+        elif not args.quiet:
+            print(f"{path}: valid")
+    return status
+
+
+def _check_plausibility(path, instance):
+    """Print any physical plausibility violations in a (valid) document, returning whether there were any"""
+    from .plausibility import check_document, format_violations  # pylint: disable=import-outside-toplevel
+
+    violations = check_document(instance)
+    if violations:
+        print(f"{path}: implausible:\n{format_violations(instance, violations)}", file=sys.stderr)
+    return bool(violations)
+
+
+def _migrate(args):
+    import importlib  # pylint: disable=import-outside-toplevel
+
+    try:
+        module_name, function_name = MIGRATIONS[(args.source_version, args.target_version)]
+    except KeyError:
+        available = ", ".join(f"{source} -> {target}" for source, target in MIGRATIONS)
+        print(
+            f"No migration from {args.source_version} to {args.target_version} (available: {available})",
+            file=sys.stderr,
+        )
+        return 2
+
+    migrate = getattr(importlib.import_module(module_name), function_name)
+    doc = _read_document(args.input)
+    with _malformed(args.input):
+        doc = migrate(doc)
+
+    from .fast_validation import is_valid  # pylint: disable=import-outside-toplevel
+
+    if not is_valid(doc):
+        print(f"{args.input}: migrated document is invalid: {_explain(doc, None)}", file=sys.stderr)
+        return 1
+    _write_json(doc, args.output, indent=args.indent)
+    return 0
+
+
+def _describe_parameter(parameter):
+    if "axis" in parameter:
+        return f"{parameter['label']} (axis {parameter['axis']}, {len(parameter['values'])} values)"
+    if "value" in parameter:
+        return f"{parameter['label']} = {parameter['value']}"
+    return f"{parameter['label']} in [{parameter.get('min')}, {parameter.get('max')}]"
+
+
+def _shape(values):
+    shape = []
+    while isinstance(values, list):
+        shape.append(len(values))
+        values = values[0] if values else None
+    return shape
+
+
+def _inspect(args):
+    doc = _read_document(args.file)
+    lines = []
+
+    for item in doc.get("document", {}).get("metadata", []):
+        if item.get("term") == "Identifier":
+            lines.append(f"identifier: {item.get('value')}")
+            break
+
+    turbine = doc.get("turbine", {})
+    if turbine:
+        lines.append(
+            f"turbine: {turbine.get('manufacturer_display_name')} {turbine.get('model_name')}"
+            f", rated power {turbine.get('rated_power')} W, rotor diameter {turbine.get('rotor_diameter')} m"
+        )
+
+    labels = [basis.get("label") for basis in doc.get("design_bases", [])]
+    lines.append(f"design bases: {', '.join(labels) or 'none'}")
+
+    power_curves = doc.get("power_curves", {})
+    modes = power_curves.get("operating_modes", [])
+    lines.append(f"operating modes: {len(modes)} (default: {power_curves.get('default_operating_mode_label')})")
+    for mode in modes:
+        shape = " x ".join(str(size) for size in _shape(mode.get("power")))
+        fields = ", ".join(field for field in ("power", "thrust_coefficient", "rotor_rpm") if field in mode)
+        lines.append(f"  {mode.get('label')} [{shape}]: {fields}")
+        for parameter in mode.get("parameters", []):
+            lines.append(f"    {_describe_parameter(parameter)}")
+
+    print("\n".join(lines))
+    return 0
+
+
+def _convert(args):
+    target = args.to
+    if target is None:
+        extensions = {_BINARY_EXTENSION: "binary", _CHUNKED_EXTENSION: "chunked"}
+        target = extensions.get(os.path.splitext(args.output.rstrip("/"))[1], "json")
+
+    doc = _read_document(args.input)
+    # Documents with encoded arrays are decoded first, so that any input can be converted to any output (importing
+    # numpy only if needed)
+    modes = doc.get("power_curves", {}).get("operating_modes", [])
+    if any(isinstance(value, dict) and "encoding" in value for mode in modes for value in mode.values()):
+        from .encoding import decode_document  # pylint: disable=import-outside-toplevel
+
+        doc = decode_document(doc)
+
+    if target == "binary":
+        from .model import PowerCurveDocument  # pylint: disable=import-outside-toplevel
+
+        with _malformed(args.input):
+            PowerCurveDocument.from_dict(doc).to_binary(args.output, compress=args.compress)
+    elif target == "chunked":
+        from .chunked import export_document  # pylint: disable=import-outside-toplevel
+
+        with _malformed(args.input):
+            export_document(doc, args.output)
+    elif target == "encoded":
+        from .encoding import encode_document  # pylint: disable=import-outside-toplevel
+
+        _write_json(encode_document(doc, encoding=args.encoding), args.output, indent=args.indent)
+    elif target == "canonical":
+        _write_json(doc, args.output, indent=args.indent)
+    else:
+        with open(args.output, "w", encoding="utf-8") as fp:
+            json.dump(doc, fp, indent=args.indent)
+            fp.write("\n")
+    return 0
+
+
+def _diff(args):
+    from .diff import diff_documents, format_report  # pylint: disable=import-outside-toplevel
+
+    old, new = _read_document(args.old), _read_document(args.new)
+    with _malformed(f"{args.old} or {args.new}"):
+        report = diff_documents(old, new, atol=args.atol, rtol=args.rtol, max_cells=args.max_cells)
+    if args.json:
+        _write_json(report, None, indent=2)
+    else:
+        print(format_report(report))
+    return 1 if report["changed"] else 0
+
+
+def _serve(args):
+    from .repository import RepositoryServer  # pylint: disable=import-outside-toplevel
+
+    server = RepositoryServer.from_directory(
+        args.directory, host=args.host, port=args.port, token=os.environ.get(args.token_variable)
+    )
+    print(f"Serving {len(server)} documents at {server.url}/documents", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+    return 0
+
+
+def _parser():
+    parser = argparse.ArgumentParser(
+        prog="power-curve-schema",
+        description="Validate, migrate, inspect, convert, compare and serve power curve documents.",
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    validate = subparsers.add_parser("validate", help="Validate documents against the power curve schema")
+    validate.add_argument(
+        "files", nargs="+", help="Documents to validate (JSON, .npz binary stores or .zarr chunked stores)"
+    )
+    validate.add_argument("--section", choices=SECTIONS, help="Validate only this top-level section of the documents")
+    validate.add_argument("--quiet", "-q", action="store_true", help="Only report invalid documents")
+    validate.add_argument(
+        "--plausibility",
+        action="store_true",
+        help="Also check that curves are physically plausible (eg power not above rated), for whole documents",
+    )
+    validate.set_defaults(handler=_validate)
+
+    migrate = subparsers.add_parser("migrate", help="Migrate a document between versions of the schema")
+    migrate.add_argument("input", help="The document to migrate, or '-' for stdin")
+    migrate.add_argument("--output", "-o", help="Where to write the migrated document (default: stdout)")
+    migrate.add_argument("--from", dest="source_version", default="alpha-3", help="The version to migrate from")
+    migrate.add_argument("--to", dest="target_version", default="alpha-4", help="The version to migrate to")
+    migrate.add_argument("--indent", type=int, default=2, help="Indentation of the output JSON")
+    migrate.set_defaults(handler=_migrate)
+
+    inspect = subparsers.add_parser("inspect", help="Summarise the contents of a document")
+    inspect.add_argument("file", help="The document to inspect, or '-' for stdin")
+    inspect.set_defaults(handler=_inspect)
+
+    convert = subparsers.add_parser("convert", help="Convert a document between storage formats")
+    convert.add_argument("input", help="The document to convert (JSON, a .npz binary store or a .zarr chunked store)")
+    convert.add_argument("output", help="Where to write the converted document")
+    convert.add_argument(
+        "--to",
+        choices=CONVERSIONS,
+        help="The output format (default: binary for .npz outputs, chunked for .zarr outputs, otherwise json)",
+    )
+    convert.add_argument("--encoding", default="delta", help="The array encoding to use for 'encoded' outputs")
+    convert.add_argument("--indent", type=int, default=None, help="Indentation of JSON outputs")
+    convert.add_argument("--compress", action="store_true", help="Compress arrays in binary outputs")
+    convert.set_defaults(handler=_convert)
+
+    diff = subparsers.add_parser("diff", help="Compare two revisions of a document (exit status 1 if they differ)")
+    diff.add_argument("old", help="The earlier revision")
+    diff.add_argument("new", help="The later revision")
+    diff.add_argument("--atol", type=float, default=0.0, help="Absolute tolerance on curve array values")
+    diff.add_argument("--rtol", type=float, default=0.0, help="Relative tolerance on curve array values")
+    diff.add_argument("--max-cells", type=int, default=10, help="The number of largest changed cells to list per array")
+    diff.add_argument("--json", action="store_true", help="Output the full report as JSON")
+    diff.set_defaults(handler=_diff)
+
+    serve = subparsers.add_parser("serve", help="Serve a directory of documents, by identifier, over HTTP")
+    serve.add_argument("directory", help="The directory of JSON documents to serve")
+    serve.add_argument("--host", default="127.0.0.1", help="The host to bind to (default: only the local machine)")
+    serve.add_argument("--port", type=int, default=8080, help="The port to bind to")
+    serve.add_argument(
+        "--token-variable",
+        default="POWER_CURVE_REPOSITORY_TOKEN",
+        help="An environment variable holding a bearer token which clients must send, if set",
+    )
+    serve.set_defaults(handler=_serve)
+
+    return parser
+
+
+def main(argv=None):
+    """Run the command line tool, returning its exit status"""
+    args = _parser().parse_args(argv)
+    try:
+        return args.handler(args)
+    except (OSError, ValueError) as e:
+        print(f"power-curve-schema {args.command}: {e}", file=sys.stderr)
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,9 @@
+"""
+Constants.py
+
+Physical constants shared between modules, kept apart from the modules using them so importing one doesn't import
+another only for its constants
+"""
+
+# Standard sea level air density (kg/m^3), used as the reference density where a mode doesn't give one
+STANDARD_AIR_DENSITY = 1.225
@@ -0,0 +1,242 @@
+"""
+Corrections.py
+
+Generate new axes for the curves of an operating mode from physical correction models, so that (for example) a mode
+given only as a function of wind speed can be expanded onto a grid of air densities, shear exponents or turbulence
+intensities.
+
+Each model gives the curves at a new parameter value in terms of the mode's reference curves evaluated at modified
+wind speeds, so a correction is a linear resampling along the wind speed axis. The interpolation (and quadrature)
+indices and weights for every new parameter value and wind speed are computed at once by broadcasting, and applied to
+every curve array along its wind speed axis by fancy indexing, so adding an axis with thousands of values is cheap
+(taking time and memory proportional to the number of values in the new curves).
+
+The new axis is placed first (axis 0), with the mode's existing axes moved up by one. A value parameter for the same
+label (eg `air-density` = 1.225) is taken as the reference condition of the mode's curves, and is replaced by the new
+axis; so is a validity range for that label.
+
+Models:
+
+- `add_air_density_axis`: IEC 61400-12-1 air density normalization. For pitch regulated turbines the curves are
+  evaluated at the density-equivalent wind speed `V (rho / rho_ref)^(1/3)`; for stall regulated turbines, power is
+  scaled by `rho / rho_ref`.
+- `add_shear_axis`: Rotor equivalent wind speed. The curves are evaluated at the wind speed whose cube is the
+  area-weighted mean of the cubed wind speeds over the rotor disk, given a power law shear profile.
+- `add_turbulence_intensity_axis`: Gaussian smoothing. The curves are averaged over normally distributed wind speeds
+  with standard deviation `TI V`, by Gauss-Hermite quadrature.
+
+Example:
+
+    from power_curve_schema.corrections import add_air_density_axis
+
+    mode = add_air_density_axis(mode, np.linspace(1.0, 1.3, 301))
+"""
+
+import numpy as np
+
+from .arrays import CURVE_FIELDS, axis_parameters, to_ndarray, to_nested
+from .constants import STANDARD_AIR_DENSITY
+from .interpolation import interval_weights
+
+_WIND_SPEED = "wind-speed"
+
+# The maximum number of values gathered at once when resampling an array along its wind speed axis
+_GATHER_SIZE = 1 << 22
+
+
+def _reference_value(mode, label, reference):
+    """Get the reference value of a parameter, defaulting to the mode's value parameter of that label"""
+    for parameter in mode["parameters"]:
+        if parameter["label"] != label:
+            continue
+        if "axis" in parameter:
+            raise ValueError(f"Operating mode '{mode.get('label')}' already has an axis for '{label}'")
+        if reference is None and "value" in parameter:
+            reference = parameter["value"]
+    return reference
+
+
+def _resampling(wind_speeds, speeds, weights=None):
+    """Get the indices and weights which evaluate curves at modified wind speeds, by linear interpolation and
+    quadrature.
+
+    Args:
+        wind_speeds: The coordinates of the wind speed axis
+        speeds: Array of shape (new values, wind speeds) or (new values, wind speeds, nodes), giving the wind speed at
+            which to evaluate the curve for each new parameter value and wind speed (and quadrature node)
+        weights: Quadrature weights to sum over the last axis of `speeds` with, if it has nodes
+
+    Returns:
+        An array of indices into the wind speed axis, of shape (new values, wind speeds, 2 * nodes) (the lower points
+        of each node's intervals, then the upper points), and an array of their (interpolation x quadrature) weights,
+        of shape (new values, wind speeds, 1, 2 * nodes)
+    """
+    if speeds.ndim == 2:
+        speeds = speeds[..., None]
+    lower, upper, weight = interval_weights(wind_speeds, speeds, out_of_bounds="clip", label=_WIND_SPEED)
+    node_weights = np.ones(speeds.shape) if weights is None else np.broadcast_to(weights, speeds.shape)
+    indices = np.concatenate((lower, upper), axis=-1)
+    return indices, np.concatenate((node_weights * (1.0 - weight), node_weights * weight), axis=-1)[..., None, :]
+
+
+def _resample_wind_speed(array, axis, resampling):
+    """Resample an array along its wind speed axis, adding a new leading axis (of the new parameter values)"""
+    indices, weights = resampling
+    rows = np.moveaxis(array, axis, 0)
+    rows = rows.reshape(rows.shape[0], -1)
+    result = np.empty(indices.shape[:2] + rows.shape[1:])
+    # Gather the rows contributing to each output and sum them with their weights, for blocks of new values at a time
+    # so that the gathered rows take bounded memory
+    block = max(1, _GATHER_SIZE // (indices[0].size * rows.shape[1]))
+    for start in range(0, indices.shape[0], block):
+        gathered = np.take(rows, indices[start : start + block], axis=0)
+        result[start : start + block] = (weights[start : start + block] @ gathered)[:, :, 0]
+    # (new, wind speed, other axes...) -> (new, axes of the input...)
+    result = result.reshape(indices.shape[:2] + array.shape[:axis] + array.shape[axis + 1 :])
+    return np.moveaxis(result, 1, axis + 1)
+
+
+def _add_axis(mode, label, values, speeds, weights=None, scale=None):
+    """Produce a new mode, with a new leading axis generated by evaluating the curves at modified wind speeds.
+
+    Args:
+        mode: The operating mode dict
+        label: The label of the new axis parameter
+        values: The values of the new axis
+        speeds: A function taking the wind speed coordinates and returning the speeds to evaluate at, as for
+            `_resampling`
+        weights: Optional quadrature weights, as for `_resampling`
+        scale: Optional dict of arrays of shape (new values,) by curve field, by which to scale the evaluated curves
+
+    Returns:
+        A new operating mode dict
+    """
+    axes = axis_parameters(mode)
+    labels = [parameter["label"] for parameter in axes]
+    if _WIND_SPEED not in labels:
+        raise ValueError(f"Operating mode '{mode.get('label')}' has no wind speed axis to apply corrections along")
+    wind_speed_axis = axes[labels.index(_WIND_SPEED)]["axis"]
+    wind_speeds = to_ndarray(axes[labels.index(_WIND_SPEED)]["values"])
+    resampling = _resampling(wind_speeds, speeds(wind_speeds), weights)
+
+    corrected = {key: value for key, value in mode.items() if key not in CURVE_FIELDS}
+    corrected["parameters"] = [{"label": label, "axis": 0, "values": [float(value) for value in values]}] + [
+        {**parameter, "axis": parameter["axis"] + 1} if "axis" in parameter else parameter
+        for parameter in mode["parameters"]
+        if parameter["label"] != label
+    ]
+    for field in CURVE_FIELDS:
+        if field not in mode:
+            continue
+        array = _resample_wind_speed(to_ndarray(mode[field]), wind_speed_axis, resampling)
+        if scale is not None and field in scale:
+            array *= scale[field].reshape((-1,) + (1,) * (array.ndim - 1))
+        corrected[field] = to_nested(array)
+    return corrected
+
+
+def add_air_density_axis(mode, air_densities, reference=None, regulation_type="pitch"):
+    """Add an `air-density` axis to an operating mode, using IEC 61400-12-1 air density normalization.
+
+    Args:
+        mode: An operating mode dict with a `wind-speed` axis
+        air_densities: The values of the new axis [kg/m^3]
+        reference: The air density of the mode's curves, defaulting to the mode's `air-density` value parameter, or to
+            the standard air density if it has none
+        regulation_type: The turbine's `regulation_type`. For "pitch" (and "other") turbines the wind speed is scaled;
+            for "stall" turbines the power is scaled.
+
+    Returns:
+        A new operating mode dict
+    """
+    reference = _reference_value(mode, "air-density", reference) or STANDARD_AIR_DENSITY
+    ratio = np.asarray(air_densities, dtype=np.float64) / reference
+
+    if regulation_type == "stall":
+        return _add_axis(
+            mode,
+            "air-density",
+            air_densities,
+            lambda wind_speeds: np.broadcast_to(wind_speeds, (ratio.size, wind_speeds.size)),
+            scale={"power": ratio},
+        )
+    return _add_axis(mode, "air-density", air_densities, lambda wind_speeds: np.outer(np.cbrt(ratio), wind_speeds))
+
+
+def rotor_equivalent_ratio(shear_exponents, hub_height, rotor_diameter, nodes=64):
+    """Get the ratio of rotor equivalent wind speed to hub height wind speed, for power law shear profiles.
+
+    Args:
+        shear_exponents: Array of vertical shear exponents
+        hub_height: The hub height [m]
+        rotor_diameter: The rotor diameter [m]
+        nodes: The number of quadrature nodes across the rotor disk
+
+    Returns:
+        An array of ratios, of the shape of `shear_exponents`
+    """
+    # Gauss-Chebyshev (second kind) quadrature of the chord-weighted integral over the disk height
+    k = np.arange(1, nodes + 1)
+    heights = np.cos(k * np.pi / (nodes + 1))
+    weights = 2 / (nodes + 1) * np.sin(k * np.pi / (nodes + 1)) ** 2
+    relative_heights = 1.0 + heights * rotor_diameter / 2 / hub_height
+    if np.any(relative_heights <= 0):
+        raise ValueError("The rotor extends below the ground")
+
+    exponents = np.asarray(shear_exponents, dtype=np.float64)
+    cubes = relative_heights ** (3 * exponents[..., None])
+    return np.cbrt(cubes @ weights)
+
+
+def add_shear_axis(mode, shear_exponents, hub_height, rotor_diameter, reference=None):
+    """Add a `vertical-shear-exponent` axis to an operating mode, using the rotor equivalent wind speed.
+
+    Args:
+        mode: An operating mode dict with a `wind-speed` axis
+        shear_exponents: The values of the new axis
+        hub_height: The hub height the curves apply at [m]
+        rotor_diameter: The rotor diameter [m]
+        reference: The shear exponent of the mode's curves, defaulting to the mode's `vertical-shear-exponent` value
+            parameter (one of which must be given)
+
+    Returns:
+        A new operating mode dict
+    """
+    reference = _reference_value(mode, "vertical-shear-exponent", reference)
+    if reference is None:
+        raise ValueError(f"A reference shear exponent is needed for operating mode '{mode.get('label')}'")
+    ratio = rotor_equivalent_ratio(shear_exponents, hub_height, rotor_diameter)
+    ratio = ratio / rotor_equivalent_ratio(reference, hub_height, rotor_diameter)
+    return _add_axis(mode, "vertical-shear-exponent", shear_exponents, lambda wind_speeds: np.outer(ratio, wind_speeds))
+
+
+def add_turbulence_intensity_axis(mode, turbulence_intensities, reference=None, nodes=20):
+    """Add a `turbulence-intensity` axis to an operating mode, by Gaussian smoothing of the curves over wind speed.
+
+    The mode's curves are taken to already include the smoothing due to the reference turbulence, so the additional
+    variance is that of the difference between the new and reference turbulence intensities. Curves can't be
+    sharpened, so those for turbulence intensities below the reference are the reference curves.
+
+    Args:
+        mode: An operating mode dict with a `wind-speed` axis
+        turbulence_intensities: The values of the new axis
+        reference: The turbulence intensity of the mode's curves, defaulting to the mode's `turbulence-intensity` value
+            parameter, or to zero if it has none
+        nodes: The number of Gauss-Hermite quadrature nodes
+
+    Returns:
+        A new operating mode dict
+    """
+    reference = _reference_value(mode, "turbulence-intensity", reference) or 0.0
+    intensities = np.asarray(turbulence_intensities, dtype=np.float64)
+    sigma = np.sqrt(np.maximum(intensities**2 - reference**2, 0.0))
+
+    # For Gauss-Hermite nodes x_k and weights w_k, the mean over standard normal u of f(V (1 + sigma u)) is
+    # sum_k w_k f(V (1 + sqrt(2) sigma x_k)) / sqrt(pi)
+    points, weights = np.polynomial.hermite.hermgauss(nodes)
+    weights = weights / np.sqrt(np.pi)
+
+    def speeds(wind_speeds):
+        return wind_speeds[None, :, None] * (1.0 + np.sqrt(2) * sigma[:, None, None] * points[None, None, :])
+
+    return _add_axis(mode, "turbulence-intensity", turbulence_intensities, speeds, weights=weights)
@@ -0,0 +1,230 @@
+"""
+Derived.py
+
+Aerodynamic quantities derived from the curve arrays of operating modes, on the same grid as the curves:
+
+- `power_coefficient`: Cp = P / (rho A U^3 / 2), using the mode's air density (its axis or value, or else standard air
+  density) and the wind speed axis
+- `axial_induction`: the axial induction factor a from the thrust coefficient, by momentum theory
+  (Ct = 4a(1 - a)) up to Ct = 0.96, and Buhl's empirical correction (without tip loss) above that
+- `tip_speed_ratio`: lambda = omega R / U, from the rotor speed and wind speed axis
+
+Power and tip speed ratio need the turbine's `rotor_diameter`. Values at zero wind speed are NaN.
+
+Derived arrays are computed on first use and kept in a cache of bounded size (in bytes, evicting the least recently used
+arrays), by the content hash of their document (as `duplicates.document_hash`, so the same curves under a different
+identifier share entries), mode label and field. `DerivedQuantities` hashes a document once, then gives derived arrays
+by mode, or interpolants which evaluate derived fields in the same way as `power`:
+
+    from power_curve_schema.derived import DerivedQuantities
+
+    derived = DerivedQuantities(doc)
+    derived.array("mode_1", "power_coefficient")  # An N-D array, aligned to the mode's axes
+    interpolant = derived.interpolant("mode_1")
+    interpolant({"air-density": 1.2, "wind-speed": speeds}, field="tip_speed_ratio")
+"""
+
+import collections
+
+import numpy as np
+
+from .arrays import BUCKET_DTYPE, DERIVED_FIELDS, axis_coordinates, axis_parameters, mode_shape, to_ndarray
+from .constants import STANDARD_AIR_DENSITY
+from .duplicates import document_hash
+from .encoding import decode_document
+from .farm import find_mode
+from .interpolation import ModeInterpolant
+
+# The maximum total size of cached derived arrays [bytes]
+DERIVED_CACHE_BYTES = 256 << 20
+
+# The thrust coefficient above which Buhl's correction replaces momentum theory
+BUHL_THRUST_COEFFICIENT = 0.96
+
+_WIND_SPEED = "wind-speed"
+_AIR_DENSITY = "air-density"
+
+
+def _axis_values(mode, label):
+    """Get the coordinates of an axis of a mode, shaped to broadcast against its curve arrays, or None if not an axis"""
+    axes = axis_parameters(mode)
+    for axis, parameter in enumerate(axes):
+        if parameter["label"] == label:
+            coordinates = axis_coordinates(parameter["values"])
+            if coordinates.dtype == BUCKET_DTYPE:
+                raise ValueError(f"Operating mode '{mode.get('label')}' has a bucketed {label} axis")
+            shape = [1] * len(axes)
+            shape[axis] = coordinates.size
+            return coordinates.reshape(shape)
+    return None
+
+
+def _curve(mode, field):
+    """Get a curve array of a mode, checking it has the shape of the mode's axes"""
+    if field not in mode:
+        raise KeyError(f"Operating mode '{mode.get('label')}' has no {field} array")
+    array = to_ndarray(mode[field])
+    if array.shape != mode_shape(mode):
+        raise ValueError(
+            f"The {field} array of operating mode '{mode.get('label')}' has shape {array.shape}, but its axes have "
+            f"shape {mode_shape(mode)}"
+        )
+    return array
+
+
+def _wind_speeds(mode):
+    wind_speeds = _axis_values(mode, _WIND_SPEED)
+    if wind_speeds is None:
+        raise ValueError(f"Operating mode '{mode.get('label')}' has no wind speed axis")
+    # Zero wind speeds give NaN rather than infinities
+    return np.where(wind_speeds > 0, wind_speeds, np.nan)
+
+
+def _air_density(mode):
+    air_density = _axis_values(mode, _AIR_DENSITY)
+    if air_density is not None:
+        return air_density
+    for parameter in mode["parameters"]:
+        if parameter["label"] == _AIR_DENSITY and "value" in parameter:
+            return parameter["value"]
+    return STANDARD_AIR_DENSITY
+
+
+def power_coefficient(mode, rotor_diameter):
+    """Get the power coefficient of an operating mode, on the grid of its curves.
+
+    Args:
+        mode: The operating mode dict
+        rotor_diameter: The rotor diameter [m]
+
+    Returns:
+        An N-D array of the shape of the mode's curves
+    """
+    area = np.pi * rotor_diameter**2 / 4
+    return _curve(mode, "power") / (0.5 * _air_density(mode) * area * _wind_speeds(mode) ** 3)
+
+
+def axial_induction(mode):
+    """Get the axial induction factor of an operating mode from its thrust coefficient, with Buhl's correction.
+
+    Args:
+        mode: The operating mode dict
+
+    Returns:
+        An N-D array of the shape of the mode's curves
+    """
+    thrust_coefficient = _curve(mode, "thrust_coefficient")
+    momentum = thrust_coefficient <= BUHL_THRUST_COEFFICIENT
+    # Solutions of Ct = 4a(1 - a) and (with no tip loss) Ct = 8/9 - 4a/9 + 14a^2/9, which meet at a = 0.4
+    low = 0.5 * (1.0 - np.sqrt(1.0 - np.where(momentum, thrust_coefficient, 0.0)))
+    high = (4.0 + np.sqrt(504.0 * np.where(momentum, BUHL_THRUST_COEFFICIENT, thrust_coefficient) - 432.0)) / 28.0
+    return np.where(momentum, low, high)
+
+
+def tip_speed_ratio(mode, rotor_diameter):
+    """Get the tip speed ratio of an operating mode, on the grid of its curves.
+
+    Args:
+        mode: The operating mode dict
+        rotor_diameter: The rotor diameter [m]
+
+    Returns:
+        An N-D array of the shape of the mode's curves
+    """
+    return _curve(mode, "rotor_rpm") * (np.pi / 30) * (rotor_diameter / 2) / _wind_speeds(mode)
+
+
+def derived_array(mode, field, rotor_diameter=None):
+    """Compute a derived array of an operating mode (uncached).
+
+    Args:
+        mode: The operating mode dict
+        field: One of `DERIVED_FIELDS`
+        rotor_diameter: The rotor diameter [m], needed for the power coefficient and tip speed ratio
+
+    Returns:
+        An N-D array of the shape of the mode's curves
+    """
+    if field not in DERIVED_FIELDS:
+        raise ValueError(f"Unknown derived field '{field}', must be one of {DERIVED_FIELDS}")
+    if field == "axial_induction":
+        return axial_induction(mode)
+    if rotor_diameter is None:
+        raise ValueError(f"The {field} of operating mode '{mode.get('label')}' needs the turbine's rotor diameter")
+    with np.errstate(divide="ignore", invalid="ignore"):
+        if field == "power_coefficient":
+            return power_coefficient(mode, rotor_diameter)
+        return tip_speed_ratio(mode, rotor_diameter)
+
+
+class DerivedCache:
+    """A cache of arrays with a bound on their total size, evicting the least recently used.
+
+    Args:
+        max_bytes: The maximum total size of the cached arrays [bytes]. Arrays larger than this aren't cached.
+    """
+
+    def __init__(self, max_bytes=DERIVED_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.entries = collections.OrderedDict()
+
+    def get(self, key, compute):
+        """Get a cached array, or compute, cache (as read-only) and return it"""
+        try:
+            self.entries.move_to_end(key)
+            return self.entries[key]
+        except KeyError:
+            pass
+        array = compute()
+        array.setflags(write=False)
+        if array.nbytes <= self.max_bytes:
+            self.entries[key] = array
+            self.bytes += array.nbytes
+            while self.bytes > self.max_bytes:
+                _, evicted = self.entries.popitem(last=False)
+                self.bytes -= evicted.nbytes
+        return array
+
+    def clear(self):
+        self.entries.clear()
+        self.bytes = 0
+
+
+_cache = DerivedCache()
+
+
+def clear_derived_cache():
+    """Clear the cache of derived arrays"""
+    _cache.clear()
+
+
+class DerivedQuantities:
+    """Derived arrays of the operating modes of a document, cached by the document's content hash.
+
+    The document is hashed once, when this is constructed, so it must not be modified while in use.
+
+    Args:
+        doc: The power curve document
+        cache: The DerivedCache to use, defaulting to one shared by all documents
+    """
+
+    def __init__(self, doc, cache=None):
+        self.doc = decode_document(doc)
+        self.hash = document_hash(self.doc)
+        self.rotor_diameter = self.doc.get("turbine", {}).get("rotor_diameter")
+        self.cache = _cache if cache is None else cache
+
+    def array(self, label, field):
+        """Get a derived array of an operating mode (the default operating mode if label is None), as read-only"""
+        mode = find_mode(self.doc, label)
+        return self.cache.get(
+            (self.hash, mode["label"], field), lambda: derived_array(mode, field, self.rotor_diameter)
+        )
+
+    def interpolant(self, label=None, out_of_bounds="raise"):
+        """Get a ModeInterpolant of an operating mode which can also evaluate the derived fields"""
+        mode = find_mode(self.doc, label)
+        return ModeInterpolant(
+            mode, out_of_bounds=out_of_bounds, derived=lambda field: self.array(mode["label"], field)
+        )
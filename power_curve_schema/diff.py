@@ -0,0 +1,332 @@
+"""
+Diff.py
+
+A semantic, numerical diff between two revisions of a power curve document.
+
+Rather than comparing documents line-by-line, content is aligned by meaning: operating modes (and other labelled items
+like design bases) by their `label`, parameters by `label` and axes by the label of the parameter defining them, and
+curve array cells by the coordinate values along each axis. So reordering modes or axes, or inserting new wind speed
+bins, doesn't show up as a change to every value.
+
+Curve arrays are compared over the coordinates common to both revisions with vectorized operations, giving absolute
+and relative deltas for every cell, which are counted as changes only where they exceed the given tolerances (in the
+same sense as `numpy.isclose`).
+
+Example:
+
+    from power_curve_schema.diff import diff_documents, format_report
+
+    report = diff_documents(rev_01, rev_02, rtol=1e-6)
+    print(format_report(report))
+"""
+
+import numpy as np
+
+from .arrays import CURVE_FIELDS, axis_coordinates, coordinate_to_json, to_ndarray
+from .encoding import decode_document
+
+# Properties of operating modes which are compared specially, rather than as plain values
+_MODE_SPECIAL_PROPERTIES = frozenset(("label", "parameters") + CURVE_FIELDS)
+
+
+def _keys(old, new):
+    """The union of the keys of two dicts, in order of appearance"""
+    return list(old) + [key for key in new if key not in old]
+
+
+def _is_labelled(items):
+    return bool(items) and all(isinstance(item, dict) and "label" in item for item in items)
+
+
+def _diff_values(old, new, path, changes):
+    """Recursively compare plain JSON values, appending {path, old, new} changes. Labelled lists align by label."""
+    if isinstance(old, dict) and isinstance(new, dict):
+        for key in _keys(old, new):
+            _diff_values(old.get(key), new.get(key), path + [key], changes)
+    elif isinstance(old, list) and isinstance(new, list) and _is_labelled(old) and _is_labelled(new):
+        old_by_label = {item["label"]: item for item in old}
+        new_by_label = {item["label"]: item for item in new}
+        for label in _keys(old_by_label, new_by_label):
+            _diff_values(old_by_label.get(label), new_by_label.get(label), path + [label], changes)
+    elif old != new:
+        changes.append({"path": path, "old": old, "new": new})
+
+
+def _tolerance(tolerance, field):
+    if isinstance(tolerance, dict):
+        return tolerance.get(field, 0.0)
+    return tolerance
+
+
+def _align_axes(old_axes, new_axes):
+    """Find the cells common to two sets of axes, returning index arrays for each and the per-axis report"""
+    old_indices, new_indices, coordinates, axes = [], [], [], {}
+    for old_parameter, new_parameter in zip(old_axes, new_axes):
+        old_coordinates = axis_coordinates(old_parameter["values"])
+        new_coordinates = axis_coordinates(new_parameter["values"])
+        if old_coordinates.dtype != new_coordinates.dtype:
+            raise ValueError(f"Axis '{old_parameter['label']}' changed between bin centers and buckets")
+
+        common, old_index, new_index = np.intersect1d(old_coordinates, new_coordinates, return_indices=True)
+        old_indices.append(old_index)
+        new_indices.append(new_index)
+        coordinates.append(common)
+
+        removed = np.setdiff1d(old_coordinates, new_coordinates)
+        added = np.setdiff1d(new_coordinates, old_coordinates)
+        if removed.size or added.size or old_parameter["axis"] != new_parameter["axis"]:
+            axes[old_parameter["label"]] = {
+                "old_axis": old_parameter["axis"],
+                "new_axis": new_parameter["axis"],
+                "removed": [coordinate_to_json(value) for value in removed],
+                "added": [coordinate_to_json(value) for value in added],
+            }
+    return old_indices, new_indices, coordinates, axes
+
+
+def _diff_array(old, new, labels, coordinates, atol, rtol, max_cells):
+    """Compare two aligned arrays, returning a report of the cells which differ by more than the tolerances"""
+    delta = new - old
+    magnitude = np.abs(old)
+    changed = np.abs(delta) > atol + rtol * magnitude
+    # Cells which are NaN in only one revision are changes too
+    changed |= np.isnan(old) != np.isnan(new)
+
+    count = int(np.count_nonzero(changed))
+    report = {"compared": int(old.size), "changed": count}
+    if count == 0:
+        return report
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        relative = np.where(magnitude > 0, delta / magnitude, np.where(delta == 0, 0.0, np.inf))
+
+    # Changes to or from NaN are ranked as infinitely large
+    changed_flat = np.flatnonzero(changed)
+    ranking = np.nan_to_num(np.abs(delta.ravel()[changed_flat]), nan=np.inf)
+    report["max_abs"] = float(ranking.max())
+    report["max_rel"] = float(np.nan_to_num(np.abs(relative.ravel()[changed_flat]), nan=np.inf).max())
+
+    # Report the largest changes, biggest first (partitioning rather than sorting all of them)
+    if count > max_cells:
+        top = np.argpartition(-ranking, max_cells - 1)[:max_cells]
+    else:
+        top = np.arange(count)
+    top = top[np.argsort(-ranking[top], kind="stable")]
+
+    cells = []
+    for flat_index in changed_flat[top]:
+        index = np.unravel_index(flat_index, old.shape)
+        cells.append(
+            {
+                "coordinates": {
+                    label: coordinate_to_json(axis[i]) for label, axis, i in zip(labels, coordinates, index)
+                },
+                "old": float(old[index]),
+                "new": float(new[index]),
+                "abs": float(delta[index]),
+                "rel": float(relative[index]),
+            }
+        )
+    report["cells"] = cells
+    return report
+
+
+def _diff_parameters(old_parameters, new_parameters):
+    """Compare parameters by label, other than the values of axes (which are compared as coordinates)"""
+    old_by_label = {parameter["label"]: parameter for parameter in old_parameters}
+    new_by_label = {parameter["label"]: parameter for parameter in new_parameters}
+    report = {
+        "removed": [label for label in old_by_label if label not in new_by_label],
+        "added": [label for label in new_by_label if label not in old_by_label],
+        "changed": [],
+    }
+    for label, old in old_by_label.items():
+        new = new_by_label.get(label)
+        if new is None:
+            continue
+        if "axis" in old and "axis" in new:
+            continue
+        if old != new:
+            report["changed"].append({"label": label, "old": old, "new": new})
+    return report
+
+
+def _diff_mode(old, new, atol, rtol, max_cells):
+    """Compare two operating modes with the same label"""
+    report = {}
+
+    changes = []
+    for key in _keys(old, new):
+        if key in _MODE_SPECIAL_PROPERTIES:
+            continue
+        _diff_values(old.get(key), new.get(key), [key], changes)
+    if changes:
+        report["properties"] = changes
+
+    parameters = _diff_parameters(old["parameters"], new["parameters"])
+    if any(parameters.values()):
+        report["parameters"] = parameters
+
+    old_axes = sorted((p for p in old["parameters"] if "axis" in p), key=lambda p: p["axis"])
+    new_axes_by_label = {p["label"]: p for p in new["parameters"] if "axis" in p}
+    labels = [parameter["label"] for parameter in old_axes]
+    if set(labels) != set(new_axes_by_label):
+        report["arrays"] = {"incomparable": "The operating mode has different axes in each revision"}
+        return report
+
+    # Bring the new arrays' axes into the old order, then select the cells common to both
+    new_axes = [new_axes_by_label[label] for label in labels]
+    try:
+        old_indices, new_indices, coordinates, axes = _align_axes(old_axes, new_axes)
+    except ValueError as e:
+        report["arrays"] = {"incomparable": str(e)}
+        return report
+    if axes:
+        report["axes"] = axes
+    transpose = [parameter["axis"] for parameter in new_axes]
+    old_shape = tuple(len(parameter["values"]) for parameter in old_axes)
+    new_shape = tuple(len(parameter["values"]) for parameter in sorted(new_axes, key=lambda p: p["axis"]))
+    old_cells = np.ix_(*old_indices)
+    new_cells = np.ix_(*new_indices)
+
+    arrays = {}
+    for field in CURVE_FIELDS:
+        if field not in old and field not in new:
+            continue
+        if field not in new:
+            arrays[field] = {"removed": True}
+            continue
+        if field not in old:
+            arrays[field] = {"added": True}
+            continue
+        old_array, new_array = to_ndarray(old[field]), to_ndarray(new[field])
+        if old_array.shape != old_shape or new_array.shape != new_shape:
+            # Cells can't be located in arrays which don't match their axes, but they can still be seen to be equal
+            if not (old_array.shape == new_array.shape and np.array_equal(old_array, new_array, equal_nan=True)):
+                arrays[field] = {"incomparable": "The shape of the array does not match the operating mode's axes"}
+            continue
+        old_array = old_array[old_cells]
+        new_array = new_array.transpose(transpose)[new_cells]
+        result = _diff_array(
+            old_array, new_array, labels, coordinates, _tolerance(atol, field), _tolerance(rtol, field), max_cells
+        )
+        if result["changed"]:
+            arrays[field] = result
+    if arrays:
+        report["arrays"] = arrays
+    return report
+
+
+def diff_documents(old, new, atol=0.0, rtol=0.0, max_cells=10):
+    """Compare two revisions of a power curve document.
+
+    Args:
+        old: The earlier revision (a document dict, whose curve arrays may be encoded)
+        new: The later revision
+        atol: Absolute tolerance on curve array cells, either a number or a dict of numbers by curve field name
+        rtol: Relative tolerance (to the old value) on curve array cells, either a number or a dict by curve field name
+        max_cells: The maximum number of changed cells to list for each array (the largest changes are listed)
+
+    Returns:
+        A JSON-serializable report, with keys:
+            `changed`: True if any difference was found
+            `properties`: Changes to content outside the operating modes, as a list of {path, old, new}
+            `modes`: {`added`: [labels], `removed`: [labels], `changed`: {label: mode report}}, where each mode report
+                may have `properties`, `parameters`, `axes` (added and removed coordinates, and moves between axes) and
+                `arrays` (per curve field, the number of cells `compared` and `changed`, `max_abs` and `max_rel`
+                deltas, and a list of the largest changed `cells`; or the reason they are `incomparable`)
+    """
+    old, new = decode_document(old), decode_document(new)
+
+    old_curves, new_curves = old.get("power_curves", {}), new.get("power_curves", {})
+    old_modes = {mode["label"]: mode for mode in old_curves.get("operating_modes", [])}
+    new_modes = {mode["label"]: mode for mode in new_curves.get("operating_modes", [])}
+
+    properties = []
+    for key in _keys(old, new):
+        if key != "power_curves":
+            _diff_values(old.get(key), new.get(key), [key], properties)
+    for key in _keys(old_curves, new_curves):
+        if key != "operating_modes":
+            _diff_values(old_curves.get(key), new_curves.get(key), ["power_curves", key], properties)
+
+    modes = {
+        "removed": [label for label in old_modes if label not in new_modes],
+        "added": [label for label in new_modes if label not in old_modes],
+        "changed": {},
+    }
+    for label, old_mode in old_modes.items():
+        if label in new_modes:
+            report = _diff_mode(old_mode, new_modes[label], atol, rtol, max_cells)
+            if report:
+                modes["changed"][label] = report
+
+    return {
+        "changed": bool(properties or modes["removed"] or modes["added"] or modes["changed"]),
+        "properties": properties,
+        "modes": modes,
+    }
+
+
+def _format_path(path):
+    return "/" + "/".join(str(item) for item in path)
+
+
+def _format_coordinates(coordinates):
+    items = []
+    for label, value in coordinates.items():
+        if isinstance(value, dict):
+            value = f"[{value['min']:g}, {value['max']:g})"
+        else:
+            value = f"{value:g}"
+        items.append(f"{label}={value}")
+    return ", ".join(items)
+
+
+def format_report(report):
+    """Format a report from `diff_documents` as compact, human-readable text"""
+    if not report["changed"]:
+        return "No changes"
+
+    lines = []
+    for change in report["properties"]:
+        lines.append(f"{_format_path(change['path'])}: {change['old']!r} -> {change['new']!r}")
+
+    modes = report["modes"]
+    for label in modes["removed"]:
+        lines.append(f"mode {label}: removed")
+    for label in modes["added"]:
+        lines.append(f"mode {label}: added")
+
+    for label, mode in modes["changed"].items():
+        lines.append(f"mode {label}:")
+        for change in mode.get("properties", ()):
+            lines.append(f"  {_format_path(change['path'])}: {change['old']!r} -> {change['new']!r}")
+        parameters = mode.get("parameters", {})
+        for parameter in parameters.get("removed", ()):
+            lines.append(f"  parameter {parameter}: removed")
+        for parameter in parameters.get("added", ()):
+            lines.append(f"  parameter {parameter}: added")
+        for change in parameters.get("changed", ()):
+            lines.append(f"  parameter {change['label']}: {change['old']!r} -> {change['new']!r}")
+        for axis_label, axis in mode.get("axes", {}).items():
+            moved = f" (axis {axis['old_axis']} -> {axis['new_axis']})" if axis["old_axis"] != axis["new_axis"] else ""
+            lines.append(f"  axis {axis_label}{moved}: {len(axis['removed'])} removed, {len(axis['added'])} added")
+        for field, array in mode.get("arrays", {}).items():
+            if field == "incomparable":
+                lines.append(f"  arrays not compared: {array}")
+            elif "incomparable" in array:
+                lines.append(f"  {field} not compared: {array['incomparable']}")
+            elif "added" in array or "removed" in array:
+                lines.append(f"  {field}: {'added' if 'added' in array else 'removed'}")
+            else:
+                lines.append(
+                    f"  {field}: {array['changed']} of {array['compared']} cells changed"
+                    f", max abs {array['max_abs']:g}, max rel {array['max_rel']:.3g}"
+                )
+                for cell in array["cells"]:
+                    lines.append(
+                        f"    {_format_coordinates(cell['coordinates'])}: {cell['old']:g} -> {cell['new']:g}"
+                        f" ({cell['abs']:+g}, {cell['rel']:+.3%})"
+                    )
+    return "\n".join(lines)
@@ -0,0 +1,249 @@
+"""
+Duplicates.py
+
+An index of a corpus of power curve documents, for finding duplicated content and misused identifiers.
+
+The first `Identifier` in a document's metadata should be globally unique to its content, but the same curves are
+often republished under new identifiers, and identifiers reused for different content. Documents are added to the index
+one at a time, keeping only small records of each, from which the index reports:
+
+- identifier collisions: identifiers used for documents with different content
+- duplicate documents: the same content under different identifiers
+- duplicate modes: operating modes with identical content (ignoring their labels, names and descriptions)
+- near-duplicate modes: operating modes whose power and thrust curves (at reference conditions) differ by less than a
+  relative tolerance
+
+Content is compared by canonical hashes (see `serialization.content_hash`), of documents without their `document`
+metadata section, and of modes. Curve arrays are decoded first, so the array encoding doesn't matter.
+
+Near duplicates are found by locality-sensitive hashing, rather than comparing every pair of modes. Each mode's power
+and thrust curves are interpolated onto fixed wind speeds (at standard air density, and the middle of its other axes),
+and log-scaled so that differences are relative. The fingerprint of a mode is a set of band keys, each the cells
+containing a few randomly chosen features in a randomly offset grid whose spacing is several times the tolerance. Modes
+closer than the tolerance share a band key with high probability, and curves of different turbines almost never do,
+so only modes sharing a band key are compared, taking time roughly linear in the size of the corpus.
+
+Example:
+
+    from power_curve_schema.duplicates import build_index
+
+    index = build_index(glob.glob("library/*.json"))
+    index.identifier_collisions()
+    index.near_duplicate_modes()
+"""
+
+import hashlib
+
+import numpy as np
+
+from .arrays import BUCKET_DTYPE, axis_coordinates, axis_parameters, mode_shape
+from .constants import STANDARD_AIR_DENSITY
+from .encoding import decode_document
+from .interpolation import ModeInterpolant
+from .serialization import content_hash
+from .sources import document_identifier, iter_sources
+
+# The wind speeds at which modes' curves are compared [m/s]
+FINGERPRINT_WIND_SPEEDS = np.arange(1.0, 30.5, 0.5)
+
+# Properties of a mode which describe it without affecting its content
+_DESCRIPTIVE_PROPERTIES = ("label", "name", "description")
+
+_WIND_SPEED = "wind-speed"
+
+
+def document_hash(doc):
+    """Get the canonical hash of a document's content, excluding its `document` metadata section"""
+    return _decoded_document_hash(decode_document(doc))
+
+
+def _decoded_document_hash(doc):
+    return content_hash({key: value for key, value in doc.items() if key != "document"})
+
+
+def mode_hash(mode):
+    """Get the canonical hash of an operating mode's content, excluding its label, name and description"""
+    return content_hash({key: value for key, value in mode.items() if key not in _DESCRIPTIVE_PROPERTIES})
+
+
+def mode_features(mode, wind_speeds=FINGERPRINT_WIND_SPEEDS):
+    """Get the log-scaled power [kW] and thrust coefficient curves of a mode at reference conditions, for comparisons.
+
+    Reference conditions are standard air density (if the mode has an air density axis) and the middle of the range of
+    any other axes. Power and thrust are zero at wind speeds outside the mode's wind speed axis.
+
+    Args:
+        mode: The operating mode dict
+        wind_speeds: The wind speeds to evaluate the curves at
+
+    Returns:
+        A 1-D array of features, or None if the mode's curves can't be interpolated (eg it has no wind speed axis, or
+        has bucketed axes, or arrays of the wrong shape)
+    """
+    axes = axis_parameters(mode)
+    if _WIND_SPEED not in [parameter["label"] for parameter in axes]:
+        return None
+    if any(axis_coordinates(parameter["values"]).dtype == BUCKET_DTYPE for parameter in axes):
+        return None
+    interpolant = ModeInterpolant(mode, out_of_bounds="clip")
+    fields = ["power", "thrust_coefficient"] if "thrust_coefficient" in mode else ["power"]
+    if any(interpolant.array(field).shape != mode_shape(mode) for field in fields):
+        return None
+
+    points = {}
+    for label, coordinates in zip(interpolant.labels, interpolant.coordinates):
+        if label == "air-density":
+            points[label] = STANDARD_AIR_DENSITY
+        else:
+            points[label] = (coordinates.min() + coordinates.max()) / 2
+    points[_WIND_SPEED] = wind_speeds
+    coordinates = interpolant.coordinates[interpolant.labels.index(_WIND_SPEED)]
+    inside = (wind_speeds >= coordinates.min()) & (wind_speeds <= coordinates.max())
+
+    # Power in kW and thrust coefficient in hundredths, so that the log scale is close to linear only near zero
+    scales = {"power": 1e-3, "thrust_coefficient": 100.0}
+    return np.concatenate(
+        [np.log1p(np.maximum(interpolant(points, field) * inside, 0.0) * scales[field]) for field in fields]
+    )
+
+
+class DuplicateIndex:
+    """An index of documents and their operating modes, by content hash, identifier and curve fingerprint.
+
+    Args:
+        tolerance: The largest relative difference in power or thrust (approximately, as a difference of log-scaled
+            features) at which modes are reported as near duplicates
+        bands: The number of band keys in each fingerprint
+        band_size: The number of features in each band key
+        cell_size: The grid spacing of band keys, as a multiple of the tolerance
+        seed: The seed for choosing band features and grid offsets (which must be the same to compare fingerprints)
+    """
+
+    def __init__(self, tolerance=0.01, bands=16, band_size=4, cell_size=8.0, seed=0):
+        self.tolerance = tolerance
+        self.bands = bands
+        self.band_size = band_size
+        self.width = cell_size * tolerance
+        self.seed = seed
+        self.sources = []
+        self.documents_by_identifier = {}
+        self.documents_by_hash = {}
+        self.modes_by_hash = {}
+        # The features of one mode for each distinct mode hash, and the mode hashes in each band bucket
+        self.features = {}
+        self.buckets = {}
+        # By number of features, the features in each band and their grid offsets
+        self._bands = {}
+
+    def _fingerprint(self, features):
+        """Get the band keys of a mode's features"""
+        if features.size not in self._bands:
+            rng = np.random.default_rng([self.seed, features.size])
+            chosen = np.stack([rng.permutation(features.size)[: self.band_size] for _ in range(self.bands)])
+            self._bands[features.size] = chosen, rng.uniform(0.0, self.width, chosen.shape)
+        chosen, offsets = self._bands[features.size]
+        cells = np.floor((features[chosen] + offsets) / self.width).astype(np.int64)
+        return [
+            (features.size, band, hashlib.blake2b(cells[band].tobytes(), digest_size=8).digest())
+            for band in range(self.bands)
+        ]
+
+    def add(self, doc, source=None):
+        """Add a document to the index.
+
+        Args:
+            doc: The power curve document (whose curve arrays may be encoded)
+            source: A name for the document in reports (eg its path), defaulting to its position in the index
+
+        Returns:
+            The document's content hash
+        """
+        doc = decode_document(doc)
+        source = len(self.sources) if source is None else source
+        self.sources.append(source)
+        digest = _decoded_document_hash(doc)
+        identifier = document_identifier(doc)
+        self.documents_by_identifier.setdefault(identifier, []).append((source, digest))
+        self.documents_by_hash.setdefault(digest, []).append((source, identifier))
+
+        for mode in doc["power_curves"]["operating_modes"]:
+            digest_of_mode = mode_hash(mode)
+            modes = self.modes_by_hash.setdefault(digest_of_mode, [])
+            modes.append((source, mode["label"]))
+            if len(modes) > 1:
+                # Only one mode of each distinct content needs a fingerprint
+                continue
+            features = mode_features(mode)
+            if features is None:
+                continue
+            self.features[digest_of_mode] = features
+            for key in self._fingerprint(features):
+                self.buckets.setdefault(key, []).append(digest_of_mode)
+        return digest
+
+    def identifier_collisions(self):
+        """Get identifiers used for documents with different content, as a dict of {identifier: [(source, hash)]}"""
+        return {
+            identifier: documents
+            for identifier, documents in self.documents_by_identifier.items()
+            if identifier is not None and len({digest for _, digest in documents}) > 1
+        }
+
+    def duplicate_documents(self):
+        """Get documents with the same content under different identifiers, as lists of (source, identifier)"""
+        return [documents for documents in self.documents_by_hash.values() if len({i for _, i in documents}) > 1]
+
+    def duplicate_modes(self):
+        """Get operating modes with identical content, as a list of lists of (source, mode label)"""
+        return [modes for modes in self.modes_by_hash.values() if len(modes) > 1]
+
+    def near_duplicate_modes(self):
+        """Get pairs of operating modes with different but nearly identical curves.
+
+        Returns:
+            A list of dicts with the `modes` (a pair of (source, mode label), being the first added of each distinct
+            content) and their `difference` (the largest difference in log-scaled features), in order of difference
+        """
+        pairs = set()
+        for digests in self.buckets.values():
+            for i, first in enumerate(digests):
+                for second in digests[i + 1 :]:
+                    pairs.add((first, second))
+
+        results = []
+        for first, second in pairs:
+            features, other = self.features[first], self.features[second]
+            if features.size != other.size:
+                continue
+            difference = float(np.max(np.abs(features - other)))
+            if difference <= self.tolerance:
+                results.append(
+                    {"modes": (self.modes_by_hash[first][0], self.modes_by_hash[second][0]), "difference": difference}
+                )
+        return sorted(results, key=lambda result: (result["difference"], str(result["modes"])))
+
+    def report(self):
+        """Get all findings of the index as a dict"""
+        return {
+            "documents": len(self.sources),
+            "identifier_collisions": self.identifier_collisions(),
+            "duplicate_documents": self.duplicate_documents(),
+            "duplicate_modes": self.duplicate_modes(),
+            "near_duplicate_modes": self.near_duplicate_modes(),
+        }
+
+
+def build_index(sources, **kwargs):
+    """Build a DuplicateIndex from a corpus, loading one document at a time.
+
+    Args:
+        sources: An iterable of documents (dicts), paths to JSON documents or paths to chunked stores
+        **kwargs: Options of the DuplicateIndex
+
+    Returns:
+        The DuplicateIndex, with paths (or positions, for dicts) as the sources in its reports
+    """
+    index = DuplicateIndex(**kwargs)
+    for source, doc in iter_sources(sources):
+        index.add(doc, source=source)
+    return index
@@ -0,0 +1,245 @@
+"""
+Effective.py
+
+Effective operating modes: the properties of each operating mode of a document, with its `overrides` merged into the
+`turbine` section, its hub height restrictions combined with the turbine's available hub heights, and its design basis
+labels resolved to the document's `design_bases`.
+
+The effective modes of a document are resolved together, once, into an `EffectiveModes` view, whose lookups by label
+are dict lookups. Views are cached by document, with a fingerprint of everything they were resolved from: the objects
+they refer to (checked by identity) and the values they copied (checked by equality), such as the turbine's properties
+and each mode's label, overrides, hub height restrictions and design basis labels. So getting the view of a document
+again costs a pass over those few values, without resolving them, and a view is re-resolved whenever any of them has
+been replaced or edited in place. The cache holds the documents it has views of, up to `VIEW_CACHE_SIZE` of them.
+
+Example:
+
+    from power_curve_schema.effective import effective_modes
+
+    modes = effective_modes(doc)
+    modes["mode_2"].rated_power  # The override if present, or else the turbine's rated power
+    modes["mode_2"].allows_hub_height(140.0)
+    [mode.label for mode in modes.for_hub_height(140.0)]
+"""
+
+import operator
+
+from .hub_heights import is_hub_height_available
+
+# The turbine properties which operating modes can override
+OVERRIDABLE_PROPERTIES = ("rated_power", "cut_in_rpm", "rated_rpm")
+
+# The maximum number of documents to keep views of, on a least recently used basis
+VIEW_CACHE_SIZE = 256
+
+_LABEL = operator.itemgetter("label")
+
+
+def _frozen(value):
+    """Get a copy of a (shallow) JSON value which can be compared with later versions of it"""
+    if isinstance(value, dict):
+        return tuple(value.items())
+    if isinstance(value, list):
+        return tuple(value)
+    return value
+
+
+def _fingerprint(doc):
+    """Get what a document's effective modes are resolved from, as (the objects referred to, the values copied)"""
+    turbine = doc.get("turbine", {})
+    power_curves = doc.get("power_curves", {})
+    modes = power_curves.get("operating_modes", [])
+    design_bases = doc.get("design_bases", [])
+    objects = (turbine, power_curves, modes, design_bases, *modes, *design_bases)
+    values = [
+        tuple(map(turbine.get, OVERRIDABLE_PROPERTIES)),
+        _frozen(turbine.get("available_hub_heights")),
+        power_curves.get("default_operating_mode_label"),
+        tuple(map(_LABEL, design_bases)),
+    ]
+    for mode in modes:
+        overrides = mode.get("overrides", {})
+        values.append(
+            (
+                mode.get("label"),
+                tuple(map(overrides.get, OVERRIDABLE_PROPERTIES)),
+                _frozen(mode.get("restricted_to_hub_heights")),
+                _frozen(mode.get("design_bases")),
+            )
+        )
+    return objects, values
+
+
+def _same_fingerprint(a, b):
+    return len(a[0]) == len(b[0]) and all(map(operator.is_, a[0], b[0])) and a[1] == b[1]
+
+
+class EffectiveMode:
+    """The effective properties of an operating mode.
+
+    Attributes:
+        label: The operating mode label
+        mode: The operating mode dict (for its curves and other properties)
+        rated_power: Rated power [W] of the mode, or None if neither the mode nor the turbine has one
+        cut_in_rpm: Cut-in rotor speed [rpm], or None
+        rated_rpm: Rated rotor speed [rpm], or None
+        available_hub_heights: The turbine's available hub heights, or None if not given
+        restricted_to_hub_heights: The mode's hub height restrictions, or None if not restricted
+        design_bases: A tuple of the design basis dicts the mode refers to
+        is_default: Whether this is the document's default operating mode
+    """
+
+    __slots__ = (
+        "label",
+        "mode",
+        "rated_power",
+        "cut_in_rpm",
+        "rated_rpm",
+        "available_hub_heights",
+        "restricted_to_hub_heights",
+        "design_bases",
+        "is_default",
+    )
+
+    def __init__(self, doc, mode, design_bases):
+        turbine = doc.get("turbine", {})
+        overrides = mode.get("overrides", {})
+        self.label = mode["label"]
+        self.mode = mode
+        for name in OVERRIDABLE_PROPERTIES:
+            setattr(self, name, overrides.get(name, turbine.get(name)))
+        self.available_hub_heights = turbine.get("available_hub_heights")
+        self.restricted_to_hub_heights = mode.get("restricted_to_hub_heights")
+        try:
+            self.design_bases = tuple(design_bases[label] for label in mode.get("design_bases", ()))
+        except KeyError as e:
+            raise ValueError(f"Operating mode '{self.label}' refers to unknown design basis {e}") from None
+        self.is_default = self.label == doc.get("power_curves", {}).get("default_operating_mode_label")
+
+    def allows_hub_height(self, hub_height):
+        """Check whether the mode can be used at a hub height, which must be available and not restricted"""
+        return is_hub_height_available(self.available_hub_heights, hub_height) and is_hub_height_available(
+            self.restricted_to_hub_heights, hub_height
+        )
+
+    def __repr__(self):
+        return f"EffectiveMode('{self.label}', rated_power={self.rated_power})"
+
+
+class EffectiveModes:
+    """The effective operating modes of a document, by label.
+
+    Args:
+        doc: The power curve document
+
+    Raises:
+        ValueError: If operating mode labels aren't unique, or a mode refers to a design basis which isn't in the
+            document's `design_bases`
+    """
+
+    __slots__ = ("_modes", "_default")
+
+    def __init__(self, doc):
+        design_bases = {basis["label"]: basis for basis in doc.get("design_bases", [])}
+        self._modes = {}
+        for mode in doc.get("power_curves", {}).get("operating_modes", []):
+            if mode["label"] in self._modes:
+                raise ValueError(f"Operating mode label '{mode['label']}' is not unique")
+            self._modes[mode["label"]] = EffectiveMode(doc, mode, design_bases)
+        self._default = next((mode for mode in self._modes.values() if mode.is_default), None)
+
+    def __getitem__(self, label):
+        try:
+            return self._modes[label]
+        except KeyError:
+            raise KeyError(f"Document has no operating mode '{label}'") from None
+
+    def __contains__(self, label):
+        return label in self._modes
+
+    def __iter__(self):
+        return iter(self._modes.values())
+
+    def __len__(self):
+        return len(self._modes)
+
+    @property
+    def labels(self):
+        """The operating mode labels, in document order"""
+        return tuple(self._modes)
+
+    @property
+    def default(self):
+        """The default operating mode, or None if the document doesn't name one"""
+        return self._default
+
+    def get(self, label=None):
+        """Get an effective mode by label, defaulting to the default operating mode (or the first, if none)"""
+        if label is None:
+            if self._default is not None:
+                return self._default
+            if self._modes:
+                return next(iter(self._modes.values()))
+        return self[label]
+
+    def for_hub_height(self, hub_height):
+        """Get the effective modes which can be used at a hub height, in document order"""
+        return [mode for mode in self._modes.values() if mode.allows_hub_height(hub_height)]
+
+
+class _ViewCache:
+    """Effective mode views by id of their document, as (document, fingerprint, view), least recently used first.
+
+    Entries hold their document, so that its id can't be reused by another document while the entry exists.
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self.views = {}
+
+    def get(self, doc):
+        entry = self.views.pop(id(doc), None)
+        fingerprint = _fingerprint(doc)
+        if entry is None or entry[0] is not doc or not _same_fingerprint(entry[1], fingerprint):
+            entry = (doc, fingerprint, EffectiveModes(doc))
+        if len(self.views) >= self.size:
+            del self.views[next(iter(self.views))]
+        self.views[id(doc)] = entry
+        return entry[2]
+
+    def invalidate(self, doc):
+        self.views.pop(id(doc), None)
+
+    def clear(self):
+        self.views.clear()
+
+
+_views = _ViewCache(VIEW_CACHE_SIZE)
+
+
+def effective_modes(doc):
+    """Get the effective operating modes of a document, resolved once and cached until anything they were resolved
+    from is replaced or edited.
+
+    Args:
+        doc: The power curve document
+
+    Returns:
+        An EffectiveModes view of the document
+    """
+    return _views.get(doc)
+
+
+def effective_mode(doc, label=None):
+    """Get the effective properties of one operating mode of a document (the default operating mode, if no label)"""
+    return _views.get(doc).get(label)
+
+
+def invalidate_effective_modes(doc):
+    """Discard the cached view of a document (edits are detected, so this only frees memory)"""
+    _views.invalidate(doc)
+
+
+def clear_effective_modes():
+    """Clear the cache of effective mode views"""
+    _views.clear()
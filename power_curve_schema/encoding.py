@@ -0,0 +1,178 @@
+"""
+Encoding.py
+
+Compact encodings for the curve arrays of power curve documents, for storage and transfer.
+
+Each curve array (`power`, `thrust_coefficient`, `rotor_rpm`) in an operating mode is replaced by an object like:
+
+    {"encoding": "delta", "shape": [8, 55], "data": "<base64>"}
+
+where `data` is a zlib-compressed, byte-shuffled little-endian buffer. Available encodings are:
+
+- `delta` (lossless): differences between consecutive float64 bit patterns. Smooth curves and plateaus produce
+  long runs of zero high-order bytes, which compress very well.
+- `rle` (lossless): run-length encoding of repeated values, ideal for flat plateaus at rated power.
+- `float32` (lossy): values stored in single precision. Relative error is bounded by 2**-24 (about 6e-8).
+- `quantize` (lossy): values rounded to the nearest multiple of a fixed `precision` then delta encoded as
+  integers. Absolute error is bounded by `precision / 2`.
+
+Encoded documents are not schema-valid; use `decode_document` to recover a schema-valid document.
+"""
+
+import base64
+import zlib
+
+import numpy as np
+
+from .arrays import CURVE_FIELDS, to_ndarray
+from .instrumentation import document_stats, span
+
+ENCODINGS = ("delta", "rle", "float32", "quantize")
+
+# Quantization steps giving errors well below the precision to which OEMs publish curves
+DEFAULT_PRECISION = {
+    "power": 1.0,
+    "thrust_coefficient": 1e-5,
+    "rotor_rpm": 1e-4,
+}
+
+
+def _pack(array):
+    """Byte-shuffle, compress and base64 encode a numpy array"""
+    array = np.ascontiguousarray(array)
+    shuffled = np.frombuffer(array.tobytes(), dtype=np.uint8).reshape(-1, array.itemsize).T
+    return base64.b64encode(zlib.compress(shuffled.tobytes(), 9)).decode("ascii")
+
+
+def _unpack(data, dtype):
+    """Inverse of _pack"""
+    dtype = np.dtype(dtype)
+    raw = np.frombuffer(zlib.decompress(base64.b64decode(data)), dtype=np.uint8)
+    return np.frombuffer(raw.reshape(dtype.itemsize, -1).T.tobytes(), dtype=dtype)
+
+
+def _delta(integers):
+    """Difference consecutive int64 values (wrapping on overflow, so exactly reversible by a cumulative sum)"""
+    return np.diff(integers, prepend=np.int64(0))
+
+
+def _undelta(deltas):
+    return np.cumsum(deltas, dtype=np.int64)
+
+
+def encode_array(values, encoding="delta", precision=None):
+    """Encode an N-D curve array.
+
+    Args:
+        values: The (possibly nested) list or array of numbers to encode
+        encoding: One of `ENCODINGS`
+        precision: The quantization step, required for (and only used by) the `quantize` encoding
+
+    Returns:
+        A JSON-serialisable dict describing the encoded array
+    """
+    array = to_ndarray(values)
+    flat = array.ravel().astype("<f8")
+    encoded = {"encoding": encoding, "shape": list(array.shape)}
+
+    if encoding == "delta":
+        encoded["data"] = _pack(_delta(flat.view("<i8")).astype("<i8"))
+
+    elif encoding == "rle":
+        bits = flat.view("<i8")
+        starts = np.flatnonzero(np.concatenate(([True], bits[1:] != bits[:-1]))) if bits.size else np.array([], int)
+        counts = np.diff(np.append(starts, bits.size))
+        encoded["data"] = _pack(flat[starts])
+        encoded["counts"] = _pack(counts.astype("<u4"))
+
+    elif encoding == "float32":
+        encoded["data"] = _pack(flat.astype("<f4"))
+
+    elif encoding == "quantize":
+        if precision is None or precision <= 0:
+            raise ValueError("A positive precision must be given for the 'quantize' encoding")
+        quantized = np.rint(flat / precision).astype("<i8")
+        encoded["precision"] = precision
+        encoded["data"] = _pack(_delta(quantized).astype("<i8"))
+
+    else:
+        raise ValueError(f"Unknown encoding '{encoding}', must be one of {ENCODINGS}")
+
+    return encoded
+
+
+def decode_array(encoded):
+    """Decode an array produced by `encode_array`, returning a float64 numpy array of the original shape"""
+    encoding = encoded["encoding"]
+
+    if encoding == "delta":
+        flat = _undelta(_unpack(encoded["data"], "<i8")).view("<f8")
+    elif encoding == "rle":
+        flat = np.repeat(_unpack(encoded["data"], "<f8"), _unpack(encoded["counts"], "<u4"))
+    elif encoding == "float32":
+        flat = _unpack(encoded["data"], "<f4").astype(np.float64)
+    elif encoding == "quantize":
+        flat = _undelta(_unpack(encoded["data"], "<i8")) * float(encoded["precision"])
+    else:
+        raise ValueError(f"Unknown encoding '{encoding}', must be one of {ENCODINGS}")
+
+    return flat.astype(np.float64).reshape(encoded["shape"])
+
+
+def is_encoded(value):
+    """Determine whether a curve field value is an encoded array (rather than a nested list)"""
+    return isinstance(value, dict) and "encoding" in value
+
+
+def encode_document(doc, encoding="delta", precision=None):
+    """Encode the curve arrays in all operating modes of a document.
+
+    The input document is not modified; a new document sharing all non-curve content with the input is returned.
+
+    Args:
+        doc: A schema-valid power curve document
+        encoding: One of `ENCODINGS`
+        precision: For the `quantize` encoding, either a number (used for all fields) or a dict mapping field name to
+            quantization step. Defaults to `DEFAULT_PRECISION`.
+
+    Returns:
+        The encoded document
+    """
+    if precision is None:
+        precision = DEFAULT_PRECISION
+    if not isinstance(precision, dict):
+        precision = {field: precision for field in CURVE_FIELDS}
+
+    modes = []
+    with span("arrays.encode", encoding=encoding) as active:
+        if active:
+            active.set(**document_stats(doc))
+        for mode in doc["power_curves"]["operating_modes"]:
+            mode = dict(mode)
+            for field in CURVE_FIELDS:
+                if field in mode and not is_encoded(mode[field]):
+                    mode[field] = encode_array(mode[field], encoding=encoding, precision=precision.get(field))
+            modes.append(mode)
+
+    return {**doc, "power_curves": {**doc["power_curves"], "operating_modes": modes}}
+
+
+def decode_document(doc):
+    """Decode a document produced by `encode_document`, returning a schema-valid document.
+
+    The input document is not modified.
+    """
+    modes = []
+    with span("arrays.decode") as active:
+        cells = 0
+        for mode in doc["power_curves"]["operating_modes"]:
+            mode = dict(mode)
+            for field in CURVE_FIELDS:
+                if field in mode and is_encoded(mode[field]):
+                    array = decode_array(mode[field])
+                    cells += array.size
+                    mode[field] = array.tolist()
+            modes.append(mode)
+        active.set(modes=len(modes), cells=cells)
+
+    return {**doc, "power_curves": {**doc["power_curves"], "operating_modes": modes}}
@@ -0,0 +1,305 @@
+"""
+Farm.py
+
+Evaluation of power and thrust coefficient for every turbine in a wind farm at once, for wake models and other flow
+simulations which query the curves many times (for every turbine, flow case and solver iteration).
+
+Turbines are grouped by (document, operating mode, hub height), and each group's interpolant and lookup tables are built
+once, when the evaluator is constructed. Each call then evaluates all turbines in one vectorized pass per group, working
+entirely in buffers allocated on the first call (or when the number of flow cases changes), so repeated calls allocate
+no memory for intermediate or output arrays.
+
+To avoid per-call `searchsorted`, each axis has a lookup table giving the lower grid index over a uniform set of bins
+finer than the grid spacing; a single comparison against the next grid point then corrects the index. Axes whose
+grid spacing is so uneven that the table would exceed `_MAX_TABLE_SIZE` bins (so that a bin could hold several grid
+points) use `searchsorted` instead. Flow arrays are checked to have a value per turbine, so indices are always in range
+and gathers use `take(..., mode="clip")`, which (unlike the default mode) doesn't buffer its output.
+
+Example:
+
+    evaluator = FarmEvaluator([(doc_a, "mode_1", 140.0)] * 150 + [(doc_b, None, 120.0)] * 50)
+    for iteration in range(100):
+        results = evaluator({"wind-speed": speeds, "air-density": 1.225})  # speeds has shape (cases, 200)
+        results["thrust_coefficient"]  # Shape (cases, 200), overwritten by the next call
+"""
+
+import itertools
+
+import numpy as np
+
+from .hub_heights import is_hub_height_available
+from .instrumentation import span
+from .interpolation import ModeInterpolant
+
+DEFAULT_FIELDS = ("power", "thrust_coefficient")
+
+# The number of lookup table bins per smallest grid spacing (at least two, so each bin contains at most one grid point)
+_BINS_PER_SPACING = 4
+
+# Bound on the size of the lookup table for an axis, beyond which `searchsorted` is used for pathologically uneven grids
+_MAX_TABLE_SIZE = 1 << 20
+
+
+def find_mode(doc, label=None):
+    """Get an operating mode of a document by label, defaulting to the document's default operating mode"""
+    power_curves = doc["power_curves"]
+    if label is None:
+        label = power_curves.get("default_operating_mode_label")
+    for mode in power_curves["operating_modes"]:
+        if mode["label"] == label or label is None:
+            return mode
+    raise KeyError(f"Document has no operating mode '{label}'")
+
+
+class _AxisTable:
+    """A lookup table giving the lower grid index of the interval containing a value, for one axis (or None as the
+    table, if the grid is too uneven for a table of bounded size)"""
+
+    __slots__ = ("coordinates", "origin", "scale", "table", "last")
+
+    def __init__(self, coordinates):
+        order = np.argsort(coordinates)
+        if not np.array_equal(order, np.arange(coordinates.size)):
+            raise ValueError("Axis values must be in increasing order for farm evaluation")
+        self.coordinates = coordinates
+        self.last = coordinates.size - 1
+        self.origin = coordinates[0]
+        if coordinates.size < 2:
+            self.scale = 0.0
+            self.table = np.zeros(1, dtype=np.intp)
+            return
+
+        spacing = np.min(np.diff(coordinates))
+        if spacing <= 0:
+            raise ValueError("Axis values must be unique")
+        bins = np.ceil((coordinates[-1] - coordinates[0]) / spacing * _BINS_PER_SPACING)
+        if bins > _MAX_TABLE_SIZE:
+            self.scale = 0.0
+            self.table = None
+            return
+        bins = int(bins)
+        self.scale = bins / (coordinates[-1] - coordinates[0])
+        edges = coordinates[0] + np.arange(bins + 1) / self.scale
+        # The last grid point at or below the start of each bin, never the final point (so there's an upper neighbour)
+        self.table = np.minimum(np.searchsorted(coordinates, edges, side="right") - 1, self.last - 1).clip(0)
+
+
+class _Group:
+    """The turbines in a farm which share a document, operating mode and hub height, with their scratch buffers"""
+
+    __slots__ = ("interpolant", "turbines", "tables", "strides", "arrays", "buffers")
+
+    def __init__(self, interpolant, turbines, fields):
+        self.interpolant = interpolant
+        self.turbines = np.asarray(turbines, dtype=np.intp)
+        self.tables = [_AxisTable(coordinates) for coordinates in interpolant.coordinates]
+        arrays = [np.ascontiguousarray(interpolant.array(field)) for field in fields]
+        self.strides = [int(np.prod(arrays[0].shape[axis + 1 :])) for axis in range(arrays[0].ndim)]
+        self.arrays = [array.ravel() for array in arrays]
+        self.buffers = None
+
+    def allocate(self, cases):
+        """Allocate scratch buffers for a number of flow cases"""
+        shape = (cases, self.turbines.size)
+        dimensions = len(self.tables)
+        self.buffers = {
+            "values": np.empty((dimensions,) + shape),
+            "lower": np.empty((dimensions,) + shape, dtype=np.intp),
+            "upper": np.empty((dimensions,) + shape, dtype=np.intp),
+            "weight": np.empty((dimensions,) + shape),
+            "scratch": np.empty(shape),
+            "denominator": np.empty(shape),
+            "mask": np.empty(shape, dtype=bool),
+            "index": np.empty(shape, dtype=np.intp),
+            "offset": np.empty(shape, dtype=np.intp),
+            "factor": np.empty(shape),
+            "sample": np.empty(shape),
+            "results": np.empty((len(self.arrays),) + shape),
+        }
+
+    def gather(self, flow, cases):
+        """Copy the flow values at this group's turbines into the values buffer"""
+        values = self.buffers["values"]
+        for axis, label in enumerate(self.interpolant.labels):
+            try:
+                value = flow[label]
+            except KeyError:
+                raise KeyError(f"Operating mode '{self.interpolant.label}' needs a value for {label}") from None
+            if np.ndim(value) == 0:
+                values[axis].fill(value)
+            elif np.ndim(value) == 1:
+                np.take(value, self.turbines, out=values[axis][0], mode="clip")
+                values[axis][1:] = values[axis][0]
+            elif np.shape(value)[0] != cases:
+                raise ValueError(f"Flow values for {label} have {np.shape(value)[0]} cases, expected {cases}")
+            else:
+                np.take(value, self.turbines, axis=-1, out=values[axis], mode="clip")
+
+    def locate(self, out_of_bounds):
+        """Find the interval of each value along each axis, and the weight of its upper point, in place"""
+        buffers = self.buffers
+        scratch, denominator = buffers["scratch"], buffers["denominator"]
+        for axis, table in enumerate(self.tables):
+            x, lower, upper, weight = (buffers[name][axis] for name in ("values", "lower", "upper", "weight"))
+            coordinates = table.coordinates
+            if out_of_bounds == "raise" and (x.min() < coordinates[0] or x.max() > coordinates[-1]):
+                raise ValueError(
+                    f"Flow values for {self.interpolant.labels[axis]} are outside the range "
+                    f"[{coordinates[0]}, {coordinates[-1]}] of operating mode '{self.interpolant.label}'"
+                )
+            if table.last == 0:
+                lower.fill(0)
+                upper.fill(0)
+                weight.fill(0.0)
+                continue
+
+            if table.table is None:
+                lower[...] = np.searchsorted(coordinates, x, side="right") - 1
+                np.clip(lower, 0, table.last - 1, out=lower)
+            else:
+                self._lookup(table, x, lower, upper)
+            np.add(lower, 1, out=upper)
+
+            # Weight of the upper point, clipped so that values outside the grid take the end values
+            np.take(coordinates, lower, out=scratch, mode="clip")
+            np.subtract(x, scratch, out=weight)
+            np.take(coordinates, upper, out=denominator, mode="clip")
+            np.subtract(denominator, scratch, out=denominator)
+            np.divide(weight, denominator, out=weight)
+            np.clip(weight, 0.0, 1.0, out=weight)
+
+    def _lookup(self, table, x, lower, upper):
+        """Find the lower grid index of each value from an axis's lookup table, using upper as scratch space"""
+        scratch, mask = self.buffers["scratch"], self.buffers["mask"]
+        coordinates = table.coordinates
+        # Look up the bin, then step up one grid point if the value is at or beyond the next one
+        np.subtract(x, table.origin, out=scratch)
+        np.multiply(scratch, table.scale, out=scratch)
+        np.clip(scratch, 0, table.table.size - 1, out=scratch)
+        np.floor(scratch, out=scratch)
+        upper[...] = scratch
+        np.take(table.table, upper, out=lower, mode="clip")
+        np.add(lower, 1, out=upper)
+        np.take(coordinates, upper, out=scratch, mode="clip")
+        np.greater_equal(x, scratch, out=mask)
+        np.add(lower, mask, out=lower, casting="unsafe")
+        np.minimum(lower, table.last - 1, out=lower)
+
+    def evaluate(self):
+        """Sum the contributions of the corners of each cell, for each field, into the results buffer"""
+        buffers = self.buffers
+        index, offset, factor, sample = buffers["index"], buffers["offset"], buffers["factor"], buffers["sample"]
+        results = buffers["results"]
+        results.fill(0.0)
+        for corner in itertools.product((0, 1), repeat=len(self.tables)):
+            index.fill(0)
+            factor.fill(1.0)
+            for axis, upper in enumerate(corner):
+                np.multiply(buffers["upper" if upper else "lower"][axis], self.strides[axis], out=offset)
+                np.add(index, offset, out=index)
+                if upper:
+                    np.multiply(factor, buffers["weight"][axis], out=factor)
+                else:
+                    np.subtract(1.0, buffers["weight"][axis], out=sample)
+                    np.multiply(factor, sample, out=factor)
+            for array, result in zip(self.arrays, results):
+                np.take(array, index, out=sample, mode="clip")
+                np.multiply(sample, factor, out=sample)
+                np.add(result, sample, out=result)
+
+
+class FarmEvaluator:
+    """Evaluate curves for every turbine in a farm, in batches with reusable buffers.
+
+    Args:
+        turbines: A sequence of (document, operating mode label, hub height) for each turbine, where the label may be
+            None to use the document's default operating mode. Documents are dicts, which must not be modified while
+            the evaluator is in use.
+        fields: The curve fields to evaluate
+        out_of_bounds: "clip" (the default) to hold the end values of the curves for flow values outside their grids,
+            or "raise" to raise a ValueError
+
+    Raises:
+        ValueError: If a turbine's hub height isn't available for its turbine type, or is excluded by its operating
+            mode's `restricted_to_hub_heights`, or its operating mode has bucketed axes
+    """
+
+    __slots__ = ("fields", "out_of_bounds", "size", "groups", "_documents", "_cases", "_results", "_outputs")
+
+    def __init__(self, turbines, fields=DEFAULT_FIELDS, out_of_bounds="clip"):
+        if out_of_bounds not in ("clip", "raise"):
+            raise ValueError(f"Unknown out_of_bounds option '{out_of_bounds}'")
+        self.fields = tuple(fields)
+        self.out_of_bounds = out_of_bounds
+
+        members = {}
+        documents = {}
+        for position, (doc, label, hub_height) in enumerate(turbines):
+            mode = find_mode(doc, label)
+            if not is_hub_height_available(doc.get("turbine", {}).get("available_hub_heights"), hub_height):
+                raise ValueError(f"Turbine {position} has hub height {hub_height} m, which is not available")
+            if not is_hub_height_available(mode.get("restricted_to_hub_heights"), hub_height):
+                raise ValueError(
+                    f"Turbine {position} has hub height {hub_height} m, which operating mode '{mode['label']}' is "
+                    "restricted from"
+                )
+            documents[id(doc)] = doc
+            members.setdefault((id(doc), mode["label"], float(hub_height)), (mode, []))[1].append(position)
+
+        # Interpolants are built once per mode, and shared by the groups of that mode at different hub heights
+        interpolants = {}
+        self.groups = []
+        for (doc_id, label, _), (mode, positions) in members.items():
+            if (doc_id, label) not in interpolants:
+                interpolants[(doc_id, label)] = ModeInterpolant(mode, out_of_bounds=out_of_bounds)
+                if interpolants[(doc_id, label)].bucketed:
+                    raise ValueError(f"Operating mode '{label}' has bucketed axes, which can't be evaluated for a farm")
+            self.groups.append(_Group(interpolants[(doc_id, label)], positions, self.fields))
+
+        self._documents = documents
+        self.size = sum(group.turbines.size for group in self.groups)
+        self._cases = None
+        self._results = None
+        self._outputs = None
+
+    def _allocate(self, cases):
+        self._cases = cases
+        self._results = np.zeros((len(self.fields), cases, self.size))
+        self._outputs = (
+            dict(zip(self.fields, self._results)),
+            dict(zip(self.fields, self._results[:, 0, :])),
+        )
+        for group in self.groups:
+            group.allocate(cases)
+
+    def __call__(self, flow):
+        """Evaluate the curves of every turbine.
+
+        Args:
+            flow: A dict mapping each axis parameter label (eg `wind-speed`, `air-density`) to either a number (for all
+                turbines), an array of shape (turbines,), or an array of shape (cases, turbines)
+
+        Returns:
+            A dict of arrays of evaluated values by field, of shape (cases, turbines) if any flow values were given by
+            case, otherwise (turbines,). These are buffers owned by the evaluator, which are overwritten by the next
+            call with the same number of cases, so copy them if they need to be kept.
+        """
+        cases = None
+        for label, value in flow.items():
+            if np.ndim(value) > 0 and np.shape(value)[-1] != self.size:
+                raise ValueError(f"Flow values for {label} have {np.shape(value)[-1]} turbines, expected {self.size}")
+            if np.ndim(value) == 2 and cases is None:
+                cases = np.shape(value)[0]
+        if (cases or 1) != self._cases:
+            self._allocate(cases or 1)
+
+        with span("farm.evaluate", groups=len(self.groups)) as active:
+            for group in self.groups:
+                group.gather(flow, self._cases)
+                group.locate(self.out_of_bounds)
+                group.evaluate()
+                self._results[:, :, group.turbines] = group.buffers["results"]
+            if active:
+                active.set(turbines=self._results.shape[2], cases=self._cases)
+
+        return self._outputs[0] if cases is not None else self._outputs[1]
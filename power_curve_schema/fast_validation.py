@@ -0,0 +1,406 @@
+"""
+Fast_validation.py
+
+A lightweight validity check for power curve documents, used where start-up time matters (eg the command line).
+
+Importing `jsonschema` alone takes longer than validating a typical document, so this module compiles the bundled
+schema (see `bundle.py`) into a tree of plain python closures that answer only "is this instance valid?". It supports
+the subset of draft 2020-12 keywords used by the power curve schema, with the same results as `jsonschema`, and raises
+a ValueError when compiling any other keyword so that it can never silently pass an unsupported schema.
+
+Arrays may be given as lists or as numpy arrays (eg curve arrays parsed by `serialization.loads(text, arrays=True)`),
+with the same results. Items of numeric numpy arrays are checked with vectorized operations, without creating a python
+object for each value, and numpy itself is never imported here.
+
+To find out *why* an instance is invalid, use `validation.validate`, which gives the full `jsonschema` error.
+
+Example:
+
+    from power_curve_schema.fast_validation import is_valid
+
+    if not is_valid(doc):
+        from power_curve_schema.validation import validate
+
+        validate(doc)  # Raises the most relevant error
+"""
+
+import functools
+import re
+
+from .bundle import ANNOTATION_KEYWORDS, SOURCE_HASH_KEY, load_bundled_schema
+from .schemas import section_schema
+
+# Keywords which have no effect on whether an instance is valid
+_IGNORED_KEYWORDS = ANNOTATION_KEYWORDS | {"$schema", "$id", "format", SOURCE_HASH_KEY}
+
+
+def _is_ndarray(instance):
+    """Check whether an instance is a numpy array (eg as parsed by `serialization.loads`), without importing numpy"""
+    cls = type(instance)
+    return cls.__name__ == "ndarray" and cls.__module__ == "numpy"
+
+
+def _is_array(instance):
+    return isinstance(instance, list) or (_is_ndarray(instance) and instance.ndim > 0)
+
+
+def _is_number(instance):
+    return isinstance(instance, (int, float)) and not isinstance(instance, bool)
+
+
+def _is_integer(instance):
+    if isinstance(instance, bool):
+        return False
+    return isinstance(instance, int) or (isinstance(instance, float) and instance.is_integer())
+
+
+_TYPE_CHECKS = {
+    "array": _is_array,
+    "boolean": lambda instance: isinstance(instance, bool),
+    "integer": _is_integer,
+    "null": lambda instance: instance is None,
+    "number": _is_number,
+    "object": lambda instance: isinstance(instance, dict),
+    "string": lambda instance: isinstance(instance, str),
+}
+
+
+def _freeze(instance):
+    """Get a hashable key for an instance, equal for JSON-equal instances (so that eg `1 == 1.0` but `1 != true`)"""
+    if isinstance(instance, bool) or instance is None:
+        return (type(instance), instance)
+    if isinstance(instance, (int, float)):
+        return (float, instance)
+    if isinstance(instance, list):
+        return (list, tuple(_freeze(item) for item in instance))
+    if _is_ndarray(instance):
+        return _freeze(instance.tolist())
+    if isinstance(instance, dict):
+        return (dict, frozenset((key, _freeze(value)) for key, value in instance.items()))
+    return (type(instance), instance)
+
+
+def _compile_type(value, schema):
+    names = [value] if isinstance(value, str) else value
+    checks = tuple(_TYPE_CHECKS[name] for name in names)
+    if len(checks) == 1:
+        return checks[0]
+    return lambda instance: any(check(instance) for check in checks)
+
+
+def _compile_properties(value, schema):
+    properties = tuple((name, compile_schema(subschema)) for name, subschema in value.items())
+
+    def check(instance):
+        if not isinstance(instance, dict):
+            return True
+        for name, subcheck in properties:
+            if name in instance and not subcheck(instance[name]):
+                return False
+        return True
+
+    return check
+
+
+def _compile_additional_properties(value, schema):
+    known = frozenset(schema.get("properties", ()))
+    patterns = tuple(re.compile(pattern) for pattern in schema.get("patternProperties", ()))
+
+    def is_additional(name):
+        return name not in known and not any(pattern.search(name) for pattern in patterns)
+
+    if value is True:
+        return None
+    if value is False:
+        return lambda instance: not isinstance(instance, dict) or not any(map(is_additional, instance))
+
+    subcheck = compile_schema(value)
+
+    def check(instance):
+        if not isinstance(instance, dict):
+            return True
+        return all(subcheck(item) for name, item in instance.items() if is_additional(name))
+
+    return check
+
+
+def _compile_pattern_properties(value, schema):
+    patterns = tuple((re.compile(pattern), compile_schema(subschema)) for pattern, subschema in value.items())
+
+    def check(instance):
+        if not isinstance(instance, dict):
+            return True
+        for pattern, subcheck in patterns:
+            for name, item in instance.items():
+                if pattern.search(name) and not subcheck(item):
+                    return False
+        return True
+
+    return check
+
+
+def _compile_required(value, schema):
+    required = tuple(value)
+    return lambda instance: not isinstance(instance, dict) or all(name in instance for name in required)
+
+
+# Keywords which `_compile_vectorized` can check on numpy arrays without visiting each element in python
+_VECTORIZED_KEYWORDS = frozenset(
+    ("type", "items", "minItems", "maxItems", "minimum", "maximum", "exclusiveMinimum", "exclusiveMaximum")
+)
+_BOUNDS = {
+    "minimum": lambda items, value: not (items < value).any(),
+    "maximum": lambda items, value: not (items > value).any(),
+    "exclusiveMinimum": lambda items, value: not (items <= value).any(),
+    "exclusiveMaximum": lambda items, value: not (items >= value).any(),
+}
+
+
+def _compile_vectorized(schema):
+    """Compile a check of all the items of a numeric numpy array against an `items` schema at once, or return None if
+    the schema uses keywords which can't be checked that way (so that each item is checked as a python object instead).
+
+    The compiled check takes an array whose first axis runs over the items, so that items of nested arrays can be
+    checked together by flattening the outer axes.
+    """
+    if schema is True:
+        return lambda items: True
+    if not isinstance(schema, dict) or not set(schema) - _IGNORED_KEYWORDS <= _VECTORIZED_KEYWORDS:
+        return None
+
+    kind = schema.get("type")
+    if kind in ("number", "integer"):
+        bounds = tuple((_BOUNDS[keyword], value) for keyword, value in schema.items() if keyword in _BOUNDS)
+
+        def check_numbers(items):
+            if items.ndim != 1 or (kind == "integer" and not (items % 1 == 0).all()):
+                return False
+            return all(bound(items, value) for bound, value in bounds)
+
+        return check_numbers
+
+    if kind == "array":
+        subcheck = _compile_vectorized(schema.get("items", True))
+        if subcheck is None:
+            return None
+        min_items, max_items = schema.get("minItems", 0), schema.get("maxItems", float("inf"))
+
+        def check_arrays(items):
+            if items.ndim < 2 or not min_items <= items.shape[1] <= max_items:
+                return False
+            return items.size == 0 or subcheck(items.reshape((-1,) + items.shape[2:]))
+
+        return check_arrays
+
+    return None
+
+
+def _compile_items(value, schema):
+    if "prefixItems" in schema:
+        raise ValueError("Keyword 'prefixItems' is not supported")
+    subcheck = compile_schema(value)
+    vectorized = _compile_vectorized(value)
+
+    def check(instance):
+        if isinstance(instance, list):
+            return all(map(subcheck, instance))
+        if not _is_ndarray(instance) or instance.ndim == 0:
+            return True
+        # Numeric arrays are checked at once where possible, otherwise their items are checked as python objects
+        if vectorized is not None and instance.dtype.kind in "fiu":
+            return vectorized(instance)
+        return all(map(subcheck, instance.tolist()))
+
+    return check
+
+
+def _compile_min_items(value, schema):
+    return lambda instance: not _is_array(instance) or len(instance) >= value
+
+
+def _compile_max_items(value, schema):
+    return lambda instance: not _is_array(instance) or len(instance) <= value
+
+
+def _compile_unique_items(value, schema):
+    if not value:
+        return None
+
+    def check(instance):
+        if _is_ndarray(instance) and instance.ndim > 0:
+            instance = instance.tolist()
+        if not isinstance(instance, list):
+            return True
+        return len(set(map(_freeze, instance))) == len(instance)
+
+    return check
+
+
+def _compile_min_length(value, schema):
+    return lambda instance: not isinstance(instance, str) or len(instance) >= value
+
+
+def _compile_max_length(value, schema):
+    return lambda instance: not isinstance(instance, str) or len(instance) <= value
+
+
+def _compile_pattern(value, schema):
+    search = re.compile(value).search
+    return lambda instance: not isinstance(instance, str) or search(instance) is not None
+
+
+def _compile_minimum(value, schema):
+    return lambda instance: not _is_number(instance) or instance >= value
+
+
+def _compile_maximum(value, schema):
+    return lambda instance: not _is_number(instance) or instance <= value
+
+
+def _compile_exclusive_minimum(value, schema):
+    return lambda instance: not _is_number(instance) or instance > value
+
+
+def _compile_exclusive_maximum(value, schema):
+    return lambda instance: not _is_number(instance) or instance < value
+
+
+def _compile_const(value, schema):
+    frozen = _freeze(value)
+    return lambda instance: _freeze(instance) == frozen
+
+
+def _compile_enum(value, schema):
+    frozen = frozenset(map(_freeze, value))
+    return lambda instance: _freeze(instance) in frozen
+
+
+def _compile_all_of(value, schema):
+    subchecks = tuple(map(compile_schema, value))
+    return lambda instance: all(subcheck(instance) for subcheck in subchecks)
+
+
+def _compile_any_of(value, schema):
+    subchecks = tuple(map(compile_schema, value))
+    return lambda instance: any(subcheck(instance) for subcheck in subchecks)
+
+
+def _compile_one_of(value, schema):
+    subchecks = tuple(map(compile_schema, value))
+
+    def check(instance):
+        matched = False
+        for subcheck in subchecks:
+            if subcheck(instance):
+                if matched:
+                    return False
+                matched = True
+        return matched
+
+    return check
+
+
+def _compile_not(value, schema):
+    subcheck = compile_schema(value)
+    return lambda instance: not subcheck(instance)
+
+
+def _compile_if(value, schema):
+    condition = compile_schema(value)
+    then = compile_schema(schema.get("then", True))
+    otherwise = compile_schema(schema.get("else", True))
+    return lambda instance: then(instance) if condition(instance) else otherwise(instance)
+
+
+_COMPILERS = {
+    "type": _compile_type,
+    "properties": _compile_properties,
+    "additionalProperties": _compile_additional_properties,
+    "patternProperties": _compile_pattern_properties,
+    "required": _compile_required,
+    "items": _compile_items,
+    "minItems": _compile_min_items,
+    "maxItems": _compile_max_items,
+    "uniqueItems": _compile_unique_items,
+    "minLength": _compile_min_length,
+    "maxLength": _compile_max_length,
+    "pattern": _compile_pattern,
+    "minimum": _compile_minimum,
+    "maximum": _compile_maximum,
+    "exclusiveMinimum": _compile_exclusive_minimum,
+    "exclusiveMaximum": _compile_exclusive_maximum,
+    "const": _compile_const,
+    "enum": _compile_enum,
+    "allOf": _compile_all_of,
+    "anyOf": _compile_any_of,
+    "oneOf": _compile_one_of,
+    "not": _compile_not,
+    "if": _compile_if,
+}
+
+# Keywords compiled as part of another keyword (`if`)
+_DEPENDENT_KEYWORDS = frozenset(("then", "else"))
+
+
+def compile_schema(schema):
+    """Compile a bundled (reference-free) schema into a function returning whether an instance is valid.
+
+    Args:
+        schema: The schema, or subschema, to compile
+
+    Returns:
+        A function taking an instance and returning True if it's valid against the schema, otherwise False
+
+    Raises:
+        ValueError: If the schema uses a keyword that isn't supported, including `$ref`
+    """
+    if schema is True:
+        return lambda instance: True
+    if schema is False:
+        return lambda instance: False
+
+    checks = []
+    for keyword, value in schema.items():
+        if keyword in _IGNORED_KEYWORDS or keyword in _DEPENDENT_KEYWORDS:
+            continue
+        try:
+            compiler = _COMPILERS[keyword]
+        except KeyError:
+            raise ValueError(f"Keyword '{keyword}' is not supported by the fast validator") from None
+        check = compiler(value, schema)
+        if check is not None:
+            checks.append(check)
+
+    # Cheap checks (eg type) are declared first in the schema, so short-circuiting in order is effective
+    if not checks:
+        return lambda instance: True
+    if len(checks) == 1:
+        return checks[0]
+    checks = tuple(checks)
+    return lambda instance: all(check(instance) for check in checks)
+
+
+@functools.lru_cache(maxsize=None)
+def get_checker(section=None):
+    """Get a memoized compiled check for whole documents, or for one of their top-level sections.
+
+    Args:
+        section: One of `SECTIONS`, or None (the default) to check whole documents
+
+    Returns:
+        A function taking an instance and returning True if it's valid against the bundled schema
+    """
+    return compile_schema(section_schema(load_bundled_schema(), section))
+
+
+def is_valid(instance, section=None):
+    """Check whether a document (or a partial document, if a section is given) is valid against the bundled schema.
+
+    Args:
+        instance: The document to check
+        section: One of `SECTIONS`, or None (the default) to check the whole document
+
+    Returns:
+        True if the instance is valid, otherwise False
+    """
+    return get_checker(section)(instance)
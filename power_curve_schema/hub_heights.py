@@ -0,0 +1,28 @@
+"""
+Hub_heights.py
+
+Hub height restrictions of turbines and operating modes, kept apart from the modules using them (with no dependencies)
+so that checking a hub height doesn't import numpy or the interpolation machinery of `farm`
+"""
+
+import math
+
+# The tolerance [m] within which a hub height matches one of a list of discrete hub heights
+HUB_HEIGHT_TOLERANCE = 1e-6
+
+
+def is_hub_height_available(hub_heights, hub_height):
+    """Check whether a hub height is allowed by an `available_hub_heights` (or `restricted_to_hub_heights`) entry.
+
+    Args:
+        hub_heights: A list of discrete hub heights, a {min, max} range (max being optional), or None for no restriction
+        hub_height: The hub height [m]
+
+    Returns:
+        True if the hub height is allowed
+    """
+    if hub_heights is None:
+        return True
+    if isinstance(hub_heights, dict):
+        return hub_heights["min"] <= hub_height <= hub_heights.get("max", math.inf)
+    return any(abs(hub_height - height) <= HUB_HEIGHT_TOLERANCE for height in hub_heights)
@@ -0,0 +1,333 @@
+"""
+Instrumentation.py
+
+Spans (timed sections of work) and counters emitted by the library, for finding where time and memory go when
+processing each document. Instrumented operations are:
+
+- `json.parse`: parsing JSON documents (see `serialization.load`), with the size in bytes, number of modes and cells
+- `schema.validate`: validating documents against the schema (see `validation.validate`)
+- `lens.<name>`: each lens of a migration between schema versions, within a `migrate.<name>` span (see `lenses`)
+- `arrays.decode` and `arrays.encode`: converting the curve arrays of documents (see `encoding.py`), and the
+  `arrays.cells` counter of values converted to numpy arrays (see `arrays.to_ndarray`)
+- `interpolation.evaluate` and `farm.evaluate`: evaluating curves (see `interpolation.ModeInterpolant` and
+  `farm.FarmEvaluator`), with the number of points or turbines and cases
+
+Events are sent to sinks, which are any callables taking an `Event`. With no sinks (the default), `span` returns a
+shared no-op span and `count` returns immediately, so instrumentation costs one check of a global per call. Attributes
+which are costly to compute are only computed for active spans (which, unlike the no-op span, are truthy):
+
+    with span("json.parse", bytes=len(text)) as active:
+        doc = json.loads(text)
+        if active:
+            active.set(**document_stats(doc))
+
+Sinks provided are `LoggingSink`, `Aggregator` (in-memory totals by name) and `MetricsServer` (which serves the totals
+of an aggregator over HTTP, in Prometheus text format, on a local port). If `tracemalloc` is tracing, spans also record
+the change in traced memory.
+
+Example:
+
+    from power_curve_schema import instrumentation
+
+    aggregator = instrumentation.Aggregator()
+    with instrumentation.instrumented(aggregator, instrumentation.LoggingSink()):
+        validate(serialization.load(fp))
+    aggregator.summary()["schema.validate"]  # {"kind": "span", "count": 1, "total": 0.0123, ...}
+
+    with instrumentation.MetricsServer(aggregator) as server:
+        server.url  # eg http://127.0.0.1:51234/metrics
+"""
+
+import collections
+import contextlib
+import contextvars
+import json
+import sys
+import threading
+import time
+
+# This module is imported by everything (see `cli.py`), so modules only some of its uses need aren't imported up front:
+# `tracemalloc` (which can only be tracing if it has already been imported), and `http.server` and `logging` (imported
+# by the sinks which use them).
+
+# An event emitted to sinks: kind is "span" (with value the duration in seconds) or "counter" (with value the
+# increment), parent is the name of the enclosing span (or None), and timestamp is the time (from `time.time`)
+Event = collections.namedtuple("Event", ("kind", "name", "value", "attributes", "parent", "timestamp"))
+
+_sinks = []
+_sinks_lock = threading.Lock()
+_current = contextvars.ContextVar("power_curve_schema_span", default=None)
+
+
+def enabled():
+    """Check whether any sinks are registered (and so whether events are emitted)"""
+    return bool(_sinks)
+
+
+def add_sink(sink):
+    """Register a sink, a callable taking each `Event`"""
+    global _sinks  # pylint: disable=global-statement
+    with _sinks_lock:
+        # The list is replaced rather than modified, so emitting events needn't hold the lock
+        _sinks = _sinks + [sink]
+
+
+def remove_sink(sink):
+    """Unregister a sink"""
+    global _sinks  # pylint: disable=global-statement
+    with _sinks_lock:
+        _sinks = [registered for registered in _sinks if registered is not sink]
+
+
+@contextlib.contextmanager
+def instrumented(*sinks):
+    """Register sinks for the duration of a `with` block"""
+    for sink in sinks:
+        add_sink(sink)
+    try:
+        yield
+    finally:
+        for sink in sinks:
+            remove_sink(sink)
+
+
+def _emit(event):
+    for sink in _sinks:
+        sink(event)
+
+
+class _NullSpan:
+    """The span returned when instrumentation is disabled, which does nothing"""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def __bool__(self):
+        return False
+
+    def set(self, **attributes):
+        """Set attributes of the span (ignored)"""
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Span:
+    """A timed section of work, emitted as an event when it ends"""
+
+    __slots__ = ("name", "attributes", "_start", "_memory", "_token")
+
+    def __init__(self, name, attributes):
+        self.name = name
+        self.attributes = attributes
+        self._start = None
+        self._memory = None
+        self._token = None
+
+    def __enter__(self):
+        self._token = _current.set(self)
+        tracemalloc = sys.modules.get("tracemalloc")
+        if tracemalloc is not None and tracemalloc.is_tracing():
+            self._memory = tracemalloc.get_traced_memory()[0]
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, error_type, *args):
+        duration = time.perf_counter() - self._start
+        _current.reset(self._token)
+        if self._memory is not None:
+            tracemalloc = sys.modules["tracemalloc"]
+            if tracemalloc.is_tracing():
+                self.attributes["memory"] = tracemalloc.get_traced_memory()[0] - self._memory
+        if error_type is not None:
+            self.attributes["error"] = error_type.__name__
+        parent = _current.get()
+        _emit(Event("span", self.name, duration, self.attributes, parent and parent.name, time.time()))
+        return False
+
+    def __bool__(self):
+        return True
+
+    def set(self, **attributes):
+        """Set attributes of the span"""
+        self.attributes.update(attributes)
+
+
+def span(name, **attributes):
+    """Time a section of work, as a context manager giving a `Span` (or a falsy no-op span if disabled)"""
+    if not _sinks:
+        return _NULL_SPAN
+    return Span(name, attributes)
+
+
+def count(name, value=1, **attributes):
+    """Emit a counter event, adding a value to the named counter"""
+    if not _sinks:
+        return
+    parent = _current.get()
+    _emit(Event("counter", name, value, attributes, parent and parent.name, time.time()))
+
+
+def document_stats(doc):
+    """Get the number of operating modes, and of cells in their curve arrays, of a document"""
+    modes = doc.get("power_curves", {}).get("operating_modes", []) if isinstance(doc, dict) else []
+    cells = 0
+    for mode in modes:
+        size = 1
+        for parameter in mode.get("parameters", []):
+            if "axis" in parameter:
+                size *= len(parameter.get("values", ()))
+        cells += size * sum(1 for field in ("power", "thrust_coefficient", "rotor_rpm") if field in mode)
+    return {"modes": len(modes), "cells": cells}
+
+
+class LoggingSink:
+    """A sink which logs each event.
+
+    Args:
+        logger: The logger to use, defaulting to this module's
+        level: The level to log events at, defaulting to `logging.DEBUG`
+    """
+
+    def __init__(self, logger=None, level=None):
+        import logging  # pylint: disable=import-outside-toplevel
+
+        self.logger = logger or logging.getLogger(__name__)
+        self.level = logging.DEBUG if level is None else level
+
+    def __call__(self, event):
+        if not self.logger.isEnabledFor(self.level):
+            return
+        if event.kind == "span":
+            self.logger.log(self.level, "%s took %.3f ms %s", event.name, event.value * 1000, event.attributes)
+        else:
+            self.logger.log(self.level, "%s += %s %s", event.name, event.value, event.attributes)
+
+
+class Aggregator:
+    """A sink which keeps totals of events by name: the count, total, min and max of span durations (or counter
+    increments), and the totals of numeric span attributes (eg bytes, cells or memory).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._totals = {}
+
+    def __call__(self, event):
+        with self._lock:
+            totals = self._totals.get(event.name)
+            if totals is None:
+                totals = self._totals[event.name] = {
+                    "kind": event.kind,
+                    "count": 0,
+                    "total": 0,
+                    "min": event.value,
+                    "max": event.value,
+                    "attributes": {},
+                }
+            totals["count"] += 1
+            totals["total"] += event.value
+            totals["min"] = min(totals["min"], event.value)
+            totals["max"] = max(totals["max"], event.value)
+            for key, value in event.attributes.items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    totals["attributes"][key] = totals["attributes"].get(key, 0) + value
+
+    def summary(self):
+        """Get the totals by event name, as a dict of dicts"""
+        with self._lock:
+            return {name: {**totals, "attributes": dict(totals["attributes"])} for name, totals in self._totals.items()}
+
+    def reset(self):
+        """Clear all totals"""
+        with self._lock:
+            self._totals.clear()
+
+    def to_prometheus(self, prefix="power_curve_schema"):
+        """Format the totals in the Prometheus text exposition format"""
+        lines = [
+            f"# TYPE {prefix}_span_seconds summary",
+            f"# TYPE {prefix}_events_total counter",
+            f"# TYPE {prefix}_attribute_total counter",
+        ]
+        for name, totals in sorted(self.summary().items()):
+            label = json.dumps(name)
+            if totals["kind"] == "span":
+                lines.append(f"{prefix}_span_seconds_count{{name={label}}} {totals['count']}")
+                lines.append(f"{prefix}_span_seconds_sum{{name={label}}} {totals['total']!r}")
+            else:
+                lines.append(f"{prefix}_events_total{{name={label}}} {totals['total']!r}")
+            for key, value in sorted(totals["attributes"].items()):
+                lines.append(f"{prefix}_attribute_total{{name={label},attribute={json.dumps(key)}}} {value!r}")
+        return "\n".join(lines) + "\n"
+
+
+class MetricsServer:
+    """A local HTTP server for the totals of an aggregator, at `/metrics` (Prometheus text) and `/metrics.json`.
+
+    Args:
+        aggregator: The Aggregator to serve (which must also be registered as a sink to receive events)
+        host: The host to bind to, by default only the local machine
+        port: The port to bind to, by default any free port
+    """
+
+    def __init__(self, aggregator, host="127.0.0.1", port=0):
+        import http.server  # pylint: disable=import-outside-toplevel
+
+        self.aggregator = aggregator
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            """Handler of metrics requests"""
+
+            def do_GET(self):  # pylint: disable=invalid-name
+                """Serve the aggregator's totals"""
+                if self.path == "/metrics":
+                    body, content_type = aggregator.to_prometheus().encode("utf-8"), "text/plain; version=0.0.4"
+                elif self.path == "/metrics.json":
+                    body, content_type = json.dumps(aggregator.summary()).encode("utf-8"), "application/json"
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+                pass
+
+        self.server = http.server.ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        """The URL of the Prometheus metrics"""
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/metrics"
+
+    def start(self):
+        """Start serving, in a background thread"""
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop serving, and close the server's socket"""
+        if self._thread is not None:
+            self.server.shutdown()
+            self._thread.join()
+            self._thread = None
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
@@ -0,0 +1,392 @@
+"""
+Interpolation.py
+
+Multilinear interpolation of the curve arrays of operating modes, either onto a new regular grid (re-gridding) or at
+arbitrary points.
+
+Re-gridding is separable: interpolating an N-D array onto a new grid is done one axis at a time, each step being a
+pair of `take`s and a weighted sum along that axis. The indices and weights for each axis depend only on the source and
+target coordinates, so are computed once and cached, then reused for every array (and every mode, in every document)
+which shares those coordinates. Re-gridded modes are schema-valid, with axes in the order given by the target grid.
+
+Axes whose values are buckets ({min, max} ranges) can't be interpolated, so buckets in the target grid are selected
+exactly from the source. Interpolating at arbitrary points selects the bucket containing each point along bucketed axes
+(see `buckets.py`), while interpolating along the others, and checks any validity range parameters of the mode.
+
+Example:
+
+    from power_curve_schema.interpolation import ModeInterpolant, regrid_documents
+
+    target = [
+        {"label": "air-density", "values": [1.15, 1.2, 1.225, 1.25]},
+        {"label": "wind-speed", "values": [3.0, 4.0, 5.0, ..., 25.0]},
+    ]
+    regridded = regrid_documents(documents, target)
+
+    power = ModeInterpolant(mode)({"air-density": 1.2, "wind-speed": speeds})
+"""
+
+import functools
+import itertools
+
+import numpy as np
+
+from .arrays import BUCKET_DTYPE, CURVE_FIELDS, DERIVED_FIELDS, axis_coordinates, axis_parameters, to_ndarray, to_nested
+from .buckets import bucket_axis, outside_validity_ranges, validity_ranges
+from .instrumentation import span
+
+OUT_OF_BOUNDS = ("raise", "clip")
+
+
+def _check_out_of_bounds(out_of_bounds):
+    if out_of_bounds not in OUT_OF_BOUNDS:
+        raise ValueError(f"Unknown out_of_bounds option '{out_of_bounds}', must be one of {OUT_OF_BOUNDS}")
+
+
+def interval_weights(source, target, out_of_bounds="raise", label="axis"):
+    """Find the indices of the points either side of each target value in a source axis, and the weight of the upper.
+
+    Args:
+        source: The (not necessarily sorted) coordinates of the source axis
+        target: Array of values to interpolate at
+        out_of_bounds: "raise" to raise a ValueError for targets outside the source, or "clip" to use the end values
+        label: The label of the axis (for error messages)
+
+    Returns:
+        Arrays of lower indices, upper indices (both into the unsorted source) and weights, each the shape of `target`
+    """
+    order = np.argsort(source, kind="stable")
+    ordered = source[order]
+    if ordered.size > 1 and np.any(np.diff(ordered) == 0):
+        raise ValueError(f"The values of axis '{label}' are not unique")
+
+    outside = (target < ordered[0]) | (target > ordered[-1])
+    if out_of_bounds == "raise" and np.any(outside):
+        raise ValueError(
+            f"Cannot interpolate axis '{label}' at {target[outside].ravel()[:5].tolist()}, which are outside the "
+            f"range [{ordered[0]}, {ordered[-1]}] (use out_of_bounds='clip' to extend the end values)"
+        )
+
+    if ordered.size == 1:
+        lower = np.zeros(target.shape, dtype=np.intp)
+        return order[lower], order[lower], np.zeros(target.shape)
+
+    lower = np.clip(np.searchsorted(ordered, target, side="right") - 1, 0, ordered.size - 2)
+    weight = np.clip((target - ordered[lower]) / (ordered[lower + 1] - ordered[lower]), 0.0, 1.0)
+    return order[lower], order[lower + 1], weight
+
+
+def point_weights(coordinates, values, out_of_bounds="raise", label="axis"):
+    """Find indices and weights along an axis for an array of values, selecting buckets if the axis is bucketed.
+
+    Args:
+        coordinates: The coordinates of the axis, from `arrays.axis_coordinates`
+        values: Array of values to interpolate (or select buckets) at
+        out_of_bounds: "raise" to raise a ValueError for values outside the axis, or "clip" to use the end values (or
+            the nearest bucket)
+        label: The label of the axis (for error messages)
+
+    Returns:
+        Arrays of lower indices, upper indices and weights, as `interval_weights`, except that for a bucketed axis the
+        upper indices are the lower and the weights are None
+    """
+    if coordinates.dtype == BUCKET_DTYPE:
+        indices = bucket_axis(coordinates, label).select(values, out_of_bounds)
+        return indices, indices, None
+    return interval_weights(coordinates, values, out_of_bounds, label)
+
+
+def cell_corners(weights):
+    """Iterate over the corners of the cells given by `point_weights` for each axis, as (indices, weight factor)"""
+    choices = [(0,) if weight is None else (0, 1) for _, _, weight in weights]
+    for corner in itertools.product(*choices):
+        index = []
+        factor = 1.0
+        for upper, (lower_indices, upper_indices, weight) in zip(corner, weights):
+            index.append(upper_indices if upper else lower_indices)
+            if weight is not None:
+                factor = factor * (weight if upper else 1.0 - weight)
+        yield tuple(index), factor
+
+
+def _bucket_indices(source, target, label):
+    """Find the index of each target bucket in a source bucketed axis, which must contain all of them exactly"""
+    order = np.argsort(source, kind="stable")
+    positions = np.clip(np.searchsorted(source[order], target), 0, source.size - 1)
+    missing = source[order][positions] != target
+    if np.any(missing):
+        raise ValueError(f"Buckets {target[missing].tolist()} of axis '{label}' are not in the source")
+    return order[positions]
+
+
+@functools.lru_cache(maxsize=1024)
+def _cached_axis_weights(source, target, bucketed, out_of_bounds, label):
+    if bucketed:
+        indices = _bucket_indices(
+            np.array(list(source), dtype=BUCKET_DTYPE), np.array(list(target), dtype=BUCKET_DTYPE), label
+        )
+        weights = (indices, indices, None)
+    else:
+        weights = interval_weights(np.array(source), np.array(target), out_of_bounds, label)
+        # Where every target is a source point, interpolation along the axis is just a selection
+        if not np.any(weights[2]):
+            weights = (weights[0], weights[0], None)
+    for array in weights:
+        if array is not None:
+            array.setflags(write=False)
+    return weights
+
+
+def axis_weights(source, target, out_of_bounds="raise", label="axis"):
+    """Get (cached) interpolation indices and weights to resample one axis onto new coordinates.
+
+    Args:
+        source: The `values` of the source axis parameter (numbers, or {min, max} buckets)
+        target: The `values` of the target axis parameter, of the same kind as the source
+        out_of_bounds: "raise" (the default) to raise a ValueError if any target is outside the range of the source,
+            or "clip" to hold the end values of the source constant outside its range
+        label: The label of the axis, used in error messages
+
+    Returns:
+        Read-only arrays of lower indices, upper indices and weights of the upper index (or None if all the targets are
+        source points, so interpolation reduces to taking the lower indices). These are shared between callers.
+    """
+    _check_out_of_bounds(out_of_bounds)
+    source, target = axis_coordinates(source), axis_coordinates(target)
+    bucketed = source.dtype == BUCKET_DTYPE
+    if (target.dtype == BUCKET_DTYPE) != bucketed:
+        raise ValueError(f"Axis '{label}' can't be resampled between bin centers and buckets")
+    return _cached_axis_weights(tuple(source.tolist()), tuple(target.tolist()), bucketed, out_of_bounds, label)
+
+
+def _apply_weights(array, axis, weights):
+    lower, upper, weight = weights
+    if weight is None:
+        return np.take(array, lower, axis=axis)
+    shape = [1] * array.ndim
+    shape[axis] = weight.size
+    weight = weight.reshape(shape)
+    return np.take(array, lower, axis=axis) * (1.0 - weight) + np.take(array, upper, axis=axis) * weight
+
+
+def _target_axes(target):
+    """Get target grid axes as (label, values) in axis order, from a list of axis parameters"""
+    if all("axis" in parameter for parameter in target):
+        target = sorted(target, key=lambda parameter: parameter["axis"])
+    labels = [parameter["label"] for parameter in target]
+    if len(set(labels)) != len(labels):
+        raise ValueError(f"The target grid has repeated axes: {labels}")
+    return [(parameter["label"], parameter["values"]) for parameter in target]
+
+
+def regrid_mode(mode, target, out_of_bounds="raise"):
+    """Resample the curve arrays of an operating mode onto a target grid.
+
+    Args:
+        mode: An operating mode dict, as in a power curve document
+        target: The target grid, as a list of axis parameters ({label, values}, and optionally axis), whose order (or
+            axis numbers, if given) sets the order of axes in the output
+        out_of_bounds: "raise" or "clip", as for `axis_weights`
+
+    Returns:
+        A new operating mode dict, with axis parameters replaced by those of the target grid and resampled arrays
+
+    Raises:
+        ValueError: If the mode's axes aren't the same as the target's, or the target extends beyond the mode's range
+            (for out_of_bounds="raise")
+    """
+    source_axes = axis_parameters(mode)
+    source_labels = [parameter["label"] for parameter in source_axes]
+    target_axes = _target_axes(target)
+    target_labels = [label for label, _ in target_axes]
+    if set(source_labels) != set(target_labels):
+        raise ValueError(
+            f"Operating mode '{mode.get('label')}' has axes {source_labels}, which can't be re-gridded onto axes "
+            f"{target_labels}"
+        )
+
+    transpose = [source_labels.index(label) for label in target_labels]
+    steps = [
+        axis_weights(source_axes[source_axis]["values"], values, out_of_bounds=out_of_bounds, label=label)
+        for source_axis, (label, values) in zip(transpose, target_axes)
+    ]
+
+    regridded = {key: value for key, value in mode.items() if key not in CURVE_FIELDS}
+    regridded["parameters"] = [parameter for parameter in mode["parameters"] if "axis" not in parameter] + [
+        {"label": label, "axis": axis, "values": list(values)} for axis, (label, values) in enumerate(target_axes)
+    ]
+    for field in CURVE_FIELDS:
+        if field not in mode:
+            continue
+        array = to_ndarray(mode[field]).transpose(transpose)
+        for axis, weights in enumerate(steps):
+            array = _apply_weights(array, axis, weights)
+        regridded[field] = to_nested(array)
+    return regridded
+
+
+def regrid_document(doc, target, out_of_bounds="raise", labels=None):
+    """Resample operating modes of a document onto a target grid, as `regrid_mode`.
+
+    Args:
+        doc: A power curve document dict, which is not modified
+        target: The target grid, as for `regrid_mode`
+        out_of_bounds: "raise" or "clip", as for `axis_weights`
+        labels: Labels of the operating modes to re-grid, defaulting to all of them (others are left unchanged)
+
+    Returns:
+        A new document with re-gridded modes
+    """
+    modes = []
+    for mode in doc["power_curves"]["operating_modes"]:
+        if labels is None or mode["label"] in labels:
+            mode = regrid_mode(mode, target, out_of_bounds=out_of_bounds)
+        modes.append(mode)
+    return {**doc, "power_curves": {**doc["power_curves"], "operating_modes": modes}}
+
+
+def regrid_documents(docs, target, out_of_bounds="raise"):
+    """Resample all operating modes of many documents onto a common target grid, as `regrid_document`.
+
+    Interpolation weights are computed once for each distinct source axis and reused for all arrays sharing it.
+    """
+    return [regrid_document(doc, target, out_of_bounds=out_of_bounds) for doc in docs]
+
+
+class ModeInterpolant:
+    """Multilinear interpolation of the curve arrays of an operating mode at arbitrary points.
+
+    Along bucketed axes, the bucket containing each point is selected rather than interpolated. Validity range
+    parameters of the mode are checked for points which give their values.
+
+    Args:
+        mode: An operating mode dict, as in a power curve document
+        out_of_bounds: "raise" or "clip", as for `axis_weights`. For "clip", points in no bucket of a bucketed axis use
+            the nearest bucket, and validity ranges aren't checked.
+        derived: An optional function of a field name giving the arrays of `DERIVED_FIELDS`, so that those can be
+            interpolated in the same way as curve arrays (see `derived.DerivedQuantities.interpolant`)
+    """
+
+    __slots__ = ("label", "labels", "_coordinates", "_ranges", "_mode", "_arrays", "_derived", "out_of_bounds")
+
+    def __init__(self, mode, out_of_bounds="raise", derived=None):
+        _check_out_of_bounds(out_of_bounds)
+        axes = axis_parameters(mode)
+        self.label = mode.get("label")
+        self.labels = tuple(parameter["label"] for parameter in axes)
+        self.out_of_bounds = out_of_bounds
+        self._coordinates = [axis_coordinates(parameter["values"]) for parameter in axes]
+        for coordinates, label in zip(self._coordinates, self.labels):
+            if coordinates.dtype == BUCKET_DTYPE:
+                bucket_axis(coordinates, label)
+        self._ranges = validity_ranges(mode)
+        self._mode = mode
+        self._arrays = {}
+        self._derived = derived
+
+    @property
+    def coordinates(self):
+        """The coordinates of each axis, in axis order (arrays of `BUCKET_DTYPE` for bucketed axes)"""
+        return tuple(self._coordinates)
+
+    @property
+    def bucketed(self):
+        """The labels of the bucketed axes"""
+        return tuple(
+            label for label, coordinates in zip(self.labels, self._coordinates) if coordinates.dtype == BUCKET_DTYPE
+        )
+
+    def array(self, field):
+        """Get a curve (or derived) array of the mode as a numpy array (converted once, on first use)"""
+        try:
+            return self._arrays[field]
+        except KeyError:
+            pass
+        if field in DERIVED_FIELDS:
+            if self._derived is None:
+                raise ValueError(f"Derived field '{field}' needs an interpolant from `derived.DerivedQuantities`")
+            array = self._arrays[field] = self._derived(field)
+            return array
+        if field not in CURVE_FIELDS:
+            raise ValueError(f"Unknown curve field '{field}', must be one of {CURVE_FIELDS + DERIVED_FIELDS}")
+        if field not in self._mode:
+            raise KeyError(f"Operating mode '{self.label}' has no {field} array")
+        array = self._arrays[field] = to_ndarray(self._mode[field])
+        return array
+
+    def weights(self, points):
+        """Get the interpolation indices and weights along each axis for a set of points.
+
+        Args:
+            points: A dict mapping the label of every axis parameter to values (numbers or arrays, which are broadcast
+                together). Entries for validity range parameters are checked (for out_of_bounds="raise"), and entries
+                for other labels are ignored.
+
+        Returns:
+            The broadcast shape of the points, and a list of (lower indices, upper indices, weights) for each axis, as
+            `point_weights`
+        """
+        try:
+            values = np.broadcast_arrays(*(np.asarray(points[label], dtype=np.float64) for label in self.labels))
+        except KeyError as e:
+            raise KeyError(f"Operating mode '{self.label}' needs a value for parameter {e}") from None
+        if self.out_of_bounds == "raise" and np.any(outside_validity_ranges(self._ranges, points)):
+            raise ValueError(
+                f"Points are outside the validity ranges {self._ranges} of operating mode '{self.label}' (use "
+                "out_of_bounds='clip' to interpolate regardless)"
+            )
+        shape = values[0].shape if values else ()
+        return shape, [
+            point_weights(coordinates, value, self.out_of_bounds, label)
+            for coordinates, value, label in zip(self._coordinates, values, self.labels)
+        ]
+
+    def outside(self, points):
+        """Check which points are outside the mode's grid, buckets or validity ranges.
+
+        Args:
+            points: A dict mapping labels to values, as for `weights` (validity ranges whose labels aren't in the points
+                aren't checked)
+
+        Returns:
+            A boolean array of the broadcast shape of the points, True where a point is outside the range of an
+            interpolated axis, in no bucket of a bucketed axis, or outside a validity range (or NaN)
+        """
+        try:
+            values = [np.asarray(points[label], dtype=np.float64) for label in self.labels]
+        except KeyError as e:
+            raise KeyError(f"Operating mode '{self.label}' needs a value for parameter {e}") from None
+        outside = outside_validity_ranges(self._ranges, points)
+        for coordinates, value, label in zip(self._coordinates, values, self.labels):
+            if coordinates.dtype == BUCKET_DTYPE:
+                outside = outside | bucket_axis(coordinates, label).locate(value)[1]
+            else:
+                outside = outside | ~((value >= coordinates.min()) & (value <= coordinates.max()))
+        return np.broadcast_to(outside, np.broadcast_shapes(outside.shape, *(value.shape for value in values)))
+
+    def __call__(self, points, field="power", out=None):
+        """Interpolate a curve array at the given points.
+
+        Args:
+            points: A dict mapping the label of every axis parameter to values, as for `weights`
+            field: The curve array to interpolate, one of `CURVE_FIELDS` (or `DERIVED_FIELDS`, if given `derived`)
+            out: An optional float64 array of the broadcast shape of the points, into which to write the result
+
+        Returns:
+            The interpolated values, as an array of the broadcast shape of the points (or `out`, if given)
+        """
+        with span("interpolation.evaluate", mode=self.label, field=field) as active:
+            array = self.array(field)
+            shape, weights = self.weights(points)
+            if out is None:
+                out = np.zeros(shape)
+            else:
+                out[...] = 0.0
+
+            # Sum the contributions of the 2^N corners of the cell containing each point (N being the number of
+            # interpolated axes, bucketed axes having just the selected bucket)
+            for index, factor in cell_corners(weights):
+                out += array[index] * factor
+            if active:
+                active.set(points=out.size)
+        return out
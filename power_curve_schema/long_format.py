@@ -0,0 +1,287 @@
+"""
+Long_format.py
+
+Flatten the curves of a library of power curve documents into one long-format table, with a row per cell of every
+operating mode's arrays, for SQL and dataframe engines.
+
+Every table has the same columns, whichever parameters its documents use:
+
+- `document_id`: the document's `Identifier` metadata value (or otherwise its path, or position in the sources)
+- `mode`: the operating mode label
+- for each parameter label in the schema (with hyphens replaced by underscores, eg `air_density`), three columns:
+  the parameter's value (a value parameter, or the bin center of a numeric axis), and its `_min` and `_max` (a
+  validity range parameter, or the bucket of a bucketed axis). These are NaN where a mode doesn't have the parameter.
+- `power`, `thrust_coefficient` and `rotor_rpm`, NaN where a mode doesn't have the curve
+
+The columns are given by `columns()`.
+
+Rows are produced in record batches (dicts of equal length numpy arrays, by column) of bounded size, reading one
+document at a time and generating the coordinates of only the cells in each batch, so memory use doesn't grow with the
+size of the library. The curve arrays of a chunked store are read a batch at a time (so only the chunks intersecting
+each batch are read), while a JSON document is loaded whole, with its curve arrays parsed straight into numpy arrays, so
+memory use does grow with the size of the largest JSON document.
+
+Writing Parquet requires the optional dependency `pyarrow`. `export_parquet` writes a directory of part files (each
+covering a contiguous run of the sources), using a process per CPU by default:
+
+    from power_curve_schema.long_format import export_parquet
+
+    export_parquet(sorted(glob.glob("library/*.json")), "library-curves", documents_per_part=500)
+
+The part files form a single dataset, eg `duckdb.sql("SELECT * FROM 'library-curves/*.parquet'")`.
+"""
+
+import concurrent.futures
+import functools
+import os
+
+import numpy as np
+
+from .arrays import CURVE_FIELDS, axis_coordinates, axis_parameters, mode_shape, to_ndarray
+from .chunked import ChunkedArray, ChunkedStore
+from .encoding import decode_array, is_encoded
+from .schemas import load_schema
+from .serialization import load
+from .sources import document_identifier
+
+# The maximum number of rows in a record batch (and so in a Parquet row group)
+BATCH_ROWS = 1 << 16
+
+
+def _column(label, suffix=""):
+    return label.replace("-", "_") + suffix
+
+
+@functools.lru_cache(maxsize=None)
+def parameter_labels():
+    """Get the parameter labels allowed by the schema (read from the schema once, on first use)"""
+    return tuple(load_schema()["$defs"]["parameter_label"]["enum"])
+
+
+@functools.lru_cache(maxsize=None)
+def columns():
+    """Get the columns of long-format tables, in order"""
+    return (
+        ("document_id", "mode")
+        + tuple(_column(label, suffix) for label in parameter_labels() for suffix in ("", "_min", "_max"))
+        + CURVE_FIELDS
+    )
+
+
+_STRING_COLUMNS = ("document_id", "mode")
+
+
+def _open_store(path):
+    """Get the document of a chunked store, with its curve arrays as (unread) ChunkedArrays"""
+    store = ChunkedStore(path)
+    modes = [
+        {**mode, **{field: store.array(mode["label"], field) for field in store.fields(mode["label"])}}
+        for mode in store.document["power_curves"]["operating_modes"]
+    ]
+    return {**store.document, "power_curves": {**store.document["power_curves"], "operating_modes": modes}}
+
+
+def _iter_documents(sources, first_position=0):
+    """Load each source in turn, as (document id, document)"""
+    for position, source in enumerate(sources, start=first_position):
+        if isinstance(source, dict):
+            doc, default_id = source, str(position)
+        elif os.path.isdir(source):
+            doc, default_id = _open_store(source), os.fspath(source)
+        else:
+            with open(source, "rb") as fp:
+                doc, default_id = load(fp, arrays=True), os.fspath(source)
+        yield document_identifier(doc) or default_id, doc
+
+
+def _field_array(mode, field):
+    """Get a curve array of a mode as a numpy array, or a ChunkedArray to be read a batch at a time"""
+    value = mode[field]
+    if is_encoded(value):
+        return decode_array(value)
+    if isinstance(value, ChunkedArray):
+        return value
+    return to_ndarray(value)
+
+
+def iter_mode_batches(document_id, mode, batch_rows=BATCH_ROWS):
+    """Flatten the curve arrays of an operating mode into long-format record batches.
+
+    Args:
+        document_id: The value of the `document_id` column
+        mode: The operating mode dict, whose curve arrays may be nested lists, numpy arrays, encoded arrays, or
+            ChunkedArrays (which are read a batch at a time)
+        batch_rows: The maximum number of rows in each batch
+
+    Yields:
+        Dicts of 1-D numpy arrays by column (as `columns()`), of at most `batch_rows` rows
+    """
+    shape = mode_shape(mode)
+    size = int(np.prod(shape))
+    fields = {}
+    for field in CURVE_FIELDS:
+        if field in mode:
+            array = _field_array(mode, field)
+            if tuple(array.shape) != shape:
+                raise ValueError(
+                    f"The {field} array of operating mode '{mode['label']}' has shape {array.shape}, but its axes have "
+                    f"shape {shape}"
+                )
+            fields[field] = array if isinstance(array, ChunkedArray) else array.reshape(-1)
+
+    constants = {}
+    for parameter in mode["parameters"]:
+        if "value" in parameter:
+            constants[_column(parameter["label"])] = parameter["value"]
+        elif "axis" not in parameter:
+            constants[_column(parameter["label"], "_min")] = parameter.get("min", np.nan)
+            constants[_column(parameter["label"], "_max")] = parameter.get("max", np.nan)
+
+    # The coordinate columns of each axis, gathered for the cells of each batch
+    axes = []
+    for parameter in axis_parameters(mode):
+        coordinates = axis_coordinates(parameter["values"])
+        if coordinates.dtype.names is None:
+            axes.append({_column(parameter["label"]): coordinates})
+        else:
+            axes.append(
+                {
+                    _column(parameter["label"], "_min"): coordinates["min"],
+                    _column(parameter["label"], "_max"): coordinates["max"],
+                }
+            )
+
+    for start in range(0, size, batch_rows):
+        stop = min(start + batch_rows, size)
+        rows = stop - start
+        batch = {column: np.full(rows, np.nan) for column in columns()}
+        batch["document_id"] = np.full(rows, document_id, dtype=object)
+        batch["mode"] = np.full(rows, mode["label"], dtype=object)
+        for column, value in constants.items():
+            batch[column][:] = value
+        for indices, axis_columns in zip(np.unravel_index(np.arange(start, stop), shape), axes):
+            for column, coordinates in axis_columns.items():
+                np.take(coordinates, indices, out=batch[column])
+        for field, values in fields.items():
+            batch[field] = values.read_cells(start, stop) if isinstance(values, ChunkedArray) else values[start:stop]
+        yield batch
+
+
+def iter_record_batches(sources, batch_rows=BATCH_ROWS):
+    """Flatten the curves of a sequence of documents into long-format record batches.
+
+    Rows of consecutive small modes are gathered into the same batch, so that batches are close to `batch_rows` long.
+
+    Args:
+        sources: An iterable of documents (dicts), paths to JSON documents or paths to chunked stores, loaded one at a
+            time
+        batch_rows: The maximum number of rows in each batch
+
+    Yields:
+        Dicts of 1-D numpy arrays by column (as `columns()`), of at most `batch_rows` rows
+    """
+    return _iter_record_batches(sources, batch_rows)
+
+
+def _iter_record_batches(sources, batch_rows, first_position=0):
+    pending, pending_rows = [], 0
+    for document_id, doc in _iter_documents(sources, first_position):
+        for mode in doc["power_curves"]["operating_modes"]:
+            for batch in iter_mode_batches(document_id, mode, batch_rows):
+                rows = len(batch["mode"])
+                if pending_rows + rows > batch_rows:
+                    yield _concatenate(pending)
+                    pending, pending_rows = [], 0
+                pending.append(batch)
+                pending_rows += rows
+    if pending:
+        yield _concatenate(pending)
+
+
+def _concatenate(batches):
+    if len(batches) == 1:
+        return batches[0]
+    return {column: np.concatenate([batch[column] for batch in batches]) for column in columns()}
+
+
+def _import_pyarrow():
+    try:
+        import pyarrow  # pylint: disable=import-outside-toplevel
+        import pyarrow.parquet  # pylint: disable=import-outside-toplevel
+    except ImportError as e:
+        raise ImportError("Writing Parquet files requires the optional dependency 'pyarrow'") from e
+    return pyarrow
+
+
+def arrow_schema():
+    """Get the pyarrow schema of long-format tables"""
+    pyarrow = _import_pyarrow()
+    return pyarrow.schema(
+        [(column, pyarrow.string() if column in _STRING_COLUMNS else pyarrow.float64()) for column in columns()]
+    )
+
+
+def write_parquet(sources, path, batch_rows=BATCH_ROWS, compression="zstd"):
+    """Write the curves of a sequence of documents to a long-format Parquet file, one record batch at a time.
+
+    Args:
+        sources: An iterable of documents or paths, as for `iter_record_batches`
+        path: The path of the Parquet file to write
+        batch_rows: The maximum number of rows in each record batch (and row group)
+        compression: The Parquet compression codec
+
+    Returns:
+        The number of rows written
+    """
+    return _write_batches(_iter_record_batches(sources, batch_rows), path, compression)
+
+
+def _write_batches(batches, path, compression):
+    pyarrow = _import_pyarrow()
+    schema = arrow_schema()
+    rows = 0
+    with pyarrow.parquet.ParquetWriter(path, schema, compression=compression) as writer:
+        for batch in batches:
+            writer.write_batch(pyarrow.record_batch([batch[column] for column in columns()], schema=schema))
+            rows += len(batch["mode"])
+    return rows
+
+
+def _write_part(path, sources, first_position, batch_rows, compression):
+    """Write one part file of an export, returning (path, number of rows)"""
+    return path, _write_batches(_iter_record_batches(sources, batch_rows, first_position), path, compression)
+
+
+def export_parquet(
+    sources, directory, documents_per_part=1000, processes=None, batch_rows=BATCH_ROWS, compression="zstd"
+):
+    """Write the curves of a library of documents to a directory of long-format Parquet part files.
+
+    Args:
+        sources: A sequence of documents or paths, as for `iter_record_batches` (paths are cheaper to send to worker
+            processes)
+        directory: The directory to write part files (`part-00000.parquet`, ...) to, which is created if needed
+        documents_per_part: The number of sources in each part file
+        processes: The number of worker processes, defaulting to the number of CPUs. If 1, parts are written in this
+            process.
+        batch_rows: The maximum number of rows in each record batch (and row group)
+        compression: The Parquet compression codec
+
+    Returns:
+        A list of (path, number of rows) for each part file written, in order of the sources
+    """
+    _import_pyarrow()
+    os.makedirs(directory, exist_ok=True)
+    sources = list(sources)
+    parts = [
+        (os.path.join(directory, f"part-{i:05d}.parquet"), sources[start : start + documents_per_part], start)
+        for i, start in enumerate(range(0, len(sources), documents_per_part))
+    ]
+    if processes == 1 or len(parts) <= 1:
+        return [_write_part(path, part, start, batch_rows, compression) for path, part, start in parts]
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=processes) as executor:
+        futures = [
+            executor.submit(_write_part, path, part, start, batch_rows, compression) for path, part, start in parts
+        ]
+        return [future.result() for future in futures]
@@ -0,0 +1,424 @@
+"""
+Model.py
+
+A typed, read-only object model for power curve documents.
+
+Classes use `__slots__` to keep per-instance memory small, and attributes cannot be reassigned once loaded. Curve
+arrays (`power`, `thrust_coefficient`, `rotor_rpm` and `sound_power_level`) are held in their source form (nested
+lists from JSON, or an unread entry in a binary store) until first accessed, at which point they are converted to a
+read-only float64 numpy array and the source form is released.
+
+Example:
+
+    doc = PowerCurveDocument.from_json("generic-274-20.json")
+    doc.turbine.rated_power
+    doc.mode("mode_1").power[0, :10]
+
+    doc.to_binary("generic-274-20.npz")
+    with PowerCurveDocument.from_binary("generic-274-20.npz") as doc:
+        doc.mode("mode_1").thrust_coefficient
+"""
+
+import json
+import os
+
+import numpy as np
+
+from .arrays import CURVE_FIELDS, to_ndarray
+from .serialization import load
+
+_DOCUMENT_MEMBER = "document.json"
+
+
+def _as_readonly_array(values):
+    array = to_ndarray(values)
+    array.setflags(write=False)
+    return array
+
+
+def _to_json_value(value):
+    """Convert model objects and arrays (recursively) back to plain JSON-compatible values"""
+    if isinstance(value, _Record):
+        return value.to_dict()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, (list, tuple)):
+        return [_to_json_value(item) for item in value]
+    return value
+
+
+class _Record:
+    """Base for read-only slotted records, constructed from the corresponding dict in a document"""
+
+    __slots__ = ()
+
+    # The document properties held by the record, in document order
+    _fields = ()
+
+    def __init__(self, **kwargs):
+        for name in self._fields:
+            object.__setattr__(self, name, kwargs.get(name))
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} objects are read-only")
+
+    def __delattr__(self, name):
+        raise AttributeError(f"{type(self).__name__} objects are read-only")
+
+    def __repr__(self):
+        label = getattr(self, "label", None)
+        return f"<{type(self).__name__} {label}>" if label is not None else f"<{type(self).__name__}>"
+
+    @classmethod
+    def from_dict(cls, data):
+        """Construct the record from the corresponding dict in a power curve document"""
+        return cls(**{name: data[name] for name in cls._fields if name in data})
+
+    def to_dict(self):
+        """Convert the record back to a plain dict, as found in a power curve document"""
+        data = {}
+        for name in self._fields:
+            value = getattr(self, name)
+            if value is not None:
+                data[name] = _to_json_value(value)
+        return data
+
+
+class _LazyArrays:
+    """Mixin for records holding curve arrays which are converted to numpy only when first accessed"""
+
+    __slots__ = ()
+
+    def _array(self, field):
+        value = self._arrays.get(field)
+        if value is None or isinstance(value, np.ndarray):
+            return value
+        array = _as_readonly_array(value() if callable(value) else value)
+        self._arrays[field] = array
+        return array
+
+    def _arrays_to_dict(self, data):
+        for field in self._arrays:
+            data[field] = self._array(field).tolist()
+        return data
+
+
+class Turbine(_Record):
+    """Information about the physical turbine hardware, common to all operating modes"""
+
+    _fields = (
+        "manufacturer_name",
+        "manufacturer_display_name",
+        "model_name",
+        "model_description",
+        "platform_name",
+        "platform_description",
+        "rotor_diameter",
+        "rotor_tilt",
+        "number_of_blades",
+        "drive_type",
+        "regulation_type",
+        "power_reference_location",
+        "rated_power",
+        "thermal_regulation",
+        "cut_in_rpm",
+        "rated_rpm",
+        "available_hub_heights",
+        "grid_frequencies",
+    )
+    __slots__ = _fields
+
+
+class DesignBasis(_Record):
+    """A design basis, describing environmental conditions for which the power curves are intended"""
+
+    _fields = (
+        "label",
+        "name",
+        "certification",
+        "design_class",
+        "design_lifetime",
+        "turbulence",
+        "standard_climate",
+        "cold_climate",
+        "hot_climate",
+    )
+    __slots__ = _fields
+
+
+class Cut(_Record):
+    """A cut-in or cut-out condition of an operating mode"""
+
+    _fields = ("cut_type", "wind_speed", "period")
+    __slots__ = _fields
+
+
+class Parameter(_Record):
+    """An independent parameter of an operating mode, given as a single value, a validity range or an array axis"""
+
+    _fields = ("label", "axis", "values", "value", "min", "max")
+    __slots__ = _fields
+
+    @classmethod
+    def from_dict(cls, data):
+        values = data.get("values")
+        if values is not None:
+            # Bin centers are held as an array, whereas buckets ({min, max} ranges) are kept as given
+            if all(isinstance(value, (int, float)) for value in values):
+                values = _as_readonly_array(values)
+            else:
+                values = tuple(values)
+        return cls(**{**data, "values": values})
+
+    @property
+    def is_axis(self):
+        """True if the parameter defines an axis of the mode's curve arrays"""
+        return self.axis is not None
+
+    @property
+    def is_range(self):
+        """True if the parameter is a validity range"""
+        return self.min is not None or self.max is not None
+
+
+class AcousticEmissions(_LazyArrays, _Record):
+    """The noise emitted by the turbine in an operating mode"""
+
+    _fields = ("margin", "weighting", "wind_speed", "frequency")
+    __slots__ = _fields + ("_arrays",)
+
+    def __init__(self, sound_power_level=None, **kwargs):
+        super().__init__(**kwargs)
+        object.__setattr__(
+            self, "_arrays", {} if sound_power_level is None else {"sound_power_level": sound_power_level}
+        )
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(
+            sound_power_level=data.get("sound_power_level"),
+            **{name: data[name] for name in cls._fields if name in data},
+        )
+
+    @property
+    def sound_power_level(self):
+        """Sound power level [dB] as a read-only array, loaded on first access"""
+        return self._array("sound_power_level")
+
+    def to_dict(self):
+        return self._arrays_to_dict(super().to_dict())
+
+
+class OperatingMode(_LazyArrays, _Record):
+    """An operating mode of the turbine, with its power, thrust and rpm curves"""
+
+    _fields = (
+        "label",
+        "name",
+        "description",
+        "design_bases",
+        "cuts",
+        "parameters",
+        "overrides",
+        "restricted_to_hub_heights",
+        "wind_speed_reference",
+        "acoustic_emissions",
+    )
+    __slots__ = _fields + ("_arrays",)
+
+    def __init__(self, arrays=None, **kwargs):
+        super().__init__(**kwargs)
+        object.__setattr__(
+            self, "_arrays", {field: value for field, value in (arrays or {}).items() if value is not None}
+        )
+
+    @classmethod
+    def from_dict(cls, data, arrays=None):
+        """Construct the mode from its dict in a power curve document.
+
+        Args:
+            data: The operating mode dict
+            arrays: Optional dict mapping curve field names to callables which load the array (eg from a binary store),
+                used in place of any values in `data`
+        """
+        arrays = {**{field: data.get(field) for field in CURVE_FIELDS}, **(arrays or {})}
+        kwargs = {name: data[name] for name in cls._fields if name in data}
+        kwargs["cuts"] = tuple(Cut.from_dict(cut) for cut in data.get("cuts", ()))
+        kwargs["parameters"] = tuple(Parameter.from_dict(parameter) for parameter in data.get("parameters", ()))
+        if "design_bases" in data:
+            kwargs["design_bases"] = tuple(data["design_bases"])
+        if "acoustic_emissions" in data:
+            kwargs["acoustic_emissions"] = AcousticEmissions.from_dict(data["acoustic_emissions"])
+        return cls(arrays=arrays, **kwargs)
+
+    @property
+    def power(self):
+        """Electrical power [W] as a read-only N-D array, loaded on first access"""
+        return self._array("power")
+
+    @property
+    def thrust_coefficient(self):
+        """Thrust coefficient [-] as a read-only N-D array, loaded on first access"""
+        return self._array("thrust_coefficient")
+
+    @property
+    def rotor_rpm(self):
+        """Rotor speed [RPM] as a read-only N-D array (or None if not given), loaded on first access"""
+        return self._array("rotor_rpm")
+
+    @property
+    def axis_parameters(self):
+        """The parameters defining axes of the curve arrays, ordered by axis"""
+        return tuple(sorted((p for p in self.parameters if p.is_axis), key=lambda p: p.axis))
+
+    def parameter(self, label):
+        """Get a parameter of this mode by label, raising KeyError if not present"""
+        for parameter in self.parameters:
+            if parameter.label == label:
+                return parameter
+        raise KeyError(f"Mode '{self.label}' has no parameter '{label}'")
+
+    def to_dict(self):
+        return self._arrays_to_dict(super().to_dict())
+
+
+class PowerCurveDocument(_Record):
+    """A complete power curve document"""
+
+    _fields = ("document", "turbine", "design_bases", "default_operating_mode_label", "operating_modes", "additional")
+    __slots__ = _fields + ("_modes_by_label", "_store")
+
+    def __init__(self, store=None, **kwargs):
+        super().__init__(**kwargs)
+        modes = self.operating_modes or ()
+        object.__setattr__(self, "_modes_by_label", {mode.label: mode for mode in modes})
+        object.__setattr__(self, "_store", store)
+
+    @classmethod
+    def from_dict(cls, data, arrays=None, store=None):
+        """Construct the model from a document dict.
+
+        Args:
+            data: The power curve document
+            arrays: Optional list (one entry per operating mode) of dicts of array loaders, as `OperatingMode.from_dict`
+            store: An optional open store object to keep alive (and close) along with the model
+
+        Returns:
+            The document model
+        """
+        power_curves = data.get("power_curves", {})
+        modes = power_curves.get("operating_modes", [])
+        arrays = arrays or [None] * len(modes)
+        return cls(
+            document=data.get("document"),
+            turbine=Turbine.from_dict(data["turbine"]) if "turbine" in data else None,
+            design_bases=tuple(DesignBasis.from_dict(basis) for basis in data.get("design_bases", ())),
+            default_operating_mode_label=power_curves.get("default_operating_mode_label"),
+            operating_modes=tuple(
+                OperatingMode.from_dict(mode, mode_arrays) for mode, mode_arrays in zip(modes, arrays)
+            ),
+            additional=data.get("additional"),
+            store=store,
+        )
+
+    @classmethod
+    def from_json(cls, source):
+        """Load the model from a JSON file path or an open file object"""
+        if isinstance(source, (str, os.PathLike)):
+            with open(source, "r", encoding="utf-8") as fp:
+                return cls.from_dict(load(fp))
+        return cls.from_dict(load(source))
+
+    @classmethod
+    def from_binary(cls, path):
+        """Load the model from a binary store written by `to_binary`.
+
+        Only the (small) non-array content is read here; each curve array is read from the store when first accessed,
+        so the store is held open until `close()` is called (or the model is used as a context manager).
+        """
+        store = np.load(path, allow_pickle=False)
+        data = json.loads(store[_DOCUMENT_MEMBER].tobytes().decode("utf-8"))
+        arrays = []
+        for i, mode in enumerate(data["power_curves"]["operating_modes"]):
+            arrays.append({field: _StoreEntry(store, f"operating_modes/{i}/{field}") for field in mode.pop("_arrays")})
+        return cls.from_dict(data, arrays=arrays, store=store)
+
+    def to_binary(self, path, compress=False):
+        """Write the document to a binary store (a numpy .npz archive), which can be loaded with `from_binary`.
+
+        Args:
+            path: The path of the file to write
+            compress: If True, compress the arrays in the store (smaller, but slower to read)
+        """
+        data = self.to_dict(arrays=False)
+        members = {}
+        for i, (mode, mode_dict) in enumerate(zip(self.operating_modes, data["power_curves"]["operating_modes"])):
+            mode_dict["_arrays"] = list(mode._arrays)  # pylint: disable=protected-access
+            for field in mode._arrays:  # pylint: disable=protected-access
+                members[f"operating_modes/{i}/{field}"] = getattr(mode, field)
+        members[_DOCUMENT_MEMBER] = np.frombuffer(json.dumps(data).encode("utf-8"), dtype=np.uint8)
+        (np.savez_compressed if compress else np.savez)(path, **members)
+
+    def mode(self, label):
+        """Get an operating mode by label, raising KeyError if not present"""
+        try:
+            return self._modes_by_label[label]
+        except KeyError:
+            raise KeyError(f"Document has no operating mode '{label}'") from None
+
+    @property
+    def identifier(self):
+        """The (first) Identifier value in the document metadata, which should be globally unique"""
+        for item in (self.document or {}).get("metadata", []):
+            if item["term"] == "Identifier":
+                return item["value"]
+        return None
+
+    def to_dict(self, arrays=True):
+        """Convert the model back to a schema-valid document dict.
+
+        Args:
+            arrays: If False, the curve arrays of operating modes are omitted (used when writing binary stores)
+        """
+        data = {}
+        if self.document is not None:
+            data["document"] = self.document
+        if self.turbine is not None:
+            data["turbine"] = self.turbine.to_dict()
+        if self.design_bases:
+            data["design_bases"] = [basis.to_dict() for basis in self.design_bases]
+        power_curves = {}
+        if self.default_operating_mode_label is not None:
+            power_curves["default_operating_mode_label"] = self.default_operating_mode_label
+        if arrays:
+            power_curves["operating_modes"] = [mode.to_dict() for mode in self.operating_modes]
+        else:
+            power_curves["operating_modes"] = [_Record.to_dict(mode) for mode in self.operating_modes]
+        data["power_curves"] = power_curves
+        if self.additional is not None:
+            data["additional"] = self.additional
+        return data
+
+    def close(self):
+        """Close the binary store backing this model (if any). Unread arrays can no longer be accessed."""
+        if self._store is not None:
+            self._store.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class _StoreEntry:
+    """A callable which reads one array from an open binary store"""
+
+    __slots__ = ("store", "key")
+
+    def __init__(self, store, key):
+        self.store = store
+        self.key = key
+
+    def __call__(self):
+        return self.store[self.key]
@@ -0,0 +1,322 @@
+"""
+Monte_carlo.py
+
+Monte Carlo estimation of the uncertainty in the annual energy production (AEP) of each operating mode of a document,
+giving the P50, P90 (etc) yields used in financing studies.
+
+Each sample draws:
+
+- a factor on the scale of the site's Weibull wind speed distribution, with relative standard deviation
+  `wind_speed_uncertainty` (the uncertainty in the long term mean wind speed)
+- values of the mode's other axis parameters (eg `air-density` or `vertical-shear-exponent`) from given distributions
+- a factor on power, with relative standard deviation `power_uncertainty` (the uncertainty in the curve itself)
+
+The AEP of a sample is the power curve integrated over the Weibull distribution, by the midpoint rule over wind speed
+bins: `hours * sum_b power(V_b, parameters) * probability(bin b)`, taking no power outside the mode's wind speed axis.
+
+Samples are evaluated a batch at a time, with no per-sample python. Each mode's power array is interpolated onto the
+wind speed bins once, so a batch only needs interpolating along the mode's other axes: the AEP of every sample is a
+weighted sum over the corners of its cell of the row-wise dot products of (samples, bins) matrices of power and of bin
+probabilities. Each batch is seeded by a child of `SeedSequence(seed)`, so results depend only on the seed, the number
+of samples and the batch size, not on the number of processes used.
+
+Results are aggregated as each batch is completed, into running moments and a fine histogram of each mode's AEP (from
+which quantiles are read to a resolution of 1/65536 of the mode's maximum possible AEP), so memory use doesn't grow
+with the number of samples unless the samples themselves are kept.
+
+Example:
+
+    from power_curve_schema.monte_carlo import simulate_aep
+
+    results = simulate_aep(
+        doc,
+        weibull_scale=9.5,
+        weibull_shape=2.1,
+        parameters={"air-density": ("normal", 1.21, 0.01)},
+        wind_speed_uncertainty=0.05,
+        power_uncertainty=0.03,
+        samples=1_000_000,
+        seed=42,
+        processes=8,
+    )
+    results["mode_1"]["P90"]  # [Wh]
+"""
+
+import concurrent.futures
+
+import numpy as np
+
+from .encoding import decode_document
+from .interpolation import ModeInterpolant, cell_corners, interval_weights, point_weights
+
+# The mean number of hours in a year, including leap years
+HOURS_PER_YEAR = 8766.0
+
+# The centers of the default wind speed bins for integrating over the Weibull distribution [m/s]
+DEFAULT_WIND_SPEEDS = np.arange(0.125, 40.0, 0.25)
+
+# Distributions for parameter values, given as (name, *arguments)
+DISTRIBUTIONS = {
+    "normal": lambda rng, size, mean, standard_deviation: rng.normal(mean, standard_deviation, size),
+    "uniform": lambda rng, size, low, high: rng.uniform(low, high, size),
+    "choice": lambda rng, size, values: rng.choice(np.asarray(values, dtype=np.float64), size),
+}
+
+HISTOGRAM_BINS = 1 << 16
+
+_WIND_SPEED = "wind-speed"
+
+# The simulation in a worker process, set by `_initialize_worker`
+_worker_simulation = None
+
+
+def _check_distribution(label, spec):
+    if isinstance(spec, (int, float)):
+        return
+    if not isinstance(spec, (list, tuple)) or not spec or spec[0] not in DISTRIBUTIONS:
+        raise ValueError(
+            f"Invalid distribution {spec!r} for parameter '{label}', must be a number or a tuple whose first item is "
+            f"one of {list(DISTRIBUTIONS)}"
+        )
+
+
+def _draw(rng, spec, size):
+    if isinstance(spec, (int, float)):
+        return np.full(size, float(spec))
+    return DISTRIBUTIONS[spec[0]](rng, size, *spec[1:])
+
+
+class _Simulation:
+    """Draws and evaluates batches of samples for a set of operating modes"""
+
+    __slots__ = (
+        "labels",
+        "axes",
+        "tables",
+        "weibull_scale",
+        "weibull_shape",
+        "parameters",
+        "wind_speed_uncertainty",
+        "power_uncertainty",
+        "edges",
+        "hours",
+    )
+
+    def __init__(
+        self,
+        modes,
+        weibull_scale,
+        weibull_shape,
+        parameters,
+        wind_speed_uncertainty,
+        power_uncertainty,
+        wind_speeds,
+        hours,
+    ):
+        for label, spec in parameters.items():
+            _check_distribution(label, spec)
+        wind_speeds = np.asarray(wind_speeds, dtype=np.float64)
+
+        # The wind speed bins are the same for every sample, so each mode's power is interpolated onto them once, giving
+        # a table with wind speed as its last axis, which samples then only need interpolating in along other axes
+        self.labels, self.axes, self.tables = [], [], []
+        for mode in modes:
+            interpolant = ModeInterpolant(mode, out_of_bounds="clip")
+            if _WIND_SPEED not in interpolant.labels:
+                raise ValueError(f"Operating mode '{interpolant.label}' has no wind speed axis")
+            if _WIND_SPEED in interpolant.bucketed:
+                raise ValueError(f"Operating mode '{interpolant.label}' has a bucketed wind speed axis")
+            axis = interpolant.labels.index(_WIND_SPEED)
+            coordinates = interpolant.coordinates[axis]
+            lower, upper, weight = interval_weights(coordinates, wind_speeds, out_of_bounds="clip", label=_WIND_SPEED)
+            power = np.moveaxis(interpolant.array("power"), axis, -1)
+            table = power[..., lower] * (1.0 - weight) + power[..., upper] * weight
+            table *= (wind_speeds >= coordinates.min()) & (wind_speeds <= coordinates.max())
+            missing = [label for label in interpolant.labels if label != _WIND_SPEED and label not in parameters]
+            if missing:
+                raise KeyError(f"Operating mode '{interpolant.label}' needs values for parameters {missing}")
+            self.labels.append(interpolant.label)
+            self.axes.append(
+                [
+                    (label, values)
+                    for label, values in zip(interpolant.labels, interpolant.coordinates)
+                    if label != _WIND_SPEED
+                ]
+            )
+            self.tables.append(table)
+
+        # Bin edges are midway between bin centers, with the outer bins extending to zero and infinity
+        self.edges = np.concatenate(([0.0], (wind_speeds[1:] + wind_speeds[:-1]) / 2, [np.inf]))
+        self.weibull_scale = weibull_scale
+        self.weibull_shape = weibull_shape
+        self.parameters = dict(parameters)
+        self.wind_speed_uncertainty = wind_speed_uncertainty
+        self.power_uncertainty = power_uncertainty
+        self.hours = hours
+
+    def __call__(self, seed, size):
+        """Draw a batch of samples, returning an array of AEP [Wh] of shape (modes, samples)"""
+        rng = np.random.default_rng(seed)
+        scale = self.weibull_scale * np.maximum(1.0 + self.wind_speed_uncertainty * rng.standard_normal(size), 1e-6)
+        factor = 1.0 + self.power_uncertainty * rng.standard_normal(size)
+        values = {label: _draw(rng, spec, size) for label, spec in self.parameters.items()}
+
+        cumulative = -np.expm1(-((self.edges[None, :] / scale[:, None]) ** self.weibull_shape))
+        probabilities = np.diff(cumulative, axis=1)
+
+        energies = np.zeros((len(self.tables), size))
+        for i, (axes, table) in enumerate(zip(self.axes, self.tables)):
+            if not axes:
+                np.matmul(probabilities, table, out=energies[i])
+                continue
+
+            # Sum the contributions of the corners of the cell containing each sample, as in `ModeInterpolant`
+            weights = [point_weights(coordinates, values[label], "clip", label) for label, coordinates in axes]
+            for index, corner_factor in cell_corners(weights):
+                energies[i] += corner_factor * np.einsum("sb,sb->s", table[index], probabilities)
+        energies *= factor * self.hours
+        return energies
+
+
+def _initialize_worker(arguments):
+    global _worker_simulation  # pylint: disable=global-statement
+    _worker_simulation = _Simulation(*arguments)
+
+
+def _run_worker_batch(seed, size):
+    return _worker_simulation(seed, size)
+
+
+class _Aggregate:
+    """Running moments and histograms of the AEP of each mode"""
+
+    __slots__ = ("count", "mean", "m2", "upper", "histograms", "samples")
+
+    def __init__(self, upper, keep_samples):
+        self.count = 0
+        self.mean = np.zeros(upper.size)
+        self.m2 = np.zeros(upper.size)
+        self.upper = upper
+        self.histograms = np.zeros((upper.size, HISTOGRAM_BINS), dtype=np.int64)
+        self.samples = [] if keep_samples else None
+
+    def add(self, energies):
+        size = energies.shape[1]
+        batch_mean = energies.mean(axis=1)
+        batch_m2 = ((energies - batch_mean[:, None]) ** 2).sum(axis=1)
+        delta = batch_mean - self.mean
+        total = self.count + size
+        self.mean += delta * size / total
+        self.m2 += batch_m2 + delta**2 * self.count * size / total
+        self.count = total
+
+        bins = np.clip((energies / self.upper[:, None] * HISTOGRAM_BINS).astype(np.int64), 0, HISTOGRAM_BINS - 1)
+        bins += np.arange(self.upper.size)[:, None] * HISTOGRAM_BINS
+        self.histograms += np.bincount(bins.ravel(), minlength=self.histograms.size).reshape(self.histograms.shape)
+        if self.samples is not None:
+            self.samples.append(energies)
+
+    def quantile(self, q):
+        """Get the q quantile of each mode's AEP, interpolating within histogram bins"""
+        cumulative = np.cumsum(self.histograms, axis=1)
+        target = q * self.count
+        values = np.empty(self.upper.size)
+        for i, counts in enumerate(cumulative):
+            index = min(int(np.searchsorted(counts, target)), HISTOGRAM_BINS - 1)
+            before = counts[index - 1] if index > 0 else 0
+            within = (target - before) / max(counts[index] - before, 1)
+            values[i] = (index + within) * self.upper[i] / HISTOGRAM_BINS
+        return values
+
+
+def simulate_aep(
+    doc,
+    weibull_scale,
+    weibull_shape,
+    parameters=None,
+    wind_speed_uncertainty=0.0,
+    power_uncertainty=0.0,
+    samples=100000,
+    batch_size=8192,
+    seed=None,
+    processes=1,
+    mode_labels=None,
+    exceedance=(50, 90),
+    hours=HOURS_PER_YEAR,
+    wind_speeds=DEFAULT_WIND_SPEEDS,
+    keep_samples=False,
+):
+    """Estimate the distribution of annual energy production of operating modes by Monte Carlo sampling.
+
+    Args:
+        doc: The power curve document (whose curve arrays may be encoded)
+        weibull_scale: The scale parameter A of the site's hub height wind speed distribution [m/s]
+        weibull_shape: The shape parameter k of the site's hub height wind speed distribution
+        parameters: A dict giving, for every axis parameter of the modes other than wind speed, a fixed value or a
+            distribution: ("normal", mean, standard deviation), ("uniform", low, high) or ("choice", values). Values
+            outside a mode's axis are clipped to it.
+        wind_speed_uncertainty: The relative standard deviation of the Weibull scale parameter
+        power_uncertainty: The relative standard deviation of power
+        samples: The number of samples
+        batch_size: The number of samples in each batch
+        seed: The seed of the random number generator, for reproducible results
+        processes: The number of processes to evaluate batches in
+        mode_labels: The labels of the modes to simulate, defaulting to all of them
+        exceedance: Probabilities of exceedance [%] to give yields for, eg 90 for the P90 yield
+        hours: The number of hours in a year
+        wind_speeds: The centers of the wind speed bins to integrate over the Weibull distribution with [m/s]
+        keep_samples: If True, also return the AEP of every sample
+
+    Returns:
+        A dict by mode label of dicts with the `mean` and standard deviation (`std`) of AEP, and its value at each
+        probability of exceedance (eg `P50`, `P90`), all in [Wh], and the array of `samples` if kept
+    """
+    doc = decode_document(doc)
+    modes = doc["power_curves"]["operating_modes"]
+    if mode_labels is not None:
+        by_label = {mode["label"]: mode for mode in modes}
+        missing = [label for label in mode_labels if label not in by_label]
+        if missing:
+            raise KeyError(f"Document has no operating modes {missing}")
+        modes = [by_label[label] for label in mode_labels]
+
+    arguments = (
+        modes,
+        weibull_scale,
+        weibull_shape,
+        parameters or {},
+        wind_speed_uncertainty,
+        power_uncertainty,
+        wind_speeds,
+        hours,
+    )
+    simulation = _Simulation(*arguments)
+
+    # The histogram range covers every sample, barring power factors more than 8 standard deviations above one
+    maximum_power = np.array([np.nanmax(table) if table.size else 0.0 for table in simulation.tables])
+    upper = np.maximum(maximum_power * hours * (1.0 + 8.0 * power_uncertainty), 1.0)
+    aggregate = _Aggregate(upper, keep_samples)
+
+    sizes = [min(batch_size, samples - start) for start in range(0, samples, batch_size)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    if processes == 1 or len(sizes) <= 1:
+        for batch_seed, size in zip(seeds, sizes):
+            aggregate.add(simulation(batch_seed, size))
+    else:
+        with concurrent.futures.ProcessPoolExecutor(
+            max_workers=processes, initializer=_initialize_worker, initargs=(arguments,)
+        ) as executor:
+            for energies in executor.map(_run_worker_batch, seeds, sizes):
+                aggregate.add(energies)
+
+    results = {}
+    std = np.sqrt(aggregate.m2 / max(aggregate.count - 1, 1))
+    quantiles = {probability: aggregate.quantile(1.0 - probability / 100) for probability in exceedance}
+    for i, label in enumerate(simulation.labels):
+        result = {"mean": float(aggregate.mean[i]), "std": float(std[i])}
+        for probability, values in quantiles.items():
+            result[f"P{probability:g}"] = float(values[i])
+        if keep_samples:
+            result["samples"] = np.concatenate([energies[i] for energies in aggregate.samples])
+        results[label] = result
+    return results
@@ -0,0 +1,211 @@
+"""
+Plausibility.py
+
+Physical plausibility checks on the curve arrays of power curve documents, which catch errors that the schema (which
+checks only types and ranges) can't, such as power above the turbine's rating.
+
+Each check is a vectorized comparison over a whole N-D array, giving a boolean mask of violating cells from which the
+cell indices are found with `argwhere`, so checking documents of many megabytes takes milliseconds once their arrays
+are loaded.
+
+Checks are configured by a dict mapping each check's name to its options (overriding those in `DEFAULT_CONFIG`), to
+True to enable it with the default options, or to False to disable it:
+
+- `power-above-rated`: power exceeds the mode's rated power (`overrides.rated_power`, or `turbine.rated_power`) by
+  more than the relative tolerance `rtol`
+- `thrust-coefficient-range`: thrust coefficient is outside [`min`, `max`]
+- `rotor-rpm-above-rated`: rotor speed exceeds the mode's rated rpm (`overrides.rated_rpm`, or `turbine.rated_rpm`)
+  by more than the relative tolerance `rtol`
+- `power-decreasing`: power falls by more than `atol` [W] from one wind speed to the next, between cut-in (the
+  `low-cut-in` wind speed, or otherwise the first wind speed with nonzero power) and the wind speed at which power first
+  reaches its maximum
+
+Example:
+
+    from power_curve_schema.plausibility import check_document, format_violations
+
+    violations = check_document(doc, config={"thrust-coefficient-range": {"max": 1.0}, "power-decreasing": False})
+    if violations:
+        print(format_violations(doc, violations))
+"""
+
+import numpy as np
+
+from .arrays import axis_coordinates, axis_parameters, coordinate_to_json, mode_shape, to_ndarray
+from .encoding import decode_document
+
+DEFAULT_CONFIG = {
+    "power-above-rated": {"rtol": 0.0},
+    "thrust-coefficient-range": {"min": 0.0, "max": 1.2},
+    "rotor-rpm-above-rated": {"rtol": 0.0},
+    "power-decreasing": {"atol": 0.0},
+}
+
+_WIND_SPEED = "wind-speed"
+
+
+def _rated(doc, mode, name):
+    """Get a rated value for an operating mode, from its overrides or else from the turbine"""
+    value = mode.get("overrides", {}).get(name)
+    if value is None:
+        value = doc.get("turbine", {}).get(name)
+    return value
+
+
+def _check_power_above_rated(doc, mode, arrays, options):
+    rated_power = _rated(doc, mode, "rated_power")
+    if rated_power is None or "power" not in arrays:
+        return []
+    limit = rated_power * (1 + options["rtol"])
+    return [("power", arrays["power"] > limit, f"power above rated power of {rated_power} W")]
+
+
+def _check_thrust_coefficient_range(doc, mode, arrays, options):
+    if "thrust_coefficient" not in arrays:
+        return []
+    thrust_coefficient = arrays["thrust_coefficient"]
+    mask = (thrust_coefficient < options["min"]) | (thrust_coefficient > options["max"])
+    return [("thrust_coefficient", mask, f"thrust coefficient outside [{options['min']}, {options['max']}]")]
+
+
+def _check_rotor_rpm_above_rated(doc, mode, arrays, options):
+    rated_rpm = _rated(doc, mode, "rated_rpm")
+    if rated_rpm is None or "rotor_rpm" not in arrays:
+        return []
+    limit = rated_rpm * (1 + options["rtol"])
+    return [("rotor_rpm", arrays["rotor_rpm"] > limit, f"rotor speed above rated speed of {rated_rpm} RPM")]
+
+
+def _check_power_decreasing(doc, mode, arrays, options):
+    axes = axis_parameters(mode)
+    labels = [parameter["label"] for parameter in axes]
+    # Arrays whose shape doesn't match the axes can't be walked along wind speed
+    if "power" not in arrays or _WIND_SPEED not in labels or arrays["power"].shape != mode_shape(mode):
+        return []
+    axis = labels.index(_WIND_SPEED)
+    wind_speeds = axis_coordinates(axes[axis]["values"])
+    if wind_speeds.dtype.names is not None or wind_speeds.size < 2:
+        return []
+
+    # Work with wind speed as the last axis, in increasing order
+    order = np.argsort(wind_speeds)
+    power = np.moveaxis(arrays["power"], axis, -1)[..., order]
+    wind_speeds = wind_speeds[order]
+    positions = np.arange(wind_speeds.size)
+
+    # Each cell after the first is checked against its predecessor, if both are between cut-in and rated
+    cut_ins = [cut["wind_speed"] for cut in mode.get("cuts", ()) if cut["cut_type"] == "low-cut-in"]
+    if cut_ins:
+        start = np.full(power.shape[:-1] + (1,), np.searchsorted(wind_speeds, min(cut_ins)))
+    else:
+        start = np.argmax(power > 0, axis=-1)[..., None]
+    rated = np.argmax(power, axis=-1)[..., None]
+    falls = np.diff(power, axis=-1) < -options["atol"]
+    mask = np.zeros(power.shape, dtype=bool)
+    mask[..., 1:] = falls & (positions[:-1] >= start) & (positions[1:] <= rated)
+
+    # Back to the array's own order of wind speeds and axes
+    unordered = np.empty_like(mask)
+    unordered[..., order] = mask
+    return [("power", np.moveaxis(unordered, -1, axis), "power decreasing between cut-in and rated wind speed")]
+
+
+CHECKS = {
+    "power-above-rated": _check_power_above_rated,
+    "thrust-coefficient-range": _check_thrust_coefficient_range,
+    "rotor-rpm-above-rated": _check_rotor_rpm_above_rated,
+    "power-decreasing": _check_power_decreasing,
+}
+
+
+def _resolve_config(config):
+    """Merge a configuration with the defaults, returning (name, options) for each enabled check"""
+    config = config or {}
+    unknown = set(config) - set(CHECKS)
+    if unknown:
+        raise ValueError(f"Unknown plausibility checks {sorted(unknown)}, must be among {list(CHECKS)}")
+    enabled = []
+    for name, defaults in DEFAULT_CONFIG.items():
+        options = config.get(name, True)
+        if options is False:
+            continue
+        if options is True:
+            options = {}
+        if not isinstance(options, dict):
+            raise ValueError(f"Options for plausibility check '{name}' must be a dict, True or False, not {options!r}")
+        enabled.append((name, {**defaults, **options}))
+    return enabled
+
+
+def check_mode(doc, mode, config=None):
+    """Run plausibility checks on the curve arrays of one operating mode.
+
+    Args:
+        doc: The power curve document containing the mode (whose turbine gives default rated values)
+        mode: The operating mode dict
+        config: Options for each check by name, as described in the module docstring
+
+    Returns:
+        A list of violations as dicts with keys `check`, `mode`, `field`, `message`, `indices` (an integer array of
+        shape (violations, array dimensions) giving the index of each violating cell) and `values` (the values of the
+        violating cells)
+    """
+    arrays = {field: to_ndarray(mode[field]) for field in ("power", "thrust_coefficient", "rotor_rpm") if field in mode}
+    violations = []
+    for name, options in _resolve_config(config):
+        for field, mask, message in CHECKS[name](doc, mode, arrays, options):
+            if not mask.any():
+                continue
+            indices = np.argwhere(mask)
+            violations.append(
+                {
+                    "check": name,
+                    "mode": mode["label"],
+                    "field": field,
+                    "message": message,
+                    "indices": indices,
+                    "values": arrays[field][mask],
+                }
+            )
+    return violations
+
+
+def check_document(doc, config=None):
+    """Run plausibility checks on every operating mode of a document, as `check_mode`.
+
+    Args:
+        doc: The power curve document (whose curve arrays may be encoded)
+        config: Options for each check by name, as described in the module docstring
+
+    Returns:
+        A list of violations, as for `check_mode`, which is empty if the document is plausible
+    """
+    doc = decode_document(doc)
+    violations = []
+    for mode in doc["power_curves"]["operating_modes"]:
+        violations.extend(check_mode(doc, mode, config=config))
+    return violations
+
+
+def format_violations(doc, violations, max_cells=5):
+    """Format violations from `check_document` as text, giving the parameter values at the first few violating cells"""
+    modes = {mode["label"]: mode for mode in doc["power_curves"]["operating_modes"]}
+    lines = []
+    for violation in violations:
+        count = len(violation["indices"])
+        lines.append(f"mode {violation['mode']}: {violation['message']} in {count} cell{'s' if count != 1 else ''}")
+        mode = modes[violation["mode"]]
+        axes = axis_parameters(mode)
+        coordinates = [axis_coordinates(parameter["values"]) for parameter in axes]
+        for index, value in zip(violation["indices"][:max_cells], violation["values"][:max_cells]):
+            if len(index) == len(axes) and all(i < len(axis) for i, axis in zip(index, coordinates)):
+                location = ", ".join(
+                    f"{parameter['label']}={coordinate_to_json(axis[i])}"
+                    for parameter, axis, i in zip(axes, coordinates, index)
+                )
+            else:
+                location = f"index {list(index)}"
+            lines.append(f"  {location}: {violation['field']} = {value:g}")
+        if count > max_cells:
+            lines.append(f"  ... and {count - max_cells} more")
+    return "\n".join(lines)
@@ -0,0 +1,282 @@
+"""
+Query.py
+
+Compiled path queries on power curve documents, for tools which evaluate the same few path expressions on many
+documents.
+
+Expressions are compiled once (and memoized) into a chain of small accessor functions, so evaluating a query is a few
+dict and list lookups rather than a walk of the document. Supported expressions are a common subset of JSONPath:
+
+- `$` (the root), `.name` and `['name']` (children, with `['a','b']` giving several), `.*` (object values)
+- `[*]`, `[2]`, `[-1]` and `[1:3]` (list items, indices and slices)
+- `..name` (descendants)
+- `[?label=='mode_1']` and `[?(@.overrides.rated_power > 15e6)]` (filters on list items, with the operators `==`, `=`,
+  `!=`, `<`, `<=`, `>` and `>=`, comparing to a string, number, `true`, `false` or `null`)
+
+Filters on `label` equality (eg for operating modes, parameters and design bases) are answered by comparing each
+item's label, with nothing cached, so results always reflect the document as it is. (An index by label would need every
+label re-read on each lookup to be sure it isn't stale, which costs as much as the comparison.) Any other expression is
+evaluated by `jsonpath_ng` (imported only when needed), so results are the same either way.
+
+Example:
+
+    from power_curve_schema.query import compile_query, query
+
+    wind_speeds = compile_query("$.power_curves.operating_modes[*].parameters[?label=='wind-speed'].values")
+    for doc in documents:
+        wind_speeds(doc)  # a list of the matching values
+
+    query("$.power_curves.operating_modes[?label=='mode_2'].overrides.rated_power", doc)
+"""
+
+import functools
+import json
+import operator
+import re
+
+_OPERATORS = {
+    "==": operator.eq,
+    "=": operator.eq,
+    "!=": operator.ne,
+    "<": operator.lt,
+    "<=": operator.le,
+    ">": operator.gt,
+    ">=": operator.ge,
+}
+
+_NAME = r"[A-Za-z_][A-Za-z0-9_\-]*"
+_STRING = r"'(?:[^'\\]|\\.)*'|\"(?:[^\"\\]|\\.)*\""
+_NUMBER = r"-?\d+(?:\.\d*)?(?:[eE][+-]?\d+)?"
+_LITERAL = rf"{_STRING}|{_NUMBER}|true|false|null"
+
+_STEP = re.compile(
+    rf"""
+    \.\.(?P<descend>{_NAME}|\*)
+    | \.(?P<child>{_NAME}|\*)
+    | \[\s*(?P<wildcard>\*)\s*\]
+    | \[\s*(?P<index>-?\d+)\s*\]
+    | \[\s*(?P<start>-?\d+)?\s*:\s*(?P<stop>-?\d+)?\s*(?::\s*(?P<step>-?\d+)\s*)?\]
+    | \[\s*(?P<names>(?:{_STRING})(?:\s*,\s*(?:{_STRING}))*)\s*\]
+    | \[\s*\?\s*(?P<open>\()?\s*(?:@\.)?(?P<field>{_NAME}(?:\.{_NAME})*)\s*(?P<operator>==|!=|<=|>=|=|<|>)\s*
+        (?P<literal>{_LITERAL})\s*(?(open)\))\s*\]
+    """,
+    re.VERBOSE,
+)
+
+
+class _Unsupported(Exception):
+    """Raised when compiling an expression outside the supported subset"""
+
+
+def _literal(text):
+    if text[0] == "'":
+        return json.loads('"' + text[1:-1].replace('"', '\\"').replace("\\'", "'") + '"')
+    return json.loads(text)
+
+
+def _values(node):
+    """The `.*` step, giving the values of an object"""
+    if isinstance(node, dict):
+        return list(node.values())
+    return ()
+
+
+def _items(node):
+    """The `[*]` step, giving the items of a list (or, as in jsonpath_ng, any other value itself)"""
+    if isinstance(node, list):
+        return node
+    return (node,)
+
+
+def _descendants(node, name):
+    """Get the values of `name` in a node and all its descendants, depth first"""
+    matches = []
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, dict):
+            if name in node:
+                matches.append(node[name])
+            children = node.values()
+        else:
+            children = node
+        # Only containers can hold further matches, which skips the (many) numbers in curve arrays
+        stack.extend([child for child in reversed(list(children)) if isinstance(child, (dict, list))])
+    return matches
+
+
+def _with_label(items, label):
+    return [item for item in items if isinstance(item, dict) and item.get("label") == label]
+
+
+def _child_step(name):
+    def step(node):
+        if isinstance(node, dict) and name in node:
+            return (node[name],)
+        return ()
+
+    return step
+
+
+def _names_step(names):
+    def step(node):
+        if isinstance(node, dict):
+            return [node[name] for name in names if name in node]
+        return ()
+
+    return step
+
+
+def _index_step(index):
+    def step(node):
+        if isinstance(node, list) and -len(node) <= index < len(node):
+            return (node[index],)
+        return ()
+
+    return step
+
+
+def _slice_step(start, stop, stride):
+    selection = slice(start, stop, stride)
+
+    def step(node):
+        if isinstance(node, list):
+            return node[selection]
+        return [node][selection]
+
+    return step
+
+
+def _filter_step(fields, compare, value):
+    if fields == ["label"] and compare is operator.eq and isinstance(value, str):
+
+        def label_step(node):
+            if isinstance(node, list):
+                return _with_label(node, value)
+            if isinstance(node, dict):
+                return _with_label(node.values(), value)
+            return ()
+
+        return label_step
+
+    def matches(item):
+        for field in fields:
+            if not isinstance(item, dict) or field not in item:
+                return False
+            item = item[field]
+        try:
+            return bool(compare(item, value))
+        except TypeError:
+            return False
+
+    def step(node):
+        if isinstance(node, dict):
+            node = node.values()
+        elif not isinstance(node, list):
+            return ()
+        return [item for item in node if matches(item)]
+
+    return step
+
+
+def _parse(expression):
+    """Parse an expression into a list of step functions, raising _Unsupported if outside the supported subset"""
+    expression = expression.strip()
+    if not expression.startswith("$"):
+        raise _Unsupported(expression)
+    steps = []
+    position = 1
+    while position < len(expression):
+        match = _STEP.match(expression, position)
+        if match is None:
+            raise _Unsupported(expression)
+        position = match.end()
+        groups = match.groupdict()
+        if groups["descend"] == "*":
+            # jsonpath_ng has its own order of results for `..*`, which is left to it
+            raise _Unsupported(expression)
+        if groups["descend"] is not None:
+            name = groups["descend"]
+            steps.append(lambda node, name=name: _descendants(node, name))
+        elif groups["child"] == "*":
+            steps.append(_values)
+        elif groups["wildcard"] is not None:
+            steps.append(_items)
+        elif groups["child"] is not None:
+            steps.append(_child_step(groups["child"]))
+        elif groups["index"] is not None:
+            steps.append(_index_step(int(groups["index"])))
+        elif groups["names"] is not None:
+            names = [_literal(name) for name in re.findall(_STRING, groups["names"])]
+            steps.append(_child_step(names[0]) if len(names) == 1 else _names_step(names))
+        elif groups["field"] is not None:
+            value = _literal(groups["literal"])
+            steps.append(_filter_step(groups["field"].split("."), _OPERATORS[groups["operator"]], value))
+        else:
+            bounds = [None if groups[key] is None else int(groups[key]) for key in ("start", "stop", "step")]
+            if bounds[2] is not None and bounds[2] <= 0:
+                raise _Unsupported(expression)
+            steps.append(_slice_step(*bounds))
+    return steps
+
+
+def _chain(steps):
+    """Compose step functions into a query function"""
+
+    def run(doc):
+        nodes = (doc,)
+        for step in steps:
+            if len(nodes) == 1:
+                nodes = step(nodes[0])
+            else:
+                matches = []
+                for node in nodes:
+                    matches.extend(step(node))
+                nodes = matches
+        return list(nodes)
+
+    return run
+
+
+def _fallback(expression):
+    """Compile an expression with jsonpath_ng, for expressions outside the supported subset"""
+    from jsonpath_ng.ext import parse  # pylint: disable=import-outside-toplevel
+
+    parsed = parse(expression)
+
+    def run(doc):
+        return [match.value for match in parsed.find(doc)]
+
+    return run
+
+
+@functools.lru_cache(maxsize=1024)
+def compile_query(expression):
+    """Compile a path expression into a function of a document, giving the list of matching values.
+
+    Args:
+        expression: A JSONPath expression, evaluated directly if in the supported subset or otherwise by `jsonpath_ng`
+
+    Returns:
+        A function taking a document (or any JSON-like value) and returning a list of the values matching the path
+    """
+    try:
+        return _chain(_parse(expression))
+    except _Unsupported:
+        return _fallback(expression)
+
+
+def query(expression, doc):
+    """Get the list of values in a document matching a path expression (compiled once, with `compile_query`)"""
+    return compile_query(expression)(doc)
+
+
+def first(expression, doc, default=None):
+    """Get the first value in a document matching a path expression, or a default if nothing matches"""
+    matches = compile_query(expression)(doc)
+    return matches[0] if matches else default
+
+
+def find_by_label(items, label):
+    """Get the items of a list of labelled objects (eg operating modes) with the given label"""
+    return _with_label(items, label)
@@ -0,0 +1,524 @@
+"""
+Repository.py
+
+A small, self-hostable repository service for power curve documents, and a client which fetches from it with as
+little repeated work as possible.
+
+Documents are fetched repeatedly by many tools, which would otherwise each download and parse the full JSON every time
+even when nothing has changed. A `RepositoryServer` serves documents (and each of their operating modes) by identifier
+over HTTP/1.1:
+
+- `GET /documents`: the identifiers of the documents served, with their ETags, as a JSON object
+- `GET /documents/<identifier>`: a document, as compact canonical JSON (see `serialization.py`)
+- `GET /documents/<identifier>/modes/<label>`: one operating mode of a document, as compact canonical JSON
+
+Each response has a strong ETag, which is the content hash of its body (`serialization.content_hash` of the document or
+mode, with any encoded curve arrays decoded first). Requests with a matching `If-None-Match` header get an empty
+`304 Not Modified` response, so a client holding a document (from a cache, or from a file) can check it's current by
+sending its hash, without downloading it again. Documents are sensitive, so the server only listens on the local
+machine by default, and can require a bearer token.
+
+A `RepositoryClient` keeps a pool of keep-alive connections to the server, and caches each resource it fetches: in
+memory, in the forms it has been asked for (parsed JSON, JSON with curve arrays as numpy arrays, or a
+`PowerCurveDocument` model), and optionally on disk, as the canonical JSON and a binary store of the model (see
+`model.py`) named by their content. Every fetch of a cached resource is a conditional request, so a repeat fetch costs
+a single `304 Not Modified` round trip on an open connection, with nothing downloaded or parsed.
+
+Example:
+
+    server = RepositoryServer.from_directory("library/", port=8080, token=token)
+    server.serve_forever()  # Or use the server in a `with` block, to serve in a background thread
+
+    client = RepositoryClient("http://127.0.0.1:8080", cache_dir="~/.cache/power-curves", token=token)
+    doc = client.document("6d3ff892-8763-4448-aab9-ab8454bf6ec5")
+    mode = client.mode("6d3ff892-8763-4448-aab9-ab8454bf6ec5", "mode_1", arrays=True)
+    client.model("6d3ff892-8763-4448-aab9-ab8454bf6ec5").mode("mode_1").power  # Read from the cached binary store
+"""
+
+import glob
+import hashlib
+import hmac
+import http.client
+import http.server
+import json
+import os
+import secrets
+import threading
+import urllib.parse
+
+from .encoding import decode_document
+from .instrumentation import span
+from .model import PowerCurveDocument
+from .serialization import content_hash, dumps, load, loads
+from .sources import document_identifier
+
+# Forms of a resource which the client can return
+FORMS = ("json", "arrays", "model")
+
+# The number of idle connections kept open by a client, by default
+DEFAULT_MAX_CONNECTIONS = 4
+
+# Seconds for which the server keeps an idle keep-alive connection open
+_IDLE_TIMEOUT = 60
+
+
+def _etag(body):
+    """Get the ETag of a response body, which is the content hash of the canonical JSON it holds"""
+    return '"' + hashlib.sha256(body).hexdigest() + '"'
+
+
+def _matches(header, etag):
+    """Check whether an If-None-Match header matches an ETag (using weak comparison, as required for If-None-Match)"""
+    if header is None:
+        return False
+    for tag in header.split(","):
+        tag = tag.strip()
+        if tag.startswith("W/"):
+            tag = tag[2:]
+        if tag == "*" or tag.strip('"') == etag.strip('"'):
+            return True
+    return False
+
+
+def _document_path(identifier):
+    return "/documents/" + urllib.parse.quote(identifier, safe="")
+
+
+def _mode_path(identifier, label):
+    return _document_path(identifier) + "/modes/" + urllib.parse.quote(label, safe="")
+
+
+class _Resource:
+    """A response body to serve, with its ETag"""
+
+    __slots__ = ("body", "etag")
+
+    def __init__(self, obj):
+        self.body = dumps(obj).encode("utf-8")
+        self.etag = _etag(self.body)
+
+
+class RepositoryServer:
+    """A local HTTP server of power curve documents and their operating modes, by identifier, with conditional requests.
+
+    Args:
+        documents: Documents to serve, each by the (first) Identifier in its metadata
+        host: The host to bind to, by default only the local machine
+        port: The port to bind to, by default any free port
+        token: If given, requests must have an `Authorization: Bearer <token>` header (otherwise getting a 401)
+    """
+
+    def __init__(self, documents=(), host="127.0.0.1", port=0, token=None):
+        self._resources = {}
+        self._lock = threading.Lock()
+        for doc in documents:
+            self.add(doc)
+
+        lookup = self._lookup
+        authorization = None if token is None else f"Bearer {token}".encode("utf-8")
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            """Handler of document requests, keeping connections alive between them"""
+
+            protocol_version = "HTTP/1.1"
+            timeout = _IDLE_TIMEOUT
+
+            def do_GET(self):  # pylint: disable=invalid-name
+                """Serve a resource, or an empty response if the client's copy is current"""
+                self._respond(head=False)
+
+            def do_HEAD(self):  # pylint: disable=invalid-name
+                """Serve the headers of a resource"""
+                self._respond(head=True)
+
+            def _respond(self, head):
+                given = self.headers.get("Authorization", "").encode("utf-8")
+                if authorization is not None and not hmac.compare_digest(given, authorization):
+                    self.send_error(401)
+                    return
+                resource = lookup(urllib.parse.urlsplit(self.path).path)
+                if resource is None:
+                    self.send_error(404)
+                    return
+                if _matches(self.headers.get("If-None-Match"), resource.etag):
+                    self.send_response(304)
+                    self.send_header("ETag", resource.etag)
+                    self.send_header("Cache-Control", "private, no-cache")
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(resource.body)))
+                self.send_header("ETag", resource.etag)
+                self.send_header("Cache-Control", "private, no-cache")
+                self.end_headers()
+                if not head:
+                    self.wfile.write(resource.body)
+
+            def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+                pass
+
+        self.server = http.server.ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self._thread = None
+
+    @classmethod
+    def from_directory(cls, path, **kwargs):
+        """Create a server of the JSON documents in a directory, each by its Identifier (or else its file name).
+
+        Args:
+            path: The directory of documents
+            **kwargs: Arguments of `RepositoryServer`
+        """
+        server = cls(**kwargs)
+        for filename in sorted(glob.glob(os.path.join(path, "*.json"))):
+            with open(filename, "r", encoding="utf-8") as fp:
+                doc = load(fp)
+            server.add(doc, identifier=document_identifier(doc) or os.path.splitext(os.path.basename(filename))[0])
+        return server
+
+    def __len__(self):
+        return len(self._resources)
+
+    def __contains__(self, identifier):
+        return identifier in self._resources
+
+    def add(self, doc, identifier=None):
+        """Serve a document, replacing any document served with the same identifier.
+
+        Args:
+            doc: The power curve document. Encoded curve arrays are decoded, so that ETags don't depend on the encoding.
+            identifier: The identifier to serve the document by, defaulting to the Identifier in its metadata
+
+        Returns:
+            The identifier
+
+        Raises:
+            ValueError: If no identifier is given and the document's metadata has none
+        """
+        identifier = identifier or document_identifier(doc)
+        if identifier is None:
+            raise ValueError("Document has no Identifier in its metadata, so an identifier must be given")
+        doc = decode_document(doc)
+        resources = {_document_path(identifier): _Resource(doc)}
+        for mode in doc.get("power_curves", {}).get("operating_modes", []):
+            resources[_mode_path(identifier, mode["label"])] = _Resource(mode)
+        with self._lock:
+            self._resources[identifier] = resources
+        return identifier
+
+    def remove(self, identifier):
+        """Stop serving a document, raising KeyError if it isn't served"""
+        with self._lock:
+            try:
+                del self._resources[identifier]
+            except KeyError:
+                raise KeyError(f"Repository has no document '{identifier}'") from None
+
+    def index(self):
+        """Get the ETags of the documents served, by identifier"""
+        with self._lock:
+            return {
+                identifier: resources[_document_path(identifier)].etag
+                for identifier, resources in self._resources.items()
+            }
+
+    def _lookup(self, path):
+        """Get the resource at a request path, or None if there's none"""
+        if path == "/documents":
+            return _Resource(self.index())
+        parts = path.split("/")
+        if len(parts) not in (3, 5) or parts[1] != "documents" or (len(parts) == 5 and parts[3] != "modes"):
+            return None
+        identifier = urllib.parse.unquote(parts[2])
+        with self._lock:
+            resources = self._resources.get(identifier, {})
+        # Paths are normalised (eg escapes which needn't be), so that equivalent paths find the same resource
+        if len(parts) == 3:
+            return resources.get(_document_path(identifier))
+        return resources.get(_mode_path(identifier, urllib.parse.unquote(parts[4])))
+
+    @property
+    def url(self):
+        """The base URL of the repository"""
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        """Start serving, in a background thread"""
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self):
+        """Serve in this thread, until interrupted or `stop` is called from another thread"""
+        self.server.serve_forever()
+
+    def stop(self):
+        """Stop serving, and close the server's socket"""
+        if self._thread is not None:
+            self.server.shutdown()
+            self._thread.join()
+            self._thread = None
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+
+class _CacheEntry:
+    """A cached resource: its ETag, the content hash of its body, its body (if not cached on disk) and parsed forms"""
+
+    __slots__ = ("etag", "digest", "body", "forms")
+
+    def __init__(self, etag, digest, body):
+        self.etag = etag
+        self.digest = digest
+        self.body = body
+        self.forms = {}
+
+
+class RepositoryClient:
+    """A client of a `RepositoryServer`, with pooled keep-alive connections and a cache of the resources fetched.
+
+    Resources returned are shared by repeat fetches while they're current, so shouldn't be modified (or, for models,
+    closed). The client is thread safe: each request uses a connection of its own, taken from the pool (or opened) and
+    returned after use.
+
+    Args:
+        url: The base URL of the repository, eg `RepositoryServer.url`
+        cache_dir: A directory in which to cache resources between processes, or None to cache them only in memory.
+            Cached bodies and binary stores are named by their content hashes, and aren't deleted when they change.
+        token: The bearer token required by the server, if any
+        max_connections: The number of idle connections to keep open
+        timeout: The timeout of connecting and of each request [s]
+
+    Attributes:
+        stats: Counts of "requests" made, responses which were "not_modified", and "connections" opened
+    """
+
+    def __init__(self, url, cache_dir=None, token=None, max_connections=DEFAULT_MAX_CONNECTIONS, timeout=30.0):
+        parts = urllib.parse.urlsplit(url)
+        if parts.scheme not in ("http", "https"):
+            raise ValueError(f"Unsupported repository URL '{url}' (the scheme should be http or https)")
+        self._connection_class = http.client.HTTPSConnection if parts.scheme == "https" else http.client.HTTPConnection
+        self._host, self._port = parts.hostname, parts.port
+        self._base = parts.path.rstrip("/")
+        self._headers = {} if token is None else {"Authorization": f"Bearer {token}"}
+        self.cache_dir = None if cache_dir is None else os.path.expanduser(cache_dir)
+        if self.cache_dir is not None:
+            os.makedirs(self.cache_dir, exist_ok=True)
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self.stats = {"requests": 0, "not_modified": 0, "connections": 0}
+        self._idle = []
+        self._cache = {}
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        """Close the idle connections (resources already returned remain usable)"""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for connection in idle:
+            connection.close()
+
+    def _acquire(self):
+        """Take an idle connection from the pool, or open a new one, returning it and whether it was idle"""
+        with self._lock:
+            if self._idle:
+                return self._idle.pop(), True
+            self.stats["connections"] += 1
+        return self._connection_class(self._host, self._port, timeout=self.timeout), False
+
+    def _release(self, connection, response):
+        """Return a connection to the pool after reading a response, unless either side is closing it"""
+        with self._lock:
+            if not response.will_close and len(self._idle) < self.max_connections:
+                self._idle.append(connection)
+                return
+        connection.close()
+
+    def _request(self, path, etag=None, method="GET"):
+        """Make a request, returning the response (whose body has been read) and its body"""
+        headers = dict(self._headers)
+        if etag is not None:
+            headers["If-None-Match"] = etag
+        with span("repository.fetch", path=path) as active:
+            while True:
+                connection, idle = self._acquire()
+                try:
+                    connection.request(method, self._base + path, headers=headers)
+                    response = connection.getresponse()
+                    body = response.read()
+                except (http.client.HTTPException, OSError):
+                    connection.close()
+                    # The server may have closed an idle connection, so requests on those are retried on a new one
+                    if idle:
+                        continue
+                    raise
+                break
+            self._release(connection, response)
+            with self._lock:
+                self.stats["requests"] += 1
+                self.stats["not_modified"] += response.status == 304
+            if active:
+                active.set(status=response.status, bytes=len(body))
+
+        if response.status == 404:
+            raise KeyError(f"Repository has no resource at '{path}'")
+        if response.status == 401:
+            raise PermissionError(f"Repository refused access to '{path}' (check the token)")
+        if response.status not in (200, 304):
+            raise OSError(f"Repository request for '{path}' failed with status {response.status} {response.reason}")
+        return response, body
+
+    def _reference_path(self, path):
+        """Get the path of the cached reference (ETag and content hash) of a resource, named by the hash of its path"""
+        key = hashlib.sha256(path.encode("utf-8")).hexdigest()[:32]
+        return os.path.join(self.cache_dir, key + ".ref")
+
+    def _content_path(self, digest, extension):
+        return os.path.join(self.cache_dir, digest + extension)
+
+    def _write(self, path, data):
+        """Write a file in the cache atomically, so that concurrent readers see either nothing or all of it"""
+        temporary = f"{path}.{secrets.token_hex(4)}.tmp"
+        with open(temporary, "wb") as fp:
+            fp.write(data)
+        os.replace(temporary, path)
+
+    def _cached(self, path):
+        """Get the cache entry of a resource, from memory or else from disk, or None if it isn't cached"""
+        with self._lock:
+            entry = self._cache.get(path)
+        if entry is not None or self.cache_dir is None:
+            return entry
+        try:
+            with open(self._reference_path(path), "r", encoding="utf-8") as fp:
+                reference = json.load(fp)
+        except (OSError, ValueError):
+            return None
+        if not os.path.exists(self._content_path(reference["digest"], ".json")):
+            return None
+        return _CacheEntry(reference["etag"], reference["digest"], None)
+
+    def _store(self, path, etag, body, previous):
+        """Cache the body of a resource, returning its new cache entry"""
+        digest = hashlib.sha256(body).hexdigest()
+        if previous is not None and previous.digest == digest:
+            entry = previous
+            entry.etag = etag
+        elif self.cache_dir is None:
+            entry = _CacheEntry(etag, digest, body)
+        else:
+            entry = _CacheEntry(etag, digest, None)
+            content = self._content_path(digest, ".json")
+            if not os.path.exists(content):
+                self._write(content, body)
+        if self.cache_dir is not None:
+            self._write(self._reference_path(path), json.dumps({"etag": etag, "digest": digest}).encode("utf-8"))
+        return entry
+
+    def _body(self, entry):
+        if entry.body is not None:
+            return entry.body
+        with open(self._content_path(entry.digest, ".json"), "rb") as fp:
+            return fp.read()
+
+    def _fetch(self, path, form):
+        """Get a resource in a form, from the cache if it's current, otherwise from the server"""
+        if form not in FORMS:
+            raise ValueError(f"Unknown form '{form}' (available: {', '.join(FORMS)})")
+
+        cached = self._cached(path)
+        response, body = self._request(path, etag=None if cached is None else cached.etag)
+        if response.status == 304:
+            entry = cached
+        else:
+            entry = self._store(path, response.getheader("ETag"), body, cached)
+        with self._lock:
+            self._cache[path] = entry
+            value = entry.forms.get(form)
+        if value is not None:
+            return value
+
+        value = self._parse(entry, body if response.status == 200 else None, form)
+        with self._lock:
+            # Another thread may have parsed the same resource meanwhile, in which case its value is shared
+            return entry.forms.setdefault(form, value)
+
+    def _parse(self, entry, body, form):
+        """Convert the body of a resource (read from the cache if None) to a form"""
+        if form == "model" and self.cache_dir is not None:
+            store = self._content_path(entry.digest, ".npz")
+            if not os.path.exists(store):
+                # numpy appends the extension to paths without it, so the temporary file keeps it
+                temporary = self._content_path(f"{entry.digest}.{secrets.token_hex(4)}.tmp", ".npz")
+                PowerCurveDocument.from_dict(self._parse(entry, body, "json")).to_binary(temporary)
+                os.replace(temporary, store)
+            return PowerCurveDocument.from_binary(store)
+
+        doc = loads((body or self._body(entry)).decode("utf-8"), arrays=form == "arrays")
+        return PowerCurveDocument.from_dict(doc) if form == "model" else doc
+
+    def identifiers(self):
+        """Get the ETags of the documents in the repository, by identifier"""
+        return json.loads(self._request("/documents")[1])
+
+    def document(self, identifier, arrays=False):
+        """Get a document.
+
+        Args:
+            identifier: The identifier of the document
+            arrays: If True, curve arrays are numpy arrays (as `serialization.loads(text, arrays=True)`)
+
+        Returns:
+            The document dict
+
+        Raises:
+            KeyError: If the repository has no such document
+        """
+        return self._fetch(_document_path(identifier), "arrays" if arrays else "json")
+
+    def mode(self, identifier, label, arrays=False):
+        """Get an operating mode of a document, without fetching the rest of the document.
+
+        Args:
+            identifier: The identifier of the document
+            label: The label of the operating mode
+            arrays: If True, curve arrays are numpy arrays (as `serialization.loads(text, arrays=True)`)
+
+        Returns:
+            The operating mode dict
+
+        Raises:
+            KeyError: If the repository has no such document, or the document no such mode
+        """
+        return self._fetch(_mode_path(identifier, label), "arrays" if arrays else "json")
+
+    def model(self, identifier):
+        """Get a document as a `PowerCurveDocument` model, loaded from a binary store in the cache directory (if any).
+
+        Raises:
+            KeyError: If the repository has no such document
+        """
+        return self._fetch(_document_path(identifier), "model")
+
+    def is_current(self, identifier, doc):
+        """Check whether a document (eg read from a file) has the same content as the repository's, without fetching it
+        (using a HEAD request conditional on the document's content hash).
+
+        Raises:
+            KeyError: If the repository has no such document
+        """
+        etag = '"' + content_hash(decode_document(doc)) + '"'
+        return self._request(_document_path(identifier), etag=etag, method="HEAD")[0].status == 304
@@ -0,0 +1,50 @@
+"""
+Schemas.py
+
+Locating, loading and scoping the power curve schema. This module is deliberately free of heavy imports.
+"""
+
+import functools
+import json
+import os
+
+SCHEMA_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "power-curve-schema", "schema.json"
+)
+
+# The top-level sections of a document which can be validated in isolation
+SECTIONS = ("document", "turbine", "design_bases", "power_curves", "additional")
+
+
+@functools.lru_cache(maxsize=None)
+def load_schema(path=SCHEMA_PATH):
+    """Load (once) a schema from disk. The returned schema is shared, so must not be mutated."""
+    with open(path, "r", encoding="utf-8") as fp:
+        return json.load(fp)
+
+
+def section_schema(schema, section):
+    """Get a schema with only one of the top-level sections in it, allowing anything in other sections to pass.
+
+    The input schema is not modified. This is useful for validating partial documents, eg for partial-update services
+    or for testing, where only data in one section is of interest.
+
+    Args:
+        schema: The full schema
+        section: One of `SECTIONS`, or None to return the full schema
+
+    Returns:
+        The section-scoped schema
+    """
+    if section is None:
+        return schema
+    if section not in SECTIONS:
+        raise ValueError(f"Unknown section '{section}', must be one of {SECTIONS} (or None for the whole document)")
+
+    return {
+        **schema,
+        "required": [section] if section in schema["required"] else [],
+        "properties": {section: schema["properties"][section]},
+        # Ensure that top level properties pass unnoticed if we only care about the subschema
+        "additionalProperties": True,
+    }
@@ -0,0 +1,323 @@
+"""
+Screening.py
+
+Site suitability screening of a corpus of power curve documents: finding the operating modes of every turbine whose
+design bases cover the conditions at each of many candidate sites, and which allow the site's hub height.
+
+Each operating mode is joined to the design bases it refers to (through `operating_modes[].design_bases`, see
+`effective.py`), and each design basis gives:
+
+- design wind speeds (reference wind speed `Vref` and annual average wind speed `Vave`), from a standard IEC class
+  (I, II or III, with the typhoon modifier T raising `Vref` to 57 m/s) or a special class S
+- a reference turbulence intensity `Iref`, from a standard IEC category (A+, A, B or C) or a special category S
+- operating and survival temperature ranges, for each of its standard, cold and hot climates
+
+A mode is suitable for a site if, for one of its design bases (and one of that basis' climates), the design wind speeds
+and turbulence intensity are at least those of the site and the temperature ranges contain the site's, and if the hub
+height is allowed by the turbine's available hub heights and the mode's restrictions. Conditions not given for a site
+aren't screened, but values not given by a design basis are taken as unsuitable for any site with that condition.
+
+The index is a table with a row per combination of (mode, design basis, climate, hub height interval), sorted by
+reference wind speed. The rows which could suit a site start at the site's `searchsorted` position in the sorted
+reference wind speeds, so sites are ordered by that position and screened in batches of sites with similar positions:
+only the rows from the first position of a batch are compared, as vectorized (sites x rows) comparisons, so each site
+is compared with few more rows than its candidates.
+
+Example:
+
+    from power_curve_schema.screening import build_screening_index
+
+    index = build_screening_index(glob.glob("library/*.json"))
+    results = index.screen(
+        {
+            "design_class": ["II", "III", "I"],
+            "turbulence_intensity": [0.16, 0.14, 0.12],
+            "operating_temperature": [[-15, 35], [-25, 30], [-5, 40]],
+            "hub_height": [140, 120, 150],
+        }
+    )
+    [index.modes[i] for i in results[0]]  # (source, mode label) of the modes suitable for the first site
+"""
+
+import numpy as np
+
+from .effective import EffectiveModes
+from .hub_heights import HUB_HEIGHT_TOLERANCE
+from .sources import iter_sources
+
+# Reference and annual average wind speeds [m/s] of the standard IEC classes
+CLASS_WIND_SPEEDS = {"I": (50.0, 10.0), "II": (42.5, 8.5), "III": (37.5, 7.5)}
+
+# Reference wind speed [m/s] of classes with the typhoon modifier
+TYPHOON_REFERENCE_WIND_SPEED = 57.0
+
+# Reference turbulence intensities of the standard IEC turbulence categories
+CATEGORY_TURBULENCE_INTENSITIES = {"A+": 0.18, "A": 0.16, "B": 0.14, "C": 0.12}
+
+CLIMATES = ("standard_climate", "cold_climate", "hot_climate")
+
+# The site conditions which can be screened, and the number of values of each per site
+CONDITIONS = {
+    "design_class": 1,
+    "reference_wind_speed": 1,
+    "annual_average_wind_speed": 1,
+    "turbulence_intensity": 1,
+    "operating_temperature": 2,
+    "survival_temperature": 2,
+    "hub_height": 1,
+}
+
+# The maximum number of (sites x rows) comparisons in a batch
+BATCH_CELLS = 1 << 22
+
+
+_COLUMNS = (
+    "reference_wind_speed",
+    "annual_average_wind_speed",
+    "turbulence_intensity",
+    "operating_temperature_min",
+    "operating_temperature_max",
+    "survival_temperature_min",
+    "survival_temperature_max",
+    "hub_height_min",
+    "hub_height_max",
+)
+
+
+def _design_wind_speeds(basis):
+    """Get the (reference, annual average) wind speeds of a design basis, NaN where not known"""
+    design_class = basis.get("design_class", {})
+    label = design_class.get("class_label")
+    if label in CLASS_WIND_SPEEDS:
+        reference, average = CLASS_WIND_SPEEDS[label]
+        if "T" in design_class.get("class_modifiers", ()):
+            reference = TYPHOON_REFERENCE_WIND_SPEED
+        return reference, average
+    return (
+        design_class.get("reference_wind_speed", np.nan),
+        design_class.get("annual_average_wind_speed", np.nan),
+    )
+
+
+def _turbulence_intensity(basis):
+    """Get the reference turbulence intensity of a design basis, NaN where not known (eg for custom models)"""
+    turbulence = basis.get("turbulence", {})
+    category = turbulence.get("category")
+    if category in CATEGORY_TURBULENCE_INTENSITIES:
+        return CATEGORY_TURBULENCE_INTENSITIES[category]
+    return turbulence.get("reference_turbulence_intensity", np.nan)
+
+
+def _temperature_ranges(basis):
+    """Get the (operating min, operating max, survival min, survival max) temperatures of each climate of a basis"""
+    ranges = []
+    for climate in CLIMATES:
+        if climate in basis:
+            values = []
+            for name in ("operating_temperature_range", "survival_temperature_range"):
+                temperatures = basis[climate].get(name)
+                values.extend((min(temperatures), max(temperatures)) if temperatures else (np.nan, np.nan))
+            ranges.append(tuple(values))
+    return ranges or [(np.nan,) * 4]
+
+
+def _intervals(hub_heights):
+    """Get the hub heights of an `available_hub_heights` entry as a list of (min, max) intervals"""
+    if hub_heights is None:
+        return [(-np.inf, np.inf)]
+    if isinstance(hub_heights, dict):
+        return [(hub_heights["min"], hub_heights.get("max", np.inf))]
+    return [(height - HUB_HEIGHT_TOLERANCE, height + HUB_HEIGHT_TOLERANCE) for height in hub_heights]
+
+
+def _hub_height_intervals(mode):
+    """Get the intervals of hub heights allowed for an effective mode"""
+    intervals = []
+    for low, high in _intervals(mode.available_hub_heights):
+        for restricted_low, restricted_high in _intervals(mode.restricted_to_hub_heights):
+            if max(low, restricted_low) <= min(high, restricted_high):
+                intervals.append((max(low, restricted_low), min(high, restricted_high)))
+    return intervals
+
+
+class ScreeningIndex:
+    """An index of the design conditions and hub heights of the operating modes of a corpus of documents.
+
+    Attributes:
+        modes: A list of (source, mode label) for each operating mode added, indexed by the results of `screen`
+    """
+
+    def __init__(self):
+        self.modes = []
+        self._documents = 0
+        self._rows = {column: [] for column in _COLUMNS + ("mode",)}
+        self._table = None
+
+    def add(self, doc, source=None):
+        """Add the operating modes of a document to the index.
+
+        Args:
+            doc: The power curve document
+            source: A name for the document in `modes` (eg its path), defaulting to its position in the index
+        """
+        source = self._documents if source is None else source
+        self._documents += 1
+        # Resolved directly rather than through the cache of views, which would hold every document indexed
+        for mode in EffectiveModes(doc):
+            position = len(self.modes)
+            self.modes.append((source, mode.label))
+            for basis in mode.design_bases or ({},):
+                for temperatures in _temperature_ranges(basis):
+                    for hub_heights in _hub_height_intervals(mode):
+                        values = (
+                            *_design_wind_speeds(basis),
+                            _turbulence_intensity(basis),
+                            *temperatures,
+                            *hub_heights,
+                        )
+                        for column, value in zip(_COLUMNS, values):
+                            self._rows[column].append(value)
+                        self._rows["mode"].append(position)
+        self._table = None
+
+    @property
+    def table(self):
+        """The index table, as a dict of 1-D arrays by column, sorted by reference wind speed"""
+        if self._table is None:
+            table = {column: np.asarray(values, dtype=np.float64) for column, values in self._rows.items()}
+            table["mode"] = np.asarray(self._rows["mode"], dtype=np.intp)
+            order = np.argsort(table["reference_wind_speed"], kind="stable")
+            self._table = {column: values[order] for column, values in table.items()}
+        return self._table
+
+    def screen(self, sites, batch_cells=BATCH_CELLS):
+        """Find the operating modes suitable for each of a batch of sites.
+
+        Args:
+            sites: A dict of arrays of site conditions, one entry per site (or scalars, for conditions common to all
+                sites), with any of the keys:
+
+                - `design_class`: an IEC class label (I, II or III), setting the reference and annual average wind
+                  speeds of sites where those aren't given (or are NaN)
+                - `reference_wind_speed`, `annual_average_wind_speed` [m/s]
+                - `turbulence_intensity`: the reference turbulence intensity
+                - `operating_temperature`, `survival_temperature`: (min, max) temperatures [deg C]
+                - `hub_height` [m]
+
+                NaN (or None, for `design_class`) values aren't screened.
+            batch_cells: The maximum number of (sites x rows) comparisons in each batch
+
+        Returns:
+            A list with an array for each site of the positions in `modes` of the suitable operating modes, in order
+        """
+        sites = self._site_conditions(sites)
+        table = self.table
+        rows = len(table["mode"])
+        # Rows with a reference wind speed below a site's can't suit it, and are before its searchsorted position
+        reference = sites["reference_wind_speed"]
+        starts = np.where(np.isnan(reference), 0, np.searchsorted(table["reference_wind_speed"], reference))
+        order = np.argsort(-starts, kind="stable")
+        # The number of candidate rows of each site, in order, which is non-decreasing
+        widths = rows - starts[order]
+
+        results = [None] * len(order)
+        start = 0
+        while start < len(order):
+            stop = self._batch_stop(widths, start, batch_cells)
+            batch = order[start:stop]
+            batch_sites = {key: values[batch] for key, values in sites.items()}
+            for site, result in zip(batch, self._screen_batch(table, batch_sites, starts[batch])):
+                results[site] = result
+            start = stop
+        return results
+
+    def suitable_modes(self, site):
+        """Get the (source, mode label) of the operating modes suitable for one site, given as a dict of conditions"""
+        return [self.modes[i] for i in self.screen({key: [value] for key, value in site.items()})[0]]
+
+    @staticmethod
+    def _site_conditions(sites):
+        """Broadcast site conditions to arrays of one (or two, for temperatures) values per site"""
+        unknown = set(sites) - set(CONDITIONS)
+        if unknown:
+            raise ValueError(f"Unknown site conditions {sorted(unknown)}, must be any of {list(CONDITIONS)}")
+        arrays = {}
+        for key, value in sites.items():
+            arrays[key] = np.atleast_1d(np.asarray(value, dtype=object if key == "design_class" else np.float64))
+        size = max([len(values) for key, values in arrays.items() if values.ndim == CONDITIONS[key]] or [1])
+
+        conditions = {}
+        for key, width in CONDITIONS.items():
+            if key != "design_class":
+                shape = (size,) if width == 1 else (size, 2)
+                conditions[key] = np.array(np.broadcast_to(arrays.get(key, np.nan), shape), dtype=np.float64)
+
+        if "design_class" in arrays:
+            for i, label in enumerate(np.broadcast_to(arrays["design_class"], (size,))):
+                if label is None:
+                    continue
+                if label not in CLASS_WIND_SPEEDS:
+                    raise ValueError(f"Unknown design class '{label}', must be one of {list(CLASS_WIND_SPEEDS)}")
+                for key, value in zip(("reference_wind_speed", "annual_average_wind_speed"), CLASS_WIND_SPEEDS[label]):
+                    if np.isnan(conditions[key][i]):
+                        conditions[key][i] = value
+        return conditions
+
+    @staticmethod
+    def _batch_stop(widths, start, batch_cells):
+        """Get the end of the largest batch of sites from `start` (at least one site) within `batch_cells` comparisons,
+        whose sites have at most twice the candidate rows of its first site (so no site is compared with more than
+        twice as many rows as could suit it).
+
+        Widths are non-decreasing, so a batch's comparisons (its sites times its last site's width) are too, and the end
+        is found by bisection.
+        """
+        low, high = start + 1, int(np.searchsorted(widths, 2 * widths[start], side="right"))
+        while low < high:
+            middle = (low + high + 1) // 2
+            if (middle - start) * widths[middle - 1] <= batch_cells:
+                low = middle
+            else:
+                high = middle - 1
+        return low
+
+    @staticmethod
+    def _screen_batch(table, sites, starts):
+        """Screen a batch of sites against the rows of the table from each site's searchsorted position"""
+        first = int(starts.min())
+        columns = {column: values[None, first:] for column, values in table.items()}
+
+        suitable = np.arange(first, len(table["mode"]))[None, :] >= starts[:, None]
+        for key, column in (
+            ("reference_wind_speed", "reference_wind_speed"),
+            ("annual_average_wind_speed", "annual_average_wind_speed"),
+            ("turbulence_intensity", "turbulence_intensity"),
+        ):
+            values = sites[key][:, None]
+            suitable &= np.isnan(values) | (columns[column] >= values)
+        for key in ("operating_temperature", "survival_temperature"):
+            low, high = sites[key][:, :1], sites[key][:, 1:]
+            suitable &= np.isnan(low) | (columns[f"{key}_min"] <= low)
+            suitable &= np.isnan(high) | (columns[f"{key}_max"] >= high)
+        heights = sites["hub_height"][:, None]
+        suitable &= np.isnan(heights) | (
+            (columns["hub_height_min"] <= heights) & (heights <= columns["hub_height_max"])
+        )
+
+        modes = table["mode"][first:]
+        return [np.unique(modes[row]) for row in suitable]
+
+
+def build_screening_index(sources):
+    """Build a ScreeningIndex from a corpus, loading one document at a time.
+
+    Args:
+        sources: An iterable of documents (dicts), paths to JSON documents or paths to chunked stores
+
+    Returns:
+        The ScreeningIndex, with paths (or positions, for dicts) as the sources of its modes
+    """
+    index = ScreeningIndex()
+    for source, doc in iter_sources(sources):
+        index.add(doc, source=source)
+    return index
@@ -0,0 +1,433 @@
+"""
+Serialization.py
+
+A streaming, canonical JSON serializer for power curve documents.
+
+Output is byte-identical for documents with identical content, which allows documents to be hashed, deduplicated
+and diffed cheaply. Canonical form is:
+
+- Object keys are sorted (by unicode code point).
+- Numbers are formatted as the shortest string which round-trips to the same IEEE 754 double. Integral values below
+  1e16 are written without a fractional part, so `22000`, `22000.0` and `numpy.float32(22000)` all serialize as
+  `22000`, and `-0.0` serializes as `0`. Non-finite numbers are not valid JSON and raise a ValueError.
+- Strings are written as UTF-8, escaping only what JSON requires.
+- Numpy arrays are written directly from their buffers, and produce the same output as the equivalent nested lists.
+
+Two layouts are available: compact (`indent=None`, no whitespace at all) or pretty-printed (`indent=<int>`), in
+which arrays of numbers are kept on a single line for readability.
+
+Documents are parsed with `load` or `loads`, which are `json.load` and `json.loads` instrumented with the size and
+contents of each document (see `instrumentation.py`). With `arrays=True`, they give curve arrays as numpy arrays, each
+converted as soon as the object containing it is parsed, and parse large arrays piece by piece, so the python floats of
+a whole large array never exist at once.
+"""
+
+import hashlib
+import json.encoder
+import math
+import re
+
+import numpy as np
+
+from .instrumentation import document_stats, span
+
+# Use the C-accelerated string encoder where available
+_encode_string = json.encoder.encode_basestring
+
+_MAX_EXACT_INTEGER = 1e16
+
+
+def _format_float(value):
+    """Format a float as the shortest round-trip representation, dropping the fractional part of integral values"""
+    if value != value or value in (float("inf"), float("-inf")):
+        raise ValueError(f"Out of range float values are not JSON compliant: {value!r}")
+    if value.is_integer() and abs(value) < _MAX_EXACT_INTEGER:
+        return "%d" % value
+    return float.__repr__(value)
+
+
+def _format_number(value):
+    """Format a python or numpy number canonically, raising TypeError if the value isn't a number"""
+    if isinstance(value, float):
+        return _format_float(value)
+    if isinstance(value, (bool, np.bool_)):
+        raise TypeError("Booleans are not numbers")
+    if isinstance(value, (int, np.integer)):
+        if abs(value) < _MAX_EXACT_INTEGER:
+            return "%d" % value
+        return _format_float(float(value))
+    if isinstance(value, np.floating):
+        return _format_float(float(value))
+    raise TypeError(f"{value!r} is not a number")
+
+
+def _format_numbers(values, separator):
+    """Format a sequence of numbers canonically and join them, raising TypeError if any value isn't a number.
+
+    Sequences of python floats (the overwhelmingly common case for curve arrays, including memoryviews of float64 array
+    buffers) are formatted with C-level string operations, rather than one python call per value.
+    """
+    try:
+        text = ",".join(map(float.__repr__, values))
+    except TypeError:
+        text = ",".join(map(_format_number, values))
+    else:
+        if "n" in text:
+            raise ValueError(f"Out of range float values are not JSON compliant: [{text}]")
+        # Drop the fractional part of integral values (repr uses exponent notation above 1e16, so never ends ".0")
+        text = (text + ",").replace(".0,", ",")[:-1]
+        if text.startswith("-0,") or text == "-0" or ",-0," in text or text.endswith(",-0"):
+            text = ",".join("0" if item == "-0" else item for item in text.split(","))
+
+    if separator != ",":
+        text = text.replace(",", separator)
+    return text
+
+
+def _encode_ndarray(array, indent, level, write):
+    """Encode a numpy array, formatting each innermost row by iterating over the array buffer (so without building a
+    list of its values). Arrays of other than numbers (eg booleans) are encoded as nested lists."""
+    if array.dtype.kind == "f":
+        array = array.astype(np.float64, copy=False)
+    elif array.dtype.kind in "iu":
+        # Buffers of non-native byte order can't be iterated over
+        array = array.astype(array.dtype.newbyteorder("="), copy=False)
+    else:
+        _encode(array.tolist(), indent, level, write)
+        return
+
+    if array.ndim == 0:
+        write(_format_number(array.item()))
+        return
+
+    if array.ndim == 1:
+        write("[" + _format_numbers(memoryview(np.ascontiguousarray(array)), "," if indent is None else ", ") + "]")
+        return
+
+    if len(array) == 0:
+        write("[]")
+        return
+
+    opening, separator, closing = _delimiters("[", "]", indent, level)
+    write(opening)
+    for i, sub_array in enumerate(array):
+        if i:
+            write(separator)
+        _encode_ndarray(sub_array, indent, level + 1, write)
+    write(closing)
+
+
+def _delimiters(opening, closing, indent, level):
+    """Get the opening, item separator and closing strings for a container at the given nesting level"""
+    if indent is None:
+        return opening, ",", closing
+    return (
+        opening + "\n" + " " * (indent * (level + 1)),
+        ",\n" + " " * (indent * (level + 1)),
+        "\n" + " " * (indent * level) + closing,
+    )
+
+
+def _encode(obj, indent, level, write):
+    """Recursively write the chunks of the canonical encoding of obj"""
+    # pylint: disable=too-many-branches
+    if isinstance(obj, str):
+        write(_encode_string(obj))
+
+    elif obj is None:
+        write("null")
+
+    elif obj is True or obj is False or isinstance(obj, np.bool_):
+        write("true" if obj else "false")
+
+    elif isinstance(obj, (int, float, np.number)):
+        write(_format_number(obj))
+
+    elif isinstance(obj, np.ndarray):
+        _encode_ndarray(obj, indent, level, write)
+
+    elif isinstance(obj, dict):
+        if not obj:
+            write("{}")
+            return
+
+        opening, separator, closing = _delimiters("{", "}", indent, level)
+        colon = ":" if indent is None else ": "
+        write(opening)
+        for i, key in enumerate(sorted(obj)):
+            if not isinstance(key, str):
+                raise TypeError(f"Keys must be strings, not {type(key).__name__}")
+            if i:
+                write(separator)
+            write(_encode_string(key) + colon)
+            _encode(obj[key], indent, level + 1, write)
+        write(closing)
+
+    elif isinstance(obj, (list, tuple)):
+        if not obj:
+            write("[]")
+            return
+
+        # Fast path for arrays of numbers, which are kept on one line
+        try:
+            formatted = _format_numbers(obj, "," if indent is None else ", ")
+        except TypeError:
+            pass
+        else:
+            write("[" + formatted + "]")
+            return
+
+        opening, separator, closing = _delimiters("[", "]", indent, level)
+        write(opening)
+        for i, item in enumerate(obj):
+            if i:
+                write(separator)
+            _encode(item, indent, level + 1, write)
+        write(closing)
+
+    else:
+        raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+class _BufferedWriter:
+    """Accumulate chunks, passing them on to a sink in large joined blocks"""
+
+    def __init__(self, sink, buffer_size):
+        self.sink = sink
+        self.buffer_size = buffer_size
+        self.chunks = []
+        self.size = 0
+
+    def write(self, chunk):
+        self.chunks.append(chunk)
+        self.size += len(chunk)
+        if self.size >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        self.sink("".join(self.chunks))
+        self.chunks = []
+        self.size = 0
+
+
+def dumps(obj, indent=None):
+    """Serialize obj to a canonical JSON string.
+
+    Args:
+        obj: The document (or any JSON-compatible object, which may contain numpy arrays and scalars) to encode
+        indent: None for compact output, or the number of spaces to indent each level for pretty-printed output
+
+    Returns:
+        The canonical JSON string
+    """
+    chunks = []
+    _encode(obj, indent, 0, chunks.append)
+    return "".join(chunks)
+
+
+def dump(obj, fp, indent=None, buffer_size=65536):
+    """Serialize obj as canonical JSON to a text file-like object, streaming it out in buffered blocks.
+
+    Args:
+        obj: The object to serialize
+        fp: A file-like object opened in text mode (use encoding="utf-8")
+        indent: None for compact output, or the number of spaces to indent each level for pretty-printed output
+        buffer_size: The approximate number of characters to accumulate between writes
+    """
+    writer = _BufferedWriter(fp.write, buffer_size)
+    _encode(obj, indent, 0, writer.write)
+    writer.flush()
+
+
+def content_hash(obj, algorithm="sha256"):
+    """Compute a hex digest of the compact canonical encoding of obj, streaming it into the hash"""
+    digest = hashlib.new(algorithm)
+    writer = _BufferedWriter(lambda block: digest.update(block.encode("utf-8")), 65536)
+    _encode(obj, None, 0, writer.write)
+    writer.flush()
+    return digest.hexdigest()
+
+
+# Properties whose values are arrays of numbers (of any dimension), which `loads` can give as numpy arrays
+ARRAY_FIELDS = ("power", "thrust_coefficient", "rotor_rpm", "sound_power_level", "values", "temperature", "power_limit")
+
+# An array field as an object member, up to the opening bracket of its value. Matches must also be preceded by the
+# start of an object or another member (so that they can't be inside a string), which is checked separately so that the
+# pattern starts with a literal, to scan fast.
+_ARRAY_KEY = re.compile(rb'"(?:' + "|".join(ARRAY_FIELDS).encode() + rb')"[ \t\n\r]*:[ \t\n\r]*(?=\[)')
+_BEFORE_KEY = b"{, \t\n\r"
+_EMPTY_ARRAY = re.compile(rb"[\[ \t\n\r]*\]")
+
+# Arrays whose text is at least this long are parsed piece by piece, into a numpy array, rather than as a whole list
+LARGE_ARRAY_BYTES = 1 << 20
+
+# Large arrays are parsed in pieces of about this many bytes (cut before a comma), so only the python floats of one
+# piece exist at once
+_PIECE_BYTES = 1 << 18
+
+_WHITESPACE = b" \t\n\r"
+_SKELETON_DELETE = b"0123456789.eE+-" + _WHITESPACE
+# Brackets are replaced by spaces (rather than removed) in the numbers of a piece, so they still separate numbers
+_FLATTEN = bytes.maketrans(b"[]", b"  ")
+
+# Placeholders for large arrays (in strings, so the remaining JSON can be parsed as usual), followed by their index
+_PLACEHOLDER = "\u0000ndarray:"
+
+_ARRAY_FIELD_SET = frozenset(ARRAY_FIELDS)
+
+
+def _nested_shape(skeleton):
+    """Get the shape of a regular nested array of numbers from its skeleton (its brackets and commas), or None if it's
+    ragged
+    """
+    depth = len(skeleton) - len(skeleton.lstrip(b"["))
+    # The innermost first array, then the first array at each outer level, ends where one more bracket closes
+    shape = [skeleton[: skeleton.find(b"]")].count(b",") + 1]
+    for level in range(1, depth):
+        end = skeleton.find(b"]" * (level + 1))
+        shape.insert(0, skeleton[:end].count(b"]" * level + b",") + 1)
+
+    expected = b"[" + b"," * (shape[-1] - 1) + b"]"
+    for size in reversed(shape[:-1]):
+        expected = b"[" + b",".join([expected] * size) + b"]"
+    return tuple(shape) if expected == skeleton else None
+
+
+def _parse_large_array(data, start, stop):
+    """Parse the text of a large (non-empty) array piece by piece into a float64 array, or None if it isn't a regular
+    N-D array of numbers. Each piece's numbers are parsed (and checked) by the JSON parser.
+    """
+    cuts = [start]
+    while cuts[-1] + _PIECE_BYTES < stop:
+        cut = data.find(b",", cuts[-1] + _PIECE_BYTES, stop)
+        if cut < 0:
+            break
+        cuts.append(cut)
+    cuts.append(stop)
+    # The pieces after the first start after the comma they were cut before
+    pieces = list(zip([start] + [cut + 1 for cut in cuts[1:-1]], cuts[1:]))
+
+    shape = _nested_shape(b",".join(data[lower:upper].translate(None, _SKELETON_DELETE) for lower, upper in pieces))
+    if shape is None:
+        return None
+    array = np.empty(math.prod(shape))
+    size = 0
+    for lower, upper in pieces:
+        try:
+            values = json.loads(b"[" + data[lower:upper].translate(_FLATTEN) + b"]")
+        except ValueError:
+            return None
+        if size + len(values) > array.size:
+            return None
+        try:
+            array[size : size + len(values)] = values
+        except (TypeError, ValueError):
+            # Anything other than numbers
+            return None
+        size += len(values)
+    return array.reshape(shape) if size == array.size else None
+
+
+def _large_array_spans(data):
+    """Find the (start, stop) spans of the values of `ARRAY_FIELDS` members which may be large arrays of numbers"""
+    spans = []
+    match = _ARRAY_KEY.search(data)
+    while match:
+        start = match.end()
+        # Arrays of numbers can't contain quotes or braces, so end before the next (after a comma, or closing an object)
+        end = min(position for position in (data.find(b'"', start), data.find(b"}", start), len(data)) if position >= 0)
+        if end - start >= LARGE_ARRAY_BYTES and data[match.start() - 1] in _BEFORE_KEY:
+            stop = end
+            while data[stop - 1] in _WHITESPACE + b",":
+                stop -= 1
+            # Anything else (eg an array of objects) is left to the JSON parser
+            if data[stop - 1] == ord("]") and not _EMPTY_ARRAY.match(data, start):
+                spans.append((start, stop))
+        match = _ARRAY_KEY.search(data, end)
+    return spans
+
+
+def _list_to_ndarray(value, booleans):
+    """Convert a list parsed from JSON to a float64 array, or None if it isn't a regular N-D array of numbers"""
+    try:
+        array = np.asarray(value)
+    except (ValueError, OverflowError):
+        # Ragged arrays, and integers too large for numpy
+        return None
+    if array.dtype.kind not in "iuf" or array.size == 0:
+        return None
+    # Numpy converts booleans mixed with numbers to numbers, so these are only found by checking each item
+    if booleans and _contains_booleans(value):
+        return None
+    return array.astype(np.float64, copy=False)
+
+
+def _contains_booleans(value):
+    return any(item is True or item is False or (isinstance(item, list) and _contains_booleans(item)) for item in value)
+
+
+def _loads_arrays(text):
+    """Parse JSON, parsing the values of `ARRAY_FIELDS` which are regular arrays of numbers into numpy arrays"""
+    arrays = []
+    if len(text) >= LARGE_ARRAY_BYTES:
+        data = text.encode("utf-8", "surrogatepass") if isinstance(text, str) else bytes(text)
+        segments, position = [], 0
+        for start, stop in _large_array_spans(data):
+            array = _parse_large_array(data, start, stop)
+            # Anything that can't be parsed here is left to the JSON parser (to parse as lists, or to report as invalid)
+            if array is not None:
+                segments.append(data[position:start])
+                segments.append(b'"\\u0000ndarray:%d"' % len(arrays))
+                position = stop
+                arrays.append(array)
+        if arrays:
+            segments.append(data[position:])
+            text = b"".join(segments)
+    true, false = ("true", "false") if isinstance(text, str) else (b"true", b"false")
+    booleans = true in text or false in text
+
+    def object_hook(obj):
+        # Convert arrays as each object is parsed, so the lists of only one object exist at once
+        if _ARRAY_FIELD_SET.isdisjoint(obj):
+            return obj
+        for key in _ARRAY_FIELD_SET.intersection(obj):
+            value = obj[key]
+            if isinstance(value, list):
+                array = _list_to_ndarray(value, booleans)
+                if array is not None:
+                    obj[key] = array
+            elif arrays and isinstance(value, str) and value.startswith(_PLACEHOLDER):
+                obj[key] = arrays[int(value[len(_PLACEHOLDER) :])]
+        return obj
+
+    return json.loads(text, object_hook=object_hook)
+
+
+def loads(text, arrays=False):
+    """Parse a JSON document from a string (or bytes), as `json.loads`, instrumented as a `json.parse` span.
+
+    Args:
+        text: The JSON text
+        arrays: If True, give curve arrays and other arrays of numbers (the values of `ARRAY_FIELDS` properties, if
+            they're regular N-D arrays) as float64 numpy arrays, rather than lists of python floats. Numbers are still
+            parsed by the JSON parser (which numpy's text parsing can't outpace), so this takes about as long as
+            `json.loads` followed by converting the arrays, but for documents with large curves it needs a fraction of
+            the memory, both at peak and once parsed (see `LARGE_ARRAY_BYTES`). It also makes validation with
+            `fast_validation.is_valid` several times faster. Ragged, empty or non-numeric arrays are parsed as lists.
+
+    Returns:
+        The parsed document
+    """
+    with span("json.parse", bytes=len(text)) as active:
+        if arrays:
+            obj = _loads_arrays(text)
+        else:
+            obj = json.loads(text)
+        if active:
+            active.set(**document_stats(obj))
+    return obj
+
+
+def load(fp, arrays=False):
+    """Parse a JSON document from a file-like object, as `loads`"""
+    return loads(fp.read(), arrays=arrays)
@@ -0,0 +1,299 @@
+"""
+Shared.py
+
+Curve tables in shared memory, for pools of processes (eg wind farm simulation workers) which all evaluate the same
+documents.
+
+Without sharing, every worker loads the same documents and converts the same curve arrays, so memory grows with the
+number of workers. Instead, the parent process publishes each document once to a `SharedCurveTables` registry, which
+converts the curve arrays (power, thrust coefficient and rotor speed) and axis grids of its operating modes into one
+named shared memory segment. The small, picklable `SharedDocument` handle it returns is sent to the workers, which
+`attach` it to get the document with its arrays as read-only numpy views onto the segment, copying nothing. Attached
+documents can be used wherever a document can (eg by `FarmEvaluator` or `ModeInterpolant`), so memory per worker stays
+flat as the pool grows.
+
+Segments are named by the registry and the content they hold, so publishing the same document again reuses its
+segment. The registry counts references to each segment, unlinking it once it has been released as many times as it
+was published, or when the registry is closed. Attachments are counted within each process: attaching a handle again
+returns the same document, and the process's mapping of the segment is closed once it has been detached as many times.
+On POSIX systems, workers which are still attached when a segment is unlinked keep their mapping until they detach.
+
+Example:
+
+    with SharedCurveTables() as tables:
+        handle = tables.publish(doc)
+        with multiprocessing.Pool() as pool:
+            pool.map(simulate, [(handle, case) for case in cases])
+
+    def simulate(args):
+        handle, case = args
+        doc = attach(handle)  # The same document for every task run by this worker
+        evaluator = FarmEvaluator([(doc, "mode_1", 140.0)] * 100)
+        ...
+"""
+
+import copy
+import hashlib
+import secrets
+import sys
+import threading
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+from .arrays import BUCKET_DTYPE, CURVE_FIELDS, axis_coordinates, to_ndarray
+from .serialization import content_hash
+
+# Prefix of the names of shared memory segments (names are kept under 31 characters, the limit on macOS)
+SEGMENT_PREFIX = "pcs_"
+
+# Alignment of each array in a segment [bytes], a cache line
+_ALIGNMENT = 64
+
+
+class SharedDocument:
+    """A picklable handle to a document published by `SharedCurveTables`, to send to worker processes to `attach`.
+
+    Attributes:
+        name: The name of the shared memory segment holding the document's arrays
+        size: The size of the segment [bytes]
+        skeleton: The document without its published arrays
+        layout: A tuple of (mode index, key, dtype, shape, offset) for each array in the segment, where the key is a
+            curve field, or the index of an axis parameter (for its `values`)
+    """
+
+    __slots__ = ("name", "size", "skeleton", "layout")
+
+    def __init__(self, name, size, skeleton, layout):
+        self.name = name
+        self.size = size
+        self.skeleton = skeleton
+        self.layout = layout
+
+    def __repr__(self):
+        return f"SharedDocument(name={self.name!r}, size={self.size}, arrays={len(self.layout)})"
+
+    def build(self, buffer):
+        """Build the document, with read-only array views onto a buffer holding the segment.
+
+        Args:
+            buffer: The buffer of the shared memory segment (or of a copy of it)
+
+        Returns:
+            A new document dict, whose published arrays are views onto the buffer
+        """
+        doc = copy.deepcopy(self.skeleton)
+        modes = doc["power_curves"]["operating_modes"]
+        for index, key, dtype, shape, offset in self.layout:
+            array = np.ndarray(shape, dtype=np.dtype(dtype), buffer=buffer, offset=offset)
+            array.setflags(write=False)
+            if isinstance(key, int):
+                modes[index]["parameters"][key]["values"] = array
+            else:
+                modes[index][key] = array
+        return doc
+
+
+def _mode_arrays(mode):
+    """Get the arrays of an operating mode to publish, as (key, array), where keys are as in `SharedDocument.layout`"""
+    arrays = [(field, to_ndarray(mode[field])) for field in CURVE_FIELDS if field in mode]
+    for position, parameter in enumerate(mode["parameters"]):
+        if "axis" in parameter:
+            coordinates = axis_coordinates(parameter["values"])
+            # Buckets are left in the skeleton, as the code using them expects {min, max} dicts
+            if coordinates.dtype != BUCKET_DTYPE:
+                arrays.append((position, coordinates))
+    return arrays
+
+
+def _split_document(doc, labels):
+    """Split a document into a skeleton (sharing all but the modes' containers with the document) and its arrays"""
+    modes = []
+    arrays = []
+    for index, mode in enumerate(doc["power_curves"]["operating_modes"]):
+        if labels is not None and mode["label"] not in labels:
+            modes.append(mode)
+            continue
+        mode_arrays = _mode_arrays(mode)
+        published = {key for key, _ in mode_arrays}
+        skeleton = {key: value for key, value in mode.items() if key not in CURVE_FIELDS}
+        skeleton["parameters"] = [
+            {key: value for key, value in parameter.items() if key != "values" or position not in published}
+            for position, parameter in enumerate(mode["parameters"])
+        ]
+        modes.append(skeleton)
+        arrays.extend((index, key, array) for key, array in mode_arrays)
+    return {**doc, "power_curves": {**doc["power_curves"], "operating_modes": modes}}, arrays
+
+
+def _open_segment(name):
+    """Attach to an existing shared memory segment, without registering it for cleanup by this process"""
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=False)  # pylint: disable=unexpected-keyword-arg
+
+    # Before python 3.13, attaching registers the segment with the resource tracker, which would unlink it (or warn of
+    # a leak) when this process exits, although it belongs to the publishing registry
+    segment = shared_memory.SharedMemory(name=name)
+    resource_tracker.unregister(segment._name, "shared_memory")  # pylint: disable=protected-access
+    return segment
+
+
+class SharedCurveTables:
+    """A registry of documents whose curve arrays are published in shared memory, for worker processes to attach to.
+
+    The registry owns its segments: they're unlinked when released as many times as they were published, or when the
+    registry is closed (including on leaving a `with` block), so it should outlive the workers' use of them.
+
+    Args:
+        prefix: The prefix of segment names, followed by a random token for the registry and the content hash
+    """
+
+    def __init__(self, prefix=SEGMENT_PREFIX):
+        self.prefix = prefix + secrets.token_hex(4) + "_"
+        self._segments = {}
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __len__(self):
+        return len(self._segments)
+
+    def __contains__(self, handle):
+        return handle.name in self._segments
+
+    def publish(self, doc, labels=None):
+        """Publish the curve arrays of the operating modes of a document to shared memory, or reuse them if published.
+
+        Args:
+            doc: A power curve document, whose curve arrays may be nested lists or numpy arrays
+            labels: Labels of the operating modes to publish, defaulting to all of them (other modes are kept in the
+                skeleton as they are)
+
+        Returns:
+            A `SharedDocument` handle, to send to worker processes to `attach`
+        """
+        digest = hashlib.sha256(content_hash(doc).encode("ascii"))
+        if labels is not None:
+            labels = sorted(labels)
+            digest.update(repr(labels).encode("utf-8"))
+        name = self.prefix + digest.hexdigest()[:16]
+
+        with self._lock:
+            entry = self._segments.get(name)
+            if entry is not None:
+                entry[2] += 1
+                return entry[1]
+
+            skeleton, arrays = _split_document(doc, labels)
+            layout = []
+            size = 0
+            for index, key, array in arrays:
+                offset = -(-size // _ALIGNMENT) * _ALIGNMENT
+                layout.append((index, key, array.dtype.str, array.shape, offset))
+                size = offset + array.nbytes
+
+            segment = shared_memory.SharedMemory(name=name, create=True, size=max(size, 1))
+            try:
+                for (_, _, array), (_, _, dtype, shape, offset) in zip(arrays, layout):
+                    np.ndarray(shape, dtype=dtype, buffer=segment.buf, offset=offset)[...] = array
+            except BaseException:
+                segment.close()
+                segment.unlink()
+                raise
+
+            handle = SharedDocument(name, size, skeleton, tuple(layout))
+            self._segments[name] = [segment, handle, 1]
+            return handle
+
+    def release(self, handle):
+        """Release one reference to a published document, unlinking its segment when none remain.
+
+        Args:
+            handle: A handle returned by `publish`
+
+        Raises:
+            KeyError: If the document isn't published by this registry (or has been released already)
+        """
+        with self._lock:
+            entry = self._segments[handle.name]
+            entry[2] -= 1
+            if entry[2] == 0:
+                del self._segments[handle.name]
+                _destroy(entry[0])
+
+    def close(self):
+        """Unlink all segments published by this registry, whatever their reference counts"""
+        with self._lock:
+            segments, self._segments = self._segments, {}
+        for segment, _, _ in segments.values():
+            _destroy(segment)
+
+
+def _destroy(segment):
+    """Close and unlink a segment owned by a registry"""
+    segment.close()
+    segment.unlink()
+
+
+# The segments attached to by this process, by name, as [segment, document, count]
+_attached = {}
+_attached_lock = threading.Lock()
+
+
+def attach(handle):
+    """Get a published document, whose curve arrays are read-only views onto its shared memory segment.
+
+    Attaching is counted, so that each call should be matched by a call to `detach`. Attaching to the same segment again
+    in a process returns the same document, so caches keyed by document (eg effective modes) are shared too.
+
+    Args:
+        handle: A `SharedDocument` handle, from `SharedCurveTables.publish`
+
+    Returns:
+        The document. Don't modify its arrays' containers, as the document is shared by all attachments in this process.
+
+    Raises:
+        FileNotFoundError: If the segment doesn't exist, eg because its registry has released it
+    """
+    with _attached_lock:
+        entry = _attached.get(handle.name)
+        if entry is None:
+            segment = _open_segment(handle.name)
+            entry = _attached[handle.name] = [segment, handle.build(segment.buf), 0]
+        entry[2] += 1
+        return entry[1]
+
+
+def detach(handle):
+    """Release one attachment of this process to a published document, closing its mapping when none remain.
+
+    The mapping can only be closed once no arrays viewing it are referenced (eg by a `FarmEvaluator`); otherwise it's
+    left to be closed when the process exits.
+
+    Args:
+        handle: A `SharedDocument` handle, previously passed to `attach`
+
+    Raises:
+        KeyError: If this process isn't attached to the document
+    """
+    with _attached_lock:
+        entry = _attached[handle.name]
+        entry[2] -= 1
+        if entry[2] > 0:
+            return
+        segment = _attached.pop(handle.name)[0]
+
+    try:
+        segment.close()
+    except BufferError:
+        pass
+
+
+def attached():
+    """Get the names of the segments this process is attached to, with their attachment counts"""
+    with _attached_lock:
+        return {name: entry[2] for name, entry in _attached.items()}
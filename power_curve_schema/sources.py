@@ -0,0 +1,39 @@
+"""
+Sources.py
+
+Loading the documents of a corpus from their sources (documents already in memory, paths to JSON documents or paths to
+chunked stores), as the tools which index or flatten a corpus take them, and identifying the documents loaded.
+"""
+
+import os
+
+
+def document_identifier(doc):
+    """Get the value of the first `Identifier` in a document's metadata, or None if it has none"""
+    for item in doc.get("document", {}).get("metadata", []):
+        if item.get("term") == "Identifier":
+            return item["value"]
+    return None
+
+
+def load_source(source):
+    """Load a document from a source: a document (a dict, returned as is), or a path to a JSON document or a chunked
+    store"""
+    if isinstance(source, dict):
+        return source
+    if os.path.isdir(source):
+        from .chunked import import_document  # pylint: disable=import-outside-toplevel
+
+        return import_document(source)
+
+    from .serialization import load  # pylint: disable=import-outside-toplevel
+
+    with open(source, "r", encoding="utf-8") as fp:
+        return load(fp)
+
+
+def iter_sources(sources):
+    """Load each of a sequence of sources in turn, as (name, document), named by their paths (or their positions in the
+    sequence, for dicts)"""
+    for position, source in enumerate(sources):
+        yield position if isinstance(source, dict) else os.fspath(source), load_source(source)
@@ -0,0 +1,412 @@
+"""
+Surrogate.py
+
+Smooth, compact surrogates of the curve arrays of operating modes, for optimization loops (eg of wind farm layout or
+control) which evaluate power and thrust, with gradients, very many times.
+
+A surrogate is a tensor product of cubic Hermite interpolants over the axes of a mode. Along each axis, the values and
+slopes at a set of knots define a cubic on each interval, so that values and first derivatives are continuous (unlike
+multilinear interpolation of the table, whose derivatives jump at every grid point). Slopes along each axis are either:
+
+- `monotone` (the default): the Fritsch-Carlson (PCHIP) slopes, which avoid overshooting the tabulated values, so that
+  eg power stays flat at rated power, and never dips before it
+- `spline`: the slopes of a natural cubic spline, which also has continuous second derivatives, but may overshoot near
+  sharp corners (eg at rated power or cut-out)
+
+With N axes, each knot holds 2^N coefficients: the value, the slopes along each axis, and the mixed derivatives, which
+are found by applying each axis's slope operator in turn. Evaluation gathers the coefficients at the corners of the
+cell containing each point, and weights them by products of the (analytically differentiable) Hermite basis functions.
+
+By default the knots are the grid points of the mode, so surrogates reproduce the table exactly at those points. Given
+a tolerance for each field, knots are chosen greedily from the grid points instead, starting from the ends of each axis
+and adding the coordinates of the worst-fitting grid point until every field is within its tolerance, giving a more
+compact surrogate. Each surrogate records the maximum absolute error of each field against the source table, over all
+of its grid points.
+
+Surrogates are serialized as JSON (with losslessly encoded coefficients, see `encoding.py`), either into the document's
+`additional.data` or into a sidecar file.
+
+Example:
+
+    from power_curve_schema.surrogate import fit_mode
+
+    surrogate = fit_mode(mode, tolerance={"power": 1000.0, "thrust_coefficient": 1e-3})
+    surrogate.max_error  # {"power": 812.5, "thrust_coefficient": 0.00071}
+    power, gradient = surrogate.gradient({"air-density": rho, "wind-speed": speeds})
+    gradient["wind-speed"]  # d(power)/d(wind speed), the shape of the points
+"""
+
+import itertools
+
+import numpy as np
+
+from .arrays import BUCKET_DTYPE, axis_coordinates, axis_parameters, mode_shape, to_ndarray
+from .encoding import decode_array, encode_array, is_encoded
+from .farm import DEFAULT_FIELDS, find_mode
+from .interpolation import OUT_OF_BOUNDS
+from .serialization import dump, load
+
+METHODS = ("monotone", "spline")
+
+# The number of terms summed for each point grows as 4^N with the number of axes, so surrogates are limited to a few
+MAX_AXES = 4
+
+# The key of surrogates (by operating mode label) in a document's `additional.data`
+ADDITIONAL_DATA_KEY = "curve_surrogates"
+
+_TYPE = "cubic-hermite"
+
+
+def _monotone_slopes(x, y):
+    """Get the Fritsch-Carlson (PCHIP) slopes of values along their first axis at points x, as scipy's PCHIP"""
+    h = np.diff(x).reshape((-1,) + (1,) * (y.ndim - 1))
+    delta = np.diff(y, axis=0) / h
+    slopes = np.zeros_like(y)
+    if x.size == 2:
+        slopes[:] = delta
+        return slopes
+
+    # Interior slopes are weighted harmonic means of the secants either side, or zero at extrema and flats
+    w1 = 2 * h[1:] + h[:-1]
+    w2 = h[1:] + 2 * h[:-1]
+    same_sign = np.sign(delta[:-1]) * np.sign(delta[1:]) > 0
+    with np.errstate(divide="ignore", invalid="ignore"):
+        harmonic = (w1 + w2) / (w1 / delta[:-1] + w2 / delta[1:])
+    slopes[1:-1] = np.where(same_sign, harmonic, 0.0)
+
+    # End slopes from a three-point estimate, limited to keep the ends monotone
+    for end, (h0, h1, d0, d1) in ((0, (h[0], h[1], delta[0], delta[1])), (-1, (h[-1], h[-2], delta[-1], delta[-2]))):
+        slope = ((2 * h0 + h1) * d0 - h0 * d1) / (h0 + h1)
+        slope = np.where(np.sign(slope) != np.sign(d0), 0.0, slope)
+        slope = np.where((np.sign(d0) != np.sign(d1)) & (np.abs(slope) > np.abs(3 * d0)), 3 * d0, slope)
+        slopes[end] = slope
+    return slopes
+
+
+def _spline_slopes(x, y):
+    """Get the slopes of the natural cubic spline through values along the first axis, at points x"""
+    h = np.diff(x)
+    delta = np.diff(y, axis=0) / h.reshape((-1,) + (1,) * (y.ndim - 1))
+    n = x.size
+    matrix = np.zeros((n, n))
+    rhs = np.zeros_like(y)
+    matrix[0, :2] = (2, 1)
+    rhs[0] = 3 * delta[0]
+    matrix[-1, -2:] = (1, 2)
+    rhs[-1] = 3 * delta[-1]
+    for i in range(1, n - 1):
+        matrix[i, i - 1 : i + 2] = (h[i], 2 * (h[i - 1] + h[i]), h[i - 1])
+        rhs[i] = 3 * (h[i] * delta[i - 1] + h[i - 1] * delta[i])
+    return np.linalg.solve(matrix, rhs.reshape(n, -1)).reshape(y.shape)
+
+
+_SLOPES = {"monotone": _monotone_slopes, "spline": _spline_slopes}
+
+
+def _coefficients(knots, values, method):
+    """Get the Hermite coefficients of an N-D array of values at the knots, of shape values.shape + (2,) * N"""
+    dimensions = len(knots)
+    coefficients = np.zeros(values.shape + (2,) * dimensions)
+    coefficients[(...,) + (0,) * dimensions] = values
+    for axis, x in enumerate(knots):
+        if x.size < 2:
+            continue
+        # Differentiate every coefficient found so far (those not yet differentiated along this axis)
+        for orders in itertools.product((0, 1), repeat=axis):
+            source = (...,) + orders + (0,) + (0,) * (dimensions - axis - 1)
+            target = (...,) + orders + (1,) + (0,) * (dimensions - axis - 1)
+            slopes = _SLOPES[method](x, np.moveaxis(coefficients[source], axis, 0))
+            coefficients[target] = np.moveaxis(slopes, 0, axis)
+    return coefficients
+
+
+def _basis(knots, x):
+    """Get the interval of each value along an axis, and the Hermite basis functions and their derivatives there.
+
+    Returns:
+        The lower knot indices, and a list of (corner, order, weight, derivative of weight) for the non-zero basis
+        functions (value and slope, at the lower and upper knot) on each interval
+    """
+    if knots.size == 1:
+        return np.zeros(x.shape, dtype=np.intp), [(0, 0, np.ones(x.shape), np.zeros(x.shape))]
+
+    lower = np.clip(np.searchsorted(knots, x, side="right") - 1, 0, knots.size - 2)
+    h = knots[lower + 1] - knots[lower]
+    t = np.clip((x - knots[lower]) / h, 0.0, 1.0)
+    # Outside the knots the surrogate holds its end values, so has no gradient along the axis
+    inside = (x >= knots[0]) & (x <= knots[-1])
+    t2 = t * t
+    t3 = t2 * t
+    return lower, [
+        (0, 0, 2 * t3 - 3 * t2 + 1, np.where(inside, (6 * t2 - 6 * t) / h, 0.0)),
+        (1, 0, 3 * t2 - 2 * t3, np.where(inside, (6 * t - 6 * t2) / h, 0.0)),
+        (0, 1, (t3 - 2 * t2 + t) * h, np.where(inside, 3 * t2 - 4 * t + 1, 0.0)),
+        (1, 1, (t3 - t2) * h, np.where(inside, 3 * t2 - 2 * t, 0.0)),
+    ]
+
+
+class Surrogate:
+    """A smooth surrogate of the curve arrays of an operating mode, evaluated in batches with analytic gradients.
+
+    Use `fit_mode` (or `fit_document`) to fit surrogates, or `from_json` to load them.
+
+    Args:
+        label: The operating mode label
+        labels: The labels of the axes, in order
+        knots: The (increasing) knots along each axis
+        coefficients: A dict of arrays of Hermite coefficients by field, each of shape (knots per axis) + (2,) * N
+        method: One of `METHODS`, the method the slopes were found by
+        max_error: A dict of the maximum absolute error of each field against the source table
+        out_of_bounds: "clip" (the default) to hold the end values outside the knots, or "raise" to raise a ValueError
+    """
+
+    __slots__ = ("label", "labels", "knots", "coefficients", "method", "max_error", "out_of_bounds", "_flat")
+
+    def __init__(self, label, labels, knots, coefficients, method, max_error, out_of_bounds="clip"):
+        if out_of_bounds not in OUT_OF_BOUNDS:
+            raise ValueError(f"Unknown out_of_bounds option '{out_of_bounds}', must be one of {OUT_OF_BOUNDS}")
+        self.label = label
+        self.labels = tuple(labels)
+        self.knots = tuple(np.asarray(x, dtype=np.float64) for x in knots)
+        self.coefficients = dict(coefficients)
+        self.method = method
+        self.max_error = dict(max_error)
+        self.out_of_bounds = out_of_bounds
+        self._flat = {field: np.ascontiguousarray(array).ravel() for field, array in self.coefficients.items()}
+
+    @property
+    def fields(self):
+        """The curve fields the surrogate represents"""
+        return tuple(self.coefficients)
+
+    def _evaluate(self, points, field, gradient):
+        try:
+            flat = self._flat[field]
+        except KeyError:
+            raise KeyError(f"The surrogate of operating mode '{self.label}' has no {field} field") from None
+        try:
+            values = np.broadcast_arrays(*(np.asarray(points[label], dtype=np.float64) for label in self.labels))
+        except KeyError as e:
+            raise KeyError(f"Operating mode '{self.label}' needs a value for parameter {e}") from None
+
+        dimensions = len(self.labels)
+        # Strides into the flattened coefficients, for the knot index along each axis and for the derivative orders
+        shape = tuple(x.size for x in self.knots)
+        strides = [int(np.prod(shape[axis + 1 :])) << dimensions for axis in range(dimensions)]
+        order_strides = [1 << (dimensions - axis - 1) for axis in range(dimensions)]
+
+        base = 0
+        bases = []
+        for x, value, label, stride in zip(self.knots, values, self.labels, strides):
+            if self.out_of_bounds == "raise" and (np.any(value < x[0]) or np.any(value > x[-1])):
+                raise ValueError(
+                    f"Cannot evaluate the surrogate of operating mode '{self.label}' at values of {label} outside "
+                    f"the range [{x[0]}, {x[-1]}] (use out_of_bounds='clip' to extend the end values)"
+                )
+            lower, functions = _basis(x, value)
+            base = base + lower * stride
+            bases.append(functions)
+
+        result = np.zeros(values[0].shape if values else ())
+        gradients = [np.zeros_like(result) for _ in range(dimensions)] if gradient else None
+        for terms in itertools.product(*bases):
+            index = base
+            weight = 1.0
+            for (corner, order, basis, _), stride, order_stride in zip(terms, strides, order_strides):
+                index = index + (corner * stride + order * order_stride)
+                weight = weight * basis
+            sample = np.take(flat, index)
+            result += sample * weight
+            if gradient:
+                for axis in range(dimensions):
+                    factor = sample
+                    for other, (_, _, basis, derivative) in enumerate(terms):
+                        factor = factor * (derivative if other == axis else basis)
+                    gradients[axis] += factor
+        return result, gradients
+
+    def __call__(self, points, field="power"):
+        """Evaluate a field of the surrogate at the given points.
+
+        Args:
+            points: A dict mapping the label of every axis to values (numbers or arrays, which are broadcast together).
+                Entries for other labels are ignored.
+            field: The curve field to evaluate
+
+        Returns:
+            The values, as an array of the broadcast shape of the points
+        """
+        return self._evaluate(points, field, False)[0]
+
+    def gradient(self, points, field="power"):
+        """Evaluate a field of the surrogate and its gradient at the given points.
+
+        Args:
+            points: A dict mapping labels to values, as for calling the surrogate
+            field: The curve field to evaluate
+
+        Returns:
+            The values, and a dict of their derivatives with respect to each axis by label, all as arrays of the
+            broadcast shape of the points (derivatives are zero outside the knots, where end values are held)
+        """
+        result, gradients = self._evaluate(points, field, True)
+        return result, dict(zip(self.labels, gradients))
+
+    def to_json(self):
+        """Get a JSON-serializable dict describing the surrogate, with losslessly encoded coefficients"""
+        return {
+            "type": _TYPE,
+            "method": self.method,
+            "label": self.label,
+            "axes": [{"label": label, "knots": x.tolist()} for label, x in zip(self.labels, self.knots)],
+            "fields": {
+                field: {"coefficients": encode_array(array), "max_error": self.max_error[field]}
+                for field, array in self.coefficients.items()
+            },
+        }
+
+    @classmethod
+    def from_json(cls, data, out_of_bounds="clip"):
+        """Load a surrogate from a dict produced by `to_json`"""
+        if data.get("type") != _TYPE:
+            raise ValueError(f"Unknown surrogate type '{data.get('type')}'")
+        return cls(
+            data["label"],
+            [axis["label"] for axis in data["axes"]],
+            [axis["knots"] for axis in data["axes"]],
+            {field: decode_array(entry["coefficients"]) for field, entry in data["fields"].items()},
+            data["method"],
+            {field: entry["max_error"] for field, entry in data["fields"].items()},
+            out_of_bounds=out_of_bounds,
+        )
+
+
+def _grid(mode):
+    """Get the labels and (sorted) coordinates of the axes of a mode, and the order to sort its arrays by"""
+    labels, coordinates, orders = [], [], []
+    for parameter in axis_parameters(mode):
+        values = axis_coordinates(parameter["values"])
+        if values.dtype == BUCKET_DTYPE:
+            raise ValueError(f"Operating mode '{mode.get('label')}' has a bucketed {parameter['label']} axis")
+        order = np.argsort(values, kind="stable")
+        if np.any(np.diff(values[order]) == 0):
+            raise ValueError(f"The values of axis '{parameter['label']}' are not unique")
+        labels.append(parameter["label"])
+        coordinates.append(values[order])
+        orders.append(order)
+    if len(labels) > MAX_AXES:
+        raise ValueError(f"Operating mode '{mode.get('label')}' has {len(labels)} axes, more than {MAX_AXES}")
+    return labels, coordinates, orders
+
+
+def fit_mode(mode, fields=DEFAULT_FIELDS, method="monotone", tolerance=None):
+    """Fit a smooth surrogate to the curve arrays of an operating mode.
+
+    Args:
+        mode: An operating mode dict, whose curve arrays may be nested lists, numpy arrays or encoded
+        fields: The curve fields to fit (those which the mode doesn't have are skipped)
+        method: One of `METHODS`
+        tolerance: None (the default) to use every grid point as a knot, or a dict of the maximum absolute error
+            allowed in each field, to use as few knots as needed
+
+    Returns:
+        A `Surrogate`
+
+    Raises:
+        ValueError: If the mode has bucketed axes, non-unique axis values, or more than `MAX_AXES` axes
+    """
+    if method not in METHODS:
+        raise ValueError(f"Unknown method '{method}', must be one of {METHODS}")
+    labels, coordinates, orders = _grid(mode)
+    tables = {}
+    for field in fields:
+        if field not in mode:
+            continue
+        table = decode_array(mode[field]) if is_encoded(mode[field]) else to_ndarray(mode[field])
+        if table.shape != mode_shape(mode):
+            raise ValueError(
+                f"The {field} array of operating mode '{mode.get('label')}' has shape {table.shape}, but its axes "
+                f"have shape {mode_shape(mode)}"
+            )
+        for axis, order in enumerate(orders):
+            table = np.take(table, order, axis=axis)
+        tables[field] = table
+    if not tables:
+        raise KeyError(f"Operating mode '{mode.get('label')}' has none of the fields {tuple(fields)}")
+
+    # Knots are held as indices into each axis's grid points, starting from every point or only the ends
+    if tolerance is None:
+        selected = [np.arange(x.size) for x in coordinates]
+    else:
+        selected = [np.unique([0, x.size - 1]) for x in coordinates]
+    points = dict(zip(labels, np.meshgrid(*coordinates, indexing="ij")))
+
+    while True:
+        index = np.ix_(*selected)
+        knots = [x[chosen] for x, chosen in zip(coordinates, selected)]
+        coefficients = {field: _coefficients(knots, table[index], method) for field, table in tables.items()}
+        surrogate = Surrogate(mode.get("label"), labels, knots, coefficients, method, {})
+        errors = {field: np.abs(surrogate(points, field) - table) for field, table in tables.items()}
+        surrogate.max_error = {field: float(error.max()) for field, error in errors.items()}
+        if tolerance is None:
+            return surrogate
+
+        # Add the coordinates of the grid point which most exceeds its field's tolerance as knots along every axis
+        excess = [error / tolerance[field] for field, error in errors.items() if field in tolerance]
+        if not excess or np.max(excess) <= 1:
+            return surrogate
+        excess = np.max(excess, axis=0)
+        worst = np.unravel_index(np.argmax(excess), excess.shape)
+        if all(position in chosen for chosen, position in zip(selected, worst)):
+            # Already a knot, so only rounding errors remain (eg for a zero tolerance)
+            return surrogate
+        selected = [np.union1d(chosen, position) for chosen, position in zip(selected, worst)]
+
+
+def fit_document(doc, fields=DEFAULT_FIELDS, method="monotone", tolerance=None, labels=None):
+    """Fit surrogates to operating modes of a document, as `fit_mode`.
+
+    Args:
+        doc: A power curve document
+        fields, method, tolerance: As for `fit_mode`
+        labels: Labels of the operating modes to fit, defaulting to all of them
+
+    Returns:
+        A dict of `Surrogate`s by operating mode label
+    """
+    if labels is None:
+        labels = [mode["label"] for mode in doc["power_curves"]["operating_modes"]]
+    return {label: fit_mode(find_mode(doc, label), fields, method, tolerance) for label in labels}
+
+
+def add_surrogates(doc, surrogates):
+    """Get a copy of a document with surrogates stored in its `additional.data`, keyed by operating mode label.
+
+    The input document is not modified; the new document shares all other content with it.
+    """
+    additional = dict(doc.get("additional", {}))
+    data = dict(additional.get("data", {}))
+    data[ADDITIONAL_DATA_KEY] = {
+        **data.get(ADDITIONAL_DATA_KEY, {}),
+        **{label: surrogate.to_json() for label, surrogate in surrogates.items()},
+    }
+    additional["data"] = data
+    return {**doc, "additional": additional}
+
+
+def document_surrogates(doc, out_of_bounds="clip"):
+    """Load the surrogates stored in a document by `add_surrogates`, as a dict by operating mode label"""
+    stored = doc.get("additional", {}).get("data", {}).get(ADDITIONAL_DATA_KEY, {})
+    return {label: Surrogate.from_json(data, out_of_bounds) for label, data in stored.items()}
+
+
+def write_surrogates(surrogates, path):
+    """Write surrogates (a dict by operating mode label) to a JSON sidecar file"""
+    with open(path, "w", encoding="utf-8") as fp:
+        dump({label: surrogate.to_json() for label, surrogate in surrogates.items()}, fp, indent=2)
+
+
+def read_surrogates(path, out_of_bounds="clip"):
+    """Read surrogates from a JSON sidecar file written by `write_surrogates`, as a dict by operating mode label"""
+    with open(path, "r", encoding="utf-8") as fp:
+        return {label: Surrogate.from_json(data, out_of_bounds) for label, data in load(fp).items()}
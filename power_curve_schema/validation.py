@@ -0,0 +1,135 @@
+"""
+Validation.py
+
+Cached validators for whole power curve documents, or for one of their top-level sections.
+
+Building a validator (checking the schema, then compiling and resolving references as validation proceeds) costs far
+more than validating a typical document, so validators of recently used schemas are memoized per (schema hash, section)
+and reused. Schemas passed to these functions must therefore not be mutated afterwards.
+
+By default, validators use the pre-bundled schema (see `bundle.py`), which gives the same results as the source
+`schema.json` without any reference resolution.
+
+Example:
+
+    from power_curve_schema.validation import validate
+
+    validate(doc)                          # Validate a whole document
+    validate(partial, section="turbine")   # Validate only the turbine section, ignoring anything else
+"""
+
+import functools
+
+from jsonschema.exceptions import best_match
+from jsonschema.validators import validator_for
+
+from .bundle import SOURCE_HASH_KEY, load_bundled_schema
+from .instrumentation import document_stats, span
+from .schemas import SCHEMA_PATH, SECTIONS, load_schema, section_schema  # pylint: disable=unused-import
+
+# The maximum number of schemas to keep the hashes of, and of (schema, section) pairs to keep validators for
+SCHEMA_CACHE_SIZE = 32
+
+
+class _Cache:
+    """A mapping of at most `size` entries, discarding the least recently used"""
+
+    def __init__(self, size):
+        self.size = size
+        self.entries = {}
+
+    def get(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.entries[key] = entry
+        return entry
+
+    def put(self, key, value):
+        if len(self.entries) >= self.size:
+            del self.entries[next(iter(self.entries))]
+        self.entries[key] = value
+        return value
+
+
+# Hashes by schema object id, as (schema, hash), holding the schema so its id can't be reused while the entry exists
+_hashes = _Cache(SCHEMA_CACHE_SIZE)
+# Validators by (schema hash, section)
+_validators = _Cache(SCHEMA_CACHE_SIZE)
+
+
+@functools.lru_cache(maxsize=None)
+def default_schema():
+    """Load (once) the bundled power curve schema used by default. The returned schema is shared, so don't mutate it."""
+    return load_bundled_schema()
+
+
+def _is_default(schema):
+    """Check whether a schema is the object returned by `default_schema` (without loading it, if it hasn't been)"""
+    return default_schema.cache_info().currsize > 0 and schema is default_schema()
+
+
+def schema_hash(schema):
+    """Get the canonical content hash of a schema, computed only once for each of the recently used schema objects"""
+    entry = _hashes.get(id(schema))
+    if entry is not None and entry[0] is schema:
+        return entry[1]
+
+    # The bundled artifact records the hash of its source, so needn't be hashed (or imported for hashing) again. Only
+    # the loaded artifact itself is trusted, as edited copies of it keep the recorded hash.
+    if _is_default(schema):
+        digest = schema[SOURCE_HASH_KEY]
+    else:
+        from .serialization import content_hash  # pylint: disable=import-outside-toplevel
+
+        digest = content_hash(schema)
+    return _hashes.put(id(schema), (schema, digest))[1]
+
+
+def _build_validator(source, section):
+    schema = section_schema(source, section)
+    cls = validator_for(schema)
+    # Checking a schema against its metaschema is expensive; the bundled artifact is checked when it's built
+    if not _is_default(source):
+        cls.check_schema(schema)
+    return cls(schema)
+
+
+def get_validator(section=None, schema=None):
+    """Get a memoized validator for a whole document or for one of its top-level sections.
+
+    Args:
+        section: One of `SECTIONS`, or None (the default) to validate whole documents
+        schema: The schema to validate against, defaulting to the bundled power curve schema in this repository
+
+    Returns:
+        A jsonschema validator instance, shared between all callers asking for the same schema and section
+    """
+    if schema is None:
+        schema = default_schema()
+    key = (schema_hash(schema), section)
+    validator = _validators.get(key)
+    if validator is None:
+        validator = _validators.put(key, _build_validator(schema, section))
+    return validator
+
+
+def validate(instance, section=None, schema=None):
+    """Validate a document (or a partial document, if a section is given) using a memoized validator.
+
+    This behaves like `jsonschema.validate`, raising the most relevant error if the instance is invalid.
+
+    Args:
+        instance: The document to validate
+        section: One of `SECTIONS`, or None (the default) to validate the whole document
+        schema: The schema to validate against, defaulting to the bundled power curve schema in this repository
+
+    Raises:
+        jsonschema.exceptions.ValidationError: If the instance is invalid
+    """
+    validator = get_validator(section=section, schema=schema)
+    with span("schema.validate", section=section) as active:
+        error = best_match(validator.iter_errors(instance))
+        if active:
+            active.set(valid=error is None, **document_stats(instance))
+    if error is not None:
+        raise error
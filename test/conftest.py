@@ -14,20 +14,6 @@ import pytest
 ROOT_DIR = os.path.dirname(os.path.dirname(__file__))
 
 
-@pytest.fixture(scope="session")
-def loaded_schema():
-    """Load the schema only once per test session for speed"""
-    with open(os.path.join(ROOT_DIR, "power-curve-schema/schema.json"), 'r', encoding="utf-8") as fp:
-        loaded = json.load(fp)
-    return loaded
-
-
-@pytest.fixture()
-def schema(loaded_schema):
-    """A fresh deep copy of the schema so it can be mutated on a per-test basis"""
-    return copy.deepcopy(loaded_schema)
-
-
 @pytest.fixture()
 def generic_document_metadata():
     return {
@@ -308,3 +294,39 @@ def generic_turbine(generic_120_3):
     return {
         "turbine": generic_120_3.pop('turbine')
     }
+
+
+@pytest.fixture()
+def six_dimensional_document(generic_274_20):
+    """The generic 274m 20MW turbine with three operating modes, each with smooth 6-D power, thrust and rpm arrays"""
+    import numpy as np  # pylint: disable=import-outside-toplevel
+
+    axes = [
+        ("air-density", [1.1, 1.125, 1.15, 1.175, 1.2, 1.225, 1.25, 1.275]),
+        ("reference-turbulence-intensity", [0.06, 0.1, 0.14, 0.18]),
+        ("vertical-shear-exponent", [0.0, 0.1, 0.2, 0.3]),
+        ("wind-veer", [0.0, 0.05, 0.1]),
+        ("turbulence-lengthscale", [50.0, 150.0, 300.0]),
+        ("wind-speed", [3.0 + 0.5 * i for i in range(55)]),
+    ]
+    grids = np.meshgrid(*(np.array(values) for _, values in axes), indexing="ij")
+    density, turbulence, shear, veer, lengthscale, wind_speed = grids
+    scale = (1 - turbulence / 4) * (1 + shear / 20) * (1 - veer / 10) * (1 + lengthscale / 30000)
+    template = generic_274_20["power_curves"]["operating_modes"][0]
+
+    modes = []
+    for i, rated_power in enumerate([20e6, 18e6, 15e6]):
+        power = np.minimum(0.5 * density * np.pi * 137**2 * 0.45 * wind_speed**3 * scale, rated_power)
+        thrust_coefficient = np.clip(0.8 * (rated_power / 20e6) * (12 / np.maximum(wind_speed, 12)) ** 2 * scale, 0, 1)
+        rotor_rpm = np.minimum(2.5 + wind_speed * 0.6, 7.5) * scale
+        modes.append({
+            **{key: value for key, value in template.items() if key not in ("parameters", "power", "thrust_coefficient")},
+            "label": f"mode_{i + 1}",
+            "parameters": [{"label": label, "axis": axis, "values": values} for axis, (label, values) in enumerate(axes)],
+            "power": power.tolist(),
+            "thrust_coefficient": thrust_coefficient.tolist(),
+            "rotor_rpm": rotor_rpm.tolist(),
+        })
+    generic_274_20["power_curves"]["operating_modes"] = modes
+    generic_274_20["power_curves"]["default_operating_mode_label"] = "mode_1"
+    return generic_274_20
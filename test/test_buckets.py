@@ -0,0 +1,73 @@
+# Turn off pylint warnings unavoidable with pytest
+# pylint: disable=redefined-outer-name, line-too-long, redefined-builtin, missing-module-docstring
+
+import numpy as np
+import pytest
+
+from power_curve_schema.arrays import axis_coordinates
+from power_curve_schema.buckets import BucketAxis, BucketSelector, bucket_axis, validity_ranges
+
+# Unsorted buckets with a gap between 0.3 and 0.4
+BUCKETS = [{"min": 0.2, "max": 0.3}, {"min": 0.0, "max": 0.1}, {"min": 0.1, "max": 0.2}, {"min": 0.4, "max": 0.5}]
+
+
+@pytest.fixture()
+def bucketed_mode(generic_274_20):
+    """An operating mode with a bucketed turbulence intensity axis and a validity range"""
+    mode = generic_274_20["power_curves"]["operating_modes"][0]
+    mode["parameters"] = [parameter for parameter in mode["parameters"] if "axis" in parameter or "value" in parameter]
+    mode["parameters"][0] = {"label": "turbulence-intensity", "axis": 0, "values": [{"min": 0.02 * i, "max": 0.02 * (i + 1)} for i in range(8)]}
+    mode["parameters"].append({"label": "wind-veer", "min": -5, "max": 5})
+    return mode
+
+
+def test_locate():
+    """Values should be assigned the bucket containing them, inclusive of min and exclusive of max"""
+    axis = bucket_axis(BUCKETS, "turbulence-intensity")
+    indices, outside = axis.locate([0.0, 0.05, 0.1, 0.2999, 0.4, 0.45])
+    assert indices.tolist() == [1, 1, 2, 0, 3, 3]
+    assert not np.any(outside)
+
+
+def test_out_of_range_values():
+    """Values in no bucket should be flagged, and assigned the nearest bucket"""
+    axis = bucket_axis(BUCKETS)
+    indices, outside = axis.locate([-0.1, 0.3, 0.32, 0.38, 0.5, 0.7, np.nan])
+    assert outside.tolist() == [True] * 7
+    assert indices[:6].tolist() == [1, 0, 0, 3, 3, 3]
+    with pytest.raises(ValueError, match="in no bucket"):
+        axis.select([0.05, 0.35])
+    assert axis.select([0.05, 0.35], out_of_bounds="clip").tolist() == [1, 0]
+
+
+def test_locate_matches_scan():
+    """Vectorized lookup should match scanning the buckets for each value"""
+    rng = np.random.default_rng(0)
+    values = rng.uniform(-0.1, 0.6, (100, 100))
+    indices, outside = bucket_axis(BUCKETS).locate(values)
+    for value, index, flag in zip(values.ravel(), indices.ravel(), outside.ravel()):
+        matches = [i for i, bucket in enumerate(BUCKETS) if bucket["min"] <= value < bucket["max"]]
+        assert flag == (not matches)
+        if matches:
+            assert index == matches[0]
+
+
+def test_invalid_buckets():
+    """Empty or overlapping buckets should be rejected"""
+    with pytest.raises(ValueError, match="empty buckets"):
+        BucketAxis(axis_coordinates([{"min": 0.8, "max": 0.15}]))
+    with pytest.raises(ValueError, match="overlapping"):
+        BucketAxis(axis_coordinates([{"min": 0.0, "max": 0.2}, {"min": 0.1, "max": 0.3}]))
+
+
+def test_selector(bucketed_mode):
+    """Selectors should select buckets on every bucketed axis and check validity ranges"""
+    assert validity_ranges(bucketed_mode) == {"wind-veer": (-5, 5)}
+    selector = BucketSelector(bucketed_mode)
+    indices, outside = selector({"turbulence-intensity": [0.01, 0.05, 0.2], "wind-veer": [0.0, 6.0, 0.0], "wind-speed": 10.0})
+    assert indices["turbulence-intensity"].tolist() == [0, 2, 7]
+    assert outside.tolist() == [False, True, True]
+    # Validity ranges aren't checked without values
+    assert selector({"turbulence-intensity": 0.05})[1].tolist() is False
+    with pytest.raises(KeyError, match="needs a value"):
+        selector({"wind-veer": 0.0})
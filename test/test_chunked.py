@@ -0,0 +1,139 @@
+# Turn off pylint warnings unavoidable with pytest
+# pylint: disable=redefined-outer-name, line-too-long, redefined-builtin, missing-module-docstring
+
+import json
+
+import numpy as np
+import pytest
+
+from power_curve_schema.chunked import ChunkedArray, ChunkedStore, default_chunks, export_document, import_document
+from power_curve_schema.encoding import encode_document
+
+
+@pytest.fixture()
+def read_chunks(monkeypatch):
+    """A list recording the index of every chunk read"""
+    indices = []
+    read_chunk = ChunkedArray._read_chunk  # pylint: disable=protected-access
+
+    def recording_read_chunk(self, index):
+        indices.append(index)
+        return read_chunk(self, index)
+
+    monkeypatch.setattr(ChunkedArray, "_read_chunk", recording_read_chunk)
+    return indices
+
+
+def test_default_chunks():
+    """Default chunks should span whole trailing axes, splitting the leading ones to fit the chunk size"""
+    assert default_chunks((8, 55), chunk_bytes=1 << 20) == (8, 55)
+    assert default_chunks((8, 4, 4, 3, 3, 55), chunk_bytes=8 * 55 * 9) == (1, 1, 1, 3, 3, 55)
+    assert default_chunks((10,) * 9, chunk_bytes=1 << 20) == (1, 1, 1, 1, 10, 10, 10, 10, 10)
+
+
+def test_round_trip(tmp_path, generic_120_3, generic_274_20):
+    """Exporting and importing should reproduce documents exactly, including from encoded documents"""
+    export_document(generic_120_3, tmp_path / "a.zarr")
+    assert import_document(tmp_path / "a.zarr") == generic_120_3
+    export_document(encode_document(generic_274_20), tmp_path / "b.zarr", chunk_bytes=1000)
+    assert import_document(tmp_path / "b.zarr") == generic_274_20
+
+
+def test_store_layout(tmp_path, generic_274_20):
+    """Arrays should have dimensions named by axis labels, with coordinate arrays and the document as metadata"""
+    store = export_document(generic_274_20, tmp_path / "doc.zarr")
+    power = store.array("mode_1", "power")
+    assert power.dimensions == ["air-density", "wind-speed"]
+    assert store.fields("mode_1") == ["power", "thrust_coefficient", "rotor_rpm"]
+    assert store.fields("mode_2") == ["power", "thrust_coefficient"]
+    wind_speeds = ChunkedArray(tmp_path / "doc.zarr" / "operating_modes" / "0" / "wind-speed")
+    assert wind_speeds.read().tolist() == generic_274_20["power_curves"]["operating_modes"][0]["parameters"][1]["values"]
+    attributes = json.loads((tmp_path / "doc.zarr" / ".zattrs").read_text(encoding="utf-8"))
+    assert attributes["power_curve_document"]["turbine"] == generic_274_20["turbine"]
+    assert "power" not in attributes["power_curve_document"]["power_curves"]["operating_modes"][0]
+
+    with pytest.raises(FileExistsError):
+        export_document(generic_274_20, tmp_path / "doc.zarr")
+
+
+def test_select_reads_only_needed_chunks(tmp_path, six_dimensional_document, read_chunks):
+    """Selecting one air density should read only the chunks at that air density, giving a valid smaller mode"""
+    store = export_document(six_dimensional_document, tmp_path / "doc.zarr", chunk_bytes=8 * 55 * 9)
+    del read_chunks[:]
+    mode = store.select("mode_2", {"air-density": 1.15}, fields=["power"])
+    expected = np.asarray(six_dimensional_document["power_curves"]["operating_modes"][1]["power"])[2]
+    assert np.array_equal(mode["power"], expected)
+    assert len(read_chunks) == 4 * 4 and all(index[0] == 2 for index in read_chunks)
+    assert [parameter["label"] for parameter in mode["parameters"]][-1] == "air-density"
+    assert {"label": "air-density", "value": 1.15} in mode["parameters"]
+    assert [parameter["axis"] for parameter in mode["parameters"] if "axis" in parameter] == [0, 1, 2, 3, 4]
+
+
+def test_select_ranges_and_slices(tmp_path, generic_274_20):
+    """Axes should be selectable by coordinate ranges and index slices, with axis values to match"""
+    store = export_document(generic_274_20, tmp_path / "doc.zarr", chunk_bytes=1000)
+    mode = store.select("mode_1", {"wind-speed": (5.0, 7.0), "air-density": slice(0, 8, 3)})
+    power = np.asarray(generic_274_20["power_curves"]["operating_modes"][0]["power"])
+    assert np.array_equal(mode["power"], power[0:8:3, 4:9])
+    assert mode["parameters"][1]["values"] == [5.0, 5.5, 6.0, 6.5, 7.0]
+    assert mode["parameters"][0]["values"] == generic_274_20["power_curves"]["operating_modes"][0]["parameters"][0]["values"][0:8:3]
+
+    with pytest.raises(ValueError, match="has no value"):
+        store.select("mode_1", {"air-density": 1.0})
+    with pytest.raises(ValueError, match="has no axes"):
+        store.select("mode_1", {"yaw-misalignment": 0.0})
+    with pytest.raises(KeyError):
+        store.select("mode_4")
+
+
+def test_write_in_slabs(tmp_path, generic_274_20):
+    """Arrays omitted from an exported document should be writable slab by slab, with unwritten cells reading as NaN"""
+    power = np.asarray(generic_274_20["power_curves"]["operating_modes"][0].pop("power"))
+    store = export_document(generic_274_20, tmp_path / "doc.zarr")
+    array = store.create_array("mode_1", "power", chunks=(3, 20))
+    for i in range(7):
+        array[i] = power[i]
+    assert np.array_equal(array[:7], power[:7])
+    assert np.isnan(array[7]).all()
+    array[7, 10:] = power[7, 10:]
+    assert np.isnan(array[7, :10]).all()
+    assert np.array_equal(ChunkedStore(tmp_path / "doc.zarr").select("mode_1", {"air-density": 1.275})["power"][10:], power[7, 10:])
+
+
+def test_indexing_matches_numpy(tmp_path):
+    """Reading and writing random regions of a chunked array should behave as for a numpy array"""
+    rng = np.random.default_rng(0)
+    shape = (7, 5, 11)
+    expected = np.zeros(shape)
+    array = ChunkedArray.create(tmp_path / "array", shape, chunks=(3, 2, 4), fill_value=0.0)
+    for _ in range(50):
+        key = tuple(slice(*sorted(rng.integers(0, size + 1, 2))) for size in shape)
+        if rng.random() < 0.3:
+            key = (int(rng.integers(-shape[0], shape[0])),) + key[1:]
+        values = rng.normal(size=expected[key].shape)
+        array[key] = values
+        expected[key] = values
+        assert np.array_equal(array[key], expected[key])
+    assert np.array_equal(array.read(), expected)
+    assert np.array_equal(array[..., ::3], expected[..., ::3])
+    assert np.array_equal(array[1:6:2, -1], expected[1:6:2, -1])
+
+    with pytest.raises(IndexError):
+        array[7]  # pylint: disable=pointless-statement
+    with pytest.raises(TypeError):
+        array[[0, 1]]  # pylint: disable=pointless-statement
+
+
+def test_read_cells(tmp_path, read_chunks):
+    """Runs of cells in C order should be read from only the chunks they intersect"""
+    expected = np.random.default_rng(0).normal(size=(5, 7, 4))
+    array = ChunkedArray.create(tmp_path / "array", expected.shape, chunks=(2, 3, 3))
+    array[...] = expected
+    flat = expected.reshape(-1)
+    for start in range(0, flat.size, 9):
+        for stop in range(start, flat.size + 1, 13):
+            assert np.array_equal(array.read_cells(start, stop), flat[start:stop])
+
+    del read_chunks[:]
+    array.read_cells(4 * 7 * 4 + 5, 4 * 7 * 4 + 10)
+    assert set(read_chunks) == {(2, 0, 0), (2, 0, 1)}
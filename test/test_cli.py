@@ -0,0 +1,163 @@
+# Turn off pylint warnings unavoidable with pytest
+# pylint: disable=redefined-outer-name, line-too-long, redefined-builtin, missing-module-docstring
+
+import json
+import os
+import subprocess
+import sys
+
+from power_curve_schema.cli import main
+from power_curve_schema.encoding import is_encoded
+
+from .conftest import ROOT_DIR
+
+EXAMPLE_PATH = os.path.join(ROOT_DIR, "power-curve-schema", "examples", "generic-120-3.json")
+ALPHA_3_PATH = os.path.join(ROOT_DIR, "test", "fixtures", "generic-120-3-alpha-3.json")
+
+
+def test_validate(capsys):
+    """Valid documents should be reported as such, with a zero exit status"""
+    assert main(["validate", EXAMPLE_PATH]) == 0
+    assert capsys.readouterr().out == f"{EXAMPLE_PATH}: valid\n"
+
+
+def test_validate_reports_errors(tmp_path, capsys, generic_120_3):
+    """Invalid documents should be explained, with the location of the error, and a non-zero exit status"""
+    generic_120_3["turbine"]["rated_power"] = -1
+    path = tmp_path / "invalid.json"
+    path.write_text(json.dumps(generic_120_3), encoding="utf-8")
+    assert main(["validate", "--quiet", EXAMPLE_PATH, str(path)]) == 1
+    captured = capsys.readouterr()
+    assert captured.out == ""
+    assert captured.err == f"{path}: invalid: -1 is less than the minimum of 0 (at /turbine/rated_power)\n"
+
+
+def test_validate_section(tmp_path, generic_120_3):
+    """Only the given section should be validated"""
+    generic_120_3["power_curves"] = "not valid"
+    path = tmp_path / "partial.json"
+    path.write_text(json.dumps(generic_120_3), encoding="utf-8")
+    assert main(["validate", "--section", "turbine", str(path)]) == 0
+    assert main(["validate", str(path)]) == 1
+
+
+def test_validate_plausibility(tmp_path, capsys, generic_120_3):
+    """Valid but physically implausible documents should fail validation only if plausibility is checked"""
+    generic_120_3["turbine"]["rated_power"] = 3000000
+    path = tmp_path / "implausible.json"
+    path.write_text(json.dumps(generic_120_3), encoding="utf-8")
+    assert main(["validate", str(path)]) == 0
+    assert main(["validate", "--plausibility", EXAMPLE_PATH]) == 0
+    capsys.readouterr()
+    assert main(["validate", "--plausibility", str(path)]) == 1
+    assert capsys.readouterr().err.startswith(f"{path}: implausible:\nmode standard: power above rated power of 3000000 W in ")
+
+
+def test_validate_does_not_import_jsonschema():
+    """Validating a valid document from a fresh process should not import the heavy dependencies"""
+    code = (
+        "import sys; from power_curve_schema.cli import main; "
+        f"assert main(['validate', '-q', {EXAMPLE_PATH!r}]) == 0; "
+        "assert not {'jsonschema', 'jsonpath_ng', 'numpy'} & set(sys.modules)"
+    )
+    subprocess.run([sys.executable, "-c", code], cwd=ROOT_DIR, check=True)
+
+
+def test_validate_does_not_import_instrumentation_sinks():
+    """Instrumentation is imported by every command, so the imports of its sinks shouldn't slow down starting up"""
+    code = (
+        "import sys; from power_curve_schema.cli import main; "
+        f"assert main(['validate', '-q', {EXAMPLE_PATH!r}]) == 0; "
+        "assert not {'http.server', 'logging', 'tracemalloc'} & set(sys.modules), set(sys.modules)"
+    )
+    subprocess.run([sys.executable, "-c", code], cwd=ROOT_DIR, check=True)
+
+
+def test_migrate(tmp_path, generic_120_3):
+    """Migrating an alpha-3 document should give a valid alpha-4 document"""
+    output_path = tmp_path / "migrated.json"
+    assert main(["migrate", ALPHA_3_PATH, "--output", str(output_path)]) == 0
+    migrated = json.loads(output_path.read_text(encoding="utf-8"))
+    assert migrated["power_curves"] == generic_120_3["power_curves"]
+    assert main(["validate", str(output_path)]) == 0
+
+
+def test_migrate_invalid_documents(tmp_path, capsys):
+    """Documents which are invalid after migrating should be reported and not written, and malformed ones reported"""
+    with open(ALPHA_3_PATH, "r", encoding="utf-8") as fp:
+        doc = json.load(fp)
+    doc["turbine"]["rated_power"] = -1
+    input_path, output_path = tmp_path / "alpha-3.json", tmp_path / "migrated.json"
+    input_path.write_text(json.dumps(doc), encoding="utf-8")
+    assert main(["migrate", str(input_path), "--output", str(output_path)]) == 1
+    assert "migrated document is invalid" in capsys.readouterr().err
+    assert not output_path.exists()
+
+    del doc["power_curves"]
+    input_path.write_text(json.dumps(doc), encoding="utf-8")
+    assert main(["migrate", str(input_path), "--output", str(output_path)]) == 1
+    assert capsys.readouterr().err == f"power-curve-schema migrate: {input_path}: malformed document, missing 'power_curves'\n"
+
+
+def test_migrate_unknown_versions(capsys):
+    """Asking for a migration which doesn't exist should fail"""
+    assert main(["migrate", ALPHA_3_PATH, "--from", "alpha-1"]) == 2
+    assert "No migration from alpha-1 to alpha-4" in capsys.readouterr().err
+
+
+def test_inspect(capsys):
+    """The summary should include the turbine and the shape and parameters of each operating mode"""
+    assert main(["inspect", EXAMPLE_PATH]) == 0
+    output = capsys.readouterr().out
+    assert "turbine: Generic Turbines GT 3.45-120" in output
+    assert "standard [45]: power, thrust_coefficient" in output
+    assert "wind-speed (axis 0, 45 values)" in output
+
+
+def test_convert_round_trip(tmp_path, generic_120_3):
+    """Converting through binary and encoded formats and back should reproduce the document"""
+    binary_path, encoded_path, json_path = tmp_path / "doc.npz", tmp_path / "encoded.json", tmp_path / "doc.json"
+    assert main(["convert", EXAMPLE_PATH, str(binary_path)]) == 0
+    assert main(["convert", str(binary_path), str(encoded_path), "--to", "encoded"]) == 0
+    encoded = json.loads(encoded_path.read_text(encoding="utf-8"))
+    assert is_encoded(encoded["power_curves"]["operating_modes"][0]["power"])
+    assert main(["convert", str(encoded_path), str(json_path)]) == 0
+    assert json.loads(json_path.read_text(encoding="utf-8")) == generic_120_3
+
+
+def test_convert_chunked(tmp_path, generic_120_3):
+    """Documents should convert to and from chunked stores, chosen by the .zarr extension"""
+    chunked_path, json_path = tmp_path / "doc.zarr", tmp_path / "doc.json"
+    assert main(["convert", EXAMPLE_PATH, str(chunked_path)]) == 0
+    assert (chunked_path / "operating_modes" / "0" / "power" / ".zarray").exists()
+    assert main(["validate", "-q", str(chunked_path)]) == 0
+    assert main(["convert", str(chunked_path), str(json_path)]) == 0
+    assert json.loads(json_path.read_text(encoding="utf-8")) == generic_120_3
+
+
+def test_convert_to_json_does_not_import_numpy(tmp_path):
+    """Converting a document without encoded arrays to plain JSON needn't decode arrays, so shouldn't import numpy"""
+    code = (
+        "import sys; from power_curve_schema.cli import main; "
+        f"assert main(['convert', {EXAMPLE_PATH!r}, {str(tmp_path / 'doc.json')!r}]) == 0; "
+        "assert 'numpy' not in sys.modules"
+    )
+    subprocess.run([sys.executable, "-c", code], cwd=ROOT_DIR, check=True)
+
+
+def test_missing_file(capsys):
+    """A missing input should be reported without a traceback"""
+    assert main(["inspect", "does-not-exist.json"]) == 1
+    assert "does-not-exist.json" in capsys.readouterr().err
+
+
+def test_diff(tmp_path, capsys, generic_120_3):
+    """Differences should be reported, with an exit status of 1 like diff(1)"""
+    generic_120_3["power_curves"]["operating_modes"][0]["power"][20] += 1000.0
+    path = tmp_path / "rev-02.json"
+    path.write_text(json.dumps(generic_120_3), encoding="utf-8")
+    assert main(["diff", EXAMPLE_PATH, EXAMPLE_PATH]) == 0
+    assert capsys.readouterr().out == "No changes\n"
+    assert main(["diff", EXAMPLE_PATH, str(path), "--json"]) == 1
+    report = json.loads(capsys.readouterr().out)
+    assert report["modes"]["changed"]["standard"]["arrays"]["power"]["changed"] == 1
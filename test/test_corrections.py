@@ -0,0 +1,82 @@
+# Turn off pylint warnings unavoidable with pytest
+# pylint: disable=redefined-outer-name, line-too-long, redefined-builtin, missing-module-docstring
+
+import numpy as np
+import pytest
+
+from power_curve_schema.corrections import (
+    add_air_density_axis,
+    add_shear_axis,
+    add_turbulence_intensity_axis,
+    rotor_equivalent_ratio,
+)
+from power_curve_schema.validation import validate
+
+
+@pytest.fixture()
+def mode(generic_120_3):
+    """The 1-D (wind speed only) operating mode of the generic 120m 3.45MW turbine, at an air density of 1.225"""
+    return generic_120_3["power_curves"]["operating_modes"][0]
+
+
+def test_air_density_axis(mode):
+    """Curves at the reference density should be unchanged, and power should increase with density below rated"""
+    corrected = add_air_density_axis(mode, np.linspace(1.0, 1.3, 3001))
+    assert [(p["label"], p["axis"]) for p in corrected["parameters"]] == [("air-density", 0), ("wind-speed", 1)]
+    power = np.array(corrected["power"])
+    assert power.shape == (3001, 45)
+    assert power[2250].tolist() == mode["power"]
+    assert np.all(np.diff(power[:, 10]) >= 0)
+    assert np.all(power <= max(mode["power"]))
+
+
+def test_stall_regulated_air_density_axis(mode):
+    """For stall regulated turbines power should scale with density, with thrust unchanged"""
+    corrected = add_air_density_axis(mode, [1.225, 2.45], regulation_type="stall")
+    assert np.allclose(corrected["power"][1], 2 * np.array(mode["power"]))
+    assert corrected["thrust_coefficient"][0] == corrected["thrust_coefficient"][1] == mode["thrust_coefficient"]
+
+
+def test_rotor_equivalent_ratio():
+    """Uniform flow should have a ratio of one, with other ratios matching a brute force integration over the disk"""
+    y, z = np.meshgrid(np.linspace(-60, 60, 2001), np.linspace(30, 150, 2001))
+    inside = y**2 + (z - 90) ** 2 <= 60**2
+    expected = [np.cbrt(np.mean((z[inside] / 90) ** (3 * alpha))) for alpha in (0.0, 0.2, 0.6)]
+    assert np.allclose(rotor_equivalent_ratio([0.0, 0.2, 0.6], 90, 120), expected, rtol=1e-4)
+
+
+def test_shear_axis_is_added_in_front(mode, generic_120_3):
+    """Axes should be renumbered, the reference value parameter replaced, and the mode remain schema-valid"""
+    corrected = add_shear_axis(add_air_density_axis(mode, [1.1, 1.2]), [0.1, 0.2, 0.3], 90, 120, reference=0.2)
+    assert [(p["label"], p.get("axis")) for p in corrected["parameters"]] == [
+        ("vertical-shear-exponent", 0),
+        ("air-density", 1),
+        ("wind-speed", 2),
+    ]
+    assert np.array(corrected["power"]).shape == (3, 2, 45)
+    assert corrected["thrust_coefficient"][1] == add_air_density_axis(mode, [1.1, 1.2])["thrust_coefficient"]
+    generic_120_3["power_curves"]["operating_modes"] = [corrected]
+    validate(generic_120_3)
+
+    with pytest.raises(ValueError, match="reference shear exponent"):
+        add_shear_axis(mode, [0.1], 90, 120)
+    with pytest.raises(ValueError, match="already has an axis"):
+        add_air_density_axis(add_air_density_axis(mode, [1.1]), [1.2])
+
+
+def test_turbulence_intensity_axis(mode):
+    """Smoothing should leave the reference curve unchanged, and increasingly flatten the knee of the curve"""
+    corrected = add_turbulence_intensity_axis(mode, np.linspace(0.0, 0.3, 1001))
+    power = np.array(corrected["power"])
+    assert np.allclose(power[0], mode["power"])
+    rated = max(mode["power"])
+    knee = mode["parameters"][1]["values"].index(12.0)
+    assert power[-1, knee] < rated
+    assert np.all(np.diff(power[:, knee]) <= 1e-6)
+
+
+def test_thousands_of_values(generic_274_20):
+    """A dense axis of thousands of values should be added to a 2-D mode"""
+    mode = generic_274_20["power_curves"]["operating_modes"][0]
+    corrected = add_turbulence_intensity_axis(mode, np.linspace(0.0, 0.3, 2000))
+    assert np.array(corrected["power"]).shape == (2000, 8, 55)
@@ -0,0 +1,91 @@
+# Turn off pylint warnings unavoidable with pytest
+# pylint: disable=redefined-outer-name, line-too-long, redefined-builtin, missing-module-docstring
+
+import copy
+
+import numpy as np
+import pytest
+
+from power_curve_schema.derived import (
+    DerivedCache,
+    DerivedQuantities,
+    axial_induction,
+    clear_derived_cache,
+    derived_array,
+)
+from power_curve_schema.interpolation import ModeInterpolant
+
+
+def test_power_coefficient(generic_274_20):
+    """Power coefficients should use the air density and wind speed axes, and stay below the Betz limit"""
+    mode = generic_274_20["power_curves"]["operating_modes"][0]
+    cp = DerivedQuantities(generic_274_20).array("mode_1", "power_coefficient")
+    power = np.array(mode["power"])
+    assert cp.shape == power.shape
+    densities, speeds = (np.array(parameter["values"]) for parameter in mode["parameters"][:2])
+    area = np.pi * generic_274_20["turbine"]["rotor_diameter"] ** 2 / 4
+    assert cp[3, 10] == pytest.approx(power[3, 10] / (0.5 * densities[3] * area * speeds[10] ** 3))
+    assert 0.4 < np.nanmax(cp) < 16 / 27
+
+
+def test_axial_induction(generic_120_3):
+    """Axial induction should invert momentum theory, and Buhl's correction above Ct = 0.96"""
+    mode = generic_120_3["power_curves"]["operating_modes"][0]
+    mode["thrust_coefficient"] = [0.0, 0.5, 0.75, 0.96, 0.96 + 1e-9, 1.2, 1.5] + mode["thrust_coefficient"][7:]
+    a = axial_induction(mode)
+    assert np.allclose(4 * a[:4] * (1 - a[:4]), mode["thrust_coefficient"][:4])
+    assert a[3] == pytest.approx(0.4) and a[4] == pytest.approx(0.4)
+    assert np.allclose(8 / 9 - 4 * a[4:7] / 9 + 14 * a[4:7] ** 2 / 9, mode["thrust_coefficient"][4:7])
+    assert np.all(np.diff(a[:7]) >= 0)
+
+
+def test_tip_speed_ratio(generic_274_20):
+    """Tip speed ratios should come from the rotor speed and wind speed axis"""
+    mode = generic_274_20["power_curves"]["operating_modes"][0]
+    tsr = derived_array(mode, "tip_speed_ratio", generic_274_20["turbine"]["rotor_diameter"])
+    speed = mode["parameters"][1]["values"][20]
+    expected = mode["rotor_rpm"][0][20] * 2 * np.pi / 60 * generic_274_20["turbine"]["rotor_diameter"] / 2 / speed
+    assert tsr[0, 20] == pytest.approx(expected)
+    with pytest.raises(ValueError, match="rotor diameter"):
+        derived_array(mode, "tip_speed_ratio")
+    with pytest.raises(KeyError, match="no rotor_rpm"):
+        DerivedQuantities(generic_274_20).array("mode_2", "tip_speed_ratio")
+
+
+def test_interpolant(generic_274_20):
+    """Derived fields should be interpolated in the same way as curve arrays"""
+    derived = DerivedQuantities(generic_274_20)
+    interpolant = derived.interpolant("mode_1")
+    mode = generic_274_20["power_curves"]["operating_modes"][0]
+    densities, speeds = (np.array(parameter["values"]) for parameter in mode["parameters"][:2])
+    points = {"air-density": densities[2], "wind-speed": speeds[5:9]}
+    assert np.allclose(
+        interpolant(points, field="power_coefficient"), derived.array("mode_1", "power_coefficient")[2, 5:9]
+    )
+    assert np.allclose(interpolant(points, field="power"), np.array(mode["power"])[2, 5:9])
+    with pytest.raises(ValueError, match="DerivedQuantities"):
+        ModeInterpolant(mode)(points, field="axial_induction")
+
+
+def test_cache_is_shared_by_content(generic_274_20):
+    """Documents with the same content should share cached arrays, and different content shouldn't"""
+    clear_derived_cache()
+    first = DerivedQuantities(generic_274_20).array("mode_1", "axial_induction")
+    republished = copy.deepcopy(generic_274_20)
+    republished["document"]["metadata"][0]["value"] = "another"
+    assert DerivedQuantities(republished).array("mode_1", "axial_induction") is first
+    assert not first.flags.writeable
+    republished["power_curves"]["operating_modes"][0]["thrust_coefficient"][0][0] += 0.01
+    assert DerivedQuantities(republished).array("mode_1", "axial_induction") is not first
+
+
+def test_cache_is_bounded(generic_274_20):
+    """The cache should evict the least recently used arrays beyond its size"""
+    cache = DerivedCache(max_bytes=2 * 8 * 8 * 55)
+    derived = DerivedQuantities(generic_274_20, cache=cache)
+    first = derived.array("mode_1", "axial_induction")
+    derived.array("mode_1", "power_coefficient")
+    assert derived.array("mode_1", "axial_induction") is first
+    derived.array("mode_3", "power_coefficient")
+    assert cache.bytes == cache.max_bytes
+    assert list(key[1:] for key in cache.entries) == [("mode_1", "axial_induction"), ("mode_3", "power_coefficient")]
@@ -1,24 +1,16 @@
 # Turn off pylint warnings unavoidable with pytest
 # pylint: disable=redefined-outer-name, line-too-long, redefined-builtin, missing-module-docstring
 
-import pytest
-from jsonschema import validate
 from jsonschema.exceptions import ValidationError
 
-from .helpers import get_subschema
+from power_curve_schema.validation import load_schema, validate
 
 
-@pytest.fixture
-def subschema(schema):
-    """Provide a schema that requires only the design_basis part of the whole schema"""
-    return get_subschema(schema, "design_bases")
-
-
-def test_generic_120_3_design_basis_1(subschema, generic_120_3):
+def test_generic_120_3_design_basis_1(generic_120_3):
     """Validation should pass on the generic turbine design basis"""
-    validate(instance=generic_120_3, schema=subschema)
+    validate(instance=generic_120_3, section="design_bases", schema=load_schema())
 
 
-def test_missing_design_basis(subschema):
+def test_missing_design_basis():
     """Validation should pass if there is no design basis section"""
-    validate(instance={}, schema=subschema)
+    validate(instance={}, section="design_bases", schema=load_schema())
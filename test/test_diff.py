@@ -0,0 +1,143 @@
+# Turn off pylint warnings unavoidable with pytest
+# pylint: disable=redefined-outer-name, line-too-long, redefined-builtin, missing-module-docstring
+
+import copy
+
+import numpy as np
+
+from power_curve_schema import diff
+from power_curve_schema.arrays import CURVE_FIELDS
+from power_curve_schema.diff import diff_documents, format_report
+from power_curve_schema.encoding import encode_document
+
+
+def test_identical_documents(generic_274_20):
+    """A document should have no differences from itself, or from an encoded copy of itself"""
+    report = diff_documents(generic_274_20, copy.deepcopy(generic_274_20))
+    assert not report["changed"]
+    assert not diff_documents(generic_274_20, encode_document(generic_274_20))["changed"]
+    assert format_report(report) == "No changes"
+
+
+def test_reordering_is_not_a_change(six_dimensional_document):
+    """Reordering modes, parameters, axes and axis values should not be reported as changes"""
+    new = copy.deepcopy(six_dimensional_document)
+    modes = new["power_curves"]["operating_modes"]
+    modes.reverse()
+    for mode in modes:
+        mode["parameters"].reverse()
+        for parameter in mode["parameters"]:
+            parameter["axis"] = 5 - parameter["axis"]
+        mode["parameters"][0]["values"].reverse()
+        for field in ("power", "thrust_coefficient", "rotor_rpm"):
+            mode[field] = np.flip(np.transpose(mode[field]), axis=0).tolist()
+
+    report = diff_documents(six_dimensional_document, new)
+    assert not any(mode.get("arrays") for mode in report["modes"]["changed"].values())
+    assert list(report["modes"]["changed"]["mode_1"]["axes"]) == [
+        "air-density",
+        "reference-turbulence-intensity",
+        "vertical-shear-exponent",
+        "wind-veer",
+        "turbulence-lengthscale",
+        "wind-speed",
+    ]
+
+
+def test_cells_are_aligned_by_coordinates(generic_274_20):
+    """Inserting a bin should be reported as an added coordinate, without changing the existing cells"""
+    new = copy.deepcopy(generic_274_20)
+    mode = new["power_curves"]["operating_modes"][0]
+    mode["parameters"][1]["values"].insert(0, 2.5)
+    mode["power"] = [[0.0] + row for row in mode["power"]]
+    mode["thrust_coefficient"] = [[0.0] + row for row in mode["thrust_coefficient"]]
+    mode["rotor_rpm"] = [[0.0] + row for row in mode["rotor_rpm"]]
+
+    report = diff_documents(generic_274_20, new)
+    assert report["modes"]["changed"] == {
+        "mode_1": {"axes": {"wind-speed": {"old_axis": 1, "new_axis": 1, "removed": [], "added": [2.5]}}}
+    }
+
+
+def test_tolerances(six_dimensional_document):
+    """Only cells differing by more than the tolerances should be reported, largest first, with their coordinates"""
+    new = copy.deepcopy(six_dimensional_document)
+    power = new["power_curves"]["operating_modes"][1]["power"]
+    power[7][0][1][2][0][40] *= 1.001
+    power[0][3][0][0][2][10] *= 1.01
+
+    assert not diff_documents(six_dimensional_document, new, rtol=0.02)["changed"]
+    assert not diff_documents(six_dimensional_document, new, rtol={"power": 0.02})["changed"]
+
+    report = diff_documents(six_dimensional_document, new, rtol=0.005)
+    array = report["modes"]["changed"]["mode_2"]["arrays"]["power"]
+    assert array["changed"] == 1
+
+    array = diff_documents(six_dimensional_document, new)["modes"]["changed"]["mode_2"]["arrays"]["power"]
+    assert array["compared"] == 63360
+    assert array["changed"] == 2
+    assert np.isclose(array["max_rel"], 0.01)
+    assert array["cells"][0]["coordinates"]["wind-speed"] == 8.0
+    assert array["cells"][1]["coordinates"] == {
+        "air-density": 1.275,
+        "reference-turbulence-intensity": 0.06,
+        "vertical-shear-exponent": 0.1,
+        "wind-veer": 0.1,
+        "turbulence-lengthscale": 50.0,
+        "wind-speed": 23.0,
+    }
+
+
+def test_metadata_mode_and_parameter_changes(generic_120_3_with_extra_parameters):
+    """Changes outside the curve arrays should be reported by path, and modes by label"""
+    old = generic_120_3_with_extra_parameters
+    new = copy.deepcopy(old)
+    new["turbine"]["rated_power"] = 3600000
+    new["design_bases"].reverse()
+    mode = new["power_curves"]["operating_modes"][0]
+    mode["parameters"] = [
+        parameter for parameter in mode["parameters"] if parameter["label"] != "turbulence-lengthscale"
+    ]
+    mode["parameters"][0]["value"] = 1.2
+    added = copy.deepcopy(mode)
+    added["label"] = "derated"
+    new["power_curves"]["operating_modes"].append(added)
+
+    report = diff_documents(old, new)
+    assert report["properties"] == [{"path": ["turbine", "rated_power"], "old": 3450000, "new": 3600000}]
+    assert report["modes"]["added"] == ["derated"]
+    parameters = report["modes"]["changed"]["standard"]["parameters"]
+    assert parameters["removed"] == ["turbulence-lengthscale"]
+    assert parameters["changed"] == [
+        {
+            "label": "air-density",
+            "old": {"label": "air-density", "value": 1.225},
+            "new": {"label": "air-density", "value": 1.2},
+        }
+    ]
+    assert "parameter air-density" in format_report(report)
+
+
+def test_six_dimensional_diff_is_vectorized(six_dimensional_document, monkeypatch):
+    """Each pair of 6-D arrays should be compared in one vectorized pass, reporting only the largest changes"""
+    new = copy.deepcopy(six_dimensional_document)
+    for mode in new["power_curves"]["operating_modes"]:
+        mode["thrust_coefficient"] = (np.array(mode["thrust_coefficient"]) * 1.0001).tolist()
+
+    calls = []
+    diff_array = diff._diff_array  # pylint: disable=protected-access
+
+    def recording_diff_array(old, new, *args):
+        calls.append(old.shape)
+        return diff_array(old, new, *args)
+
+    monkeypatch.setattr(diff, "_diff_array", recording_diff_array)
+    report = diff_documents(six_dimensional_document, new)
+    modes = six_dimensional_document["power_curves"]["operating_modes"]
+    fields = [field for mode in modes for field in CURVE_FIELDS if field in mode]
+    assert len(calls) == len(fields)
+    arrays = report["modes"]["changed"]["mode_3"]["arrays"]
+    assert list(arrays) == ["thrust_coefficient"]
+    size = np.size(modes[2]["thrust_coefficient"])
+    assert arrays["thrust_coefficient"]["compared"] == arrays["thrust_coefficient"]["changed"] == size
+    assert len(arrays["thrust_coefficient"]["cells"]) == 10
@@ -0,0 +1,133 @@
+# Turn off pylint warnings unavoidable with pytest
+# pylint: disable=redefined-outer-name, line-too-long, redefined-builtin, missing-module-docstring
+
+import copy
+import itertools
+import json
+
+import numpy as np
+
+from power_curve_schema.duplicates import DuplicateIndex, build_index, document_hash, mode_features, mode_hash
+from power_curve_schema.encoding import encode_document
+
+
+def _set_identifier(doc, identifier):
+    for item in doc["document"]["metadata"]:
+        if item["term"] == "Identifier":
+            item["value"] = identifier
+            return doc
+    doc["document"]["metadata"].append({"term": "Identifier", "value": identifier})
+    return doc
+
+
+def _scale_power(mode, factor):
+    mode["power"] = (np.asarray(mode["power"], dtype=float) * factor).tolist()
+    return mode
+
+
+def test_document_hash_ignores_metadata_and_encoding(generic_274_20):
+    """Document hashes should ignore the document section and the encoding of curve arrays"""
+    relabelled = _set_identifier(copy.deepcopy(generic_274_20), "another-identifier")
+    assert document_hash(relabelled) == document_hash(generic_274_20)
+    assert document_hash(encode_document(generic_274_20)) == document_hash(generic_274_20)
+    generic_274_20["turbine"]["rated_power"] += 1
+    assert document_hash(relabelled) != document_hash(generic_274_20)
+
+
+def test_mode_hash_ignores_labels(generic_274_20):
+    """Mode hashes should ignore labels, names and descriptions, but not curves"""
+    mode = generic_274_20["power_curves"]["operating_modes"][0]
+    renamed = dict(mode, label="renamed", name="Renamed", description="A copy")
+    assert mode_hash(renamed) == mode_hash(mode)
+    assert mode_hash(_scale_power(copy.deepcopy(mode), 1.001)) != mode_hash(mode)
+
+
+def test_mode_features(generic_120_3, generic_274_20, generic_120_3_with_extra_parameters):
+    """Features should be log-scaled power and thrust at reference conditions, or None if not interpolable"""
+    features = mode_features(generic_120_3["power_curves"]["operating_modes"][0])
+    assert features.shape == (118,)
+    assert features[0] == 0
+    assert np.all(features >= 0)
+    assert mode_features(generic_274_20["power_curves"]["operating_modes"][0]).shape == (118,)
+    assert mode_features(generic_120_3_with_extra_parameters["power_curves"]["operating_modes"][0]) is None
+
+
+def test_identifier_collisions_and_duplicate_documents(generic_120_3, generic_274_20):
+    """Reused identifiers and republished content should be reported"""
+    identifier = "shared-identifier"
+    republished = _set_identifier(copy.deepcopy(generic_274_20), "republished")
+    index = DuplicateIndex()
+    index.add(_set_identifier(generic_120_3, identifier), source="a.json")
+    index.add(_set_identifier(copy.deepcopy(generic_274_20), identifier), source="b.json")
+    index.add(republished, source="c.json")
+
+    collisions = index.identifier_collisions()
+    assert list(collisions) == [identifier]
+    assert [source for source, _ in collisions[identifier]] == ["a.json", "b.json"]
+    assert index.duplicate_documents() == [[("b.json", identifier), ("c.json", "republished")]]
+    assert index.report()["documents"] == 3
+
+
+def test_duplicate_modes(generic_274_20):
+    """Modes with identical content should be reported across documents, whatever their labels"""
+    other = copy.deepcopy(generic_274_20)
+    other["power_curves"]["operating_modes"][0]["label"] = "copied"
+    other["turbine"]["rated_power"] += 1
+    index = build_index([generic_274_20, other])
+    assert [(0, "mode_1"), (1, "copied")] in index.duplicate_modes()
+    # Exact duplicates aren't also reported as near duplicates
+    assert all({(0, "mode_1"), (1, "copied")} != set(result["modes"]) for result in index.near_duplicate_modes())
+
+
+def test_near_duplicate_modes(generic_120_3, generic_274_20):
+    """Modes with nearly identical curves should be reported, and different turbines shouldn't"""
+    nudged = copy.deepcopy(generic_120_3)
+    _scale_power(nudged["power_curves"]["operating_modes"][0], 1.002)
+    index = build_index([generic_120_3, generic_274_20, nudged], tolerance=0.01)
+    near = index.near_duplicate_modes()
+    assert [result["modes"] for result in near] == [((0, "standard"), (2, "standard"))]
+    assert near[0]["difference"] < 0.01
+
+
+def test_near_duplicates_match_all_pairs(generic_274_20):
+    """Near duplicates found by fingerprints should be those found by comparing every pair of modes"""
+    rng = np.random.default_rng(1)
+    mode = generic_274_20["power_curves"]["operating_modes"][0]
+    documents = []
+    for i in range(40):
+        doc = {"power_curves": {"operating_modes": []}}
+        # A few families of similar modes, with small perturbations within each family
+        family = _scale_power(copy.deepcopy(mode), 1 + 0.1 * (i % 4))
+        for j in range(3):
+            perturbed = _scale_power(copy.deepcopy(family), 1 + rng.uniform(-0.004, 0.004))
+            perturbed["label"] = f"mode_{j}"
+            doc["power_curves"]["operating_modes"].append(perturbed)
+        documents.append(doc)
+
+    tolerance = 0.01
+    index = build_index(documents, tolerance=tolerance)
+    found = {frozenset(result["modes"]) for result in index.near_duplicate_modes()}
+
+    modes = [
+        ((i, m["label"]), mode_features(m))
+        for i, doc in enumerate(documents)
+        for m in doc["power_curves"]["operating_modes"]
+    ]
+    expected = {
+        frozenset((first, second))
+        for (first, a), (second, b) in itertools.combinations(modes, 2)
+        if 0 < np.max(np.abs(a - b)) <= tolerance
+    }
+    assert expected
+    assert found == expected
+
+
+def test_build_index_from_paths(tmp_path, generic_120_3):
+    """Indices should be built from paths, reported by path"""
+    paths = []
+    for name in ("first.json", "second.json"):
+        path = tmp_path / name
+        path.write_text(json.dumps(generic_120_3), encoding="utf-8")
+        paths.append(path)
+    index = build_index(paths)
+    assert index.duplicate_modes() == [[(str(paths[0]), "standard"), (str(paths[1]), "standard")]]
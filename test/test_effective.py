@@ -0,0 +1,96 @@
+# Turn off pylint warnings unavoidable with pytest
+# pylint: disable=redefined-outer-name, line-too-long, redefined-builtin, missing-module-docstring
+
+import subprocess
+import sys
+
+import pytest
+
+from power_curve_schema.effective import clear_effective_modes, effective_mode, effective_modes, invalidate_effective_modes
+
+from .conftest import ROOT_DIR
+
+
+def test_overrides(generic_274_20):
+    """Overrides should take precedence over the turbine's values, which apply otherwise"""
+    modes = effective_modes(generic_274_20)
+    assert modes.labels == ("mode_1", "mode_2", "mode_3")
+    assert modes["mode_1"].rated_power == 20e6
+    assert modes["mode_2"].rated_power == 18e6
+    assert modes["mode_2"].rated_rpm == generic_274_20["turbine"]["rated_rpm"]
+    assert modes["mode_2"].cut_in_rpm == 1
+    assert modes["mode_2"].mode is generic_274_20["power_curves"]["operating_modes"][1]
+
+
+def test_default_mode(generic_274_20):
+    """The default operating mode should be found, and used when no label is given"""
+    modes = effective_modes(generic_274_20)
+    assert modes.default.label == "mode_1"
+    assert effective_mode(generic_274_20).label == "mode_1"
+    assert [mode.is_default for mode in modes] == [True, False, False]
+    with pytest.raises(KeyError, match="no operating mode 'missing'"):
+        effective_mode(generic_274_20, "missing")
+
+
+def test_hub_heights(generic_274_20):
+    """Hub heights should be allowed by both the turbine's available hub heights and the mode's restrictions"""
+    modes = effective_modes(generic_274_20)
+    assert [mode.label for mode in modes.for_hub_height(145.0)] == ["mode_1", "mode_2"]
+    assert [mode.label for mode in modes.for_hub_height(150.0)] == ["mode_1", "mode_2", "mode_3"]
+    assert modes.for_hub_height(160.0) == []
+
+
+def test_design_bases(generic_274_20):
+    """Design basis labels should resolve to the document's design bases"""
+    basis = effective_mode(generic_274_20, "mode_1").design_bases[0]
+    assert basis is generic_274_20["design_bases"][0]
+    generic_274_20["power_curves"]["operating_modes"][0]["design_bases"] = ["missing"]
+    with pytest.raises(ValueError, match="unknown design basis 'missing'"):
+        effective_modes(generic_274_20)
+
+
+def test_views_are_cached(generic_274_20):
+    """Views should be reused while the document is unchanged"""
+    clear_effective_modes()
+    assert effective_modes(generic_274_20) is effective_modes(generic_274_20)
+
+
+def test_views_are_invalidated(generic_274_20):
+    """Views should be resolved again when sections of the document are replaced or edited in place"""
+    view = effective_modes(generic_274_20)
+    generic_274_20["turbine"] = {**generic_274_20["turbine"], "rated_power": 21e6}
+    assert effective_modes(generic_274_20) is not view
+    assert effective_mode(generic_274_20, "mode_1").rated_power == 21e6
+
+    generic_274_20["turbine"]["rated_power"] = 22e6
+    assert effective_mode(generic_274_20, "mode_1").rated_power == 22e6
+    generic_274_20["power_curves"]["operating_modes"][1]["overrides"]["rated_power"] = 17e6
+    assert effective_mode(generic_274_20, "mode_2").rated_power == 17e6
+
+    generic_274_20["power_curves"]["operating_modes"][0]["restricted_to_hub_heights"] = {"min": 150}
+    assert [mode.label for mode in effective_modes(generic_274_20).for_hub_height(140.0)] == ["mode_2", "mode_3"]
+    generic_274_20["power_curves"]["operating_modes"][0]["restricted_to_hub_heights"]["min"] = 130
+    assert [mode.label for mode in effective_modes(generic_274_20).for_hub_height(140.0)] == ["mode_1", "mode_2", "mode_3"]
+
+    mode = {**generic_274_20["power_curves"]["operating_modes"][2]}
+    generic_274_20["power_curves"]["operating_modes"][2] = mode
+    assert effective_mode(generic_274_20, "mode_3").mode is mode
+    generic_274_20["power_curves"]["operating_modes"].pop()
+    assert "mode_3" not in effective_modes(generic_274_20)
+
+    view = effective_modes(generic_274_20)
+    invalidate_effective_modes(generic_274_20)
+    assert effective_modes(generic_274_20) is not view
+
+
+def test_does_not_import_numpy():
+    """Effective modes are used by light tools, so shouldn't import numpy"""
+    code = "import sys; import power_curve_schema.effective; assert 'numpy' not in sys.modules"
+    subprocess.run([sys.executable, "-c", code], cwd=ROOT_DIR, check=True)
+
+
+def test_duplicate_labels(generic_274_20):
+    """Duplicate mode labels should be rejected"""
+    generic_274_20["power_curves"]["operating_modes"][1]["label"] = "mode_1"
+    with pytest.raises(ValueError, match="not unique"):
+        effective_modes(generic_274_20)
@@ -0,0 +1,87 @@
+# Turn off pylint warnings unavoidable with pytest
+# pylint: disable=redefined-outer-name, line-too-long, redefined-builtin, missing-module-docstring
+
+import json
+
+import numpy as np
+import pytest
+
+from power_curve_schema.arrays import CURVE_FIELDS, to_ndarray
+from power_curve_schema.encoding import (
+    DEFAULT_PRECISION,
+    ENCODINGS,
+    decode_array,
+    decode_document,
+    encode_array,
+    encode_document,
+    is_encoded,
+)
+from power_curve_schema.validation import validate
+
+
+def _max_errors(original, decoded):
+    """Get the maximum absolute error in each curve field across all modes of two documents"""
+    errors = {}
+    for mode, decoded_mode in zip(original["power_curves"]["operating_modes"], decoded["power_curves"]["operating_modes"]):
+        for field in CURVE_FIELDS:
+            if field in mode:
+                error = np.max(np.abs(to_ndarray(mode[field]) - to_ndarray(decoded_mode[field])))
+                errors[field] = max(errors.get(field, 0), error)
+    return errors
+
+
+@pytest.mark.parametrize("encoding", ["delta", "rle"])
+def test_lossless_encodings_round_trip_exactly(generic_274_20, encoding):
+    """Lossless encodings should reproduce every value bit-for-bit, including float noise"""
+    encoded = json.loads(json.dumps(encode_document(generic_274_20, encoding=encoding)))
+    decoded = decode_document(encoded)
+    assert decoded["power_curves"] == generic_274_20["power_curves"]
+
+
+def test_float32_error_bound(generic_274_20):
+    """Float32 storage should be accurate to within single precision"""
+    decoded = decode_document(encode_document(generic_274_20, encoding="float32"))
+    for field, error in _max_errors(generic_274_20, decoded).items():
+        assert error <= 2**-24 * 20000000.0, field
+
+
+def test_quantize_error_bound(generic_274_20):
+    """Quantized values should be within half a quantization step of the originals"""
+    decoded = decode_document(encode_document(generic_274_20, encoding="quantize"))
+    for field, error in _max_errors(generic_274_20, decoded).items():
+        assert error <= DEFAULT_PRECISION[field] / 2 * (1 + 1e-9), field
+
+
+@pytest.mark.parametrize("encoding", ENCODINGS)
+def test_decoded_documents_are_schema_valid(generic_274_20, encoding):
+    """Decoding should produce schema-valid documents, without modifying the input"""
+    encoded = encode_document(generic_274_20, encoding=encoding)
+    assert all(is_encoded(mode["power"]) for mode in encoded["power_curves"]["operating_modes"])
+    assert not is_encoded(generic_274_20["power_curves"]["operating_modes"][0]["power"])
+    validate(instance=decode_document(encoded))
+
+
+def test_high_dimensional_arrays_shrink_by_an_order_of_magnitude():
+    """A smooth 4-D power array with plateaus should compress to a tenth of its JSON size"""
+    wind_speed = np.arange(3, 30.5, 0.5)
+    air_density = np.linspace(1.1, 1.275, 8)[:, None, None, None]
+    turbulence_intensity = np.linspace(0.05, 0.25, 6)[:, None, None]
+    shear = np.linspace(0, 0.4, 5)[:, None]
+    power = 0.5 * air_density * np.pi * 137**2 * 0.45 * wind_speed**3 * (1 - turbulence_intensity / 10) * (1 + shear / 20)
+    power = np.minimum(power, 20e6)
+
+    encoded = encode_array(power, encoding="quantize", precision=1.0)
+    assert len(json.dumps(power.tolist())) > 10 * len(json.dumps(encoded))
+    assert np.max(np.abs(decode_array(encoded) - power)) <= 0.5
+
+
+def test_unknown_encoding():
+    """An unknown encoding should raise a ValueError"""
+    with pytest.raises(ValueError):
+        encode_array([1.0, 2.0], encoding="zip")
+
+
+def test_quantize_requires_precision():
+    """Quantizing without a positive precision should raise a ValueError"""
+    with pytest.raises(ValueError):
+        encode_array([1.0, 2.0], encoding="quantize")
@@ -1,19 +1,19 @@
 # Turn off pylint warnings unavoidable with pytest
 # pylint: disable=redefined-outer-name, line-too-long, redefined-builtin, missing-module-docstring
 
-from jsonschema import validate
+from power_curve_schema.validation import load_schema, validate
 
 
-def test_generic_120_3_with_extra_parameters(schema, generic_120_3_with_extra_parameters):
+def test_generic_120_3_with_extra_parameters(generic_120_3_with_extra_parameters):
     """Validation should pass on the entire example document"""
-    validate(instance=generic_120_3_with_extra_parameters, schema=schema)
+    validate(instance=generic_120_3_with_extra_parameters, schema=load_schema())
 
 
-def test_generic_120_3(schema, generic_120_3):
+def test_generic_120_3(generic_120_3):
     """Validation should pass on the entire example document"""
-    validate(instance=generic_120_3, schema=schema)
+    validate(instance=generic_120_3, schema=load_schema())
 
 
-def test_generic_274_20(schema, generic_274_20):
+def test_generic_274_20(generic_274_20):
     """Validation should pass on the entire example document"""
-    validate(instance=generic_274_20, schema=schema)
+    validate(instance=generic_274_20, schema=load_schema())
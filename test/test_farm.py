@@ -0,0 +1,111 @@
+# Turn off pylint warnings unavoidable with pytest
+# pylint: disable=redefined-outer-name, line-too-long, redefined-builtin, missing-module-docstring
+
+import tracemalloc
+
+import numpy as np
+import pytest
+
+from power_curve_schema.farm import FarmEvaluator, is_hub_height_available
+from power_curve_schema.interpolation import ModeInterpolant
+
+
+@pytest.fixture()
+def farm(generic_274_20, generic_120_3):
+    """A farm of 200 turbines, in three groups across two documents"""
+    turbines = [(generic_274_20, "mode_1", 140.0)] * 100 + [(generic_274_20, "mode_3", 150.0)] * 50 + [(generic_120_3, None, 116.5)] * 50
+    return FarmEvaluator(turbines)
+
+
+@pytest.fixture()
+def flow():
+    """Random wind speeds for 360 flow cases, with a fixed air density at each turbine"""
+    rng = np.random.default_rng(0)
+    return {"wind-speed": rng.uniform(0.0, 32.0, (360, 200)), "air-density": rng.uniform(1.1, 1.3, 200)}
+
+
+def test_farm_matches_mode_interpolants(farm, flow, generic_274_20, generic_120_3):
+    """Each turbine should get the same values as interpolating its own mode, with values outside the grid clipped"""
+    results = farm(flow)
+    assert len(farm.groups) == 3
+
+    mode_3 = ModeInterpolant(generic_274_20["power_curves"]["operating_modes"][2], out_of_bounds="clip")
+    expected = mode_3({"wind-speed": flow["wind-speed"][:, 100:150], "air-density": flow["air-density"][100:150]}, field="thrust_coefficient")
+    assert np.allclose(results["thrust_coefficient"][:, 100:150], expected, rtol=1e-12, atol=0)
+
+    standard = ModeInterpolant(generic_120_3["power_curves"]["operating_modes"][0], out_of_bounds="clip")
+    assert np.allclose(results["power"][:, 150:], standard({"wind-speed": flow["wind-speed"][:, 150:]}), rtol=1e-12, atol=0)
+
+
+def test_buffers_are_reused(farm, flow):
+    """Repeated calls should return the same buffers, without allocating arrays"""
+    first = farm(flow)["power"]
+    flow["wind-speed"] = flow["wind-speed"][::-1].copy()
+    tracemalloc.start()
+    second = farm(flow)["power"]
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    assert second is first
+    assert peak < first.nbytes / 4
+
+
+def test_single_case(farm):
+    """Flow values given per turbine (or for all turbines) should give results per turbine"""
+    results = farm({"wind-speed": np.linspace(3, 25, 200), "air-density": 1.225})
+    assert results["power"].shape == (200,)
+    assert results["power"][-1] == 3450000.0
+
+
+def test_hub_heights():
+    """Hub heights should be checked against both discrete lists and ranges"""
+    assert is_hub_height_available(None, 100.0)
+    assert is_hub_height_available([91.5, 116.5], 116.5)
+    assert not is_hub_height_available([91.5, 116.5], 120.0)
+    assert is_hub_height_available({"min": 120.0}, 200.0)
+    assert not is_hub_height_available({"min": 120.0, "max": 180.0}, 200.0)
+
+
+def test_restricted_hub_heights(generic_274_20):
+    """Turbines can't use a mode which is restricted from their hub height, or a hub height which isn't available"""
+    with pytest.raises(ValueError, match="restricted"):
+        FarmEvaluator([(generic_274_20, "mode_3", 145.0)])
+    with pytest.raises(ValueError, match="not available"):
+        FarmEvaluator([(generic_274_20, "mode_1", 160.0)])
+
+
+def test_out_of_bounds(generic_274_20):
+    """Flow values outside a mode's grid can be made to raise"""
+    farm = FarmEvaluator([(generic_274_20, None, 140.0)], out_of_bounds="raise")
+    with pytest.raises(ValueError, match="outside the range"):
+        farm({"wind-speed": 12.0, "air-density": 1.5})
+    with pytest.raises(KeyError):
+        farm({"wind-speed": 12.0})
+
+
+def test_bucketed_modes_are_rejected(generic_274_20):
+    """Modes with bucketed axes can't be evaluated for a farm"""
+    mode = generic_274_20["power_curves"]["operating_modes"][0]
+    mode["parameters"][0] = {"label": "turbulence-intensity", "axis": 0, "values": [{"min": 0.02 * i, "max": 0.02 * (i + 1)} for i in range(8)]}
+    with pytest.raises(ValueError, match="bucketed axes"):
+        FarmEvaluator([(generic_274_20, "mode_1", 140.0)])
+
+
+def test_uneven_grids(generic_120_3):
+    """Grids too uneven for a bounded lookup table should still find the right interval"""
+    mode = generic_120_3["power_curves"]["operating_modes"][0]
+    speeds = [0.0, 1e-7, 2e-7, 3e-7] + list(range(1, 1001))
+    mode["parameters"][1]["values"] = speeds
+    mode["power"] = mode["thrust_coefficient"] = [float(i) for i in range(len(speeds))]
+    points = np.array([5e-4, 1.5e-7, 0.5, 999.5])
+    results = FarmEvaluator([(generic_120_3, None, 116.5)] * 4)({"wind-speed": points})
+    expected = ModeInterpolant(mode, out_of_bounds="clip")({"wind-speed": points})
+    assert np.allclose(results["power"], expected, rtol=1e-12, atol=0)
+    assert results["power"][0] == pytest.approx(3.0005, abs=1e-6)
+
+
+def test_flow_values_must_cover_every_turbine(farm, flow):
+    """Flow arrays with a value for too few (or too many) turbines should be rejected, rather than clipped"""
+    with pytest.raises(ValueError, match="have 199 turbines, expected 200"):
+        farm({**flow, "air-density": flow["air-density"][:199]})
+    with pytest.raises(ValueError, match="have 201 turbines"):
+        farm({**flow, "wind-speed": np.ones((360, 201))})
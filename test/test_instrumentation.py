@@ -0,0 +1,156 @@
+# Turn off pylint warnings unavoidable with pytest
+# pylint: disable=redefined-outer-name, line-too-long, redefined-builtin, missing-module-docstring
+
+import io
+import json
+import logging
+import os
+import tracemalloc
+import urllib.error
+import urllib.request
+
+import pytest
+
+from lenses.lenses import alpha_3_to_alpha_4
+from power_curve_schema import instrumentation, serialization
+from power_curve_schema.encoding import decode_document, encode_document
+from power_curve_schema.farm import FarmEvaluator
+from power_curve_schema.instrumentation import Aggregator, LoggingSink, MetricsServer, count, instrumented, span
+from power_curve_schema.interpolation import ModeInterpolant
+from power_curve_schema.validation import validate
+
+from .conftest import ROOT_DIR
+
+
+@pytest.fixture()
+def events():
+    """A list of the events emitted while the test runs"""
+    received = []
+    with instrumented(received.append):
+        yield received
+
+
+def test_disabled_by_default():
+    """Without sinks, spans should be a shared falsy no-op and counters should do nothing"""
+    assert not instrumentation.enabled()
+    first, second = span("a", size=1), span("b")
+    assert first is second and not first
+    with first as active:
+        active.set(size=2)
+    count("c", 3)
+
+
+def test_spans_and_counters(events):
+    """Spans should be timed and nested, and counters attributed to their enclosing span"""
+    with span("outer", size=1) as outer:
+        assert outer
+        with span("inner"):
+            count("cells", 5, field="power")
+        outer.set(modes=2)
+    with pytest.raises(KeyError):
+        with span("failing"):
+            raise KeyError("x")
+    assert [(event.kind, event.name, event.parent) for event in events] == [
+        ("counter", "cells", "inner"),
+        ("span", "inner", "outer"),
+        ("span", "outer", None),
+        ("span", "failing", None),
+    ]
+    assert events[0].value == 5 and events[0].attributes == {"field": "power"}
+    assert events[2].value >= events[1].value >= 0
+    assert events[2].attributes == {"size": 1, "modes": 2}
+    assert events[3].attributes == {"error": "KeyError"}
+
+
+def test_span_memory(events):
+    """Spans should record the change in traced memory while tracemalloc is tracing"""
+    tracemalloc.start()
+    try:
+        with span("allocating"):
+            values = list(range(100000))
+    finally:
+        tracemalloc.stop()
+    with span("untraced"):
+        pass
+    assert events[0].attributes["memory"] > 100000 and len(values) == 100000
+    assert "memory" not in events[1].attributes
+
+
+def test_instrumented_operations(events, generic_274_20):
+    """Parsing, validation, array conversion and evaluation should emit spans with document statistics"""
+    text = json.dumps(generic_274_20)
+    doc = serialization.load(io.StringIO(text))
+    validate(doc)
+    decode_document(encode_document(doc))
+    ModeInterpolant(doc["power_curves"]["operating_modes"][0])({"air-density": 1.2, "wind-speed": [5.0, 10.0, 15.0]})
+    FarmEvaluator([(doc, "mode_1", 140.0)] * 4)({"air-density": 1.2, "wind-speed": 10.0})
+
+    spans = {event.name: event.attributes for event in events if event.kind == "span"}
+    assert spans["json.parse"] == {"bytes": len(text), "modes": 3, "cells": 3 * 8 * 55 * 2 + 8 * 55}
+    assert spans["schema.validate"]["valid"] and spans["schema.validate"]["modes"] == 3
+    assert spans["arrays.encode"]["cells"] == spans["arrays.decode"]["cells"] == spans["json.parse"]["cells"]
+    assert spans["interpolation.evaluate"] == {"mode": "mode_1", "field": "power", "points": 3}
+    assert spans["farm.evaluate"]["turbines"] == 4 and spans["farm.evaluate"]["cases"] == 1
+    assert sum(event.value for event in events if event.name == "arrays.cells") >= 8 * 55
+
+
+def test_lens_spans(events):
+    """Each lens of a migration should be a span within the migration's span"""
+    with open(os.path.join(ROOT_DIR, "test", "fixtures", "generic-120-3-alpha-3.json"), "r", encoding="utf-8") as fp:
+        alpha_3_to_alpha_4(json.load(fp))
+    lenses = [event for event in events if event.name.startswith("lens.")]
+    assert [event.name for event in lenses] == [
+        "lens.add_power_reference_location",
+        "lens.change_shear_coefficient_to_vertical_shear_exponent",
+        "lens.move_available_hub_heights_to_restricted",
+        "lens.rename_dimension_to_axis",
+        "lens.collapse_singleton_dimensions",
+    ]
+    assert all(event.parent == "migrate.alpha_3_to_alpha_4" for event in lenses)
+    assert events[-1].name == "migrate.alpha_3_to_alpha_4"
+
+
+def test_aggregator():
+    """The aggregator should total events by name, and format them for Prometheus"""
+    aggregator = Aggregator()
+    with instrumented(aggregator):
+        for size in (10, 30):
+            with span("json.parse", bytes=size, valid=True):
+                pass
+        count("arrays.cells", 4)
+        count("arrays.cells", 6)
+    summary = aggregator.summary()
+    assert summary["json.parse"]["count"] == 2
+    assert summary["json.parse"]["attributes"] == {"bytes": 40}
+    assert summary["arrays.cells"] == {"kind": "counter", "count": 2, "total": 10, "min": 4, "max": 6, "attributes": {}}
+    text = aggregator.to_prometheus()
+    assert 'power_curve_schema_span_seconds_count{name="json.parse"} 2' in text
+    assert 'power_curve_schema_attribute_total{name="json.parse",attribute="bytes"} 40' in text
+    assert 'power_curve_schema_events_total{name="arrays.cells"} 10' in text
+    aggregator.reset()
+    assert not aggregator.summary()
+
+
+def test_logging_sink(caplog):
+    """The logging sink should log each event"""
+    with caplog.at_level(logging.DEBUG, logger="power_curve_schema.instrumentation"):
+        with instrumented(LoggingSink()):
+            with span("schema.validate", modes=3):
+                count("arrays.cells", 7)
+    assert "arrays.cells += 7" in caplog.messages[0]
+    assert caplog.messages[1].startswith("schema.validate took") and "'modes': 3" in caplog.messages[1]
+
+
+def test_metrics_server():
+    """The metrics server should serve an aggregator's totals on a local port"""
+    aggregator = Aggregator()
+    with instrumented(aggregator):
+        count("arrays.cells", 12)
+    with MetricsServer(aggregator) as server:
+        assert server.url.startswith("http://127.0.0.1:")
+        with urllib.request.urlopen(server.url, timeout=10) as response:
+            assert 'power_curve_schema_events_total{name="arrays.cells"} 12' in response.read().decode("utf-8")
+        with urllib.request.urlopen(server.url + ".json", timeout=10) as response:
+            assert json.load(response)["arrays.cells"]["total"] == 12
+        with pytest.raises(urllib.error.HTTPError):
+            urllib.request.urlopen(server.url.replace("/metrics", "/other"), timeout=10)
@@ -0,0 +1,132 @@
+# Turn off pylint warnings unavoidable with pytest
+# pylint: disable=redefined-outer-name, line-too-long, redefined-builtin, missing-module-docstring
+
+import numpy as np
+import pytest
+
+from power_curve_schema.interpolation import (
+    ModeInterpolant,
+    axis_weights,
+    regrid_document,
+    regrid_documents,
+    regrid_mode,
+)
+from power_curve_schema.validation import validate
+
+WIND_SPEEDS = [4.0 + 0.25 * i for i in range(81)]
+AIR_DENSITIES = [1.15, 1.2, 1.225]
+
+
+@pytest.fixture()
+def target():
+    """A target grid with axes in the opposite order to the example documents"""
+    return [{"label": "wind-speed", "values": WIND_SPEEDS}, {"label": "air-density", "values": AIR_DENSITIES}]
+
+
+def test_regridded_documents_are_schema_valid(generic_274_20, target):
+    """Re-gridded documents should be valid, with the target's axes and the input left unchanged"""
+    (regridded,) = regrid_documents([generic_274_20], target)
+    validate(regridded)
+    mode = regridded["power_curves"]["operating_modes"][0]
+    assert [(p["label"], p["axis"]) for p in mode["parameters"]] == [("wind-speed", 0), ("air-density", 1)]
+    assert np.shape(mode["power"]) == (81, 3)
+    assert np.shape(generic_274_20["power_curves"]["operating_modes"][0]["power"]) == (8, 55)
+
+
+def test_regridding_matches_linear_interpolation(generic_274_20, target):
+    """Re-gridded values should match 1-D linear interpolation along wind speed, at each source air density"""
+    source = generic_274_20["power_curves"]["operating_modes"][1]
+    regridded = np.array(regrid_mode(source, target)["thrust_coefficient"])
+    densities = source["parameters"][0]["values"]
+    for i, density in enumerate(AIR_DENSITIES):
+        expected = np.interp(
+            WIND_SPEEDS, source["parameters"][1]["values"], source["thrust_coefficient"][densities.index(density)]
+        )
+        assert np.allclose(regridded[:, i], expected, rtol=1e-12)
+
+
+def test_weights_are_shared():
+    """Weights for the same source and target axes should be computed once, and selection needs no weights"""
+    source = [3.0 + 0.5 * i for i in range(55)]
+    assert axis_weights(source, WIND_SPEEDS) is axis_weights(list(source), list(WIND_SPEEDS))
+    lower, upper, weight = axis_weights(source, [3.0, 4.0, 5.0])
+    assert lower.tolist() == upper.tolist() == [0, 2, 4]
+    assert weight is None
+
+
+def test_unsorted_source_axis():
+    """Source axes needn't be sorted"""
+    lower, upper, weight = axis_weights([2.0, 0.0, 1.0], [0.5, 1.5])
+    assert lower.tolist() == [1, 2] and upper.tolist() == [2, 0] and weight.tolist() == [0.5, 0.5]
+
+
+def test_out_of_bounds(generic_274_20):
+    """Targets outside the source range should raise unless clipped"""
+    mode = generic_274_20["power_curves"]["operating_modes"][0]
+    target = [{"label": "air-density", "values": [1.0, 1.1]}, {"label": "wind-speed", "values": [2.0, 3.0, 40.0]}]
+    with pytest.raises(ValueError, match="outside the range"):
+        regrid_mode(mode, target)
+    power = np.array(regrid_mode(mode, target, out_of_bounds="clip")["power"])
+    assert power[0, 0] == power[0, 1] == mode["power"][0][0]
+    assert power[1, 2] == mode["power"][0][-1]
+
+
+def test_mismatched_axes(generic_120_3, target):
+    """Modes can't be re-gridded onto axes they don't vary along"""
+    with pytest.raises(ValueError, match="can't be re-gridded"):
+        regrid_document(generic_120_3, target)
+
+
+def test_mode_interpolant(generic_274_20, target):
+    """Interpolating at scattered points should agree with re-gridding, writing into a given output array"""
+    mode = generic_274_20["power_curves"]["operating_modes"][0]
+    regridded = np.array(regrid_mode(mode, target)["power"])
+    interpolant = ModeInterpolant(mode)
+
+    wind_speed, air_density = np.meshgrid(WIND_SPEEDS, AIR_DENSITIES, indexing="ij")
+    out = np.empty(wind_speed.shape)
+    result = interpolant({"wind-speed": wind_speed, "air-density": air_density, "wind-veer": 0.0}, out=out)
+    assert result is out
+    assert np.allclose(out, regridded, rtol=1e-12)
+
+    assert interpolant({"wind-speed": [7.25], "air-density": 1.2}, field="rotor_rpm").shape == (1,)
+    with pytest.raises(KeyError):
+        interpolant({"wind-speed": 7.25})
+
+
+def test_bucketed_axes_are_selected(generic_274_20):
+    """Buckets in the target should be selected exactly from the source, rather than interpolated"""
+    mode = generic_274_20["power_curves"]["operating_modes"][0]
+    mode["parameters"][0] = {"label": "turbulence-intensity", "axis": 0, "values": [{"min": 0.02 * i, "max": 0.02 * (i + 1)} for i in range(8)]}
+    buckets = [{"min": 0.06, "max": 0.08}, {"min": 0.02, "max": 0.04}]
+    target = [{"label": "turbulence-intensity", "values": buckets}, mode["parameters"][1]]
+    power = regrid_mode(mode, target)["power"]
+    assert power == [mode["power"][3], mode["power"][1]]
+
+    with pytest.raises(ValueError, match="not in the source"):
+        regrid_mode(mode, [{"label": "turbulence-intensity", "values": [{"min": 0.0, "max": 0.05}]}, mode["parameters"][1]])
+
+
+def test_interpolant_selects_buckets(generic_274_20):
+    """Interpolants should select buckets along bucketed axes while interpolating along others"""
+    mode = generic_274_20["power_curves"]["operating_modes"][0]
+    mode["parameters"][0] = {"label": "turbulence-intensity", "axis": 0, "values": [{"min": 0.02 * i, "max": 0.02 * (i + 1)} for i in range(8)]}
+    mode["parameters"].append({"label": "wind-veer", "min": -5, "max": 5})
+    interpolant = ModeInterpolant(mode)
+    assert interpolant.bucketed == ("turbulence-intensity",)
+
+    power = np.array(mode["power"])
+    wind_speeds = np.array(mode["parameters"][1]["values"])
+    speeds = np.array([7.25, 12.1, 24.9])
+    expected = [np.interp(speed, wind_speeds, power[bucket]) for speed, bucket in zip(speeds, [0, 3, 7])]
+    result = interpolant({"turbulence-intensity": [0.01, 0.07, 0.159], "wind-speed": speeds})
+    assert np.allclose(result, expected)
+
+    points = {"turbulence-intensity": [0.01, 0.2, 0.01], "wind-speed": [7.0, 7.0, 7.0], "wind-veer": [0.0, 0.0, 10.0]}
+    assert interpolant.outside(points).tolist() == [False, True, True]
+    with pytest.raises(ValueError, match="no bucket"):
+        interpolant({"turbulence-intensity": 0.2, "wind-speed": 7.0})
+    with pytest.raises(ValueError, match="validity ranges"):
+        interpolant({"turbulence-intensity": 0.01, "wind-speed": 7.0, "wind-veer": 10.0})
+    clipped = ModeInterpolant(mode, out_of_bounds="clip")
+    assert clipped({"turbulence-intensity": 0.2, "wind-speed": 7.0, "wind-veer": 10.0}) == clipped({"turbulence-intensity": 0.15, "wind-speed": 7.0})
@@ -0,0 +1,106 @@
+# Turn off pylint warnings unavoidable with pytest
+# pylint: disable=redefined-outer-name, line-too-long, redefined-builtin, missing-module-docstring
+
+import json
+
+import numpy as np
+import pytest
+
+from power_curve_schema.chunked import ChunkedArray, export_document
+from power_curve_schema.long_format import columns, export_parquet, iter_mode_batches, iter_record_batches
+
+
+def test_mode_batches(generic_274_20):
+    """Each cell of a mode should become a row with its axis coordinates, value parameters and curve values"""
+    mode = generic_274_20["power_curves"]["operating_modes"][0]
+    (batch,) = iter_mode_batches("doc", mode)
+    assert tuple(batch) == columns()
+    assert all(len(column) == 8 * 55 for column in batch.values())
+    power = np.asarray(mode["power"])
+    row = 3 * 55 + 10
+    assert batch["air_density"][row] == mode["parameters"][0]["values"][3]
+    assert batch["wind_speed"][row] == mode["parameters"][1]["values"][10]
+    assert batch["power"][row] == power[3, 10]
+    assert batch["rotor_rpm"][row] == np.asarray(mode["rotor_rpm"])[3, 10]
+    assert np.isnan(batch["turbulence_intensity"]).all() and np.isnan(batch["wind_speed_min"]).all()
+    assert set(batch["document_id"]) == {"doc"} and set(batch["mode"]) == {"mode_1"}
+
+
+def test_bucket_and_range_parameters(generic_120_3):
+    """Bucketed axes and validity ranges should fill the min and max columns"""
+    mode = generic_120_3["power_curves"]["operating_modes"][0]
+    mode["parameters"] = [
+        {"label": "wind-speed", "axis": 0, "values": [{"min": 3.0 + i, "max": 4.0 + i} for i in range(45)]},
+        {"label": "turbulence-intensity", "min": 0.05, "max": 0.15},
+        {"label": "air-density", "value": 1.225},
+    ]
+    (batch,) = iter_mode_batches("doc", mode)
+    assert batch["wind_speed_min"][:3].tolist() == [3.0, 4.0, 5.0]
+    assert batch["wind_speed_max"][:3].tolist() == [4.0, 5.0, 6.0]
+    assert np.isnan(batch["wind_speed"]).all()
+    assert set(batch["turbulence_intensity_min"]) == {0.05} and set(batch["air_density"]) == {1.225}
+
+
+def test_batches_are_bounded(six_dimensional_document, generic_120_3):
+    """Batches should never exceed the row limit, with large modes split and small ones gathered together"""
+    batches = list(iter_record_batches([generic_120_3, generic_120_3, six_dimensional_document], batch_rows=10000))
+    assert max(len(batch["mode"]) for batch in batches) == 10000
+    assert sum(len(batch["mode"]) for batch in batches) == 2 * 45 + 3 * 63360
+    assert batches[0]["mode"][:90].tolist() == ["standard"] * 90
+
+    rows = np.concatenate([batch["power"] for batch in batches])[90 : 90 + 63360]
+    assert np.array_equal(rows, np.asarray(six_dimensional_document["power_curves"]["operating_modes"][0]["power"]).ravel())
+    wind_speeds = np.concatenate([batch["wind_speed"] for batch in batches])[90 : 90 + 63360]
+    assert wind_speeds[:56].tolist() == [3.0 + 0.5 * i for i in range(55)] + [3.0]
+
+
+def test_default_document_ids(generic_120_3):
+    """Documents without an Identifier should be identified by their position in the sources"""
+    generic_120_3["document"]["metadata"] = [item for item in generic_120_3["document"]["metadata"] if item["term"] != "Identifier"]
+    (batch,) = iter_record_batches([generic_120_3, generic_120_3])
+    assert batch["document_id"][::45].tolist() == ["0", "1"]
+
+
+def test_sources_from_files(tmp_path, generic_274_20):
+    """Paths to JSON documents and chunked stores should be read, identified by their Identifier metadata"""
+    json_path = tmp_path / "doc.json"
+    json_path.write_text(json.dumps(generic_274_20), encoding="utf-8")
+    export_document(generic_274_20, tmp_path / "doc.zarr")
+    batches = list(iter_record_batches([json_path, tmp_path / "doc.zarr"]))
+    identifiers = {item["value"] for item in generic_274_20["document"]["metadata"] if item["term"] == "Identifier"}
+    assert set(batches[0]["document_id"]) == identifiers
+    half = len(batches[0]["mode"]) // 2
+    assert np.array_equal(batches[0]["power"][:half], batches[0]["power"][half:], equal_nan=True)
+
+
+def test_chunked_stores_are_read_a_batch_at_a_time(tmp_path, generic_274_20, monkeypatch):
+    """Batches of a chunked store should match those of the document, without reading its arrays whole"""
+    store = export_document(generic_274_20, tmp_path / "doc.zarr", chunk_bytes=8 * 40)
+    monkeypatch.setattr(ChunkedArray, "read", None)
+    expected = list(iter_record_batches([generic_274_20], batch_rows=100))
+    batches = list(iter_record_batches([store.path], batch_rows=100))
+    assert len(batches) == len(expected)
+    for batch, expected_batch in zip(batches, expected):
+        for field in ("power", "thrust_coefficient", "rotor_rpm", "wind_speed"):
+            assert np.array_equal(batch[field], expected_batch[field], equal_nan=True)
+
+
+def test_mismatched_arrays(generic_120_3_with_extra_parameters):
+    """Arrays which don't match their axes can't be flattened"""
+    with pytest.raises(ValueError, match="but its axes have shape"):
+        list(iter_record_batches([generic_120_3_with_extra_parameters]))
+
+
+def test_export_parquet(tmp_path, generic_120_3, generic_274_20):
+    """Parts should be written in parallel and read back as one table"""
+    pyarrow_parquet = pytest.importorskip("pyarrow.parquet")
+    paths = []
+    for i, doc in enumerate([generic_120_3, generic_274_20] * 3):
+        paths.append(tmp_path / f"{i}.json")
+        paths[-1].write_text(json.dumps(doc), encoding="utf-8")
+
+    parts = export_parquet(paths, tmp_path / "curves", documents_per_part=2, processes=2, batch_rows=500)
+    assert [rows for _, rows in parts] == [45 + 8 * 55 * 3] * 3
+    table = pyarrow_parquet.read_table(tmp_path / "curves")
+    assert table.column_names == list(columns())
+    assert table.num_rows == 3 * (45 + 8 * 55 * 3)
@@ -0,0 +1,79 @@
+# Turn off pylint warnings unavoidable with pytest
+# pylint: disable=redefined-outer-name, line-too-long, redefined-builtin, missing-module-docstring, protected-access
+
+import json
+import os
+
+import numpy as np
+import pytest
+
+from power_curve_schema.model import PowerCurveDocument
+
+from .conftest import ROOT_DIR
+
+
+def test_attribute_access(generic_274_20):
+    """Document content should be available through typed attributes"""
+    doc = PowerCurveDocument.from_dict(generic_274_20)
+    assert doc.identifier == "6d3ff892-8763-4448-aab9-ab8454bf6ec5"
+    assert doc.turbine.rated_power == 20000000
+    assert doc.design_bases[0].label == "basis_1"
+    mode = doc.mode("mode_1")
+    assert [parameter.label for parameter in mode.axis_parameters] == ["air-density", "wind-speed"]
+    assert mode.parameter("wind-speed").values.shape == (55,)
+    assert mode.cuts[0].cut_type == "low-cut-in"
+
+
+def test_arrays_are_materialized_lazily(generic_274_20):
+    """Curve arrays should stay in source form until first accessed, then be held as read-only numpy arrays"""
+    mode = PowerCurveDocument.from_dict(generic_274_20).mode("mode_1")
+    assert isinstance(mode._arrays["power"], list)
+
+    power = mode.power
+    assert isinstance(power, np.ndarray)
+    assert power.shape == (8, 55)
+    assert mode.power is power
+    assert isinstance(mode._arrays["thrust_coefficient"], list)
+    assert mode.rotor_rpm.shape == (8, 55)
+    with pytest.raises(ValueError):
+        power[0, 0] = 1
+
+
+def test_model_is_read_only(generic_120_3):
+    """Attributes of the model cannot be reassigned"""
+    doc = PowerCurveDocument.from_dict(generic_120_3)
+    with pytest.raises(AttributeError):
+        doc.turbine.rated_power = 1
+    with pytest.raises(AttributeError):
+        doc.operating_modes[0].label = "other"
+
+
+def test_missing_mode(generic_120_3):
+    """Looking up a mode which isn't present should raise a KeyError"""
+    with pytest.raises(KeyError):
+        PowerCurveDocument.from_dict(generic_120_3).mode("not_a_mode")
+
+
+@pytest.mark.parametrize("name", ["generic-120-3.json", "generic-120-3-with-extra-parameters.json", "generic-274-20.json"])
+def test_json_round_trip(name):
+    """Loading a document from JSON and converting back should reproduce the document"""
+    path = os.path.join(ROOT_DIR, "power-curve-schema", "examples", name)
+    with open(path, "r", encoding="utf-8") as fp:
+        expected = json.load(fp)
+    assert PowerCurveDocument.from_json(path).to_dict() == expected
+    with open(path, "r", encoding="utf-8") as fp:
+        assert PowerCurveDocument.from_json(fp).to_dict() == expected
+
+
+@pytest.mark.parametrize("compress", [False, True])
+def test_binary_round_trip(tmp_path, generic_274_20, compress):
+    """Documents written to a binary store should load back lazily with identical content"""
+    path = str(tmp_path / "doc.npz")
+    PowerCurveDocument.from_dict(generic_274_20).to_binary(path, compress=compress)
+
+    with PowerCurveDocument.from_binary(path) as doc:
+        mode = doc.mode("mode_2")
+        assert callable(mode._arrays["power"])
+        assert mode.power.tolist() == generic_274_20["power_curves"]["operating_modes"][1]["power"]
+        assert mode.rotor_rpm is None
+        assert doc.to_dict() == generic_274_20
@@ -0,0 +1,79 @@
+# Turn off pylint warnings unavoidable with pytest
+# pylint: disable=redefined-outer-name, line-too-long, redefined-builtin, missing-module-docstring
+
+import numpy as np
+import pytest
+
+from power_curve_schema.interpolation import ModeInterpolant
+from power_curve_schema.monte_carlo import DEFAULT_WIND_SPEEDS, HOURS_PER_YEAR, simulate_aep
+
+
+def test_without_uncertainty(generic_120_3):
+    """With nothing uncertain, every sample should have the AEP of the power curve integrated over the Weibull distribution"""
+    results = simulate_aep(generic_120_3, 8.0, 2.0, samples=1000, keep_samples=True)
+    mode = generic_120_3["power_curves"]["operating_modes"][0]
+    wind_speeds = np.asarray(next(parameter["values"] for parameter in mode["parameters"] if "axis" in parameter))
+
+    # Fine trapezoidal integration of the curve (zero outside the wind speed axis) against the Weibull density
+    speeds = np.linspace(wind_speeds[0], wind_speeds[-1], 200001)
+    density = 2.0 / 8.0 * (speeds / 8.0) * np.exp(-((speeds / 8.0) ** 2))
+    integrand = np.interp(speeds, wind_speeds, mode["power"]) * density
+    expected = HOURS_PER_YEAR * np.sum((integrand[1:] + integrand[:-1]) / 2 * np.diff(speeds))
+
+    result = results["standard"]
+    assert np.allclose(result["samples"], result["mean"], rtol=1e-12, atol=0)
+    assert result["mean"] == pytest.approx(expected, rel=2e-3)
+    assert result["std"] == pytest.approx(0, abs=1e-6 * expected)
+    assert result["P50"] == pytest.approx(result["mean"], rel=1e-4) and result["P90"] == pytest.approx(result["mean"], rel=1e-4)
+
+
+def test_matches_mode_interpolant(generic_274_20):
+    """Sampled air densities should give the same AEP as evaluating the mode at each sample's density"""
+    results = simulate_aep(generic_274_20, 9.0, 2.2, {"air-density": ("choice", [1.1, 1.213, 1.3])}, samples=20, seed=3, mode_labels=["mode_2"], keep_samples=True)
+    interpolant = ModeInterpolant(generic_274_20["power_curves"]["operating_modes"][1], out_of_bounds="clip")
+    edges = np.concatenate(([0.0], (DEFAULT_WIND_SPEEDS[1:] + DEFAULT_WIND_SPEEDS[:-1]) / 2, [np.inf]))
+    probabilities = np.diff(1 - np.exp(-((edges / 9.0) ** 2.2)))
+    inside = (DEFAULT_WIND_SPEEDS >= 3) & (DEFAULT_WIND_SPEEDS <= 30)
+    expected = {
+        density: HOURS_PER_YEAR * np.sum(probabilities[inside] * interpolant({"air-density": density, "wind-speed": DEFAULT_WIND_SPEEDS[inside]}))
+        for density in (1.1, 1.213, 1.3)
+    }
+    assert list(results) == ["mode_2"]
+    samples = results["mode_2"]["samples"]
+    assert all(any(np.isclose(sample, value, rtol=1e-12) for value in expected.values()) for sample in samples)
+    assert len({round(sample) for sample in samples}) == 3
+
+
+def test_reproducible_across_processes(generic_274_20):
+    """Results should depend on the seed, but not on the number of processes"""
+    arguments = {"parameters": {"air-density": ("normal", 1.2, 0.03)}, "wind_speed_uncertainty": 0.05, "power_uncertainty": 0.03, "samples": 5000, "batch_size": 1000, "keep_samples": True}
+    single = simulate_aep(generic_274_20, 9.5, 2.1, seed=7, **arguments)
+    multiple = simulate_aep(generic_274_20, 9.5, 2.1, seed=7, processes=2, **arguments)
+    other = simulate_aep(generic_274_20, 9.5, 2.1, seed=8, **arguments)
+    for label in ("mode_1", "mode_2", "mode_3"):
+        assert np.array_equal(single[label]["samples"], multiple[label]["samples"])
+        assert single[label]["P90"] == multiple[label]["P90"]
+        assert not np.array_equal(single[label]["samples"], other[label]["samples"])
+
+
+def test_streamed_statistics(generic_274_20):
+    """Streamed moments and histogram quantiles should match those of the kept samples"""
+    results = simulate_aep(generic_274_20, 9.5, 2.1, {"air-density": ("uniform", 1.1, 1.3)}, wind_speed_uncertainty=0.06, power_uncertainty=0.04, samples=30000, batch_size=4096, seed=0, exceedance=(50, 75, 90), keep_samples=True)
+    for result in results.values():
+        samples = result["samples"]
+        assert samples.shape == (30000,)
+        assert result["mean"] == pytest.approx(samples.mean(), rel=1e-12)
+        assert result["std"] == pytest.approx(samples.std(ddof=1), rel=1e-9)
+        for probability in (50, 75, 90):
+            assert result[f"P{probability}"] == pytest.approx(np.percentile(samples, 100 - probability), rel=1e-4)
+        assert result["P90"] < result["P75"] < result["P50"]
+
+
+def test_invalid_inputs(generic_274_20):
+    """Missing parameters, unknown distributions and unknown modes should be reported"""
+    with pytest.raises(KeyError, match="needs values for parameters"):
+        simulate_aep(generic_274_20, 9.5, 2.1)
+    with pytest.raises(ValueError, match="Invalid distribution"):
+        simulate_aep(generic_274_20, 9.5, 2.1, {"air-density": ("gamma", 1, 2)})
+    with pytest.raises(KeyError, match="no operating modes"):
+        simulate_aep(generic_274_20, 9.5, 2.1, {"air-density": 1.2}, mode_labels=["mode_4"])
@@ -0,0 +1,91 @@
+# Turn off pylint warnings unavoidable with pytest
+# pylint: disable=redefined-outer-name, line-too-long, redefined-builtin, missing-module-docstring
+
+import numpy as np
+import pytest
+
+from power_curve_schema.encoding import encode_document
+from power_curve_schema.plausibility import check_document, format_violations
+
+
+def test_examples_are_plausible(generic_120_3, generic_274_20, generic_120_3_with_extra_parameters):
+    """The example documents should pass every check with the default configuration"""
+    assert not check_document(generic_120_3)
+    assert not check_document(generic_274_20)
+    assert not check_document(generic_120_3_with_extra_parameters)
+
+
+def test_power_above_rated_uses_overrides(generic_274_20):
+    """Power above an overridden rated power should be located by cell, and disabling the check should silence it"""
+    mode_2 = generic_274_20["power_curves"]["operating_modes"][1]
+    mode_2["overrides"]["rated_power"] = 17000000
+    violations = check_document(generic_274_20)
+    assert {(violation["check"], violation["mode"]) for violation in violations} == {("power-above-rated", "mode_2")}
+    power = np.asarray(mode_2["power"])
+    assert np.array_equal(violations[0]["indices"], np.argwhere(power > 17000000))
+    assert np.all(violations[0]["values"] > 17000000)
+
+    assert not check_document(generic_274_20, config={"power-above-rated": {"rtol": 0.1}})
+    assert not check_document(generic_274_20, config={"power-above-rated": False})
+
+
+def test_thrust_coefficient_and_rotor_rpm(generic_274_20):
+    """Out of range thrust coefficients and rotor speeds above rated should be flagged at their cells"""
+    mode_1 = generic_274_20["power_curves"]["operating_modes"][0]
+    mode_1["thrust_coefficient"][2][10] = -0.1
+    mode_1["thrust_coefficient"][5][40] = 1.5
+    mode_1["rotor_rpm"][7][30] = 6.5
+    violations = {violation["check"]: violation for violation in check_document(generic_274_20)}
+    assert violations["thrust-coefficient-range"]["indices"].tolist() == [[2, 10], [5, 40]]
+    assert violations["thrust-coefficient-range"]["values"].tolist() == [-0.1, 1.5]
+    assert violations["rotor-rpm-above-rated"]["indices"].tolist() == [[7, 30]]
+
+    assert "thrust-coefficient-range" not in {violation["check"] for violation in check_document(generic_274_20, config={"thrust-coefficient-range": {"min": -1, "max": 2}})}
+
+
+def test_power_decreasing(generic_274_20):
+    """A dip in power below rated wind speed should be flagged at the cell after the fall, but not falls above rated"""
+    mode_3 = generic_274_20["power_curves"]["operating_modes"][2]
+    mode_3["power"][4][12] = mode_3["power"][4][11] - 1000.0
+    mode_3["power"][4][50] = mode_3["power"][4][50] - 1000.0
+    violations = check_document(generic_274_20)
+    assert [(violation["check"], violation["indices"].tolist()) for violation in violations] == [("power-decreasing", [[4, 12]])]
+    assert not check_document(generic_274_20, config={"power-decreasing": {"atol": 2000.0}})
+
+
+def test_checks_encoded_documents(generic_274_20):
+    """Documents with encoded arrays should be checked the same as plain ones"""
+    generic_274_20["power_curves"]["operating_modes"][0]["thrust_coefficient"][0][0] = 3.0
+    violations = check_document(encode_document(generic_274_20))
+    assert [violation["indices"].tolist() for violation in violations] == [[[0, 0]]]
+
+
+def test_six_dimensional_document(six_dimensional_document):
+    """Violations in a high dimensional document should be located in every dimension"""
+    mode = six_dimensional_document["power_curves"]["operating_modes"][1]
+    power = np.asarray(mode["power"])
+    power[3, 2, 1, 0, 2, 54] = 2 * six_dimensional_document["turbine"]["rated_power"]
+    mode["power"] = power.tolist()
+    violations = check_document(six_dimensional_document, config={"power-decreasing": False, "rotor-rpm-above-rated": False})
+    assert [(violation["mode"], violation["indices"].tolist()) for violation in violations] == [("mode_2", [[3, 2, 1, 0, 2, 54]])]
+
+
+def test_format_violations(generic_274_20):
+    """Formatted violations should give the parameter values at each cell"""
+    generic_274_20["power_curves"]["operating_modes"][0]["thrust_coefficient"][0][2] = 3.0
+    text = format_violations(generic_274_20, check_document(generic_274_20))
+    assert "mode mode_1: thrust coefficient outside [0.0, 1.2] in 1 cell" in text
+    assert "wind-speed=4.0: thrust_coefficient = 3" in text
+
+
+def test_unknown_check(generic_120_3):
+    """Configuring a check which doesn't exist should raise an error"""
+    with pytest.raises(ValueError, match="Unknown plausibility checks"):
+        check_document(generic_120_3, config={"power-too-high": False})
+
+
+def test_checks_can_be_enabled_with_true(generic_120_3):
+    """True should enable a check with its default options, and other non-dict options should be rejected"""
+    assert check_document(generic_120_3, config={"power-decreasing": True}) == check_document(generic_120_3)
+    with pytest.raises(ValueError, match="plausibility check 'power-decreasing'"):
+        check_document(generic_120_3, config={"power-decreasing": 1.0})
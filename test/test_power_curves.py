@@ -4,63 +4,58 @@
 from copy import deepcopy
 
 import pytest
-from jsonschema import validate
 from jsonschema.exceptions import ValidationError
 
-from .helpers import get_subschema
+from power_curve_schema.validation import load_schema, validate
 
 
-@pytest.fixture
-def subschema(schema):
-    """Provide a schema that requires only the turbine part of the whole schema"""
-    return get_subschema(schema, "power_curves")
-
-
-def test_missing_power_curves(subschema):
+def test_missing_power_curves():
     """Validation should fail if there is no power_curves section"""
     with pytest.raises(ValidationError) as e:
-        validate(instance={}, schema=subschema)
+        validate(instance={}, section="power_curves", schema=load_schema())
     assert "'power_curves' is a required property" in str(e)
 
 
-def test_missing_default_mode(subschema, one_dimensional_mode):
+def test_missing_default_mode(one_dimensional_mode):
     """Validation will not fail if there is no default_operating_mode_label value"""
 
     validate(
         instance={"power_curves": {"operating_modes": [one_dimensional_mode]}},
-        schema=subschema,
+        section="power_curves", schema=load_schema(),
     )
 
 
-def test_blank_default_mode(subschema, one_dimensional_mode):
+def test_blank_default_mode(one_dimensional_mode):
     """Validation should fail if default_operating_mode_label is blank"""
     with pytest.raises(ValidationError) as e:
         validate(
             instance={"power_curves": {"default_operating_mode_label": "", "operating_modes": [one_dimensional_mode]}},
-            schema=subschema,
+            section="power_curves", schema=load_schema(),
         )
     assert "does not match" in str(e)
 
 
-def test_missing_modes(subschema):
+def test_missing_modes():
     """Validation should fail if there is no modes section"""
     with pytest.raises(ValidationError) as e:
-        validate(instance={"power_curves": {"default_operating_mode_label": ""}}, schema=subschema)
+        validate(
+            instance={"power_curves": {"default_operating_mode_label": ""}}, section="power_curves", schema=load_schema()
+        )
     assert "'operating_modes' is a required property" in str(e)
 
 
-def test_invalid_modes(subschema):
+def test_invalid_modes():
     """Validation should fail if modes is not a list"""
     with pytest.raises(ValidationError) as e:
         validate(
             instance={"power_curves": {"default_operating_mode_label": "", "operating_modes": {}}},
-            schema=subschema,
+            section="power_curves", schema=load_schema(),
         )
 
     assert "is not of type 'array'" in str(e)
 
 
-def test_one_dimensional_mode(subschema, one_dimensional_mode):
+def test_one_dimensional_mode(one_dimensional_mode):
 
     validate(
         instance={
@@ -69,11 +64,11 @@ def test_one_dimensional_mode(subschema, one_dimensional_mode):
                 "operating_modes": [one_dimensional_mode],
             }
         },
-        schema=subschema,
+        section="power_curves", schema=load_schema(),
     )
 
 
-def test_two_dimensional_mode(subschema, two_dimensional_mode):
+def test_two_dimensional_mode(two_dimensional_mode):
 
     validate(
         instance={
@@ -82,11 +77,11 @@ def test_two_dimensional_mode(subschema, two_dimensional_mode):
                 "operating_modes": [two_dimensional_mode],
             }
         },
-        schema=subschema,
+        section="power_curves", schema=load_schema(),
     )
 
 
-def test_missing_mode_properties(subschema, one_dimensional_mode):
+def test_missing_mode_properties(one_dimensional_mode):
     """Validation should fail if there is no overrides section in a mode"""
 
     for required in [
@@ -105,12 +100,12 @@ def test_missing_mode_properties(subschema, one_dimensional_mode):
                         "operating_modes": [partial],
                     }
                 },
-                schema=subschema,
+                section="power_curves", schema=load_schema(),
             )
         assert f"'{required}' is a required property" in str(e)
 
 
-def test_invalid_cuts(subschema, one_dimensional_mode):
+def test_invalid_cuts(one_dimensional_mode):
     """Validation should fail if cut type, speed or period is invalid"""
 
     invalid = [
@@ -151,13 +146,13 @@ def test_invalid_cuts(subschema, one_dimensional_mode):
                         "operating_modes": [one_dimensional_mode],
                     }
                 },
-                schema=subschema,
+                section="power_curves", schema=load_schema(),
             )
 
         assert reason in str(e)
 
 
-def test_invalid_overrides(subschema, one_dimensional_mode):
+def test_invalid_overrides(one_dimensional_mode):
     """Validation should fail if overrides are invalid"""
 
     invalid = [
@@ -190,7 +185,7 @@ def test_invalid_overrides(subschema, one_dimensional_mode):
                         "operating_modes": [one_dimensional_mode],
                     }
                 },
-                schema=subschema,
+                section="power_curves", schema=load_schema(),
             )
 
         assert reason in str(e)
@@ -204,7 +199,7 @@ def test_invalid_overrides(subschema, one_dimensional_mode):
         [100, 120, 140],
     ],
 )
-def test_restricted_to_hub_heights(subschema, one_dimensional_mode, restricted_to_hub_heights):
+def test_restricted_to_hub_heights(one_dimensional_mode, restricted_to_hub_heights):
     """Restricted hub heights should be definable as a continuous range or as a list of numbers"""
     one_dimensional_mode["restricted_to_hub_heights"] = restricted_to_hub_heights
     validate(
@@ -214,11 +209,11 @@ def test_restricted_to_hub_heights(subschema, one_dimensional_mode, restricted_t
                 "operating_modes": [one_dimensional_mode],
             }
         },
-        schema=subschema,
+        section="power_curves", schema=load_schema(),
     )
 
 
-def test_invalid_restricted_to_hub_heights(subschema, one_dimensional_mode):
+def test_invalid_restricted_to_hub_heights(one_dimensional_mode):
     """Validation should fail if restricted_to_hub_heights is invalid"""
     one_dimensional_mode["restricted_to_hub_heights"] = "not an array or hub heights dict"
 
@@ -230,13 +225,13 @@ def test_invalid_restricted_to_hub_heights(subschema, one_dimensional_mode):
                     "operating_modes": [one_dimensional_mode],
                 }
             },
-            schema=subschema,
+            section="power_curves", schema=load_schema(),
         )
 
     assert "is not valid under any of the given schemas" in str(e)
 
 
-def test_acoustic_emissions(subschema, one_dimensional_mode):
+def test_acoustic_emissions(one_dimensional_mode):
     """Ensure all three variations of acoustic emissions validate correctly"""
     # fmt: off
     third_octave_noise = {
@@ -286,11 +281,11 @@ def test_acoustic_emissions(subschema, one_dimensional_mode):
                     "operating_modes": [one_dimensional_mode],
                 }
             },
-            schema=subschema,
+            section="power_curves", schema=load_schema(),
         )
 
 
-def test_with_varied_parameters(subschema, two_dimensional_mode_with_varied_parameters):
+def test_with_varied_parameters(two_dimensional_mode_with_varied_parameters):
     """Parameters which do not have an `axis` property are informational
     and do not relate to an axis of the power curve nd-array. Test that they are acceptable."""
 
@@ -301,11 +296,11 @@ def test_with_varied_parameters(subschema, two_dimensional_mode_with_varied_para
                 "operating_modes": [two_dimensional_mode_with_varied_parameters],
             }
         },
-        schema=subschema,
+        section="power_curves", schema=load_schema(),
     )
 
 
-def test_wind_speed_reference(subschema, one_dimensional_mode):
+def test_wind_speed_reference(one_dimensional_mode):
     """Ensure all three kinds of wind speed reference location are encompassed"""
     rotor_averaged = {
         "reference_type": "rotor-averaged",
@@ -329,11 +324,11 @@ def test_wind_speed_reference(subschema, one_dimensional_mode):
                     "operating_modes": [one_dimensional_mode],
                 }
             },
-            schema=subschema,
+            section="power_curves", schema=load_schema(),
         )
 
 
-def test_rotor_rpm(subschema, one_dimensional_mode, two_dimensional_mode):
+def test_rotor_rpm(one_dimensional_mode, two_dimensional_mode):
     """Ensure rotor_rpm is optional and validates correctly for 1D and 2D arrays"""
     # fmt: off
     # 1D rotor_rpm array matching the wind-speed axis (45 values)
@@ -365,7 +360,7 @@ def test_rotor_rpm(subschema, one_dimensional_mode, two_dimensional_mode):
                 "operating_modes": [one_dimensional_mode],
             }
         },
-        schema=subschema,
+        section="power_curves", schema=load_schema(),
     )
 
     # Test 2D mode with rotor_rpm
@@ -377,11 +372,11 @@ def test_rotor_rpm(subschema, one_dimensional_mode, two_dimensional_mode):
                 "operating_modes": [two_dimensional_mode],
             }
         },
-        schema=subschema,
+        section="power_curves", schema=load_schema(),
     )
 
 
-def test_rotor_rpm_invalid(subschema, one_dimensional_mode):
+def test_rotor_rpm_invalid(one_dimensional_mode):
     """Validation should fail if rotor_rpm contains invalid values"""
     one_dimensional_mode["rotor_rpm"] = "not an array"
 
@@ -393,7 +388,7 @@ def test_rotor_rpm_invalid(subschema, one_dimensional_mode):
                     "operating_modes": [one_dimensional_mode],
                 }
             },
-            schema=subschema,
+            section="power_curves", schema=load_schema(),
         )
 
     assert "is not valid under any of the given schemas" in str(e)
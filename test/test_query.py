@@ -0,0 +1,94 @@
+# Turn off pylint warnings unavoidable with pytest
+# pylint: disable=redefined-outer-name, line-too-long, redefined-builtin, missing-module-docstring
+
+import pytest
+from jsonpath_ng.ext import parse
+
+from power_curve_schema.query import compile_query, find_by_label, first, query
+
+EXPRESSIONS = [
+    "$.turbine.rated_power",
+    "$.turbine['rated_power','rated_rpm']",
+    "$.turbine.*",
+    "$.power_curves.operating_modes[*].label",
+    "$.power_curves.operating_modes[-1].label",
+    "$.power_curves.operating_modes[0:2].label",
+    "$.power_curves.operating_modes[::2].label",
+    "$.power_curves.operating_modes.*.label",
+    "$.power_curves.operating_modes[*].parameters[?label=='wind-speed'].values",
+    "$.power_curves.operating_modes[?(@.label == 'mode_2')].overrides",
+    "$.power_curves.operating_modes[?label=='mode_3'].cuts[?wind_speed > 3].cut_type",
+    "$.power_curves.operating_modes[?overrides.rated_power < 20000000].label",
+    "$.document.metadata[?term = 'Identifier'].value",
+    "$.design_bases[?label != 'none'].label",
+    "$..rated_power",
+    "$..label",
+    "$.turbine.missing",
+    "$.power_curves.operating_modes[7]",
+]
+
+
+@pytest.mark.parametrize("expression", EXPRESSIONS)
+def test_matches_jsonpath_ng(expression, generic_274_20):
+    """Compiled queries should give the same results, in the same order, as jsonpath_ng"""
+    assert compile_query(expression)(generic_274_20) == [match.value for match in parse(expression).find(generic_274_20)]
+
+
+def test_queries_are_memoized(generic_120_3):
+    """Compiling the same expression twice should give the same function"""
+    expression = "$.power_curves.operating_modes[*].label"
+    assert compile_query(expression) is compile_query(expression)
+    assert query(expression, generic_120_3) == ["standard"]
+    assert first("$.turbine.rated_power", generic_120_3) == generic_120_3["turbine"]["rated_power"]
+    assert first("$.turbine.missing", generic_120_3, default=0) == 0
+
+
+def test_unsupported_expressions_fall_back(generic_274_20):
+    """Expressions outside the supported subset should still be evaluated, by jsonpath_ng"""
+    expression = "$.power_curves.operating_modes[?label =~ 'mode_[13]'].label"
+    assert compile_query(expression)(generic_274_20) == ["mode_1", "mode_3"]
+    assert compile_query("$.turbine..*")(generic_274_20) == [match.value for match in parse("$.turbine..*").find(generic_274_20)]
+
+
+def test_label_filters_follow_changes(generic_274_20):
+    """Lookups by label should see modes added, removed and relabelled since the list was indexed"""
+    modes = generic_274_20["power_curves"]["operating_modes"]
+    mode_query = compile_query("$.power_curves.operating_modes[?label=='mode_2'].label")
+    assert mode_query(generic_274_20) == ["mode_2"]
+
+    modes[0]["label"], modes[1]["label"] = "mode_2", "mode_1"
+    assert find_by_label(modes, "mode_2") == [modes[0]]
+    assert find_by_label(modes, "mode_1") == [modes[1]]
+    modes[1]["label"] = "renamed"
+    assert find_by_label(modes, "renamed") == [modes[1]]
+    assert find_by_label(modes, "mode_1") == []
+    modes.append({**modes[2], "label": "mode_4"})
+    assert find_by_label(modes, "mode_4") == [modes[3]]
+    del modes[:2]
+    assert mode_query(generic_274_20) == []
+    assert find_by_label(modes, "mode_3") == [modes[0]]
+
+
+def test_label_filters_of_new_lists():
+    """Lists created where a searched list was freed should be searched afresh"""
+    for _ in range(100):
+        items = [{"label": "mode_1"}, {"label": "mode_2"}]
+        assert find_by_label(items, "mode_1") == [items[0]]
+        del items
+        items = [{"label": "mode_1"}, {"label": "mode_1"}]
+        assert find_by_label(items, "mode_1") == items
+
+
+def test_duplicate_labels(generic_274_20):
+    """Every item with a label should be found, including when relabelling an item in place creates a duplicate"""
+    modes = generic_274_20["power_curves"]["operating_modes"]
+    modes.append({**modes[0]})
+    assert find_by_label(modes, "mode_1") == [modes[0], modes[3]]
+    modes[1]["label"] = "mode_1"
+    assert find_by_label(modes, "mode_1") == [modes[0], modes[1], modes[3]]
+
+
+def test_unlabelled_items():
+    """Lists with items which aren't labelled objects should still be searched"""
+    items = [{"label": "a"}, {"value": 1}, 3, {"label": ["a"]}, {"label": "a"}]
+    assert find_by_label(items, "a") == [items[0], items[4]]
@@ -0,0 +1,108 @@
+# Turn off pylint warnings unavoidable with pytest
+# pylint: disable=redefined-outer-name, line-too-long, redefined-builtin, missing-module-docstring
+
+import concurrent.futures
+import json
+import os
+
+import numpy as np
+import pytest
+
+from power_curve_schema.encoding import encode_document
+from power_curve_schema.repository import RepositoryClient, RepositoryServer
+from power_curve_schema.serialization import content_hash
+
+IDENTIFIER = "6d3ff892-8763-4448-aab9-ab8454bf6ec5"
+
+
+@pytest.fixture()
+def server(generic_274_20):
+    with RepositoryServer([generic_274_20]) as server:
+        yield server
+
+
+def test_repeat_fetches_are_single_not_modified_round_trips(server, generic_274_20):
+    """Repeat fetches should make one conditional request on the same connection, returning the cached document"""
+    with RepositoryClient(server.url) as client:
+        doc = client.document(IDENTIFIER)
+        assert doc == generic_274_20
+        assert client.stats == {"requests": 1, "not_modified": 0, "connections": 1}
+        for _ in range(3):
+            assert client.document(IDENTIFIER) is doc
+        assert client.stats == {"requests": 4, "not_modified": 3, "connections": 1}
+
+        mode = client.mode(IDENTIFIER, "mode_2", arrays=True)
+        assert np.array_equal(mode["power"], generic_274_20["power_curves"]["operating_modes"][1]["power"])
+        assert client.identifiers() == {IDENTIFIER: '"' + content_hash(generic_274_20) + '"'}
+        assert client.stats["connections"] == 1
+
+        with pytest.raises(KeyError):
+            client.document("other")
+        with pytest.raises(KeyError):
+            client.mode(IDENTIFIER, "other")
+
+
+def test_changed_documents_are_fetched_again(server, generic_274_20):
+    """Documents changed on the server should be downloaded again, and checked against local copies by content hash"""
+    with RepositoryClient(server.url) as client:
+        assert client.is_current(IDENTIFIER, generic_274_20)
+        assert client.is_current(IDENTIFIER, encode_document(generic_274_20))
+        first = client.document(IDENTIFIER)
+
+        changed = json.loads(json.dumps(generic_274_20))
+        changed["turbine"]["rated_power"] += 1
+        server.add(changed)
+        assert not client.is_current(IDENTIFIER, generic_274_20)
+        assert client.document(IDENTIFIER) == changed != first
+        assert client.stats["not_modified"] == 2
+
+        server.remove(IDENTIFIER)
+        with pytest.raises(KeyError):
+            client.document(IDENTIFIER)
+
+
+def test_disk_cache_is_shared_between_clients(server, generic_274_20, tmp_path):
+    """A new client with the same cache directory should revalidate without downloading, and reuse the binary store"""
+    with RepositoryClient(server.url, cache_dir=tmp_path) as client:
+        model = client.model(IDENTIFIER)
+        assert np.array_equal(model.mode("mode_1").power, generic_274_20["power_curves"]["operating_modes"][0]["power"])
+    assert sorted(os.path.splitext(name)[1] for name in os.listdir(tmp_path)) == [".json", ".npz", ".ref"]
+
+    with RepositoryClient(server.url, cache_dir=tmp_path) as client:
+        assert client.document(IDENTIFIER) == generic_274_20
+        assert client.model(IDENTIFIER).identifier == IDENTIFIER
+        assert client.stats == {"requests": 2, "not_modified": 2, "connections": 1}
+
+
+def test_connections_are_pooled_between_threads(server):
+    """Concurrent fetches should each use their own connection, which are kept open for later fetches"""
+    with RepositoryClient(server.url, max_connections=4) as client:
+        with concurrent.futures.ThreadPoolExecutor(4) as executor:
+            labels = list(executor.map(lambda i: client.mode(IDENTIFIER, f"mode_{i % 3 + 1}")["label"], range(20)))
+        assert labels == [f"mode_{i % 3 + 1}" for i in range(20)]
+        assert 1 <= client.stats["connections"] <= 4 and client.stats["requests"] == 20
+
+
+def test_stale_connections_are_replaced(generic_274_20):
+    """Requests on pooled connections which the server has closed should be retried on a new connection"""
+    server = RepositoryServer([generic_274_20]).start()
+    try:
+        client = RepositoryClient(server.url)
+        client.document(IDENTIFIER)
+        for connection in client._idle:  # pylint: disable=protected-access
+            connection.sock.close()
+        assert client.document(IDENTIFIER)["turbine"] == generic_274_20["turbine"]
+        assert client.stats["connections"] == 2
+    finally:
+        server.stop()
+
+
+def test_tokens_are_required(generic_274_20, tmp_path):
+    """Servers with a token should refuse requests without it, and serve documents from a directory"""
+    with open(tmp_path / "doc.json", "w", encoding="utf-8") as fp:
+        json.dump(generic_274_20, fp)
+    with RepositoryServer.from_directory(tmp_path, token="secret") as server:
+        assert IDENTIFIER in server and len(server) == 1
+        with pytest.raises(PermissionError):
+            RepositoryClient(server.url).document(IDENTIFIER)
+        assert RepositoryClient(server.url, token="secret").document(IDENTIFIER) == generic_274_20
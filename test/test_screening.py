@@ -0,0 +1,141 @@
+# Turn off pylint warnings unavoidable with pytest
+# pylint: disable=redefined-outer-name, line-too-long, redefined-builtin, missing-module-docstring
+
+import copy
+
+import numpy as np
+import pytest
+
+from power_curve_schema.effective import effective_modes
+from power_curve_schema.screening import ScreeningIndex, build_screening_index
+
+
+@pytest.fixture()
+def index(generic_120_3, generic_274_20):
+    """A screening index of the generic turbines"""
+    return build_screening_index([generic_120_3, generic_274_20])
+
+
+def test_modes(index):
+    """Every operating mode should be indexed, by source and label"""
+    assert index.modes == [(0, "standard"), (1, "mode_1"), (1, "mode_2"), (1, "mode_3")]
+
+
+def test_design_class(index):
+    """Modes should be suitable for sites of their design class or a less severe one"""
+    assert index.suitable_modes({"design_class": "III"}) == index.modes
+    assert index.suitable_modes({"design_class": "II"}) == index.modes
+    assert index.suitable_modes({"design_class": "I"}) == []
+    # Only the custom class of the smaller turbine's second design basis allows a lower reference wind speed
+    assert index.suitable_modes({"reference_wind_speed": 40.0, "annual_average_wind_speed": 8.0}) == index.modes
+    assert index.suitable_modes({"reference_wind_speed": 30.0, "annual_average_wind_speed": 9.0}) == []
+
+
+def test_turbulence_and_temperatures(index):
+    """Turbulence intensity and temperature ranges should be covered by a design basis"""
+    assert index.suitable_modes({"turbulence_intensity": 0.16}) == index.modes
+    assert index.suitable_modes({"turbulence_intensity": 0.17}) == []
+    # Only the cold climates cover -20 to 40 deg C
+    assert index.suitable_modes({"operating_temperature": [-20, 40]}) == index.modes
+    assert index.suitable_modes({"operating_temperature": [-20, 45]}) == []
+    assert index.suitable_modes({"survival_temperature": [-30, 50], "operating_temperature": [-10, 45]}) == []
+
+
+def test_hub_heights(index):
+    """Hub heights should be allowed by both the turbine and the mode"""
+    assert index.suitable_modes({"hub_height": 116.5}) == [(0, "standard")]
+    assert index.suitable_modes({"hub_height": 145}) == [(1, "mode_1"), (1, "mode_2")]
+    assert index.suitable_modes({"hub_height": 150}) == [(1, "mode_1"), (1, "mode_2"), (1, "mode_3")]
+    assert index.suitable_modes({"hub_height": 146}) == []
+
+
+def test_screen_matches_loop(generic_120_3, generic_274_20):
+    """Batched screening should match checking every site against every mode"""
+    rng = np.random.default_rng(0)
+    documents = []
+    for i in range(20):
+        doc = copy.deepcopy(generic_274_20 if i % 2 else generic_120_3)
+        for basis in doc["design_bases"]:
+            basis["design_class"] = {
+                "class_label": "S",
+                "reference_wind_speed": float(rng.uniform(35, 55)),
+                "annual_average_wind_speed": float(rng.uniform(7, 11)),
+            }
+            basis["turbulence"] = {"category": "S", "reference_turbulence_intensity": float(rng.uniform(0.1, 0.2))}
+        documents.append(doc)
+    index = build_screening_index(documents)
+
+    sites = {
+        "reference_wind_speed": rng.uniform(35, 55, 200),
+        "annual_average_wind_speed": rng.uniform(7, 11, 200),
+        "turbulence_intensity": rng.uniform(0.1, 0.2, 200),
+        "operating_temperature": np.stack([rng.uniform(-25, -5, 200), rng.uniform(30, 45, 200)], axis=-1),
+        "hub_height": rng.choice([116.5, 140.0, 145.0, 150.0], 200),
+    }
+    results = index.screen(sites, batch_cells=1000)
+
+    for site in range(200):
+        expected = []
+        for position, doc in enumerate(documents):
+            for mode in effective_modes(doc):
+                if not mode.allows_hub_height(sites["hub_height"][site]):
+                    continue
+                for basis in mode.design_bases:
+                    climates = [basis[name] for name in ("standard_climate", "cold_climate", "hot_climate")]
+                    if (
+                        basis["design_class"]["reference_wind_speed"] >= sites["reference_wind_speed"][site]
+                        and basis["design_class"]["annual_average_wind_speed"]
+                        >= sites["annual_average_wind_speed"][site]
+                        and basis["turbulence"]["reference_turbulence_intensity"] >= sites["turbulence_intensity"][site]
+                        and any(
+                            climate["operating_temperature_range"][0] <= sites["operating_temperature"][site][0]
+                            and climate["operating_temperature_range"][1] >= sites["operating_temperature"][site][1]
+                            for climate in climates
+                        )
+                    ):
+                        expected.append((position, mode.label))
+                        break
+        assert [index.modes[i] for i in results[site]] == expected
+
+
+def test_unknown_conditions(index):
+    """Unknown site conditions and design classes should be rejected"""
+    with pytest.raises(ValueError, match="Unknown site conditions"):
+        index.screen({"wind_speed": [10.0]})
+    with pytest.raises(ValueError, match="Unknown design class"):
+        index.screen({"design_class": ["IV"]})
+
+
+def test_empty_index():
+    """An empty index should find no modes"""
+    results = ScreeningIndex().screen({"hub_height": [100.0, 120.0]})
+    assert [len(result) for result in results] == [0, 0]
+
+
+def test_sites_are_compared_with_their_candidate_rows(generic_274_20, monkeypatch):
+    """Sites should be batched with sites of similar reference wind speeds, so few rows below theirs are compared"""
+    documents = []
+    for reference in np.linspace(35, 55, 50):
+        doc = copy.deepcopy(generic_274_20)
+        doc["design_bases"][0]["design_class"] = {
+            "class_label": "S",
+            "reference_wind_speed": float(reference),
+            "annual_average_wind_speed": 8.0,
+        }
+        documents.append(doc)
+    index = build_screening_index(documents)
+    rows = len(index.table["mode"])
+    sites = {"reference_wind_speed": np.random.default_rng(0).uniform(35, 55, 1000)}
+    candidates = rows - np.searchsorted(index.table["reference_wind_speed"], sites["reference_wind_speed"])
+
+    compared = []
+    screen_batch = ScreeningIndex._screen_batch  # pylint: disable=protected-access
+
+    def recording_screen_batch(table, batch_sites, starts):
+        compared.extend([rows - int(starts.min())] * len(starts))
+        return screen_batch(table, batch_sites, starts)
+
+    monkeypatch.setattr(ScreeningIndex, "_screen_batch", staticmethod(recording_screen_batch))
+    results = index.screen(sites)
+    assert len(compared) == 1000 and sum(compared) <= 2 * candidates.sum()
+    assert results[0].tolist() == index.screen({key: values[:1] for key, values in sites.items()})[0].tolist()
@@ -0,0 +1,146 @@
+# Turn off pylint warnings unavoidable with pytest
+# pylint: disable=redefined-outer-name, line-too-long, redefined-builtin, missing-module-docstring
+
+import copy
+import io
+import json
+import tracemalloc
+
+import numpy as np
+import pytest
+
+from power_curve_schema import serialization
+from power_curve_schema.serialization import content_hash, dump, dumps, loads
+
+
+@pytest.fixture(params=["small", "large"])
+def array_sizes(request, monkeypatch):
+    """Parse arrays as by the JSON parser, or (with tiny thresholds) as large arrays, piece by piece"""
+    if request.param == "large":
+        monkeypatch.setattr(serialization, "LARGE_ARRAY_BYTES", 1)
+        monkeypatch.setattr(serialization, "_PIECE_BYTES", 4)
+
+
+def test_round_trip(generic_274_20):
+    """Compact and pretty-printed output should both parse back to the same content"""
+    assert json.loads(dumps(generic_274_20)) == generic_274_20
+    assert json.loads(dumps(generic_274_20, indent=2)) == generic_274_20
+
+
+def test_key_order_does_not_affect_output(generic_120_3):
+    """Documents which differ only in key order should serialize identically"""
+    reordered = json.loads(json.dumps(generic_120_3, sort_keys=True))
+    reordered["turbine"] = dict(reversed(list(reordered["turbine"].items())))
+    assert dumps(reordered) == dumps(generic_120_3)
+    assert content_hash(reordered) == content_hash(generic_120_3)
+
+
+def test_number_formatting():
+    """Numbers should use the shortest round-trip representation, without fractional parts for integral values"""
+    assert dumps([22000.0, 22000, np.float32(0.5), -0.0, 0.1, 1e16, 1e-7, np.int64(3)]) == "[22000,22000,0.5,0,0.1,1e+16,1e-07,3]"
+    assert dumps({"b": [True, None], "a": "é"}) == '{"a":"é","b":[true,null]}'
+
+
+def test_non_finite_numbers_are_rejected():
+    """NaN and infinity aren't valid JSON"""
+    with pytest.raises(ValueError):
+        dumps([1.0, float("nan")])
+    with pytest.raises(ValueError):
+        dumps(np.array([float("inf")]))
+
+
+def test_numpy_arrays_serialize_like_nested_lists(generic_274_20):
+    """A mode holding numpy arrays should produce exactly the same bytes as the one holding nested lists"""
+    mode = generic_274_20["power_curves"]["operating_modes"][0]
+    with_arrays = copy.copy(mode)
+    with_arrays["power"] = np.array(mode["power"])
+    with_arrays["thrust_coefficient"] = np.array(mode["thrust_coefficient"], dtype=np.float64)
+    assert dumps(with_arrays) == dumps(mode)
+    assert dumps(with_arrays, indent=2) == dumps(mode, indent=2)
+
+
+@pytest.mark.parametrize(
+    "array",
+    [
+        np.arange(6, dtype=">i8").reshape(2, 3),
+        np.arange(6, dtype=">f8").reshape(2, 3).T,
+        np.array([[1.5, -0.0], [2.0**60, 3]]),
+        np.arange(4, dtype=np.uint8),
+        np.float32([0.1, 2]),
+        np.array([True, False]),
+        np.zeros((2, 0)),
+    ],
+)
+def test_array_layouts_serialize_like_nested_lists(array):
+    """Arrays of any byte order, memory layout and numeric dtype should be encoded as their nested lists"""
+    assert dumps(array) == dumps(array.tolist())
+    assert dumps(array, indent=2) == dumps(array.tolist(), indent=2)
+
+
+def test_dump_streams_identical_output(generic_274_20):
+    """Writing to a file in small buffered blocks should give the same output as dumps"""
+    fp = io.StringIO()
+    dump(generic_274_20, fp, indent=4, buffer_size=100)
+    assert fp.getvalue() == dumps(generic_274_20, indent=4)
+
+
+def test_loads_parses_curve_arrays_into_numpy_arrays(generic_274_20, array_sizes):
+    """Curve fields should be parsed into float64 arrays of their shape, and everything else as by json.loads"""
+    text = dumps(generic_274_20, indent=2)
+    doc = loads(text, arrays=True)
+    mode = doc["power_curves"]["operating_modes"][0]
+    expected = generic_274_20["power_curves"]["operating_modes"][0]
+    assert isinstance(mode["power"], np.ndarray) and mode["power"].dtype == np.float64
+    assert mode["power"].shape == np.shape(expected["power"])
+    assert np.array_equal(mode["power"], expected["power"])
+    assert isinstance(mode["parameters"][0]["values"], np.ndarray)
+    assert mode["label"] == expected["label"]
+    assert dumps(doc) == dumps(generic_274_20)
+    assert dumps(loads(text.encode("utf-8"), arrays=True)) == dumps(generic_274_20)
+
+
+@pytest.mark.parametrize(
+    "text, expected",
+    [
+        ('{"power": [[1, 2.5], [3e2, -0.0]]}', np.array([[1, 2.5], [300, 0]])),
+        ('{"power": [[1, 2], [3]]}', [[1, 2], [3]]),
+        ('{"power": [[1], []]}', [[1], []]),
+        ('{"power": []}', []),
+        ('{"power": [1, "a"]}', [1, "a"]),
+        ('{"power": [1, true]}', [1, True]),
+        ('{"power": [1.5, null]}', [1.5, None]),
+        ('{"values": [{"min": 1}]}', [{"min": 1}]),
+        ('{"label": "\\"power\\": [1, 2]", "power": [1]}', np.array([1.0])),
+    ],
+)
+def test_loads_leaves_other_arrays_to_the_json_parser(text, expected, array_sizes):
+    """Ragged, empty and non-numeric arrays (and text inside strings) should be parsed exactly as by json.loads"""
+    value = loads(text, arrays=True)["values" if '"values"' in text else "power"]
+    assert type(value) is type(expected)
+    assert np.array_equal(value, expected) if isinstance(expected, np.ndarray) else value == expected
+
+
+@pytest.mark.parametrize("number", [".5", "5.", "+5", "05", "-05", "1.2.3", "1e", "e5", "-", "1 2", "[1]2"])
+def test_loads_rejects_invalid_numbers_in_arrays(number, array_sizes):
+    """Numbers which numpy would accept but JSON doesn't should still be rejected"""
+    with pytest.raises(json.JSONDecodeError):
+        loads(f'{{"power": [[1], [{number}]]}}', arrays=True)
+
+
+def test_loads_needs_a_fraction_of_the_memory_for_large_arrays():
+    """Parsing a large curve into a numpy array should need a fraction of the peak memory of parsing it into lists"""
+    power = np.random.default_rng(0).random((20, 50, 500)) * 1e6
+    data = dumps({"label": "mode_1", "power": power}).encode("utf-8")
+    assert len(data) > serialization.LARGE_ARRAY_BYTES
+
+    peaks = []
+    for arrays in (False, True):
+        tracemalloc.start()
+        try:
+            doc = loads(data, arrays=arrays)
+            peaks.append(tracemalloc.get_traced_memory()[1])
+        finally:
+            tracemalloc.stop()
+    assert np.array_equal(doc["power"], power)
+    # The lists alone take 32 bytes per number (a pointer and a python float), against 8 bytes in the numpy array
+    assert peaks[1] < peaks[0] / 3
@@ -0,0 +1,79 @@
+# Turn off pylint warnings unavoidable with pytest
+# pylint: disable=redefined-outer-name, line-too-long, redefined-builtin, missing-module-docstring
+
+import multiprocessing
+import pickle
+
+import numpy as np
+import pytest
+
+from power_curve_schema.farm import FarmEvaluator
+from power_curve_schema.shared import SharedCurveTables, attach, attached, detach
+
+FLOW = {"wind-speed": np.linspace(0.0, 30.0, 61), "air-density": 1.2}
+
+
+def _evaluate(handle):
+    """Evaluate a farm of an attached document in a worker, returning the results and whether the arrays were copied"""
+    doc = attach(handle)
+    try:
+        mode = doc["power_curves"]["operating_modes"][0]
+        results = FarmEvaluator([(doc, mode["label"], 140.0)] * 61)(FLOW)
+        return results["power"].copy(), mode["power"].flags.owndata
+    finally:
+        detach(handle)
+
+
+@pytest.fixture()
+def tables():
+    with SharedCurveTables() as tables:
+        yield tables
+
+
+def test_attached_documents_evaluate_like_the_original(tables, generic_274_20):
+    """Attached documents should hold read-only views of the curve arrays, which evaluate exactly as the original"""
+    handle = tables.publish(generic_274_20)
+    doc = attach(handle)
+    try:
+        mode = doc["power_curves"]["operating_modes"][0]
+        original = generic_274_20["power_curves"]["operating_modes"][0]
+        assert not mode["power"].flags.writeable and not mode["power"].flags.owndata
+        assert np.array_equal(mode["power"], original["power"])
+        assert np.array_equal(mode["parameters"][1]["values"], original["parameters"][1]["values"])
+        assert doc["turbine"] == generic_274_20["turbine"]
+        expected = FarmEvaluator([(generic_274_20, "mode_1", 140.0)] * 61)(FLOW)["power"]
+        assert np.array_equal(FarmEvaluator([(doc, "mode_1", 140.0)] * 61)(FLOW)["power"], expected)
+        assert attach(handle) is doc
+        assert attached()[handle.name] == 2
+        detach(handle)
+    finally:
+        detach(handle)
+    assert handle.name not in attached()
+
+
+def test_publishing_is_reference_counted(tables, generic_274_20):
+    """Publishing the same document again should reuse its segment, which is unlinked when released as often"""
+    handle = tables.publish(generic_274_20)
+    assert tables.publish(generic_274_20) is handle
+    assert tables.publish(generic_274_20, labels=["mode_1"]).name != handle.name
+    assert len(tables) == 2
+
+    tables.release(handle)
+    assert handle in tables
+    tables.release(handle)
+    assert handle not in tables
+    with pytest.raises(FileNotFoundError):
+        attach(handle)
+    with pytest.raises(KeyError):
+        tables.release(handle)
+
+
+def test_workers_attach_without_copying(tables, generic_274_20):
+    """Worker processes should get the same results from views of the shared arrays, given only the pickled handle"""
+    handle = tables.publish(generic_274_20)
+    assert len(pickle.dumps(handle)) < handle.size
+    expected = _evaluate(handle)[0]
+    with multiprocessing.get_context("spawn").Pool(2) as pool:
+        for power, owndata in pool.map(_evaluate, [handle] * 4):
+            assert np.array_equal(power, expected)
+            assert not owndata
@@ -0,0 +1,24 @@
+# Turn off pylint warnings unavoidable with pytest
+# pylint: disable=redefined-outer-name, line-too-long, redefined-builtin, missing-module-docstring
+
+import json
+
+from power_curve_schema.chunked import export_document
+from power_curve_schema.sources import document_identifier, iter_sources
+
+
+def test_document_identifier(generic_120_3):
+    """The first Identifier in the metadata should identify a document"""
+    generic_120_3["document"]["metadata"] = [{"term": "Other", "value": "x"}, {"term": "Identifier", "value": "a"}]
+    assert document_identifier(generic_120_3) == "a"
+    assert document_identifier({}) is None
+
+
+def test_iter_sources(tmp_path, generic_120_3):
+    """Documents, JSON paths and chunked stores should be loaded, named by their paths or positions"""
+    json_path = tmp_path / "doc.json"
+    json_path.write_text(json.dumps(generic_120_3), encoding="utf-8")
+    export_document(generic_120_3, tmp_path / "doc.zarr")
+    loaded = list(iter_sources([generic_120_3, json_path, tmp_path / "doc.zarr"]))
+    assert [name for name, _ in loaded] == [0, str(json_path), str(tmp_path / "doc.zarr")]
+    assert all(doc == generic_120_3 for _, doc in loaded)
@@ -0,0 +1,90 @@
+# Turn off pylint warnings unavoidable with pytest
+# pylint: disable=redefined-outer-name, line-too-long, redefined-builtin, missing-module-docstring
+
+import json
+
+import numpy as np
+import pytest
+
+from power_curve_schema.surrogate import Surrogate, add_surrogates, document_surrogates, fit_document, fit_mode, read_surrogates, write_surrogates
+from power_curve_schema.validation import validate
+
+
+@pytest.fixture()
+def mode(generic_274_20):
+    return generic_274_20["power_curves"]["operating_modes"][0]
+
+
+@pytest.fixture()
+def points():
+    """Random points inside the grid of the 274-20 turbine's first mode (away from its edges, for finite differences)"""
+    rng = np.random.default_rng(0)
+    return {"air-density": rng.uniform(1.101, 1.274, 10000), "wind-speed": rng.uniform(0.01, 29.99, 10000)}
+
+
+@pytest.mark.parametrize("method", ["monotone", "spline"])
+def test_surrogates_reproduce_the_table(mode, method):
+    """With every grid point as a knot, surrogates should be exact at the grid points"""
+    surrogate = fit_mode(mode, method=method)
+    assert surrogate.max_error["power"] < 1e-6 and surrogate.max_error["thrust_coefficient"] < 1e-12
+    densities, speeds = np.meshgrid(mode["parameters"][0]["values"], mode["parameters"][1]["values"], indexing="ij")
+    assert np.allclose(surrogate({"air-density": densities, "wind-speed": speeds}, "thrust_coefficient"), mode["thrust_coefficient"], rtol=0, atol=1e-12)
+
+
+@pytest.mark.parametrize("method", ["monotone", "spline"])
+def test_gradients_match_finite_differences(mode, points, method):
+    """Analytic gradients should match central differences of the surrogate's values"""
+    surrogate = fit_mode(mode, method=method)
+    values, gradient = surrogate.gradient(points, "power")
+    assert np.array_equal(values, surrogate(points, "power"))
+    step = 1e-7
+    for label in points:
+        above = surrogate({**points, label: points[label] + step}, "power")
+        below = surrogate({**points, label: points[label] - step}, "power")
+        assert np.allclose(gradient[label], (above - below) / (2 * step), rtol=1e-5, atol=1e-3 * np.abs(gradient[label]).max())
+
+
+def test_monotone_surrogates_do_not_overshoot(mode):
+    """Between grid points along wind speed, monotone surrogates should stay within the neighbouring values"""
+    surrogate = fit_mode(mode, method="monotone")
+    speeds = np.asarray(mode["parameters"][1]["values"])
+    fine = np.linspace(speeds[0], speeds[-1], 5001)
+    power = surrogate({"air-density": 1.225, "wind-speed": fine})
+    table = np.asarray(mode["power"])[5]
+    interval = np.clip(np.searchsorted(speeds, fine, side="right") - 1, 0, speeds.size - 2)
+    low = np.minimum(table[interval], table[interval + 1])
+    high = np.maximum(table[interval], table[interval + 1])
+    assert np.all((power >= low - 1e-6) & (power <= high + 1e-6))
+
+
+def test_tolerance_gives_compact_surrogates(mode):
+    """Given tolerances, surrogates should use fewer knots, with errors within the tolerances"""
+    tolerance = {"power": 20000.0, "thrust_coefficient": 1e-2}
+    surrogate = fit_mode(mode, tolerance=tolerance)
+    assert sum(knots.size for knots in surrogate.knots) < 8 + 55
+    assert all(surrogate.max_error[field] <= tolerance[field] for field in tolerance)
+
+
+def test_out_of_bounds(mode):
+    """Values outside the knots should hold the end values (with no gradient along that axis), or raise"""
+    surrogate = fit_mode(mode)
+    values, gradient = surrogate.gradient({"air-density": 1.225, "wind-speed": [40.0, 50.0]})
+    assert values[0] == values[1] and np.all(gradient["wind-speed"] == 0)
+    strict = Surrogate.from_json(surrogate.to_json(), out_of_bounds="raise")
+    with pytest.raises(ValueError):
+        strict({"air-density": 1.225, "wind-speed": 40.0})
+
+
+def test_surrogates_round_trip(generic_274_20, points, tmp_path):
+    """Surrogates stored in additional data or a sidecar file should evaluate identically, and keep documents valid"""
+    surrogates = fit_document(generic_274_20, labels=["mode_1", "mode_2"])
+    with_surrogates = json.loads(json.dumps(add_surrogates(generic_274_20, surrogates)))
+    validate(with_surrogates)
+    assert "additional" not in generic_274_20
+
+    path = tmp_path / "surrogates.json"
+    write_surrogates(surrogates, path)
+    for loaded in (document_surrogates(with_surrogates), read_surrogates(path)):
+        assert set(loaded) == {"mode_1", "mode_2"}
+        assert np.array_equal(loaded["mode_2"](points, "thrust_coefficient"), surrogates["mode_2"](points, "thrust_coefficient"))
+        assert loaded["mode_1"].max_error == surrogates["mode_1"].max_error
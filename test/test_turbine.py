@@ -3,27 +3,20 @@
 
 
 import pytest
-from jsonschema import validate
 from jsonschema.exceptions import ValidationError
 
-from .helpers import get_subschema
+from power_curve_schema.validation import load_schema, validate
 
 
-@pytest.fixture
-def subschema(schema):
-    """Provide a schema that requires only the turbine part of the whole schema"""
-    return get_subschema(schema, "turbine")
-
-
-def test_generic_turbine(subschema, generic_turbine):
+def test_generic_turbine(generic_turbine):
     """Validation should pass on the generic turbine"""
-    validate(instance=generic_turbine, schema=subschema)
+    validate(instance=generic_turbine, section="turbine", schema=load_schema())
 
 
-def test_missing_turbine(subschema):
+def test_missing_turbine():
     """Validation should fail if there is no turbine section"""
     with pytest.raises(ValidationError) as e:
-        validate(instance={}, schema=subschema)
+        validate(instance={}, section="turbine", schema=load_schema())
     assert "'turbine' is a required property" in str(e)
 
 
@@ -40,11 +33,11 @@ def test_missing_turbine(subschema):
         "number_of_blades",
     ],
 )
-def test_missing_properties(subschema, generic_turbine, property):
+def test_missing_properties(generic_turbine, property):
     """Validation should fail if any required property is missing from turbine metadata"""
     generic_turbine["turbine"].pop(property, None)
     with pytest.raises(ValidationError) as e:
-        validate(instance=generic_turbine, schema=subschema)
+        validate(instance=generic_turbine, section="turbine", schema=load_schema())
     assert f"'{property}' is a required property" in str(e)
 
 
@@ -52,11 +45,11 @@ def test_missing_properties(subschema, generic_turbine, property):
     "property",
     ["model_name", "manufacturer_name", "manufacturer_display_name"],
 )
-def test_non_blankable_properties(subschema, generic_turbine, property):
+def test_non_blankable_properties(generic_turbine, property):
     """Validation should fail if any required string property (other than model_description) contains a blank string"""
     generic_turbine["turbine"][property] = ""
     with pytest.raises(ValidationError) as e:
-        validate(instance=generic_turbine, schema=subschema)
+        validate(instance=generic_turbine, section="turbine", schema=load_schema())
     assert "is too short" in str(e)
 
 
@@ -64,21 +57,21 @@ def test_non_blankable_properties(subschema, generic_turbine, property):
     "property",
     ["model_description", "platform_name", "platform_description"],
 )
-def test_blankable_properties(subschema, generic_turbine, property):
+def test_blankable_properties(generic_turbine, property):
     """Validation should pass if these string properties contain a blank string"""
     generic_turbine["turbine"][property] = ""
-    validate(instance=generic_turbine, schema=subschema)
+    validate(instance=generic_turbine, section="turbine", schema=load_schema())
 
 
 @pytest.mark.parametrize(
     "property",
     ["model_name", "platform_name", "manufacturer_display_name"],
 )
-def test_name_length_limits(subschema, generic_turbine, property):
+def test_name_length_limits(generic_turbine, property):
     """Validation should fail if name properties exceed a character limit"""
     generic_turbine["turbine"][property] = "01234567890123456789012345678901234567890-"
     with pytest.raises(ValidationError) as e:
-        validate(instance=generic_turbine, schema=subschema)
+        validate(instance=generic_turbine, section="turbine", schema=load_schema())
     assert "is too long" in str(e)
 
 
@@ -86,19 +79,19 @@ def test_name_length_limits(subschema, generic_turbine, property):
     "value",
     ["", "wrong", None],
 )
-def test_invalid_power_reference_location(subschema, generic_turbine, value):
+def test_invalid_power_reference_location(generic_turbine, value):
     """Validation should fail if any required string property (other than model_description) contains a blank string"""
     generic_turbine["turbine"]["power_reference_location"] = value
     with pytest.raises(ValidationError) as e:
-        validate(instance=generic_turbine, schema=subschema)
+        validate(instance=generic_turbine, section="turbine", schema=load_schema())
     assert "is not one of" in str(e)
 
 
 @pytest.mark.parametrize("available_hub_heights", [{"max": 168, "min": 84}, [100, 110, 112.3]])
-def test_available_hub_heights(subschema, generic_turbine, available_hub_heights):
+def test_available_hub_heights(generic_turbine, available_hub_heights):
     """Hub heights should be definable as a continuous range of values or as a list of numbers"""
     generic_turbine["turbine"]["available_hub_heights"] = available_hub_heights
-    validate(instance=generic_turbine, schema=subschema)
+    validate(instance=generic_turbine, section="turbine", schema=load_schema())
 
 
 @pytest.mark.parametrize(
@@ -112,11 +105,11 @@ def test_available_hub_heights(subschema, generic_turbine, available_hub_heights
         ),  # 41 characters
     ],
 )
-def test_invalid_manufacturer_display_names(subschema, generic_turbine, manufacturer_display_name):
+def test_invalid_manufacturer_display_names(generic_turbine, manufacturer_display_name):
     """Ensure manufacturer_display_name is validated as a string of maximum length"""
     generic_turbine["turbine"]["manufacturer_display_name"] = manufacturer_display_name[0]
     with pytest.raises(ValidationError) as e:
-        validate(instance=generic_turbine, schema=subschema)
+        validate(instance=generic_turbine, section="turbine", schema=load_schema())
     assert manufacturer_display_name[1] in str(e)
 
 
@@ -130,45 +123,45 @@ def test_invalid_manufacturer_display_names(subschema, generic_turbine, manufact
         ),
     ],
 )
-def test_invalid_rotor_diameters(subschema, generic_turbine, rotor_diameter):
+def test_invalid_rotor_diameters(generic_turbine, rotor_diameter):
     """Ensure rotor diameter cannot be outside acceptable bounds"""
     generic_turbine["turbine"]["rotor_diameter"] = rotor_diameter[0]
     with pytest.raises(ValidationError) as e:
-        validate(instance=generic_turbine, schema=subschema)
+        validate(instance=generic_turbine, section="turbine", schema=load_schema())
     assert rotor_diameter[1] in str(e)
 
 
 @pytest.mark.parametrize("drive_type", ["direct", "geared", "other"])
-def test_valid_drive_types(subschema, generic_turbine, drive_type):
+def test_valid_drive_types(generic_turbine, drive_type):
     """There is a fixed set of available drive types"""
     generic_turbine["turbine"]["drive_type"] = drive_type
-    validate(instance=generic_turbine, schema=subschema)
+    validate(instance=generic_turbine, section="turbine", schema=load_schema())
 
 
-def test_invalid_drive_type(subschema, generic_turbine):
+def test_invalid_drive_type(generic_turbine):
     """Validation should fail if drive type is anything but one of a set of values"""
     generic_turbine["turbine"]["drive_type"] = "gizmo"
     with pytest.raises(ValidationError) as e:
-        validate(instance=generic_turbine, schema=subschema)
+        validate(instance=generic_turbine, section="turbine", schema=load_schema())
     assert "'gizmo' is not one of ['geared', 'direct', 'other']" in str(e)
 
 
 @pytest.mark.parametrize("drive_type", ["pitch", "stall", "other"])
-def test_valid_regulation_types(subschema, generic_turbine, drive_type):
+def test_valid_regulation_types(generic_turbine, drive_type):
     """There is a fixed set of available regulation types"""
     generic_turbine["turbine"]["regulation_type"] = drive_type
-    validate(instance=generic_turbine, schema=subschema)
+    validate(instance=generic_turbine, section="turbine", schema=load_schema())
 
 
-def test_invalid_regulation_type(subschema, generic_turbine):
+def test_invalid_regulation_type(generic_turbine):
     """Validation should fail if regulation type is anything but one of a set of values"""
     generic_turbine["turbine"]["regulation_type"] = "aeroflap"
     with pytest.raises(ValidationError) as e:
-        validate(instance=generic_turbine, schema=subschema)
+        validate(instance=generic_turbine, section="turbine", schema=load_schema())
     assert "'aeroflap' is not one of ['pitch', 'stall', 'other']" in str(e)
 
 
-def test_reactive_power_derating(subschema, generic_turbine):
+def test_reactive_power_derating(generic_turbine):
     """Validation should pass for reactive power based thermal derating"""
     generic_turbine["turbine"]["thermal_regulation"] = {
         "derating": [
@@ -180,10 +173,10 @@ def test_reactive_power_derating(subschema, generic_turbine):
             }
         ]
     }
-    validate(instance=generic_turbine, schema=subschema)
+    validate(instance=generic_turbine, section="turbine", schema=load_schema())
 
 
-def test_reactive_power_derating_with_multiple_curves(subschema, generic_turbine):
+def test_reactive_power_derating_with_multiple_curves(generic_turbine):
     """Validation should pass for multiple reactive power based thermal derating curves"""
     generic_turbine["turbine"]["thermal_regulation"] = {
         "derating": [
@@ -207,10 +200,10 @@ def test_reactive_power_derating_with_multiple_curves(subschema, generic_turbine
             },
         ]
     }
-    validate(instance=generic_turbine, schema=subschema)
+    validate(instance=generic_turbine, section="turbine", schema=load_schema())
 
 
-def test_reactive_power_derating_negative_value_invalid(subschema, generic_turbine):
+def test_reactive_power_derating_negative_value_invalid(generic_turbine):
     """Validation should fail for negative reactive power values"""
     generic_turbine["turbine"]["thermal_regulation"] = {
         "derating": [
@@ -222,11 +215,11 @@ def test_reactive_power_derating_negative_value_invalid(subschema, generic_turbi
         ]
     }
     with pytest.raises(ValidationError) as e:
-        validate(instance=generic_turbine, schema=subschema)
+        validate(instance=generic_turbine, section="turbine", schema=load_schema())
     assert "minimum" in str(e)
 
 
-def test_reactive_power_derating_missing_required_field(subschema, generic_turbine):
+def test_reactive_power_derating_missing_required_field(generic_turbine):
     """Validation should fail if reactive_power derating is missing temperature or power_limit"""
     generic_turbine["turbine"]["thermal_regulation"] = {
         "derating": [
@@ -238,6 +231,6 @@ def test_reactive_power_derating_missing_required_field(subschema, generic_turbi
         ]
     }
     with pytest.raises(ValidationError) as e:
-        validate(instance=generic_turbine, schema=subschema)
+        validate(instance=generic_turbine, section="turbine", schema=load_schema())
     # Since derating uses anyOf, the error message indicates it doesn't match any schema
     assert "is not valid under any of the given schemas" in str(e)
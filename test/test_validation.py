@@ -0,0 +1,198 @@
+# Turn off pylint warnings unavoidable with pytest
+# pylint: disable=redefined-outer-name, line-too-long, redefined-builtin, missing-module-docstring
+
+import copy
+
+import numpy as np
+import pytest
+from jsonschema.exceptions import SchemaError, ValidationError
+
+from power_curve_schema import validation
+from power_curve_schema.bundle import SOURCE_HASH_KEY, build_bundled_schema, bundle_schema, load_bundled_schema
+from power_curve_schema.fast_validation import compile_schema, is_valid
+from power_curve_schema.serialization import dumps, loads
+from power_curve_schema.validation import (
+    SCHEMA_PATH,
+    default_schema,
+    get_validator,
+    load_schema,
+    section_schema,
+    validate,
+)
+
+
+def test_validators_are_memoized():
+    """The same validator should be returned for the same schema and section"""
+    assert get_validator("turbine") is get_validator("turbine")
+    assert get_validator("turbine") is not get_validator("power_curves")
+    assert get_validator() is get_validator(None, schema=default_schema())
+
+
+def test_equal_schemas_share_validators():
+    """Validators are keyed by schema content, so identical copies of a schema should reuse them"""
+    validator = get_validator("design_bases", schema=copy.deepcopy(default_schema()))
+    assert validator is get_validator("design_bases", schema=copy.deepcopy(default_schema()))
+
+
+def test_edited_copies_of_the_bundled_schema_get_their_own_validators(generic_120_3):
+    """Copies of the bundled schema keep its recorded source hash, which must not be trusted once they're edited"""
+    edited = copy.deepcopy(default_schema())
+    assert SOURCE_HASH_KEY in edited
+    edited["properties"]["turbine"] = False
+    with pytest.raises(ValidationError):
+        validate(generic_120_3, schema=edited)
+    validate(generic_120_3)
+    assert get_validator(schema=edited) is not get_validator()
+
+    edited["properties"]["turbine"] = {"type": "not-a-type"}
+    with pytest.raises(SchemaError):
+        get_validator(schema=copy.deepcopy(edited))
+
+
+def test_section_schema_does_not_modify_the_schema():
+    """Scoping a schema to a section should not alter the (shared) full schema"""
+    schema = load_schema()
+    before = copy.deepcopy(schema)
+    scoped = section_schema(schema, "turbine")
+    assert list(scoped["properties"]) == ["turbine"]
+    assert scoped["required"] == ["turbine"]
+    assert schema == before
+
+
+def test_unknown_section():
+    """An unknown section should raise a ValueError"""
+    with pytest.raises(ValueError):
+        get_validator("not_a_section")
+
+
+def test_section_validation_ignores_other_sections(generic_120_3):
+    """Validating a section should ignore invalid data elsewhere in the document"""
+    generic_120_3["power_curves"] = "not valid"
+    validate(instance=generic_120_3, section="turbine")
+    with pytest.raises(ValidationError):
+        validate(instance=generic_120_3)
+
+
+def test_bundled_schema_has_no_references():
+    """The bundled schema should have all references inlined and annotations removed"""
+    bundled = dumps(bundle_schema(load_schema()))
+    assert '"$ref"' not in bundled
+    assert '"$defs"' not in bundled
+    assert '"examples"' not in bundled
+    # Properties named like annotation keywords must be kept
+    assert '"description":{"type":"string"}' in bundled
+
+
+@pytest.mark.parametrize(
+    "section, path, value",
+    [
+        ("turbine", ["turbine", "rated_power"], -1),
+        ("turbine", ["turbine", "model_name"], ""),
+        ("power_curves", ["power_curves", "operating_modes", 0, "power"], [[1, "a"]]),
+        ("power_curves", ["power_curves", "operating_modes", 0, "parameters", 0, "label"], "not-a-label"),
+        ("design_bases", ["design_bases", 0, "design_class"], {"class_label": "IV"}),
+    ],
+)
+def test_bundled_schema_gives_the_same_results(generic_120_3, section, path, value):
+    """Validation errors from the bundled schema should match those from the source schema"""
+    node = generic_120_3
+    for key in path[:-1]:
+        node = node[key]
+    node[path[-1]] = value
+
+    errors = []
+    for schema in (load_schema(), bundle_schema(load_schema())):
+        with pytest.raises(ValidationError) as e:
+            validate(generic_120_3, section=section, schema=schema)
+        errors.append((e.value.message, list(e.value.absolute_path)))
+    assert errors[0] == errors[1]
+
+
+def test_bundled_schema_is_rebuilt_when_stale(tmp_path):
+    """The on-disk artifact should be built on first load, then rebuilt only when the source schema changes"""
+    source_path = tmp_path / "schema.json"
+    output_path = tmp_path / "schema.bundled.json"
+    with open(SCHEMA_PATH, "r", encoding="utf-8") as fp:
+        source_path.write_text(fp.read(), encoding="utf-8")
+
+    bundled = load_bundled_schema(str(source_path), str(output_path))
+    assert output_path.exists()
+    assert load_bundled_schema(str(source_path), str(output_path)) == bundled
+
+    source_path.write_text(source_path.read_text(encoding="utf-8") + "\n", encoding="utf-8")
+    assert load_bundled_schema(str(source_path), str(output_path))[SOURCE_HASH_KEY] != bundled[SOURCE_HASH_KEY]
+    assert build_bundled_schema(str(source_path), str(output_path)) == load_bundled_schema(
+        str(source_path), str(output_path)
+    )
+
+
+@pytest.mark.parametrize(
+    "path, value",
+    [
+        (["turbine", "rated_power"], -1),
+        (["turbine", "rated_power"], True),
+        (["turbine", "number_of_blades"], 3.0),
+        (["turbine", "model_name"], ""),
+        (["turbine", "unknown_property"], 1),
+        (["power_curves", "operating_modes", 0, "power"], [[1, "a"]]),
+        (["power_curves", "operating_modes", 0, "parameters", 0, "label"], "not-a-label"),
+        (["design_bases", 0, "design_class"], {"class_label": "IV"}),
+        (["design_bases", 0, "design_class"], {"class_label": "S"}),
+    ],
+)
+def test_fast_validator_agrees_with_jsonschema(generic_120_3, path, value):
+    """The compiled fast validator should give the same validity as the full jsonschema validator"""
+    node = generic_120_3
+    for key in path[:-1]:
+        node = node[key]
+    node[path[-1]] = value
+    assert is_valid(generic_120_3) == get_validator().is_valid(generic_120_3)
+
+
+def test_fast_validator_rejects_unsupported_keywords():
+    """Compiling a schema with a keyword the fast validator doesn't support should fail, rather than pass silently"""
+    assert compile_schema({"type": "array", "items": {"type": "number"}})([1, 2.5])
+    with pytest.raises(ValueError):
+        compile_schema({"$ref": "#/$defs/thing"})
+
+
+@pytest.mark.parametrize(
+    "path, value",
+    [
+        (["power_curves", "operating_modes", 0, "power"], np.array([[1.0, 2.0]])),
+        (["power_curves", "operating_modes", 0, "power"], np.array([1.0, 2.0])),
+        (["power_curves", "operating_modes", 0, "power"], np.array([[1.0, -1.0]])),
+        (["power_curves", "operating_modes", 0, "thrust_coefficient"], np.array([[[1.0]]])),
+        (["power_curves", "operating_modes", 0, "parameters", 0, "values"], np.array([1.1, 1.2])),
+        (["power_curves", "operating_modes", 0, "parameters", 0, "values"], np.array([1, 2], dtype=np.int64)),
+        (["power_curves", "operating_modes", 0, "parameters", 0, "values"], np.array([True, False])),
+        (["power_curves", "operating_modes", 0, "parameters", 0, "values"], np.array(["a", "b"])),
+        (["power_curves", "operating_modes", 0, "parameters", 0, "values"], np.array(1.2)),
+    ],
+)
+def test_fast_validator_checks_numpy_arrays_as_lists(generic_120_3, path, value):
+    """Documents holding numpy arrays (eg as parsed by `serialization.loads`) should be as valid as with nested lists"""
+    as_lists = copy.deepcopy(generic_120_3)
+    for doc, item in ((generic_120_3, value), (as_lists, value.tolist())):
+        node = doc
+        for key in path[:-1]:
+            node = node[key]
+        node[path[-1]] = item
+    assert is_valid(generic_120_3) == get_validator().is_valid(as_lists)
+
+
+def test_fast_validator_accepts_parsed_arrays(generic_274_20):
+    """Documents parsed with curve arrays as numpy arrays should be valid"""
+    assert is_valid(loads(dumps(generic_274_20), arrays=True))
+
+
+def test_validators_of_recent_schemas_are_kept(monkeypatch):
+    """Only the validators and hashes of the most recently used schemas should be kept"""
+    # pylint: disable=protected-access
+    monkeypatch.setattr(validation, "_hashes", validation._Cache(2))
+    monkeypatch.setattr(validation, "_validators", validation._Cache(2))
+    schemas = [{"type": "object", "title": str(i)} for i in range(5)]
+    validators = [get_validator(schema=schema) for schema in schemas]
+    assert len(validation._hashes.entries) == len(validation._validators.entries) == 2
+    assert get_validator(schema=schemas[-1]) is validators[-1]
+    assert get_validator(schema=schemas[0]) is not validators[0]